@@ -0,0 +1,23 @@
+"""
+Accounts Middleware
+Attaches the request's RBAC principal.
+"""
+
+from django.utils.functional import SimpleLazyObject
+
+from accounts.rbac import resolve_principal
+
+
+class PrincipalMiddleware:
+    """
+    Set ``request.principal``, resolved on first use.
+
+    Must come after SessionMiddleware and AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: resolve_principal(request))
+        return self.get_response(request)
@@ -8,7 +8,7 @@ from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
 from django.contrib import messages
 from accounts.models import UserRole
-from accounts.rbac import ROLE_PERMISSIONS, get_user_dashboard_url
+from accounts.rbac import ROLE_PERMISSIONS, get_principal, get_user_dashboard_url, permission_mask, role_mask
 
 
 class RoleRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -19,9 +19,7 @@ class RoleRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     allowed_roles = []
     
     def test_func(self):
-        if not hasattr(self.request.user, 'profile'):
-            return False
-        return self.request.user.profile.role in self.allowed_roles
+        return get_principal(self.request).has_role(role_mask(*self.allowed_roles))
     
     def handle_no_permission(self):
         if not self.request.user.is_authenticated:
@@ -42,23 +40,14 @@ class PermissionRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     required_permissions = []
     
     def test_func(self):
-        if not hasattr(self.request.user, 'profile'):
-            return False
-        
-        user_role = self.request.user.profile.role
-        user_permissions = ROLE_PERMISSIONS.get(user_role, {}).get('permissions', [])
-        
-        return all(perm in user_permissions for perm in self.required_permissions)
+        principal = get_principal(self.request)
+        return principal.has_profile and principal.has_permissions(permission_mask(*self.required_permissions))
     
     def handle_no_permission(self):
         if not self.request.user.is_authenticated:
             return redirect('accounts:login')
         
-        missing_perms = []
-        if hasattr(self.request.user, 'profile'):
-            user_role = self.request.user.profile.role
-            user_permissions = ROLE_PERMISSIONS.get(user_role, {}).get('permissions', [])
-            missing_perms = [p for p in self.required_permissions if p not in user_permissions]
+        missing_perms = get_principal(self.request).missing_permissions(permission_mask(*self.required_permissions))
         
         messages.error(
             self.request,
@@ -72,11 +61,7 @@ class ActiveUserRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     Mixin to check if user account is active.
     """
     def test_func(self):
-        if not hasattr(self.request.user, 'profile'):
-            return False
-        
-        profile = self.request.user.profile
-        return profile.is_active and profile.status == 'active'
+        return get_principal(self.request).is_active
     
     def handle_no_permission(self):
         if not self.request.user.is_authenticated:
@@ -1,14 +1,43 @@
 """
 Role-Based Access Control (RBAC) for DUSANGIRE
 Based on Business Model Canvas roles and responsibilities
+
+ROLE_PERMISSIONS is compiled at import into integer bitsets: one bit per role
+and per permission, and one permission mask per role. PrincipalMiddleware
+attaches an immutable Principal to each request. The decorators, mixins and
+the context processor check it with a single AND, whatever the size of the
+permission lists.
+
+A principal is resolved once per session. The first authenticated request
+loads the user with its profile (select_related) and stores the role, signed,
+in the session. Later requests rebuild the principal from that value and
+never query the profile. The cached value is bound to the session's user and
+auth hash. It expires after PRINCIPAL_MAX_AGE, or as soon as the profile is
+saved: saving rotates a version token kept in the cache, which every process
+must see. Session principals are therefore only trusted with SHARED_CACHE
+(REDIS_URL). With a per-process cache, each request loads the profile again.
 """
 
+import uuid
+from dataclasses import dataclass
 from functools import wraps
-from django.shortcuts import redirect
+from typing import Optional
+
+from django.conf import settings
 from django.contrib import messages
-from django.http import HttpResponseForbidden
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
 from django.contrib.auth.decorators import login_required
-from accounts.models import UserRole
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponseForbidden
+from django.shortcuts import redirect
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import empty
+from accounts.models import Profile, UserRole
 
 
 # ==================== ROLE DEFINITIONS ====================
@@ -166,6 +195,231 @@ ROLE_PERMISSIONS = {
 }
 
 
+# ==================== COMPILED PERMISSIONS ====================
+
+# One bit per permission named anywhere in ROLE_PERMISSIONS
+PERMISSION_BITS = {
+    permission: 1 << index
+    for index, permission in enumerate(sorted({
+        permission for role_info in ROLE_PERMISSIONS.values() for permission in role_info['permissions']
+    }))
+}
+
+# One bit per role
+ROLE_BITS = {role: 1 << index for index, role in enumerate(UserRole.values)}
+
+
+def permission_mask(*permissions):
+    """Bitmask of permission names; unknown names are a configuration error"""
+    mask = 0
+    for permission in permissions:
+        try:
+            mask |= PERMISSION_BITS[permission]
+        except KeyError:
+            raise ImproperlyConfigured(f"Unknown permission '{permission}'; add it to ROLE_PERMISSIONS")
+    return mask
+
+
+def role_mask(*roles):
+    """Bitmask of role values"""
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS.get(role, 0)
+    return mask
+
+
+# Permission mask of each role
+ROLE_MASKS = {role: permission_mask(*info['permissions']) for role, info in ROLE_PERMISSIONS.items()}
+
+
+class PermissionSet:
+    """Read-only set of permission names backed by a bitmask"""
+    __slots__ = ('mask',)
+
+    def __init__(self, mask=0):
+        self.mask = mask
+
+    def __contains__(self, permission):
+        return bool(self.mask & PERMISSION_BITS.get(permission, 0))
+
+    def __iter__(self):
+        return (permission for permission, bit in PERMISSION_BITS.items() if self.mask & bit)
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def __bool__(self):
+        return bool(self.mask)
+
+    def __repr__(self):
+        return f"PermissionSet({sorted(self)})"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authorization facts of the requesting user, fixed for the request"""
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+    role_bit: int = 0
+    permission_mask: int = 0
+    is_active: bool = False
+
+    @classmethod
+    def for_role(cls, user_id, role, is_active):
+        return cls(
+            user_id=user_id,
+            role=role,
+            role_bit=ROLE_BITS.get(role, 0),
+            permission_mask=ROLE_MASKS.get(role, 0),
+            is_active=is_active,
+        )
+
+    @classmethod
+    def for_user(cls, user):
+        """Principal of a loaded user; reads ``user.profile``"""
+        if not user.is_authenticated:
+            return ANONYMOUS
+        profile = getattr(user, 'profile', None)
+        if profile is None:
+            return cls(user_id=user.pk)
+        return cls.for_role(user.pk, profile.role, profile.is_active and profile.status == 'active')
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def has_profile(self):
+        return self.role is not None
+
+    @property
+    def permissions(self):
+        return PermissionSet(self.permission_mask)
+
+    @property
+    def dashboard_url(self):
+        return ROLE_PERMISSIONS.get(self.role, {}).get('dashboard', '/')
+
+    def has_role(self, mask):
+        """Whether the role is in a ``role_mask``"""
+        return bool(self.role_bit & mask)
+
+    def has_permissions(self, mask):
+        """Whether every permission of a ``permission_mask`` is granted"""
+        return self.permission_mask & mask == mask
+
+    def missing_permissions(self, mask):
+        return list(PermissionSet(mask & ~self.permission_mask))
+
+
+ANONYMOUS = Principal()
+
+
+# ==================== PRINCIPAL RESOLUTION ====================
+
+# Session key of the signed, cached principal
+PRINCIPAL_SESSION_KEY = '_rbac_principal'
+
+PRINCIPAL_SALT = 'accounts.rbac.principal'
+
+# Seconds a cached principal is trusted without reading the profile
+PRINCIPAL_MAX_AGE = 15 * 60
+
+
+def _version_key(user_id):
+    return f"rbac:principal_version:{user_id}"
+
+
+def invalidate_principal(user_id):
+    """Make every session of a user resolve its principal again"""
+    cache.set(_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def _cached_principal(request, session_user_id):
+    token = request.session.get(PRINCIPAL_SESSION_KEY)
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=PRINCIPAL_SALT, max_age=PRINCIPAL_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if (
+        data.get('u') != str(session_user_id)
+        or data.get('h') != request.session.get(HASH_SESSION_KEY)
+        or data.get('v') != cache.get(_version_key(session_user_id), '')
+    ):
+        return None
+    return Principal.for_role(int(data['u']), data['r'], data['a'])
+
+
+def _store_principal(request, principal):
+    if principal.has_profile:
+        request.session[PRINCIPAL_SESSION_KEY] = signing.dumps({
+            'u': str(principal.user_id),
+            'r': principal.role,
+            'a': principal.is_active,
+            'h': request.session.get(HASH_SESSION_KEY),
+            'v': cache.get(_version_key(principal.user_id), ''),
+        }, salt=PRINCIPAL_SALT)
+
+
+def _load_user(request, session_user_id):
+    """
+    The session's user with its profile in one query.
+
+    Replaces the lazy ``request.user`` when the session auth hash matches;
+    anything else is left to Django's own session checks.
+    """
+    if getattr(request.user, '_wrapped', None) is not empty:
+        # Already loaded (or not lazy at all)
+        return request.user
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    user = User.objects.select_related('profile').filter(pk=session_user_id).first()
+    if (
+        user is not None
+        and user.is_active
+        and backend_path in settings.AUTHENTICATION_BACKENDS
+        and constant_time_compare(request.session.get(HASH_SESSION_KEY) or '', user.get_session_auth_hash())
+    ):
+        request.user = user
+        return user
+    return request.user
+
+
+def resolve_principal(request):
+    """Principal of a request, from the session cache when it is still valid"""
+    session = getattr(request, 'session', None)
+    session_user_id = session.get(SESSION_KEY) if session is not None else None
+    if session_user_id is None:
+        return Principal.for_user(request.user)
+
+    if not settings.SHARED_CACHE:
+        # Another process's profile save would not reach this one
+        return Principal.for_user(_load_user(request, session_user_id))
+
+    principal = _cached_principal(request, session_user_id)
+    if principal is None:
+        principal = Principal.for_user(_load_user(request, session_user_id))
+        _store_principal(request, principal)
+    return principal
+
+
+def get_principal(request):
+    """The request's principal, resolving it when no middleware attached one"""
+    principal = getattr(request, 'principal', None)
+    if principal is None:
+        principal = request.principal = resolve_principal(request)
+    return principal
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_principal_on_profile_change(sender, instance, raw=False, **kwargs):
+    """Role or status edits apply to the user's next request"""
+    if not raw:
+        invalidate_principal(instance.user_id)
+
+
 # ==================== DECORATOR FUNCTIONS ====================
 
 def role_required(*allowed_roles):
@@ -173,18 +427,19 @@ def role_required(*allowed_roles):
     Decorator to check if user has one of the allowed roles.
     Usage: @role_required(UserRole.PATIENT, UserRole.CAREGIVER)
     """
+    allowed = role_mask(*allowed_roles)
+    allowed_names = ", ".join([ROLE_PERMISSIONS.get(r, {}).get("name", r) for r in allowed_roles])
+
     def decorator(view_func):
         @wraps(view_func)
         @login_required
         def wrapper(request, *args, **kwargs):
-            if hasattr(request.user, 'profile'):
-                if request.user.profile.role in allowed_roles:
+            principal = get_principal(request)
+            if principal.has_profile:
+                if principal.has_role(allowed):
                     return view_func(request, *args, **kwargs)
                 else:
-                    messages.error(
-                        request,
-                        f'Access denied. This page is only accessible to: {", ".join([ROLE_PERMISSIONS.get(r, {}).get("name", r) for r in allowed_roles])}'
-                    )
+                    messages.error(request, f'Access denied. This page is only accessible to: {allowed_names}')
                     return HttpResponseForbidden("You do not have permission to access this page.")
             else:
                 messages.error(request, 'Please complete your profile setup first.')
@@ -198,21 +453,20 @@ def permission_required(*permissions):
     Decorator to check if user has specific permissions.
     Usage: @permission_required('create_meal_plans', 'manage_patients')
     """
+    required = permission_mask(*permissions)
+
     def decorator(view_func):
         @wraps(view_func)
         @login_required
         def wrapper(request, *args, **kwargs):
-            if hasattr(request.user, 'profile'):
-                user_role = request.user.profile.role
-                user_permissions = ROLE_PERMISSIONS.get(user_role, {}).get('permissions', [])
-                
-                if all(perm in user_permissions for perm in permissions):
+            principal = get_principal(request)
+            if principal.has_profile:
+                if principal.has_permissions(required):
                     return view_func(request, *args, **kwargs)
                 else:
-                    missing_perms = [p for p in permissions if p not in user_permissions]
                     messages.error(
                         request,
-                        f'Access denied. You do not have permission(s): {", ".join(missing_perms)}'
+                        f'Access denied. You do not have permission(s): {", ".join(principal.missing_permissions(required))}'
                     )
                     return HttpResponseForbidden("You do not have the required permissions.")
             else:
@@ -230,8 +484,9 @@ def active_user_required(view_func):
     @wraps(view_func)
     @login_required
     def wrapper(request, *args, **kwargs):
-        if hasattr(request.user, 'profile'):
-            if request.user.profile.is_active and request.user.profile.status == 'active':
+        principal = get_principal(request)
+        if principal.has_profile:
+            if principal.is_active:
                 return view_func(request, *args, **kwargs)
             else:
                 messages.error(request, 'Your account is not active. Please contact support.')
@@ -262,18 +517,12 @@ def get_user_role_info(user):
 
 def check_user_permission(user, permission):
     """Check if user has a specific permission"""
-    if hasattr(user, 'profile'):
-        user_role = user.profile.role
-        user_permissions = ROLE_PERMISSIONS.get(user_role, {}).get('permissions', [])
-        return permission in user_permissions
-    return False
+    return permission in Principal.for_user(user).permissions
 
 
 def check_user_role(user, *allowed_roles):
     """Check if user has one of the allowed roles"""
-    if hasattr(user, 'profile'):
-        return user.profile.role in allowed_roles
-    return False
+    return Principal.for_user(user).has_role(role_mask(*allowed_roles))
 
 
 def get_role_choices():
@@ -315,18 +564,10 @@ def rbac_context(request):
     Context processor to add role information to all templates.
     Add to TEMPLATES['OPTIONS']['context_processors'] in settings.py
     """
-    context = {
-        'user_role': None,
-        'user_permissions': [],
-        'user_dashboard_url': '/',
-        'role_permissions': ROLE_PERMISSIONS,
+    principal = get_principal(request)
+    return {
+        'principal': principal,
+        'user_role': principal.role,
+        'user_permissions': principal.permissions,
+        'user_dashboard_url': principal.dashboard_url if principal.has_profile else '/',
     }
-    
-    if request.user.is_authenticated and hasattr(request.user, 'profile'):
-        context['user_role'] = request.user.profile.role
-        context['user_permissions'] = ROLE_PERMISSIONS.get(
-            request.user.profile.role, {}
-        ).get('permissions', [])
-        context['user_dashboard_url'] = get_user_dashboard_url(request.user)
-    
-    return context
@@ -1,7 +1,7 @@
 """
 Unit tests for accounts app
 """
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from .models import Profile, UserRole
 
@@ -91,3 +91,104 @@ class UserAuthenticationTest(TestCase):
             self.assertTrue(User.objects.filter(username='newuser').exists())
             new_user = User.objects.get(username='newuser')
             self.assertTrue(hasattr(new_user, 'profile'))
+
+
+@override_settings(SHARED_CACHE=True)
+class CompiledRBACTests(TestCase):
+    """Bitset permission checks and the session-cached principal"""
+
+    def setUp(self):
+        from django.test import RequestFactory
+
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='cook', password='testpass123')
+        self.user.profile.role = UserRole.CHEF
+        self.user.profile.save()
+
+    def _session(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session.keys()  # load it outside the query counts
+        return session
+
+    def _request(self, session):
+        from django.contrib.auth import get_user
+        from django.utils.functional import SimpleLazyObject
+
+        request = self.factory.get('/')
+        request.session = session
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        return request
+
+    def test_role_masks_match_permission_lists(self):
+        from .rbac import ROLE_PERMISSIONS, Principal
+
+        for role, info in ROLE_PERMISSIONS.items():
+            permissions = Principal.for_role(1, role, True).permissions
+            self.assertEqual(set(permissions), set(info['permissions']))
+            self.assertNotIn('not_a_permission', permissions)
+
+    def test_decorators_use_principal(self):
+        from django.contrib.messages.storage.fallback import FallbackStorage
+        from django.http import HttpResponse
+        from .rbac import permission_required, role_required
+
+        @role_required(UserRole.CHEF, UserRole.KITCHEN_STAFF)
+        def kitchen(request):
+            return HttpResponse('ok')
+
+        @permission_required('manage_menu', 'manage_database')
+        def admin_menu(request):
+            return HttpResponse('ok')
+
+        self.client.force_login(self.user)
+        request = self._request(self.client.session)
+        request._messages = FallbackStorage(request)
+        self.assertEqual(kitchen(request).status_code, 200)
+        self.assertEqual(admin_menu(request).status_code, 403)
+
+    def test_cached_principal_skips_profile_query(self):
+        from .rbac import resolve_principal
+
+        session = self._session()
+        request = self._request(session)
+        with self.assertNumQueries(1):
+            principal = resolve_principal(request)
+            self.assertEqual(request.user.profile.role, UserRole.CHEF)
+        self.assertTrue(principal.has_profile)
+
+        with self.assertNumQueries(0):
+            cached = resolve_principal(self._request(session))
+        self.assertEqual(cached, principal)
+        self.assertIn('manage_menu', cached.permissions)
+
+    def test_profile_change_and_tampering_invalidate_cache(self):
+        from .rbac import PRINCIPAL_SESSION_KEY, resolve_principal
+
+        session = self._session()
+        resolve_principal(self._request(session))
+
+        self.user.profile.role = UserRole.SUPPORT_STAFF
+        self.user.profile.save()
+        principal = resolve_principal(self._request(session))
+        self.assertEqual(principal.role, UserRole.SUPPORT_STAFF)
+
+        token = session[PRINCIPAL_SESSION_KEY]
+        session[PRINCIPAL_SESSION_KEY] = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        with self.assertNumQueries(1):
+            principal = resolve_principal(self._request(session))
+        self.assertEqual(principal.role, UserRole.SUPPORT_STAFF)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_principal_read_every_request_without_shared_cache(self):
+        from .rbac import PRINCIPAL_SESSION_KEY, resolve_principal
+
+        session = self._session()
+        self.assertEqual(resolve_principal(self._request(session)).role, UserRole.CHEF)
+        self.assertNotIn(PRINCIPAL_SESSION_KEY, session)
+
+        # A change made by another process rotates no token this process can see
+        Profile.objects.filter(user=self.user).update(role=UserRole.KITCHEN_STAFF)
+        with self.assertNumQueries(1):
+            principal = resolve_principal(self._request(session))
+        self.assertEqual(principal.role, UserRole.KITCHEN_STAFF)
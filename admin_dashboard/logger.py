@@ -6,6 +6,7 @@ import json
 from functools import wraps
 from django.utils import timezone
 from django.core.serializers.json import DjangoJSONEncoder
+from dusangire.dates import since_day, until_day
 from .models import AdminLog
 
 # Configure logging
@@ -244,8 +245,8 @@ def get_logs_by_date_range(start_date, end_date, action=None, user=None):
     Get logs within a date range
     """
     logs = AdminLog.objects.filter(
-        timestamp__date__gte=start_date,
-        timestamp__date__lte=end_date
+        **since_day('timestamp', start_date),
+        **until_day('timestamp', end_date)
     )
     
     if action:
@@ -1,9 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Count, Sum, Q, Avg
+from django.db.models import Count, Sum, Q, Avg, F
 from django.core.paginator import Paginator
+from dusangire.pagination import CursorPaginator
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from dusangire.dates import on_day, since_day, until_day
 from datetime import datetime, timedelta
 from decimal import Decimal
 
@@ -12,6 +15,7 @@ from menu.models import MenuItem, Category
 from payments.models import Payment, PaymentStatus
 from accounts.models import User
 from delivery.models import DeliveryAddress
+from analytics.models import CustomerActivityRollup, OrderItemRollup, OrderRollup, PaymentRollup
 
 
 def is_staff_or_admin(user):
@@ -27,57 +31,48 @@ def dashboard(request):
     week_ago = today - timedelta(days=7)
     month_ago = today - timedelta(days=30)
     
-    # Order Statistics
-    total_orders = Order.objects.count()
-    today_orders = Order.objects.filter(created_at__date=today).count()
-    week_orders = Order.objects.filter(created_at__date__gte=week_ago).count()
-    month_orders = Order.objects.filter(created_at__date__gte=month_ago).count()
-    
-    # Revenue Statistics
-    total_revenue = Payment.objects.filter(status=PaymentStatus.COMPLETED).aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    today_revenue = Payment.objects.filter(
-        status=PaymentStatus.COMPLETED,
-        paid_at__date=today
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    
-    week_revenue = Payment.objects.filter(
-        status=PaymentStatus.COMPLETED,
-        paid_at__date__gte=week_ago
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    
-    month_revenue = Payment.objects.filter(
-        status=PaymentStatus.COMPLETED,
-        paid_at__date__gte=month_ago
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    
-    # Order Status Breakdown
-    pending_orders = Order.objects.filter(status=OrderStatus.PENDING).count()
-    confirmed_orders = Order.objects.filter(status=OrderStatus.CONFIRMED).count()
-    preparing_orders = Order.objects.filter(status=OrderStatus.PREPARING).count()
-    ready_orders = Order.objects.filter(status=OrderStatus.READY).count()
-    delivered_orders = Order.objects.filter(status=OrderStatus.DELIVERED).count()
+    # Order statistics and status breakdown from the hourly rollups, in one query
+    order_stats = OrderRollup.objects.aggregate(
+        total_orders=Sum('order_count', default=0),
+        total_amount=Sum('total_amount', default=Decimal('0.00')),
+        today_orders=Sum('order_count', filter=Q(date=today), default=0),
+        week_orders=Sum('order_count', filter=Q(date__gte=week_ago), default=0),
+        month_orders=Sum('order_count', filter=Q(date__gte=month_ago), default=0),
+        **{
+            f'{status.value}_orders': Sum('order_count', filter=Q(status=status), default=0)
+            for status in [OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PREPARING,
+                           OrderStatus.READY, OrderStatus.DELIVERED]
+        }
+    )
+    
+    # Revenue and payment status breakdown from the daily payment rollups
+    completed = Q(status=PaymentStatus.COMPLETED)
+    payment_stats = PaymentRollup.objects.aggregate(
+        total_revenue=Sum('amount', filter=completed, default=Decimal('0.00')),
+        today_revenue=Sum('amount', filter=completed & Q(date=today), default=Decimal('0.00')),
+        week_revenue=Sum('amount', filter=completed & Q(date__gte=week_ago), default=Decimal('0.00')),
+        month_revenue=Sum('amount', filter=completed & Q(date__gte=month_ago), default=Decimal('0.00')),
+        pending_payments=Sum('payment_count', filter=Q(status=PaymentStatus.PENDING), default=0),
+        completed_payments=Sum('payment_count', filter=completed, default=0),
+        failed_payments=Sum('payment_count', filter=Q(status=PaymentStatus.FAILED), default=0),
+    )
     
     # Recent Orders
     recent_orders = Order.objects.select_related('user', 'payment').order_by('-created_at')[:10]
     
     # Popular Items (top 10)
-    popular_items = OrderItem.objects.values(
+    popular_items = OrderItemRollup.objects.values(
         'menu_item__name', 'menu_item__id'
     ).annotate(
         total_quantity=Sum('quantity'),
-        total_orders=Count('order', distinct=True)
+        total_lines=Sum('line_count')
     ).order_by('-total_quantity')[:10]
     
-    # Payment Status Breakdown
-    pending_payments = Payment.objects.filter(status=PaymentStatus.PENDING).count()
-    completed_payments = Payment.objects.filter(status=PaymentStatus.COMPLETED).count()
-    failed_payments = Payment.objects.filter(status=PaymentStatus.FAILED).count()
-    
     # Average Order Value
-    avg_order_value = Order.objects.aggregate(avg=Avg('total'))['avg'] or Decimal('0.00')
+    avg_order_value = (
+        order_stats['total_amount'] / order_stats['total_orders']
+        if order_stats['total_orders'] else Decimal('0.00')
+    )
     
     # Corporate Statistics
     from corporate.models import CorporateContract, CorporatePartner
@@ -94,29 +89,11 @@ def dashboard(request):
     )['total'] or Decimal('0.00')
 
     context = {
-        # Order Stats
-        'total_orders': total_orders,
-        'today_orders': today_orders,
-        'week_orders': week_orders,
-        'month_orders': month_orders,
-        
-        # Revenue Stats
-        'total_revenue': total_revenue,
-        'today_revenue': today_revenue,
-        'week_revenue': week_revenue,
-        'month_revenue': month_revenue,
-        
-        # Order Status
-        'pending_orders': pending_orders,
-        'confirmed_orders': confirmed_orders,
-        'preparing_orders': preparing_orders,
-        'ready_orders': ready_orders,
-        'delivered_orders': delivered_orders,
+        # Order Stats and Order Status
+        **{key: value for key, value in order_stats.items() if key != 'total_amount'},
         
-        # Payment Status
-        'pending_payments': pending_payments,
-        'completed_payments': completed_payments,
-        'failed_payments': failed_payments,
+        # Revenue Stats and Payment Status
+        **payment_stats,
         
         # Corporate & Catering
         'total_partners': total_partners,
@@ -148,11 +125,11 @@ def order_management(request):
     if status_filter:
         orders = orders.filter(status=status_filter)
     
-    if date_from:
-        orders = orders.filter(created_at__date__gte=date_from)
+    if date_from and parse_date(date_from):
+        orders = orders.filter(**since_day('created_at', parse_date(date_from)))
     
-    if date_to:
-        orders = orders.filter(created_at__date__lte=date_to)
+    if date_to and parse_date(date_to):
+        orders = orders.filter(**until_day('created_at', parse_date(date_to)))
     
     if search_query:
         orders = orders.filter(
@@ -253,44 +230,42 @@ def reports(request):
         date_to_obj = timezone.now().date()
     
     # Sales Report
-    orders_in_range = Order.objects.filter(created_at__date__range=[date_from_obj, date_to_obj])
-    total_sales = orders_in_range.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-    total_orders = orders_in_range.count()
-    avg_order_value = orders_in_range.aggregate(avg=Avg('total'))['avg'] or Decimal('0.00')
+    orders_in_range = OrderRollup.objects.filter(date__range=[date_from_obj, date_to_obj])
+    sales = orders_in_range.aggregate(
+        total_sales=Sum('total_amount', default=Decimal('0.00')),
+        total_orders=Sum('order_count', default=0),
+    )
+    total_sales = sales['total_sales']
+    total_orders = sales['total_orders']
+    avg_order_value = total_sales / total_orders if total_orders else Decimal('0.00')
     
     # Sales by day
-    daily_sales = orders_in_range.extra(
-        select={'day': 'date(created_at)'}
-    ).values('day').annotate(
-        total=Sum('total'),
-        count=Count('id')
+    daily_sales = orders_in_range.values(day=F('date')).annotate(
+        total=Sum('total_amount'),
+        count=Sum('order_count')
     ).order_by('day')
     
+    items_in_range = OrderItemRollup.objects.filter(date__range=[date_from_obj, date_to_obj])
+    
     # Popular Items
-    popular_items = OrderItem.objects.filter(
-        order__created_at__date__range=[date_from_obj, date_to_obj]
-    ).values(
-        'menu_item__name', 'menu_item__category__name'
+    popular_items = items_in_range.values(
+        'menu_item__name', 'category__name'
     ).annotate(
         total_quantity=Sum('quantity'),
-        total_revenue=Sum('subtotal'),
-        order_count=Count('order', distinct=True)
+        total_revenue=Sum('revenue'),
+        line_count=Sum('line_count')
     ).order_by('-total_quantity')[:20]
     
     # Sales by Category
-    category_sales = OrderItem.objects.filter(
-        order__created_at__date__range=[date_from_obj, date_to_obj]
-    ).values('menu_item__category__name').annotate(
-        total_revenue=Sum('subtotal'),
+    category_sales = items_in_range.values('category__name').annotate(
+        total_revenue=Sum('revenue'),
         total_quantity=Sum('quantity')
     ).order_by('-total_revenue')
     
     # Payment Methods Breakdown
-    payment_methods = Payment.objects.filter(
-        order__created_at__date__range=[date_from_obj, date_to_obj]
-    ).values('payment_method').annotate(
-        count=Count('id'),
-        total=Sum('amount')
+    payment_methods = orders_in_range.values('payment_method').annotate(
+        count=Sum('order_count'),
+        total=Sum('total_amount')
     ).order_by('-total')
     
     context = {
@@ -315,39 +290,44 @@ def bi_dashboard(request):
     from datetime import timedelta
     
     # Time periods
-    now = timezone.now()
-    month_ago = now - timedelta(days=30)
-    two_months_ago = now - timedelta(days=60)
+    today = timezone.localdate()
+    month_ago_date = today - timedelta(days=30)
+    two_months_ago_date = today - timedelta(days=60)
     
     # 1. Average Order Value (AOV)
-    aov = Order.objects.filter(status=OrderStatus.DELIVERED).aggregate(avg=Avg('total'))['avg'] or Decimal('0.00')
+    delivered = OrderRollup.objects.filter(status=OrderStatus.DELIVERED).aggregate(
+        count=Sum('order_count', default=0),
+        amount=Sum('total_amount', default=Decimal('0.00'))
+    )
+    aov = delivered['amount'] / delivered['count'] if delivered['count'] else Decimal('0.00')
     
     # 2. Customer Retention Rate
     # Customers who ordered in the previous month
-    prev_month_customers = Order.objects.filter(
-        created_at__range=[two_months_ago, month_ago]
-    ).values('user').distinct().count()
+    prev_month = CustomerActivityRollup.objects.filter(
+        date__gte=two_months_ago_date, date__lt=month_ago_date
+    ).values('user_id')
+    prev_month_customers = prev_month.distinct().count()
     
     # Customers from prev month who also ordered this month
-    retained_customers = Order.objects.filter(
-        created_at__range=[month_ago, now],
-        user__in=Order.objects.filter(created_at__range=[two_months_ago, month_ago]).values('user')
-    ).values('user').distinct().count()
+    retained_customers = CustomerActivityRollup.objects.filter(
+        date__gte=month_ago_date,
+        user_id__in=prev_month
+    ).values('user_id').distinct().count()
     
     retention_rate = (retained_customers / prev_month_customers * 100) if prev_month_customers > 0 else 0
     
     # 3. Customer Lifetime Value (CLV)
     # CLV = AOV * Purchase Frequency
-    total_orders = Order.objects.filter(status=OrderStatus.DELIVERED).count()
-    total_customers = Order.objects.values('user').distinct().count()
+    total_orders = delivered['count']
+    total_customers = CustomerActivityRollup.objects.values('user_id').distinct().count()
     purchase_frequency = (total_orders / total_customers) if total_customers > 0 else 0
     clv = aov * Decimal(str(purchase_frequency))
     
     # 4. Revenue vs Target (Placeholder target)
-    monthly_revenue = Payment.objects.filter(
+    monthly_revenue = PaymentRollup.objects.filter(
         status=PaymentStatus.COMPLETED,
-        paid_at__gte=month_ago
-    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        date__gte=month_ago_date
+    ).aggregate(total=Sum('amount', default=Decimal('0.00')))['total']
     
     revenue_target = Decimal('5000000.00') # Example target: 5M RWF
     target_achievement = (monthly_revenue / revenue_target * 100) if revenue_target > 0 else 0
@@ -356,10 +336,10 @@ def bi_dashboard(request):
     churn_rate = 100 - retention_rate if prev_month_customers > 0 else 0
 
     # 6. Revenue by Category
-    category_revenue = OrderItem.objects.values(
-        'menu_item__category__name'
+    category_revenue = OrderItemRollup.objects.values(
+        'category__name'
     ).annotate(
-        revenue=Sum('subtotal')
+        revenue=Sum('revenue')
     ).order_by('-revenue')
 
     context = {
@@ -388,7 +368,7 @@ def view_admin_logs(request):
     from .logger import get_recent_logs
     
     # Get all logs
-    logs = AdminLog.objects.all()
+    logs = AdminLog.objects.select_related('admin_user')
     
     # Apply filters
     action_filter = request.GET.get('action')
@@ -420,10 +400,20 @@ def view_admin_logs(request):
     action_choices = AdminLog.ACTION_CHOICES
     admin_users = User.objects.filter(is_staff=True).order_by('username')
     
-    # Pagination
-    paginator = Paginator(logs, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (timestamp, id); the total is capped and cached
+    page_obj = CursorPaginator(logs, 50, ordering=('-timestamp', '-id')).get_page(request)
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(page_obj.as_json(lambda log: {
+            'id': log.id,
+            'action': log.action,
+            'admin_user': log.admin_user_id,
+            'model_name': log.model_name,
+            'object_id': log.object_id,
+            'description': log.description,
+            'status': log.status,
+            'timestamp': log.timestamp.isoformat(),
+        }))
     
     context = {
         'page_obj': page_obj,
@@ -434,7 +424,7 @@ def view_admin_logs(request):
         'current_model': model_filter,
         'current_status': status_filter,
         'search_query': search_query,
-        'total_logs': logs.count(),
+        'total_logs': page_obj.count,
         'title': 'Admin Activity Logs',
     }
     
@@ -469,9 +459,9 @@ def admin_activity_summary(request):
     month_ago = today - timedelta(days=30)
     
     # Activity statistics
-    today_logs = AdminLog.objects.filter(timestamp__date=today).count()
-    week_logs = AdminLog.objects.filter(timestamp__date__gte=week_ago).count()
-    month_logs = AdminLog.objects.filter(timestamp__date__gte=month_ago).count()
+    today_logs = AdminLog.objects.filter(**on_day('timestamp', today)).count()
+    week_logs = AdminLog.objects.filter(**since_day('timestamp', week_ago)).count()
+    month_logs = AdminLog.objects.filter(**since_day('timestamp', month_ago)).count()
     
     # Failed actions
     failed_actions = AdminLog.objects.filter(status='FAILED').count()
@@ -518,7 +508,6 @@ def export_logs(request):
     """Export admin logs to CSV or JSON"""
     from .models import AdminLog
     from .logger import export_logs_to_json
-    import csv
     from django.http import HttpResponse
     
     # Get filtered logs
@@ -537,11 +526,32 @@ def export_logs(request):
         return response
     
     else:  # CSV format (default)
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="admin_logs.csv"'
+        from hospital_wards.exports import iter_keyset, stream_csv, wants_gzip
+        
+        action_labels = dict(AdminLog.ACTION_CHOICES)
+        rows = (
+            [
+                log_id,
+                str(username),
+                action_labels.get(action, action),
+                model_name,
+                object_id,
+                description,
+                status,
+                timezone.localtime(timestamp).strftime('%Y-%m-%d %H:%M:%S'),
+                ip_address or '',
+                duration_ms or '',
+                error_message or '',
+            ]
+            for log_id, username, action, model_name, object_id, description, status,
+                timestamp, ip_address, duration_ms, error_message
+            in iter_keyset(logs, [
+                'id', 'admin_user__username', 'action', 'model_name', 'object_id',
+                'description', 'status', 'timestamp', 'ip_address', 'duration_ms', 'error_message',
+            ], descending=True)
+        )
         
-        writer = csv.writer(response)
-        writer.writerow([
+        return stream_csv('admin_logs.csv', [
             'ID',
             'Admin User',
             'Action',
@@ -553,21 +563,4 @@ def export_logs(request):
             'IP Address',
             'Duration (ms)',
             'Error Message'
-        ])
-        
-        for log in logs:
-            writer.writerow([
-                log.id,
-                str(log.admin_user),
-                log.get_action_display(),
-                log.model_name,
-                log.object_id,
-                log.description,
-                log.status,
-                log.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                log.ip_address or '',
-                log.duration_ms or '',
-                log.error_message or '',
-            ])
-        
-        return response
+        ], rows, compress=wants_gzip(request))
@@ -0,0 +1,19 @@
+"""
+Django management command to recompute the dashboard rollup tables
+Usage: python manage.py rebuild_rollups
+"""
+
+from django.core.management.base import BaseCommand
+from analytics.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the order, item, payment and customer activity rollups from scratch'
+
+    def handle(self, *args, **options):
+        counts = rebuild_rollups()
+        
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count} row(s)')
+        
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt'))
@@ -1,9 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.contrib.auth.models import User
 from datetime import timedelta
 from analytics.services import AnalyticsService
-from analytics.models import DailyAnalyticsSnapshot
 
 
 class Command(BaseCommand):
@@ -23,33 +21,24 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        today = timezone.now().date()
+        
         if options['backfill']:
-            # Backfill last 30 days
-            today = timezone.now().date()
-            for i in range(30):
-                date = today - timedelta(days=i)
-                self.stdout.write(f'Processing {date}...')
-                AnalyticsService.calculate_daily_snapshot(date)
+            # Backfill last 30 days in one grouped query
+            AnalyticsService.backfill_daily_snapshots(today - timedelta(days=29), today)
             self.stdout.write(self.style.SUCCESS('Backfill completed for last 30 days'))
         else:
             # Process specified number of days (default: today)
             days = options['days']
-            today = timezone.now().date()
+            snapshots = AnalyticsService.backfill_daily_snapshots(today - timedelta(days=days - 1), today)
             
-            for i in range(days):
-                date = today - timedelta(days=i)
-                self.stdout.write(f'Processing {date}...')
-                snapshot = AnalyticsService.calculate_daily_snapshot(date)
+            for snapshot in reversed(snapshots):
+                self.stdout.write(f'Processing {snapshot.date}...')
                 self.stdout.write(f'  Orders: {snapshot.total_orders}, Revenue: RWF {snapshot.total_revenue}')
         
         # Update customer metrics for all users
         self.stdout.write('Updating customer metrics...')
-        users = User.objects.all()
-        updated_count = 0
-        
-        for user in users:
-            AnalyticsService.update_customer_metrics(user)
-            updated_count += 1
+        updated_count = AnalyticsService.recompute_customer_metrics()
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully updated analytics for {updated_count} customers')
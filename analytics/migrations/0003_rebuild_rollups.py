@@ -0,0 +1,61 @@
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+
+
+def seed_rollups(apps, schema_editor):
+    """Aggregate existing orders, items and payments into the rollup tables"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Payment = apps.get_model('payments', 'Payment')
+    OrderRollup = apps.get_model('analytics', 'OrderRollup')
+    OrderItemRollup = apps.get_model('analytics', 'OrderItemRollup')
+    PaymentRollup = apps.get_model('analytics', 'PaymentRollup')
+    CustomerActivityRollup = apps.get_model('analytics', 'CustomerActivityRollup')
+
+    orders = Order.objects.annotate(
+        date=TruncDate('created_at'), hour=ExtractHour('created_at')
+    ).values('date', 'hour', 'status', 'payment_method').annotate(
+        order_count=Count('id'), total_amount=Sum('total')
+    ).order_by()
+    OrderRollup.objects.bulk_create([OrderRollup(**row) for row in orders], batch_size=1000)
+
+    items = OrderItem.objects.annotate(
+        date=TruncDate('order__created_at'),
+        status=F('order__status'),
+        category_id=F('menu_item__category_id'),
+    ).values('date', 'status', 'category_id', 'menu_item_id').annotate(
+        order_count=Count('id'), quantity_sum=Sum('quantity'), revenue=Sum('subtotal')
+    ).order_by()
+    OrderItemRollup.objects.bulk_create(
+        [OrderItemRollup(quantity=row.pop('quantity_sum'), **row) for row in items], batch_size=1000
+    )
+
+    payments = Payment.objects.annotate(
+        date=TruncDate(Coalesce('paid_at', 'created_at'))
+    ).values('date', 'status', 'payment_method').annotate(
+        payment_count=Count('id'), amount_sum=Sum('amount')
+    ).order_by()
+    PaymentRollup.objects.bulk_create(
+        [PaymentRollup(amount=row.pop('amount_sum'), **row) for row in payments], batch_size=1000
+    )
+
+    activity = Order.objects.annotate(
+        date=TruncDate('created_at')
+    ).values('user_id', 'date').annotate(order_count=Count('id')).order_by()
+    CustomerActivityRollup.objects.bulk_create(
+        [CustomerActivityRollup(**row) for row in activity], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_order_rollups'),
+        ('orders', '0005_order_special_requests_alter_order_delivery_address'),
+        ('payments', '0004_rename_payments_pa_created_idx_payments_pa_created_3147e3_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_rebuild_rollups'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='orderitemrollup',
+            old_name='order_count',
+            new_name='line_count',
+        ),
+        migrations.AlterField(
+            model_name='orderitemrollup',
+            name='line_count',
+            field=models.IntegerField(default=0, help_text='Order lines, not distinct orders'),
+        ),
+    ]
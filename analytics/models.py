@@ -257,3 +257,87 @@ class ConversionEvent(models.Model):
     
     def __str__(self):
         return f"{self.get_event_type_display()} - {self.timestamp}"
+
+
+# ==================== DASHBOARD ROLLUPS ====================
+# Pre-aggregated order, item and payment totals maintained incrementally by
+# analytics.signals and rebuilt by `manage.py rebuild_rollups` (see analytics.rollups).
+
+class OrderRollup(models.Model):
+    """Hourly order counts and totals by status and payment method"""
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=50)
+    
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        unique_together = ('date', 'hour', 'status', 'payment_method')
+        ordering = ['-date', '-hour']
+        indexes = [
+            models.Index(fields=['status', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}:00 {self.status}/{self.payment_method}: {self.order_count}"
+
+
+class OrderItemRollup(models.Model):
+    """Daily menu item sales by order status and category"""
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    category = models.ForeignKey('menu.Category', on_delete=models.CASCADE, related_name='+')
+    menu_item = models.ForeignKey('menu.MenuItem', on_delete=models.CASCADE, related_name='+')
+    
+    line_count = models.IntegerField(default=0, help_text="Order lines, not distinct orders")
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        unique_together = ('date', 'status', 'category', 'menu_item')
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'category']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} item {self.menu_item_id} ({self.status}): {self.quantity}"
+
+
+class PaymentRollup(models.Model):
+    """Daily payment counts and amounts by status and method, dated by paid_at (or created_at)"""
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=50)
+    
+    payment_count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    
+    class Meta:
+        unique_together = ('date', 'status', 'payment_method')
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['status', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.payment_method}: RWF {self.amount}"
+
+
+class CustomerActivityRollup(models.Model):
+    """Orders placed per customer per day, for retention and customer counts"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    date = models.DateField()
+    order_count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('user', 'date')
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'user']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} on {self.date}: {self.order_count}"
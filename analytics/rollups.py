@@ -0,0 +1,298 @@
+"""
+Dashboard Rollups
+Incremental maintenance and full rebuilds of the pre-aggregated order, item,
+payment and customer-activity tables read by the admin and BI dashboards.
+
+Each saved Order, OrderItem or Payment contributes to exactly one row per
+rollup table. On save, the contribution recorded at load time
+(``loaded_values()``) is subtracted and the current one added with F()
+updates, so dashboards never scan order history. Bulk inserts report
+themselves through ``record_created``; other writes that bypass signals
+(queryset.update, raw SQL) are not tracked, and `manage.py rebuild_rollups`
+recomputes every table from scratch.
+"""
+
+import logging
+from decimal import Decimal
+
+from django.apps import apps as django_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+from django.utils import timezone
+
+from .models import CustomerActivityRollup, OrderItemRollup, OrderRollup, PaymentRollup
+
+logger = logging.getLogger(__name__)
+
+
+def _local(value):
+    return timezone.localtime(value) if timezone.is_aware(value) else value
+
+
+def bump(model, key, **deltas):
+    """Add ``deltas`` to the rollup row identified by ``key``, creating it if needed"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # Nothing recorded to take away from; a rebuild will reconcile
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Created concurrently between our update and insert
+        model.objects.filter(**key).update(**updates)
+
+
+def _move(model, previous, current):
+    """Apply a ``(key, measures)`` contribution change to one rollup table"""
+    if previous == current:
+        return
+    if previous is not None:
+        key, measures = previous
+        bump(model, key, **{field: -value for field, value in measures.items()})
+    if current is not None:
+        key, measures = current
+        bump(model, key, **measures)
+
+
+# ==================== CONTRIBUTIONS ====================
+
+def _order_contribution(values):
+    if values.get('created_at') is None:
+        return None
+    created = _local(values['created_at'])
+    key = {
+        'date': created.date(),
+        'hour': created.hour,
+        'status': values['status'],
+        'payment_method': values['payment_method'],
+    }
+    return key, {'order_count': 1, 'total_amount': values['total'] or Decimal('0.00')}
+
+
+def _activity_contribution(values):
+    if values.get('created_at') is None:
+        return None
+    return {'user_id': values['user_id'], 'date': _local(values['created_at']).date()}, {'order_count': 1}
+
+
+def _item_contribution(values, order_values, category_id):
+    if order_values is None or order_values.get('created_at') is None:
+        return None
+    key = {
+        'date': _local(order_values['created_at']).date(),
+        'status': order_values['status'],
+        'category_id': category_id,
+        'menu_item_id': values['menu_item_id'],
+    }
+    return key, {'line_count': 1, 'quantity': values['quantity'], 'revenue': values['subtotal'] or Decimal('0.00')}
+
+
+def _payment_contribution(values):
+    dated_by = values.get('paid_at') or values.get('created_at')
+    if dated_by is None:
+        return None
+    key = {
+        'date': _local(dated_by).date(),
+        'status': values['status'],
+        'payment_method': values['payment_method'],
+    }
+    return key, {'payment_count': 1, 'amount': values['amount'] or Decimal('0.00')}
+
+
+def _previous(instance, created):
+    """Loaded values of a saved instance, or None if it was not counted before"""
+    if created:
+        return None
+    previous = instance.loaded_values()
+    if set(previous) != set(instance.TRACKED_FIELDS):
+        return False
+    return previous
+
+
+# ==================== INCREMENTAL UPDATES ====================
+
+def record_order(order, created=False, deleted=False):
+    """Move an order (and, on a status/date change, its items) between rollup rows"""
+    previous = _previous(order, created) if not deleted else (order.loaded_values() or order._tracked_values())
+    if previous is False:
+        logger.warning(f"Order {order.pk} saved without its loaded values; rollups need a rebuild")
+        return
+    current = None if deleted else order._tracked_values()
+
+    _move(OrderRollup, previous and _order_contribution(previous), current and _order_contribution(current))
+    _move(
+        CustomerActivityRollup,
+        previous and _activity_contribution(previous),
+        current and _activity_contribution(current)
+    )
+
+    if deleted or previous is None:
+        return
+    old_item_key = (previous['status'], previous['created_at'])
+    if old_item_key == (current['status'], current['created_at']):
+        return
+
+    # Items follow their order's status and date
+    items = order.items.values('menu_item_id', 'menu_item__category_id', 'quantity', 'subtotal')
+    for item in items:
+        _move(
+            OrderItemRollup,
+            _item_contribution(item, previous, item['menu_item__category_id']),
+            _item_contribution(item, current, item['menu_item__category_id'])
+        )
+
+
+def record_order_item(item, created=False, deleted=False):
+    """Move an order item between rollup rows"""
+    from menu.models import MenuItem
+    from orders.models import Order
+
+    order = item._state.fields_cache.get('order')
+    if order is not None:
+        order_values = order._tracked_values()
+    else:
+        order_values = Order.objects.filter(pk=item.order_id).values(*Order.TRACKED_FIELDS).first()
+    if order_values is None:
+        return
+
+    menu_item = item._state.fields_cache.get('menu_item')
+    if menu_item is not None:
+        category_id = menu_item.category_id
+    else:
+        category_id = MenuItem.objects.filter(pk=item.menu_item_id).values_list('category_id', flat=True).first()
+
+    if deleted:
+        previous = item.loaded_values() or item._tracked_values()
+    else:
+        previous = _previous(item, created)
+        if previous is False:
+            logger.warning(f"Order item {item.pk} saved without its loaded values; rollups need a rebuild")
+            return
+    current = None if deleted else item._tracked_values()
+
+    _move(
+        OrderItemRollup,
+        previous and _item_contribution(previous, order_values, category_id),
+        current and _item_contribution(current, order_values, category_id)
+    )
+
+
+def record_payment(payment, created=False, deleted=False):
+    """Move a payment between rollup rows"""
+    previous = _previous(payment, created) if not deleted else (payment.loaded_values() or payment._tracked_values())
+    if previous is False:
+        logger.warning(f"Payment {payment.pk} saved without its loaded values; rollups need a rebuild")
+        return
+    current = None if deleted else payment._tracked_values()
+
+    _move(PaymentRollup, previous and _payment_contribution(previous), current and _payment_contribution(current))
+
+
+def _accumulate(totals, model, contribution):
+    if contribution is None:
+        return
+    key, measures = contribution
+    row = totals.setdefault((model, tuple(sorted(key.items()))), {})
+    for field, value in measures.items():
+        row[field] = row.get(field, 0) + value
+
+
+def record_created(orders=(), items=(), payments=(), categories=None):
+    """
+    Add rows inserted with bulk_create, which sends no post_save, to the rollups.
+
+    Contributions are summed per rollup row first, so a batch costs one bump
+    per distinct row. ``categories`` maps menu item ids to category ids for
+    ``items``; missing entries are looked up in one query.
+    """
+    from menu.models import MenuItem
+
+    totals = {}
+    order_values = {order.pk: order._tracked_values() for order in orders}
+    for values in order_values.values():
+        _accumulate(totals, OrderRollup, _order_contribution(values))
+        _accumulate(totals, CustomerActivityRollup, _activity_contribution(values))
+
+    categories = dict(categories or {})
+    missing = {item.menu_item_id for item in items} - set(categories)
+    if missing:
+        categories.update(MenuItem.objects.filter(pk__in=missing).values_list('pk', 'category_id'))
+    for item in items:
+        _accumulate(totals, OrderItemRollup, _item_contribution(
+            item._tracked_values(), order_values.get(item.order_id), categories.get(item.menu_item_id)
+        ))
+
+    for payment in payments:
+        _accumulate(totals, PaymentRollup, _payment_contribution(payment._tracked_values()))
+
+    for (model, key), measures in totals.items():
+        bump(model, dict(key), **measures)
+
+
+# ==================== REBUILD ====================
+
+def rebuild_rollups(apps=django_apps):
+    """
+    Recompute every rollup table from the order, item and payment tables.
+
+    Returns the number of rows written per table. Data migrations keep their
+    own copy of these queries: the fields named here follow the current models.
+    """
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Payment = apps.get_model('payments', 'Payment')
+    rollups = {
+        name: apps.get_model('analytics', name)
+        for name in ('OrderRollup', 'OrderItemRollup', 'PaymentRollup', 'CustomerActivityRollup')
+    }
+
+    orders = Order.objects.annotate(
+        date=TruncDate('created_at'), hour=ExtractHour('created_at')
+    ).values('date', 'hour', 'status', 'payment_method').annotate(
+        order_count=Count('id'), total_amount=Sum('total')
+    ).order_by()
+
+    items = OrderItem.objects.annotate(
+        date=TruncDate('order__created_at'),
+        status=F('order__status'),
+        category_id=F('menu_item__category_id'),
+    ).values('date', 'status', 'category_id', 'menu_item_id').annotate(
+        line_count=Count('id'), quantity_sum=Sum('quantity'), revenue=Sum('subtotal')
+    ).order_by()
+
+    payments = Payment.objects.annotate(
+        date=TruncDate(Coalesce('paid_at', 'created_at'))
+    ).values('date', 'status', 'payment_method').annotate(
+        payment_count=Count('id'), amount_sum=Sum('amount')
+    ).order_by()
+
+    activity = Order.objects.annotate(
+        date=TruncDate('created_at')
+    ).values('user_id', 'date').annotate(order_count=Count('id')).order_by()
+
+    rows = {
+        'OrderRollup': [rollups['OrderRollup'](**row) for row in orders],
+        'OrderItemRollup': [
+            rollups['OrderItemRollup'](
+                quantity=row.pop('quantity_sum'), **row
+            ) for row in items
+        ],
+        'PaymentRollup': [
+            rollups['PaymentRollup'](amount=row.pop('amount_sum'), **row) for row in payments
+        ],
+        'CustomerActivityRollup': [rollups['CustomerActivityRollup'](**row) for row in activity],
+    }
+
+    with transaction.atomic():
+        for name, model in rollups.items():
+            model.objects.all().delete()
+            model.objects.bulk_create(rows[name], batch_size=1000)
+
+    return {name: len(objs) for name, objs in rows.items()}
@@ -1,8 +1,11 @@
-from django.db.models import Sum, Avg, Count, Q
+from django.db import transaction
+from django.db.models import Sum, Avg, Count, Q, F, Min, Max
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.contrib.auth.models import User
 from decimal import Decimal
 from datetime import timedelta
+from dusangire.dates import day_start
 from orders.models import Order
 from .models import (
     DailyAnalyticsSnapshot,
@@ -15,6 +18,94 @@ from .models import (
 )
 
 
+# Order statuses that count towards revenue and customer metrics
+COMPLETED_STATUSES = ['completed', 'delivered']
+
+# Every discount applied to an order, summed per row by the database
+ORDER_DISCOUNTS = (
+    F('loyalty_discount_amount') + F('vip_discount_amount') +
+    F('corporate_discount_amount') + F('referral_discount_amount')
+)
+
+MOBILE_MONEY_METHODS = ['mtn_mobile_money', 'airtel_money']
+
+# Conditional aggregates for a day's orders, evaluated in a single pass
+SNAPSHOT_AGGREGATES = {
+    'total_orders': Count('id'),
+    'unique_customers': Count('user_id', distinct=True),
+    'total_revenue': Sum('total'),
+    'total_discount': Sum(ORDER_DISCOUNTS),
+    'vip_discounts_given': Sum('vip_discount_amount'),
+    'loyalty_discounts_given': Sum('loyalty_discount_amount'),
+    'referral_discounts_given': Sum('referral_discount_amount'),
+    'vip_orders': Count('id', filter=Q(user__customer_metrics__vip_tier_current__gt='')),
+    'referral_orders': Count('id', filter=Q(referral_discount_amount__gt=0)),
+    'cash_orders': Count('id', filter=Q(payment_method='cash_on_delivery')),
+    'mobile_money_orders': Count('id', filter=Q(payment_method__in=MOBILE_MONEY_METHODS)),
+    'bank_transfer_orders': Count('id', filter=Q(payment_method='bank_transfer')),
+    'card_orders': Count('id', filter=Q(payment_method='card')),
+}
+
+# Per-customer aggregates over completed orders
+CUSTOMER_AGGREGATES = {
+    'total_orders': Count('id'),
+    'total_spent': Sum('total'),
+    'first_order_date': Min('created_at'),
+    'last_order_date': Max('created_at'),
+    'total_discounts': Sum(ORDER_DISCOUNTS),
+}
+
+CUSTOMER_METRIC_FIELDS = [
+    'total_orders', 'total_spent', 'average_order_value', 'first_order_date',
+    'last_order_date', 'days_since_last_order', 'lifetime_value', 'churn_risk',
+    'total_discounts_received', 'updated_at',
+]
+
+
+def _completed_orders(start, end):
+    """Completed orders created in the half-open range [start, end)"""
+    return Order.objects.filter(
+        created_at__gte=start,
+        created_at__lt=end,
+        status__in=COMPLETED_STATUSES
+    )
+
+
+def _snapshot_values(row):
+    """DailyAnalyticsSnapshot field values from a SNAPSHOT_AGGREGATES row"""
+    values = {
+        field: row.get(field) or (Decimal('0.00') if isinstance(aggregate, Sum) else 0)
+        for field, aggregate in SNAPSHOT_AGGREGATES.items()
+    }
+    values['average_order_value'] = (
+        values['total_revenue'] / values['total_orders'] if values['total_orders'] > 0 else Decimal('0.00')
+    )
+    return values
+
+
+def _customer_metric_values(row, now):
+    """CustomerMetrics field values from a CUSTOMER_AGGREGATES row"""
+    total_orders = row.get('total_orders') or 0
+    total_spent = row.get('total_spent') or Decimal('0.00')
+    last_order_date = row.get('last_order_date')
+
+    # Calculate days since last order
+    days_since_last_order = (now - last_order_date).days if last_order_date else 0
+
+    return {
+        'total_orders': total_orders,
+        'total_spent': total_spent,
+        'average_order_value': total_spent / total_orders if total_orders > 0 else Decimal('0.00'),
+        'first_order_date': row.get('first_order_date'),
+        'last_order_date': last_order_date,
+        'days_since_last_order': days_since_last_order,
+        'lifetime_value': total_spent,
+        # Churn risk: no order in 60+ days
+        'churn_risk': days_since_last_order >= 60 and total_orders > 0,
+        'total_discounts_received': row.get('total_discounts') or Decimal('0.00'),
+    }
+
+
 class AnalyticsService:
     """Service for analytics calculations and updates"""
     
@@ -24,121 +115,122 @@ class AnalyticsService:
         if date is None:
             date = timezone.now().date()
         
-        # Get orders for the day
-        day_start = timezone.make_aware(timezone.datetime.combine(date, timezone.datetime.min.time()))
-        day_end = timezone.make_aware(timezone.datetime.combine(date, timezone.datetime.max.time()))
-        
-        orders = Order.objects.filter(
-            created_at__gte=day_start,
-            created_at__lte=day_end,
-            status__in=['completed', 'delivered']
-        )
-        
-        # Calculate basic metrics
-        total_orders = orders.count()
-        unique_customers = orders.values('user_id').distinct().count()
-        total_revenue = orders.aggregate(Sum('total_price'))['total_price__sum'] or Decimal('0.00')
-        
-        # Calculate discounts
-        total_discount = (
-            orders.aggregate(Sum('loyalty_discount_amount'))['loyalty_discount_amount__sum'] or Decimal('0.00')
-        ) + (
-            orders.aggregate(Sum('vip_discount_amount'))['vip_discount_amount__sum'] or Decimal('0.00')
-        ) + (
-            orders.aggregate(Sum('corporate_discount_amount'))['corporate_discount_amount__sum'] or Decimal('0.00')
-        ) + (
-            orders.aggregate(Sum('referral_discount_amount'))['referral_discount_amount__sum'] or Decimal('0.00')
-        )
-        
-        # Calculate average order value
-        average_order_value = (
-            total_revenue / total_orders if total_orders > 0 else Decimal('0.00')
-        )
-        
-        # Count order types
-        vip_orders = orders.filter(user__customer_metrics__vip_tier_current__isnull=False).count()
+        # All of the day's metrics in one conditional-aggregation query
+        row = _completed_orders(
+            day_start(date), day_start(date + timedelta(days=1))
+        ).aggregate(**SNAPSHOT_AGGREGATES)
         
-        # Count payment methods
-        cash_orders = orders.filter(payment_method='cash_on_delivery').count()
-        mobile_money_orders = orders.filter(payment_method='mobile_money').count()
-        bank_transfer_orders = orders.filter(payment_method='bank_transfer').count()
-        card_orders = orders.filter(payment_method='card').count()
-        
-        # Create or update snapshot
         snapshot, created = DailyAnalyticsSnapshot.objects.update_or_create(
             date=date,
-            defaults={
-                'total_orders': total_orders,
-                'unique_customers': unique_customers,
-                'total_revenue': total_revenue,
-                'total_discount': total_discount,
-                'average_order_value': average_order_value,
-                'vip_orders': vip_orders,
-                'cash_orders': cash_orders,
-                'mobile_money_orders': mobile_money_orders,
-                'bank_transfer_orders': bank_transfer_orders,
-                'card_orders': card_orders,
-            }
+            defaults=_snapshot_values(row)
         )
         
         return snapshot
     
     @staticmethod
-    def update_customer_metrics(user):
-        """Update customer metrics for a specific user"""
-        orders = Order.objects.filter(user=user, status__in=['completed', 'delivered'])
-        
-        total_orders = orders.count()
-        total_spent = orders.aggregate(Sum('total_price'))['total_price__sum'] or Decimal('0.00')
-        
-        # Calculate average order value
-        average_order_value = (
-            total_spent / total_orders if total_orders > 0 else Decimal('0.00')
-        )
-        
-        # Get first and last order dates
-        first_order = orders.order_by('created_at').first()
-        last_order = orders.order_by('-created_at').first()
-        
-        first_order_date = first_order.created_at if first_order else None
-        last_order_date = last_order.created_at if last_order else None
-        
-        # Calculate days since last order
-        days_since_last_order = 0
-        if last_order_date:
-            days_since_last_order = (timezone.now() - last_order_date).days
+    def backfill_daily_snapshots(start_date, end_date=None):
+        """
+        Calculate snapshots for every date from start_date to end_date inclusive.
+        
+        The whole range is aggregated with one GROUP BY date query and written
+        with bulk_create/bulk_update, so cost does not grow with query count per day.
+        """
+        if end_date is None:
+            end_date = timezone.now().date()
+        
+        rows = _completed_orders(
+            day_start(start_date), day_start(end_date + timedelta(days=1))
+        ).annotate(
+            day=TruncDate('created_at')
+        ).values('day').annotate(**SNAPSHOT_AGGREGATES).order_by('day')
+        by_day = {row['day']: row for row in rows}
+        
+        existing = {
+            snapshot.date: snapshot
+            for snapshot in DailyAnalyticsSnapshot.objects.filter(date__range=(start_date, end_date))
+        }
         
-        # Calculate churn risk (no order in 60+ days)
-        churn_risk = days_since_last_order >= 60 and total_orders > 0
+        now = timezone.now()
+        snapshots, to_create, to_update = [], [], []
+        date = start_date
+        while date <= end_date:
+            values = _snapshot_values(by_day.get(date, {}))
+            snapshot = existing.get(date)
+            if snapshot is None:
+                snapshot = DailyAnalyticsSnapshot(date=date, **values)
+                to_create.append(snapshot)
+            else:
+                for field, value in values.items():
+                    setattr(snapshot, field, value)
+                snapshot.updated_at = now
+                to_update.append(snapshot)
+            snapshots.append(snapshot)
+            date += timedelta(days=1)
+        
+        with transaction.atomic():
+            DailyAnalyticsSnapshot.objects.bulk_create(to_create)
+            DailyAnalyticsSnapshot.objects.bulk_update(
+                to_update, list(SNAPSHOT_AGGREGATES) + ['average_order_value', 'updated_at']
+            )
         
-        # Calculate total discounts received
-        total_discounts = (
-            orders.aggregate(Sum('loyalty_discount_amount'))['loyalty_discount_amount__sum'] or Decimal('0.00')
-        ) + (
-            orders.aggregate(Sum('vip_discount_amount'))['vip_discount_amount__sum'] or Decimal('0.00')
-        ) + (
-            orders.aggregate(Sum('corporate_discount_amount'))['corporate_discount_amount__sum'] or Decimal('0.00')
-        ) + (
-            orders.aggregate(Sum('referral_discount_amount'))['referral_discount_amount__sum'] or Decimal('0.00')
-        )
+        return snapshots
+    
+    @staticmethod
+    def update_customer_metrics(user):
+        """Update customer metrics for a specific user"""
+        row = Order.objects.filter(
+            user=user, status__in=COMPLETED_STATUSES
+        ).aggregate(**CUSTOMER_AGGREGATES)
         
         metrics, created = CustomerMetrics.objects.update_or_create(
             user=user,
-            defaults={
-                'total_orders': total_orders,
-                'total_spent': total_spent,
-                'average_order_value': average_order_value,
-                'first_order_date': first_order_date,
-                'last_order_date': last_order_date,
-                'days_since_last_order': days_since_last_order,
-                'lifetime_value': total_spent,
-                'churn_risk': churn_risk,
-                'total_discounts_received': total_discounts,
-            }
+            defaults=_customer_metric_values(row, timezone.now())
         )
         
         return metrics
     
+    @staticmethod
+    def recompute_customer_metrics(batch_size=1000, user_ids=None):
+        """
+        Recompute CustomerMetrics for every user, or only ``user_ids``.
+        
+        Uses one grouped query over completed orders and one query for the
+        existing metrics rows, then writes them with bulk_create/bulk_update.
+        Returns the number of users processed.
+        """
+        now = timezone.now()
+        orders = Order.objects.filter(status__in=COMPLETED_STATUSES)
+        existing = CustomerMetrics.objects.order_by()
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            orders = orders.filter(user_id__in=user_ids)
+            existing = existing.filter(user_id__in=user_ids)
+        rows = {
+            row['user_id']: row
+            for row in orders.values('user_id').annotate(**CUSTOMER_AGGREGATES).order_by()
+        }
+        existing = {metrics.user_id: metrics for metrics in existing}
+        
+        if user_ids is None:
+            user_ids = User.objects.values_list('id', flat=True).iterator()
+        to_create, to_update = [], []
+        for user_id in user_ids:
+            values = _customer_metric_values(rows.get(user_id, {}), now)
+            metrics = existing.get(user_id)
+            if metrics is None:
+                to_create.append(CustomerMetrics(user_id=user_id, **values))
+            else:
+                for field, value in values.items():
+                    setattr(metrics, field, value)
+                metrics.updated_at = now
+                to_update.append(metrics)
+        
+        with transaction.atomic():
+            CustomerMetrics.objects.bulk_create(to_create, batch_size=batch_size)
+            CustomerMetrics.objects.bulk_update(to_update, CUSTOMER_METRIC_FIELDS, batch_size=batch_size)
+        
+        return len(to_create) + len(to_update)
+    
     @staticmethod
     def track_revenue_stream(date=None, channel='direct_order', amount=Decimal('0.00'), transaction_count=1):
         """Track revenue by channel/stream"""
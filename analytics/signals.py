@@ -1,55 +1,71 @@
+from django.db import transaction
+from django.db.models import F
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from decimal import Decimal
-from orders.models import Order
+from orders.events import subscriber
+from orders.models import Order, OrderItem
 from payments.models import Payment
+from subscriptions.models import SubscriptionOrder
+from . import rollups
 from .models import ConversionEvent, RevenueStream
-from .services import AnalyticsService
+from .services import COMPLETED_STATUSES, AnalyticsService
 
 
-@receiver(post_save, sender=Order)
-def track_order_completion(sender, instance, created, **kwargs):
-    """Track order completion and update analytics"""
-    
-    # Only track completed orders
-    if instance.status not in ['completed', 'delivered']:
+@subscriber
+def track_order_completion(events):
+    """Record conversions, revenue and customer metrics for orders that were completed"""
+    completed = {
+        event.order_id: event.order
+        for event in events if event.entered(*COMPLETED_STATUSES)
+    }
+    if not completed:
         return
+    orders = list(completed.values())
     
-    # Record conversion event
-    ConversionEvent.objects.create(
-        user=instance.user,
-        event_type='complete_order',
-        session_id=getattr(instance, 'session_id', ''),
-        metadata={
-            'order_id': instance.id,
-            'amount': float(instance.total_price),
-            'payment_method': instance.payment_method,
-        }
+    # Record conversion events
+    ConversionEvent.objects.bulk_create([
+        ConversionEvent(
+            user_id=order.user_id,
+            event_type='complete_order',
+            session_id=getattr(order, 'session_id', ''),
+            metadata={
+                'order_id': order.id,
+                'amount': float(order.total),
+                'payment_method': order.payment_method,
+            }
+        )
+        for order in orders
+    ])
+    
+    # Revenue per channel, added to today's streams
+    subscription_order_ids = set(
+        SubscriptionOrder.objects.filter(order_id__in=completed).values_list('order_id', flat=True)
     )
+    revenue = {}
+    for order in orders:
+        channel = 'direct_order'
+        if order.id in subscription_order_ids:
+            channel = 'subscription'
+        elif order.corporate_discount_amount:
+            channel = 'corporate'
+        amount, count = revenue.get(channel, (Decimal('0.00'), 0))
+        revenue[channel] = (amount + order.total, count + 1)
     
-    # Track revenue stream
     today = timezone.now().date()
-    
-    # Determine revenue channel
-    channel = 'direct_order'
-    if instance.subscription_order:
-        channel = 'subscription'
-    elif instance.is_corporate:
-        channel = 'corporate'
-    elif instance.is_catering:
-        channel = 'catering'
-    
-    # Update revenue stream
-    AnalyticsService.track_revenue_stream(
-        date=today,
-        channel=channel,
-        amount=instance.total_price,
-        transaction_count=1
-    )
+    with transaction.atomic():
+        for channel, (amount, count) in revenue.items():
+            stream, _ = RevenueStream.objects.get_or_create(
+                date=today, channel=channel, defaults={'amount': Decimal('0.00'), 'transaction_count': 0}
+            )
+            RevenueStream.objects.filter(pk=stream.pk).update(
+                amount=F('amount') + amount,
+                transaction_count=F('transaction_count') + count
+            )
     
     # Update customer metrics
-    AnalyticsService.update_customer_metrics(instance.user)
+    AnalyticsService.recompute_customer_metrics(user_ids={order.user_id for order in orders})
 
 
 @receiver(post_save, sender=Payment)
@@ -70,3 +86,41 @@ def track_payment_completion(sender, instance, created, **kwargs):
             'payment_method': instance.payment_method,
         }
     )
+
+
+# ==================== DASHBOARD ROLLUPS ====================
+
+@receiver(post_save, sender=Order)
+def rollup_order_save(sender, instance, created, raw=False, **kwargs):
+    """Move the order's contribution between rollup rows"""
+    if not raw:
+        rollups.record_order(instance, created=created)
+
+
+@receiver(post_delete, sender=Order)
+def rollup_order_delete(sender, instance, **kwargs):
+    rollups.record_order(instance, deleted=True)
+
+
+@receiver(post_save, sender=OrderItem)
+def rollup_order_item_save(sender, instance, created, raw=False, **kwargs):
+    """Move the item's contribution between rollup rows"""
+    if not raw:
+        rollups.record_order_item(instance, created=created)
+
+
+@receiver(post_delete, sender=OrderItem)
+def rollup_order_item_delete(sender, instance, **kwargs):
+    rollups.record_order_item(instance, deleted=True)
+
+
+@receiver(post_save, sender=Payment)
+def rollup_payment_save(sender, instance, created, raw=False, **kwargs):
+    """Move the payment's contribution between rollup rows"""
+    if not raw:
+        rollups.record_payment(instance, created=created)
+
+
+@receiver(post_delete, sender=Payment)
+def rollup_payment_delete(sender, instance, **kwargs):
+    rollups.record_payment(instance, deleted=True)
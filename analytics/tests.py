@@ -1,3 +1,164 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from menu.models import Category, MenuItem
+from orders.models import Order, OrderItem
+from payments.models import Payment
+
+from .models import (
+    CustomerActivityRollup, CustomerMetrics, DailyAnalyticsSnapshot, OrderItemRollup,
+    OrderRollup, PaymentRollup
+)
+from .rollups import rebuild_rollups
+from .services import AnalyticsService
+
+
+class AnalyticsAggregationTests(TestCase):
+    """Single-pass snapshot and customer metric aggregation"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.today = timezone.now().date()
+        self.yesterday = self.today - timedelta(days=1)
+
+        self.create_order(self.alice, '1', 'delivered', 'card', Decimal('100.00'), vip=Decimal('10.00'))
+        self.create_order(self.alice, '2', 'delivered', 'mtn_mobile_money', Decimal('50.00'), loyalty=Decimal('5.00'))
+        self.create_order(self.bob, '3', 'delivered', 'airtel_money', Decimal('30.00'))
+        self.create_order(self.bob, '4', 'cancelled', 'card', Decimal('999.00'))
+        self.create_order(self.bob, '5', 'delivered', 'cash_on_delivery', Decimal('20.00'), days_ago=1)
+
+    def create_order(self, user, number, status, method, total, vip=Decimal('0.00'), loyalty=Decimal('0.00'), days_ago=0):
+        # bulk_create skips the order signals, which are not under test here
+        order, = Order.objects.bulk_create([Order(
+            user=user, order_number=f'ORD{number}', status=status, payment_method=method,
+            customer_name=user.username, customer_phone='0788000000',
+            subtotal=total, total=total, vip_discount_amount=vip, loyalty_discount_amount=loyalty,
+        )])
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_daily_snapshot_is_one_aggregate_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            snapshot = AnalyticsService.calculate_daily_snapshot(self.today)
+
+        order_queries = [q for q in queries.captured_queries if 'orders_order' in q['sql']]
+        self.assertEqual(len(order_queries), 1)
+
+        self.assertEqual(snapshot.total_orders, 3)
+        self.assertEqual(snapshot.unique_customers, 2)
+        self.assertEqual(snapshot.total_revenue, Decimal('180.00'))
+        self.assertEqual(snapshot.total_discount, Decimal('15.00'))
+        self.assertEqual(snapshot.average_order_value, Decimal('60.00'))
+        self.assertEqual(
+            (snapshot.card_orders, snapshot.mobile_money_orders, snapshot.cash_orders),
+            (1, 2, 0)
+        )
+
+    def test_backfill_matches_per_day_snapshots(self):
+        DailyAnalyticsSnapshot.objects.create(date=self.yesterday, total_orders=42)
+
+        snapshots = AnalyticsService.backfill_daily_snapshots(self.yesterday - timedelta(days=1), self.today)
+
+        self.assertEqual([s.date for s in snapshots], [self.yesterday - timedelta(days=1), self.yesterday, self.today])
+        self.assertEqual([s.total_orders for s in snapshots], [0, 1, 3])
+        stored = DailyAnalyticsSnapshot.objects.get(date=self.yesterday)
+        self.assertEqual((stored.total_orders, stored.cash_orders), (1, 1))
+
+        single = AnalyticsService.calculate_daily_snapshot(self.today)
+        self.assertEqual(single.total_revenue, snapshots[-1].total_revenue)
+
+    def test_recompute_customer_metrics_for_all_users(self):
+        CustomerMetrics.objects.create(user=self.bob, total_orders=99)
+
+        # Grouped orders, existing metrics, user ids, then one insert and one update
+        with self.assertNumQueries(7):
+            count = AnalyticsService.recompute_customer_metrics()
+
+        self.assertEqual(count, 2)
+        alice = CustomerMetrics.objects.get(user=self.alice)
+        bob = CustomerMetrics.objects.get(user=self.bob)
+        self.assertEqual((alice.total_orders, alice.total_spent), (2, Decimal('150.00')))
+        self.assertEqual(alice.total_discounts_received, Decimal('15.00'))
+        self.assertEqual((bob.total_orders, bob.total_spent), (2, Decimal('50.00')))
+        self.assertEqual(
+            AnalyticsService.update_customer_metrics(self.bob).total_spent, bob.total_spent
+        )
+
+
+class RollupTests(TestCase):
+    """Dashboard rollups maintained from order, item and payment saves"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.category = Category.objects.create(name='Lunch', slug='lunch')
+        self.dish = MenuItem.objects.create(
+            name='Isombe', description='Cassava leaves', category=self.category, price=Decimal('2000.00')
+        )
+
+    def place_order(self, quantity=2):
+        order = Order.objects.create(
+            user=self.user, customer_name='Alice', customer_phone='0788000000',
+            subtotal=Decimal('2000.00') * quantity, total=Decimal('2000.00') * quantity,
+        )
+        OrderItem.objects.create(order=order, menu_item=self.dish, quantity=quantity, price=Decimal('2000.00'))
+        return order
+
+    def snapshot(self):
+        """Rollup rows as comparable tuples"""
+        return (
+            sorted(OrderRollup.objects.filter(order_count__gt=0).values_list(
+                'date', 'hour', 'status', 'payment_method', 'order_count', 'total_amount')),
+            sorted(OrderItemRollup.objects.filter(line_count__gt=0).values_list(
+                'date', 'status', 'category_id', 'menu_item_id', 'line_count', 'quantity', 'revenue')),
+            sorted(PaymentRollup.objects.filter(payment_count__gt=0).values_list(
+                'date', 'status', 'payment_method', 'payment_count', 'amount')),
+            sorted(CustomerActivityRollup.objects.filter(order_count__gt=0).values_list(
+                'user_id', 'date', 'order_count')),
+        )
+
+    def test_status_change_moves_order_and_items(self):
+        order = self.place_order()
+        self.place_order(quantity=1)
+
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'delivered'
+        order.save()
+
+        delivered = OrderRollup.objects.get(status='delivered')
+        self.assertEqual((delivered.order_count, delivered.total_amount), (1, Decimal('4000.00')))
+        self.assertEqual(OrderRollup.objects.get(status='pending').order_count, 1)
+        self.assertEqual(OrderItemRollup.objects.get(status='delivered').quantity, 2)
+        self.assertEqual(CustomerActivityRollup.objects.get(user=self.user).order_count, 2)
+
+    def test_incremental_rollups_match_rebuild(self):
+        first = self.place_order()
+        second = self.place_order(quantity=3)
+        payment = Payment.objects.create(order=first, amount=first.total)
+        payment.status = 'failed'
+        payment.save()
+        Payment.objects.create(order=second, amount=second.total)
+
+        second.status = 'cancelled'
+        second.save()
+        first.delete()
+
+        incremental = self.snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_dashboard_reads_rollups(self):
+        admin = User.objects.create_user(username='admin', password='pass12345', is_staff=True)
+        self.place_order()
+        self.client.force_login(admin)
 
-# Create your tests here.
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_orders'], 1)
+        self.assertEqual(response.context['pending_orders'], 1)
+        self.assertEqual(response.context['popular_items'][0]['total_quantity'], 2)
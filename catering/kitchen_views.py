@@ -10,6 +10,7 @@ from django.db.models import Count, Q
 from django.utils import timezone
 
 from accounts.models import UserRole
+from dusangire.dates import on_day
 from orders.models import Order, OrderStatus, OrderItem
 from hospital_wards.models import DeliveryScheduleSlot
 
@@ -42,31 +43,31 @@ def kitchen_dashboard(request):
     # Get pending meals (not yet prepared)
     pending_meals = Order.objects.filter(
         status__in=[OrderStatus.PENDING, OrderStatus.CONFIRMED],
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user').prefetch_related('items__menu_item').order_by('created_at')
     
     # Get preparing meals
     preparing_meals = Order.objects.filter(
         status=OrderStatus.PREPARING,
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user').prefetch_related('items__menu_item').order_by('created_at')
     
     # Get ready meals (waiting for delivery)
     ready_meals = Order.objects.filter(
         status=OrderStatus.READY,
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user').prefetch_related('items__menu_item').order_by('created_at')
     
     # Get meal items to prepare
     meal_items_to_prepare = OrderItem.objects.filter(
         order__status__in=[OrderStatus.PENDING, OrderStatus.CONFIRMED],
-        order__created_at__date=today
+        **on_day('order__created_at', today)
     ).select_related('menu_item', 'order__user').order_by('order__created_at')
     
     # Get kitchen statistics
-    total_orders_today = Order.objects.filter(created_at__date=today).count()
+    total_orders_today = Order.objects.filter(**on_day('created_at', today)).count()
     completed_today = Order.objects.filter(
-        created_at__date=today,
+        **on_day('created_at', today),
         status=OrderStatus.READY
     ).count()
     
@@ -96,7 +97,7 @@ def meal_preparation_list(request):
     
     # Get all meals for today
     meals = Order.objects.filter(
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user').prefetch_related(
         'items__menu_item'
     ).order_by('status', 'created_at')
@@ -2,9 +2,11 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.db import models
+from dusangire.pagination import CursorPaginator
 from orders.models import Order
 from subscriptions.models import Subscription
 import logging
@@ -85,16 +87,29 @@ def dashboard(request):
 def my_orders(request):
     """View customer orders"""
     try:
-        orders = Order.objects.filter(user=request.user).order_by('-created_at')
-        total_spent = sum(order.total_amount for order in orders if order.total_amount)
+        orders = Order.objects.filter(user=request.user)
+        # Totals in one aggregate query; the list itself is paged by (created_at, id)
+        totals = orders.aggregate(total_orders=models.Count('id'), total_spent=models.Sum('total'))
+        page_obj = CursorPaginator(orders, 10, count=None).get_page(request)
     except Exception as e:
         logger.error(f"Error loading orders: {e}")
-        orders = []
-        total_spent = 0
+        totals = {'total_orders': 0, 'total_spent': 0}
+        page_obj = None
+    
+    if page_obj is not None and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(page_obj.as_json(lambda order: {
+            'id': order.id,
+            'order_number': order.order_number,
+            'status': order.status,
+            'total': str(order.total),
+            'created_at': order.created_at.isoformat(),
+        }))
     
     return render(request, 'customer_dashboard/my_orders.html', {
-        'orders': orders,
-        'total_spent': total_spent,
+        'orders': page_obj or [],
+        'page_obj': page_obj,
+        'total_orders': totals['total_orders'],
+        'total_spent': totals['total_spent'] or 0,
         'title': _('My Orders'),
         'user': request.user,
     })
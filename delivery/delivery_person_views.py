@@ -10,6 +10,7 @@ from django.db.models import Count, Q
 from django.utils import timezone
 
 from accounts.models import UserRole
+from dusangire.dates import on_day
 from orders.models import Order, OrderStatus
 from delivery.models import DeliveryAddress
 
@@ -42,19 +43,19 @@ def delivery_dashboard(request):
     # Get assigned deliveries for today
     assigned_deliveries = Order.objects.filter(
         status=OrderStatus.READY,
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user', 'delivery_address').order_by('created_at')
     
     # Get in-transit deliveries
     in_transit = Order.objects.filter(
         status=OrderStatus.IN_TRANSIT,
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user', 'delivery_address').order_by('created_at')
     
     # Get delivered orders
     delivered_today = Order.objects.filter(
         status=OrderStatus.DELIVERED,
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user', 'delivery_address').order_by('-updated_at')
     
     # Get delivery statistics
@@ -87,7 +88,7 @@ def active_deliveries(request):
     # Get all active deliveries (ready and in-transit)
     active_deliveries = Order.objects.filter(
         status__in=[OrderStatus.READY, OrderStatus.IN_TRANSIT],
-        created_at__date=today
+        **on_day('created_at', today)
     ).select_related('user', 'delivery_address').order_by('status', 'created_at')
     
     context = {
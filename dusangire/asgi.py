@@ -20,6 +20,7 @@ django_asgi_app = get_asgi_application()
 
 # Import routing after Django is set up
 from hospital_wards.routing import websocket_urlpatterns
+from notifications.routing import websocket_urlpatterns as badge_websocket_urlpatterns
 
 application = ProtocolTypeRouter({
     # Django's ASGI application for HTTP requests
@@ -29,7 +30,7 @@ application = ProtocolTypeRouter({
     'websocket': AllowedHostsOriginValidator(
         AuthMiddlewareStack(
             URLRouter(
-                websocket_urlpatterns
+                websocket_urlpatterns + badge_websocket_urlpatterns
             )
         )
     ),
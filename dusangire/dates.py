@@ -0,0 +1,41 @@
+"""
+Date Ranges
+Half-open datetime ranges for filtering DateTimeFields by calendar day.
+
+A ``created_at__date=day`` filter converts every row's column to a date
+before comparing it, so no index on created_at can serve the query, and
+SQLite scans the whole table. The same rows are matched by
+``created_at >= day 00:00 AND created_at < next day 00:00`` in the current
+time zone. That range can use an index on created_at, or on a composite
+index that ends in it, such as (status, created_at).
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def day_start(day):
+    """Aware datetime of midnight at the start of ``day``"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(first_day, last_day=None):
+    """``(start, end)`` covering ``first_day`` through ``last_day`` inclusive, end excluded"""
+    return day_start(first_day), day_start((last_day or first_day) + timedelta(days=1))
+
+
+def on_day(field, day=None):
+    """Lookups matching ``field`` on ``day`` (today when omitted), e.g. ``filter(**on_day('created_at'))``"""
+    start, end = day_range(day or timezone.localdate())
+    return {f'{field}__gte': start, f'{field}__lt': end}
+
+
+def since_day(field, day):
+    """Lookups matching ``field`` on or after ``day``"""
+    return {f'{field}__gte': day_start(day)}
+
+
+def until_day(field, day):
+    """Lookups matching ``field`` on or before ``day``"""
+    return {f'{field}__lt': day_start(day + timedelta(days=1))}
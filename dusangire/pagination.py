@@ -0,0 +1,208 @@
+"""
+Keyset Pagination
+Cursor-based pages for long, time-ordered lists (orders, notifications, logs, tickets).
+
+``Paginator`` pages with OFFSET, so deep pages scan every row before them,
+and each page runs a ``COUNT(*)``. ``CursorPaginator`` instead orders by a
+unique key, such as ``('-created_at', '-id')``, and fetches the rows after
+the last row shown (``WHERE (created_at, id) < (...) LIMIT n + 1``). Every
+page costs the same, and the extra row tells whether another page follows.
+
+Cursors are opaque: the boundary row's key values are signed with
+``django.core.signing``, so they cannot be forged or replayed against
+another list. An invalid cursor falls back to the first page, like
+``Paginator.get_page``. Totals are optional. Approximate totals stop
+counting at COUNT_LIMIT and are cached briefly per query.
+"""
+
+import hashlib
+from datetime import date, datetime
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import QueryDict
+
+CURSOR_PARAM = 'cursor'
+
+SALT = 'dusangire.pagination'
+
+# Approximate counts stop at this many rows and show as "1000+"
+COUNT_LIMIT = 1000
+
+# Seconds an approximate count is reused for the same query
+COUNT_CACHE_TIMEOUT = 60
+
+
+class CursorPage:
+    """One page of rows with the cursors and links of its neighbours"""
+
+    def __init__(self, object_list, paginator, params, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+        self.next_cursor = paginator.encode(object_list[-1], forward=True) if self.has_next else None
+        self.previous_cursor = paginator.encode(object_list[0], forward=False) if self.has_previous else None
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _url(self, cursor):
+        params = self._params.copy()
+        params.pop(CURSOR_PARAM, None)
+        if cursor:
+            params[CURSOR_PARAM] = cursor
+        return f"?{params.urlencode()}"
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self.has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor) if self.has_previous else None
+
+    @property
+    def first_url(self):
+        return self._url(None)
+
+    @property
+    def count(self):
+        return self.paginator.count
+
+    @property
+    def count_is_approximate(self):
+        return self.paginator.count_is_approximate
+
+    def as_json(self, serialize):
+        """JSON body for XHR variants of a list, each row passed through ``serialize``"""
+        return {
+            'results': [serialize(row) for row in self.object_list],
+            'next': self.next_cursor,
+            'previous': self.previous_cursor,
+            'count': self.count,
+            'count_is_approximate': self.count_is_approximate,
+        }
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over a queryset.
+
+    ``ordering`` must end in a unique field so every row has a distinct key.
+    ``count`` is ``'exact'``, ``'approximate'`` (capped at COUNT_LIMIT) or
+    None to skip counting. ``key`` names the list in the cursor signature;
+    it defaults to the model label.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'), count='approximate', key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_mode = count
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.salt = f"{SALT}:{key or queryset.model._meta.label_lower}"
+        self._count = None
+
+    # ==================== CURSORS ====================
+
+    def encode(self, row, forward=True):
+        values = []
+        for name, _ in self.fields:
+            value = getattr(row, name)
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        return signing.dumps({'v': values, 'f': int(forward)}, salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        """``(key values, forward)`` of a cursor; raises ``signing.BadSignature`` when invalid"""
+        payload = signing.loads(cursor, salt=self.salt)
+        values = payload['v']
+        if len(values) != len(self.fields):
+            raise signing.BadSignature('Cursor does not match the ordering')
+        model = self.queryset.model
+        values = [model._meta.get_field(name).to_python(value) for (name, _), value in zip(self.fields, values)]
+        return values, bool(payload['f'])
+
+    def _after(self, values, forward):
+        """Rows strictly after the key in the paging direction"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending == forward else 'gt'
+            step = Q(**{name: value for (name, _), value in zip(self.fields[:i], values[:i])})
+            step &= Q(**{f'{name}__{lookup}': values[i]})
+            condition |= step
+        return condition
+
+    # ==================== PAGES ====================
+
+    def page(self, cursor=None, params=None):
+        """The page a cursor points at, the first page when it is missing or invalid"""
+        params = params if params is not None else QueryDict(mutable=True)
+        values = None
+        forward = True
+        if cursor:
+            try:
+                values, forward = self.decode(cursor)
+            except (signing.BadSignature, ValidationError, KeyError, TypeError, ValueError):
+                values, forward = None, True
+
+        if forward:
+            queryset = self.queryset.order_by(*self.ordering)
+        else:
+            queryset = self.queryset.order_by(*(name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, forward))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return CursorPage(rows, self, params, has_next=has_more, has_previous=values is not None)
+        rows.reverse()
+        return CursorPage(rows, self, params, has_next=True, has_previous=has_more)
+
+    def get_page(self, request):
+        """The page named by the request's ``cursor`` parameter"""
+        return self.page(request.GET.get(CURSOR_PARAM), params=request.GET.copy())
+
+    # ==================== COUNTS ====================
+
+    def _count_rows(self):
+        queryset = self.queryset.order_by()
+        if self.count_mode == 'exact':
+            return queryset.count(), False
+        key = f"pagination:count:{hashlib.sha1(str(queryset.query).encode()).hexdigest()}"
+        found = cache.get(key)
+        if found is None:
+            total = queryset[:COUNT_LIMIT + 1].count()
+            found = (min(total, COUNT_LIMIT), total > COUNT_LIMIT)
+            cache.set(key, found, COUNT_CACHE_TIMEOUT)
+        return found
+
+    def _counted(self):
+        if self._count is None:
+            self._count = (None, False) if self.count_mode is None else self._count_rows()
+        return self._count
+
+    @property
+    def count(self):
+        return self._counted()[0]
+
+    @property
+    def count_is_approximate(self):
+        return self._counted()[1]
@@ -86,6 +86,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.PrincipalMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -120,6 +121,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
+                'accounts.rbac.rbac_context',
             ],
         },
     },
@@ -294,6 +296,26 @@ CORS_ALLOWED_ORIGINS = [
 # Redirect URLs after OAuth
 SOCIALACCOUNT_ADAPTER = 'allauth.socialaccount.adapter.DefaultSocialAccountAdapter'
 HOSPITAL_ACQUISITION_MODE = True  # Enable hospital-specific features
+# Cache shared by every process (Redis in production). Header badge counts are
+# refreshed by whichever process writes them, including the background
+# workers, so web processes only see them through a shared cache. Without
+# REDIS_URL each process keeps its own in-memory cache (development and tests)
+REDIS_URL = config('REDIS_URL', default='')
+SHARED_CACHE = bool(REDIS_URL)
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Django Channels Configuration
 ASGI_APPLICATION = 'dusangire.asgi.application'
 
@@ -309,6 +331,13 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Order lifecycle events are left to `manage.py process_order_events` when set;
+# otherwise they are processed right after the saving transaction commits
+ORDER_EVENTS_ASYNC = config('ORDER_EVENTS_ASYNC', default=False, cast=bool)
+
+# Processes rendering menu images; 0 renders on the committing thread
+MENU_IMAGE_WORKERS = config('MENU_IMAGE_WORKERS', default=2, cast=int)
+
 # In-memory channel layer for development (if Redis is not available)
 # Uncomment for local development without Redis
 # CHANNEL_LAYERS = {
@@ -0,0 +1,159 @@
+"""
+Query plan regression tests for the hot list and dashboard views
+"""
+import re
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import UserRole
+from dusangire.dates import on_day, since_day
+from health_profiles.models import HealthCheck
+from hospital_wards.models import CaregiverNotification, PatientAdmission, Ward, WardBed
+from orders.models import Order, OrderItem, OrderStatus
+from payments.models import Payment
+
+# Tables whose hot filters must be served by an index
+HOT_TABLES = {
+    'orders_order',
+    'payments_payment',
+    'hospital_wards_wardbed',
+    'hospital_wards_patientadmission',
+    'health_profiles_healthcheck',
+    'hospital_wards_caregivernotification',
+}
+
+# A plan step reading every row of a table: "SCAN <table or alias>" without an index
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def table_aliases(sql):
+    """``{alias: table}`` of the tables a query reads, tables mapping to themselves"""
+    aliases = {}
+    for table, alias in re.findall(r'(?:FROM|JOIN)\s+"(\w+)"(?:\s+(?:AS\s+)?"?(\w+)"?)?', sql):
+        aliases[table] = table
+        if alias and alias.upper() not in ('ON', 'WHERE', 'INNER', 'LEFT', 'GROUP', 'ORDER', 'LIMIT'):
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(sql, params=()):
+    """Hot tables ``EXPLAIN QUERY PLAN`` reads in full for one query"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        steps = [row[-1] for row in cursor.fetchall()]
+    aliases = table_aliases(sql)
+    scanned = set()
+    for step in steps:
+        match = FULL_SCAN.match(step.strip())
+        if match and aliases.get(match.group(1), match.group(1)) in HOT_TABLES:
+            scanned.add(aliases.get(match.group(1), match.group(1)))
+    return scanned
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class HotQueryPlanTests(TestCase):
+    """Hot views must not fall back to full table scans of the large tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer', password='pass12345')
+        cls.staff = {}
+        for role in (UserRole.KITCHEN_STAFF, UserRole.MEDICAL_STAFF, UserRole.CAREGIVER):
+            user = User.objects.create_user(username=role, password='pass12345', is_staff=True)
+            user.profile.role = role
+            user.profile.save()
+            cls.staff[role] = user
+
+        now = timezone.now()
+        statuses = [OrderStatus.PENDING, OrderStatus.CONFIRMED, OrderStatus.PREPARING,
+                    OrderStatus.READY, OrderStatus.DELIVERED]
+        orders = []
+        for i in range(60):
+            order = Order.objects.create(
+                user=cls.customer, customer_name='Customer', customer_phone='+250788123456',
+                subtotal=Decimal('1000.00'), total=Decimal('1000.00'), status=statuses[i % len(statuses)]
+            )
+            orders.append(order)
+        # Spread the orders over the last days so "today" is a narrow range
+        for i, order in enumerate(orders):
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(hours=6 * i))
+        for order in orders[:20]:
+            Payment.objects.create(order=order, amount=order.total, payment_method='cash_on_delivery')
+        Payment.objects.update(status='completed', paid_at=now - timedelta(days=3))
+
+        ward = Ward.objects.create(name='Ward A', location='Block A', capacity=10)
+        for number in range(10):
+            WardBed.objects.create(ward=ward, bed_number=str(number), status='available' if number % 2 else 'occupied')
+        PatientAdmission.objects.create(patient=cls.customer, bed=WardBed.objects.first())
+        HealthCheck.objects.create(patient=cls.customer, assigned_consultant=cls.staff[UserRole.MEDICAL_STAFF])
+        CaregiverNotification.objects.create(
+            patient=cls.customer, caregiver=cls.staff[UserRole.CAREGIVER],
+            notification_type='order_update', title='Order update', message='Ready'
+        )
+
+    def assertNoFullScans(self, user, *urls):
+        self.client.force_login(user)
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                scanned = full_scans(sql)
+                self.assertFalse(scanned, f"{url} scans {sorted(scanned)}:\n{sql}")
+
+    def assertQueriesUseIndexes(self, **querysets):
+        for name, queryset in querysets.items():
+            sql, params = queryset.query.sql_with_params()
+            scanned = full_scans(sql, params)
+            self.assertFalse(scanned, f"{name} scans {sorted(scanned)}:\n{sql}")
+
+    def test_kitchen_and_caregiver_views(self):
+        self.assertNoFullScans(self.staff[UserRole.KITCHEN_STAFF], '/catering/kitchen/dashboard/')
+        self.assertNoFullScans(self.staff[UserRole.CAREGIVER], '/hospital/notifications/?read=unread')
+
+    def test_customer_lists(self):
+        self.assertNoFullScans(self.customer, '/orders/history/', '/customer-dashboard/orders/', '/notifications/')
+
+    def test_order_dashboard_filters(self):
+        # Kitchen, delivery, chef and admin dashboards: status and/or a day range on created_at
+        today = on_day('created_at')
+        self.assertQueriesUseIndexes(
+            todays_orders=Order.objects.filter(**today),
+            status_today=Order.objects.filter(status=OrderStatus.READY, **today),
+            statuses_today=Order.objects.filter(status__in=[OrderStatus.PENDING, OrderStatus.CONFIRMED], **today),
+            status_queue=Order.objects.filter(status=OrderStatus.PENDING).order_by('created_at')[:8],
+            admin_range=Order.objects.filter(status=OrderStatus.PENDING, **since_day('created_at', timezone.localdate())),
+            items_today=OrderItem.objects.filter(order__status=OrderStatus.PENDING, **on_day('order__created_at')),
+        )
+
+    def test_hospital_filters(self):
+        month_ago = timezone.now() - timedelta(days=30)
+        ward = Ward.objects.get()
+        self.assertQueriesUseIndexes(
+            revenue=Payment.objects.filter(status='completed', paid_at__gte=month_ago),
+            ward_beds=WardBed.objects.filter(ward=ward, status='available', is_active=True),
+            active_admissions=PatientAdmission.objects.filter(is_active=True, admission_date__gte=month_ago),
+            admissions=PatientAdmission.objects.filter(admission_date__gte=month_ago),
+            consultant_checks=HealthCheck.objects.filter(
+                status='pending', assigned_consultant=self.staff[UserRole.MEDICAL_STAFF]
+            ),
+            caregiver_unread=CaregiverNotification.objects.filter(
+                caregiver=self.staff[UserRole.CAREGIVER], is_read=False
+            ),
+        )
+
+    def test_day_filter_is_a_range_on_the_column(self):
+        sql, _ = Order.objects.filter(**on_day('created_at')).query.sql_with_params()
+        self.assertNotIn('django_datetime_cast_date', sql)
+        self.assertIn('"orders_order"."created_at" >=', sql)
+        self.assertIn('"orders_order"."created_at" <', sql)
@@ -0,0 +1,229 @@
+"""
+Health Check Assignment Engine
+Batch matching of pending health checks to available consultants.
+
+Pending checks and consultant capacity are loaded once. Checks are taken in
+priority order (urgent first, then oldest) and each goes to the eligible
+consultant with the lightest workload, best rating breaking ties. Eligibility
+is the consultant's preferred check types (none means every type). One heap
+of consultants per check type keeps each pick O(log consultants); entries
+left stale by an earlier assignment are discarded when they surface.
+
+The plan is written in one transaction: a ``bulk_update`` of the checks and
+consultant workloads and a ``bulk_create`` of AutoAssignmentLog rows.
+Assignment emails are queued with ``transaction.on_commit`` and sent over a
+single mail connection. The auto_assign_health_checks command and the
+consultant availability signal both run ``assign_pending_checks``.
+"""
+
+import heapq
+import logging
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import AutoAssignmentLog, ConsultantAvailability, HealthCheck
+
+logger = logging.getLogger(__name__)
+
+# Assignment order of check priorities
+PRIORITY_RANK = {'urgent': 0, 'high': 1, 'normal': 2, 'low': 3}
+
+CHECK_TYPES = [check_type for check_type, _ in HealthCheck.TYPE_CHOICES]
+
+
+@dataclass
+class AssignmentPlan:
+    """Checks matched to consultants, and the checks left waiting"""
+    assignments: list = field(default_factory=list)
+    unassigned: list = field(default_factory=list)
+
+
+def preferred_types(availability):
+    """Check types a consultant accepts; every type when none are preferred"""
+    types = [t.strip() for t in availability.preferred_check_types.split(',') if t.strip()]
+    return types or CHECK_TYPES
+
+
+def check_order(health_check):
+    return (PRIORITY_RANK.get(health_check.priority, len(PRIORITY_RANK)), health_check.created_at, health_check.pk or 0)
+
+
+def plan_assignments(checks, consultants):
+    """
+    Match checks to consultants in memory.
+
+    ``checks`` are taken in the order given; ``consultants`` are
+    ConsultantAvailability rows whose ``current_assignments`` is used as the
+    starting workload. Returns an AssignmentPlan of ``(check, availability)``
+    pairs; the consultants' workloads are not modified.
+    """
+    loads = {}
+    versions = {}
+    heaps = {check_type: [] for check_type in CHECK_TYPES}
+    accepts = {}
+
+    def push(index):
+        availability = consultants[index]
+        entry = (loads[index], -availability.average_rating, index, versions[index])
+        for check_type in accepts[index]:
+            heapq.heappush(heaps.setdefault(check_type, []), entry)
+
+    for index, availability in enumerate(consultants):
+        if availability.available_slots <= 0:
+            continue
+        loads[index] = availability.current_assignments
+        versions[index] = 0
+        accepts[index] = preferred_types(availability)
+        push(index)
+
+    plan = AssignmentPlan()
+    for health_check in checks:
+        heap = heaps.get(health_check.check_type, [])
+        chosen = None
+        while heap:
+            _, _, index, version = heapq.heappop(heap)
+            if version == versions[index] and loads[index] < consultants[index].max_concurrent_checks:
+                chosen = index
+                break
+        if chosen is None:
+            plan.unassigned.append(health_check)
+            continue
+        plan.assignments.append((health_check, consultants[chosen]))
+        loads[chosen] += 1
+        versions[chosen] += 1
+        push(chosen)
+    return plan
+
+
+# ==================== DATABASE ====================
+
+def pending_checks():
+    return HealthCheck.objects.filter(status='pending', assigned_consultant__isnull=True)
+
+
+def available_consultants():
+    return ConsultantAvailability.objects.filter(
+        status='available',
+        current_assignments__lt=F('max_concurrent_checks')
+    )
+
+
+def assign_pending_checks(consultant_ids=None, dry_run=False, log_unassigned=True,
+                          message='Auto-assigned to {name}'):
+    """
+    Assign every pending check that has an eligible consultant.
+
+    ``consultant_ids`` limits the consultants considered (ConsultantAvailability
+    consultant user ids). ``message`` is formatted with the consultant's
+    ``name`` for the success log. Returns the AssignmentPlan.
+    """
+    with transaction.atomic():
+        consultants = available_consultants().select_related('consultant').order_by('pk')
+        if consultant_ids is not None:
+            consultants = consultants.filter(consultant_id__in=consultant_ids)
+        consultants = list(consultants.select_for_update(of=('self',)))
+        checks = sorted(
+            pending_checks().select_related('patient').order_by().select_for_update(skip_locked=True, of=('self',)),
+            key=check_order
+        )
+        plan = plan_assignments(checks, consultants)
+        if not dry_run:
+            _save_plan(plan, log_unassigned, message)
+    return plan
+
+
+def _save_plan(plan, log_unassigned, message):
+    now = timezone.now()
+    logs = []
+    workloads = {}
+    for health_check, availability in plan.assignments:
+        consultant = availability.consultant
+        health_check.assigned_consultant = consultant
+        health_check.status = 'assigned'
+        health_check.auto_assigned = True
+        health_check.assigned_at = now
+        health_check.updated_at = now
+        health_check.assignment_reason = f"Auto-assigned to {availability.specialization}"[:200]
+        workloads[availability.pk] = availability
+        availability.current_assignments += 1
+        logs.append(AutoAssignmentLog(
+            health_check=health_check,
+            assigned_consultant=consultant,
+            result='success',
+            message=message.format(name=consultant.get_full_name())
+        ))
+    if log_unassigned:
+        logs.extend(
+            AutoAssignmentLog(
+                health_check=health_check,
+                result='no_available',
+                message='No available consultant matching criteria'
+            )
+            for health_check in plan.unassigned
+        )
+
+    HealthCheck.objects.bulk_update(
+        [health_check for health_check, _ in plan.assignments],
+        ['assigned_consultant', 'status', 'auto_assigned', 'assigned_at', 'assignment_reason', 'updated_at'],
+        batch_size=500
+    )
+    ConsultantAvailability.objects.bulk_update(list(workloads.values()), ['current_assignments'], batch_size=500)
+    AutoAssignmentLog.objects.bulk_create(logs, batch_size=500)
+
+    if plan.assignments:
+        assignments = list(plan.assignments)
+        transaction.on_commit(lambda: notify_assignments(assignments))
+    logger.info(f"Auto-assigned {len(plan.assignments)} health checks, {len(plan.unassigned)} awaiting consultants")
+
+
+# ==================== NOTIFICATIONS ====================
+
+def assignment_email(health_check, consultant):
+    """Email telling a patient their consultant, or None without a patient email"""
+    patient = health_check.patient
+    if not patient.email:
+        return None
+    context = {
+        'patient_name': patient.get_full_name(),
+        'consultant_name': consultant.get_full_name(),
+        'check_type': health_check.get_check_type_display(),
+        'check_id': health_check.id,
+        'site_name': settings.SITE_NAME,
+        'contact_email': settings.CONTACT_EMAIL,
+    }
+    email = EmailMultiAlternatives(
+        subject=f"Health Check Assigned - Check #{health_check.id}",
+        body=render_to_string('emails/health_check_assigned.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[patient.email]
+    )
+    email.attach_alternative(render_to_string('emails/health_check_assigned.html', context), 'text/html')
+    return email
+
+
+def notify_assignments(assignments):
+    """Send assignment emails for ``(check, availability)`` pairs over one connection"""
+    messages = []
+    for health_check, availability in assignments:
+        try:
+            email = assignment_email(health_check, availability.consultant)
+        except Exception as e:
+            logger.error(f"Error building assignment notification for check #{health_check.id}: {e}")
+            continue
+        if email is not None:
+            messages.append(email)
+    if not messages:
+        return 0
+    try:
+        sent = get_connection(fail_silently=True).send_messages(messages) or 0
+    except Exception as e:
+        logger.error(f"Error sending assignment notifications: {e}")
+        return 0
+    logger.info(f"Sent {sent} assignment notifications")
+    return sent
@@ -0,0 +1,61 @@
+"""
+Management command to benchmark the in-memory health check assignment planner
+Usage: python manage.py benchmark_health_assignment [--checks 5000] [--consultants 200] [--repeat 3]
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from health_profiles.assignment import CHECK_TYPES, PRIORITY_RANK, check_order, plan_assignments
+from health_profiles.models import ConsultantAvailability, HealthCheck
+
+
+class Command(BaseCommand):
+    help = 'Time assignment planning on synthetic pending checks and consultants (no database writes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=5000, help='Pending checks to generate')
+        parser.add_argument('--consultants', type=int, default=200, help='Available consultants to generate')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs; the best is reported')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        checks = sorted((
+            HealthCheck(
+                pk=index + 1,
+                check_type=rng.choice(CHECK_TYPES),
+                priority=rng.choice(list(PRIORITY_RANK)),
+                created_at=now - timedelta(minutes=rng.randrange(60 * 24 * 7)),
+            )
+            for index in range(options['checks'])
+        ), key=check_order)
+        consultants = [
+            ConsultantAvailability(
+                pk=index + 1,
+                status='available',
+                max_concurrent_checks=rng.randint(5, 40),
+                current_assignments=rng.randint(0, 4),
+                preferred_check_types=','.join(rng.sample(CHECK_TYPES, rng.randint(0, 3))),
+                average_rating=round(rng.uniform(3, 5), 1),
+            )
+            for index in range(options['consultants'])
+        ]
+
+        timings = []
+        for _ in range(max(options['repeat'], 1)):
+            started = time.perf_counter()
+            plan = plan_assignments(checks, consultants)
+            timings.append(time.perf_counter() - started)
+
+        best = min(timings)
+        capacity = sum(c.available_slots for c in consultants)
+        self.stdout.write(f"Checks: {len(checks)}  Consultants: {len(consultants)}  Open slots: {capacity}")
+        self.stdout.write(f"Assigned: {len(plan.assignments)}  Awaiting: {len(plan.unassigned)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Best of {len(timings)}: {best * 1000:.1f} ms ({len(checks) / best:,.0f} checks/s)"
+        ))
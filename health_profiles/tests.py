@@ -1,3 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from .assignment import assign_pending_checks, plan_assignments
+from .models import AutoAssignmentLog, ConsultantAvailability, HealthCheck
+
+
+class HealthCheckAssignmentTests(TestCase):
+    """Batch matching of pending health checks to consultants"""
+
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient', email='patient@example.com', password='pass12345')
+        self.generalist = self._consultant('gp', rating=4.0, max_checks=2)
+        self.nutritionist = self._consultant('nutri', rating=4.8, max_checks=2, types='nutrition')
+
+    def _consultant(self, username, rating, max_checks, types='', status='available'):
+        user = User.objects.create_user(username=username, first_name=username.title(), password='pass12345')
+        return ConsultantAvailability.objects.create(
+            consultant=user, status=status, average_rating=rating,
+            max_concurrent_checks=max_checks, preferred_check_types=types
+        )
+
+    def _check(self, check_type='wellness', priority='normal'):
+        return HealthCheck.objects.create(
+            patient=self.patient, check_type=check_type, priority=priority, description='Routine check'
+        )
+
+    def test_plan_orders_by_priority_and_balances_workload(self):
+        low = self._check(priority='low')
+        urgent = self._check(priority='urgent')
+        nutrition = self._check(check_type='nutrition')
+        wellness = self._check()
+        consultants = [self.generalist, self.nutritionist]
+
+        plan = plan_assignments([urgent, nutrition, wellness, low], consultants)
+        assigned = {check.pk: availability.pk for check, availability in plan.assignments}
+
+        self.assertEqual(assigned[urgent.pk], self.generalist.pk)
+        self.assertEqual(assigned[nutrition.pk], self.nutritionist.pk)
+        self.assertEqual(assigned[wellness.pk], self.generalist.pk)
+        self.assertEqual(plan.unassigned, [low])
+        self.assertEqual(self.generalist.current_assignments, 0)
+
+    def test_command_writes_assignments_and_notifies_on_commit(self):
+        checks = [self._check(priority=priority) for priority in ('low', 'urgent', 'high')]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('auto_assign_health_checks', stdout=StringIO())
+
+        checks[1].refresh_from_db()
+        self.assertEqual(checks[1].status, 'assigned')
+        self.assertEqual(checks[1].assigned_consultant, self.generalist.consultant)
+        self.assertEqual(HealthCheck.objects.get(pk=checks[0].pk).status, 'pending')
+        self.generalist.refresh_from_db()
+        self.assertEqual(self.generalist.current_assignments, 2)
+        self.assertEqual(AutoAssignmentLog.objects.filter(result='success').count(), 2)
+        self.assertEqual(AutoAssignmentLog.objects.get(result='no_available').health_check, checks[0])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_query_count_is_independent_of_pending_checks(self):
+        extra = self._consultant('extra', rating=3.0, max_checks=40, status='offline')
+        ConsultantAvailability.objects.filter(pk=extra.pk).update(status='available')
+        for _ in range(30):
+            self._check()
+        with self.assertNumQueries(7):
+            plan = assign_pending_checks()
+        self.assertEqual(len(plan.assignments), 30)
+
+    def test_consultant_becoming_available_takes_matching_checks(self):
+        self._check(check_type='medical')
+        self._check(check_type='nutrition', priority='low')
+        self._check(check_type='nutrition', priority='high')
+        specialist = self._consultant('dietitian', rating=4.0, max_checks=3, types='nutrition', status='offline')
+
+        specialist.status = 'available'
+        specialist.save()
+
+        assigned = HealthCheck.objects.filter(assigned_consultant=specialist.consultant)
+        self.assertEqual(sorted(assigned.values_list('priority', flat=True)), ['high', 'low'])
+        self.assertEqual(specialist.current_assignments, 2)
+        self.assertFalse(AutoAssignmentLog.objects.filter(result='no_available').exists())
@@ -0,0 +1,157 @@
+"""
+Health Alert Scanner
+Set-based detection of threshold breaches and at-risk goals.
+
+Patients are scanned in chunks of user ids. For each chunk, unflagged recent
+readings outside their metric type's alert thresholds are selected with one
+join in SQL, active goals due within two weeks are checked for risk from one
+``values_list`` query, and the resulting HealthAlerts are written with one ``bulk_create``
+per chunk. Each chunk is its own short transaction, so the scan can run every
+few minutes over the whole hospital alongside request traffic.
+
+``HealthService.detect_health_alerts(user)`` is a one-user scan.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import DailyHealthMetric, HealthAlert, PatientHealthGoal
+
+logger = logging.getLogger(__name__)
+
+# Patients scanned per transaction
+SCAN_CHUNK_SIZE = 500
+
+# Readings recorded within this many days are checked for threshold breaches
+METRIC_LOOKBACK_DAYS = 1
+
+# Active goals due within this many days are checked for risk
+GOAL_RISK_WINDOW_DAYS = 14
+
+# A goal is on track while its progress is at least this share of the time elapsed
+ON_TRACK_MARGIN = 0.8
+
+
+def _breaching_metrics(user_ids, since):
+    """Unflagged readings outside their type's alert thresholds (a zero threshold is unset)"""
+    above = Q(value__gt=F('metric_type__alert_threshold_max')) & ~Q(metric_type__alert_threshold_max=0)
+    below = Q(value__lt=F('metric_type__alert_threshold_min')) & ~Q(metric_type__alert_threshold_min=0)
+    return DailyHealthMetric.objects.filter(
+        above | below,
+        user_id__in=user_ids,
+        recorded_date__gte=since,
+        is_alert_generated=False,
+    ).select_related('metric_type').order_by('pk')
+
+
+def metric_alerts(metrics):
+    """Unsaved unusual_metric alerts for breaching readings"""
+    return [
+        HealthAlert(
+            user_id=metric.user_id,
+            alert_type='unusual_metric',
+            severity='warning',
+            title=f'Alert: Unusual {metric.metric_type.metric_name}',
+            message=f'{metric.metric_type.metric_name} reading of {metric.value} {metric.metric_type.unit} is outside normal range',
+            metric=metric,
+            notify_nutritionist=True,
+            send_email=True
+        )
+        for metric in metrics
+    ]
+
+
+def goal_off_track(today, start_date, target_date, current_value, target_value, baseline):
+    """
+    Whether a goal is behind schedule.
+
+    ``baseline`` is the goal's metric type normal_range_min, None for goals
+    without a metric type (which count as having made no progress). Progress
+    is measured from the baseline towards the target and compared with the
+    share of the goal period elapsed, allowing ON_TRACK_MARGIN.
+    """
+    days_elapsed = (today - start_date).days
+    days_total = (target_date - start_date).days
+    if days_total <= 0 or days_elapsed <= 0:
+        return False
+    achieved_ratio = 0.0
+    if baseline is not None and target_value != baseline:
+        achieved_ratio = (current_value - baseline) / (target_value - baseline)
+    return achieved_ratio < days_elapsed / days_total * ON_TRACK_MARGIN
+
+
+def goal_alerts(user_ids, today):
+    """Unsaved goal_at_risk alerts for goals behind schedule without an open alert"""
+    goals = (
+        PatientHealthGoal.objects.filter(
+            user_id__in=user_ids,
+            status='active',
+            target_date__gt=today,
+            target_date__lt=today + timedelta(days=GOAL_RISK_WINDOW_DAYS),
+        ).exclude(
+            current_value__isnull=True
+        ).exclude(
+            current_value=0
+        ).exclude(
+            Exists(HealthAlert.objects.filter(goal=OuterRef('pk'), alert_type='goal_at_risk', is_acknowledged=False))
+        ).values_list(
+            'id', 'user_id', 'goal_name', 'start_date', 'target_date',
+            'current_value', 'target_value', 'metric_type_id', 'metric_type__normal_range_min'
+        )
+    )
+    return [
+        HealthAlert(
+            user_id=user_id,
+            alert_type='goal_at_risk',
+            severity='warning',
+            title=f'Goal at Risk: {goal_name}',
+            message=f'Your goal "{goal_name}" may not be achieved by {target_date}. Consider adjusting your strategy.',
+            goal_id=goal_id,
+            notify_nutritionist=True
+        )
+        for goal_id, user_id, goal_name, start_date, target_date, current_value, target_value, type_id, baseline in goals
+        if goal_off_track(
+            today, start_date, target_date, float(current_value), float(target_value),
+            None if type_id is None else float(baseline or 0)
+        )
+    ]
+
+
+def scan_chunk(user_ids, today=None):
+    """Create every due alert for one chunk of users; returns the created alerts"""
+    today = today or timezone.now().date()
+    with transaction.atomic():
+        metrics = list(
+            _breaching_metrics(user_ids, today - timedelta(days=METRIC_LOOKBACK_DAYS))
+            .select_for_update(skip_locked=True, of=('self',))
+        )
+        alerts = HealthAlert.objects.bulk_create(metric_alerts(metrics) + goal_alerts(user_ids, today))
+        if metrics:
+            DailyHealthMetric.objects.filter(pk__in=[metric.pk for metric in metrics]).update(is_alert_generated=True)
+    return alerts
+
+
+def scan_health_alerts(user_ids, chunk_size=SCAN_CHUNK_SIZE, today=None):
+    """Scan the given users in chunks; returns ``{'metric': n, 'goal': n}`` alert counts"""
+    today = today or timezone.now().date()
+    counts = {'metric': 0, 'goal': 0}
+    chunk = []
+
+    def flush():
+        for alert in scan_chunk(chunk, today):
+            counts['metric' if alert.alert_type == 'unusual_metric' else 'goal'] += 1
+        chunk.clear()
+
+    for user_id in user_ids:
+        chunk.append(user_id)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    logger.info(f"Health alert scan created {counts['metric']} metric and {counts['goal']} goal alerts")
+    return counts
@@ -0,0 +1,37 @@
+"""
+Management command to generate health reports for every active patient
+Usage: python manage.py generate_health_reports [--report-type weekly] [--chunk-size 500]
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserRole
+from health_tracking.services import REPORT_CHUNK_SIZE, HealthService
+
+
+class Command(BaseCommand):
+    help = 'Generate health reports for all active patients in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report-type',
+            choices=['weekly', 'monthly'],
+            default='weekly',
+            help='Report period (default: weekly)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=REPORT_CHUNK_SIZE,
+            help=f'Patients loaded and written per batch (default: {REPORT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        patients = User.objects.filter(profile__role=UserRole.PATIENT, is_active=True).order_by('pk')
+        created = HealthService.generate_health_reports(
+            patients.iterator(chunk_size=options['chunk_size']),
+            report_type=options['report_type'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Generated {created} {options['report_type']} health reports"))
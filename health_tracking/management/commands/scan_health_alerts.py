@@ -0,0 +1,31 @@
+"""
+Management command to scan every active patient for health alerts
+Usage: python manage.py scan_health_alerts [--chunk-size 500]
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserRole
+from health_tracking.alerts import SCAN_CHUNK_SIZE, scan_health_alerts
+
+
+class Command(BaseCommand):
+    help = 'Create alerts for threshold breaches and at-risk goals across all patients'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=SCAN_CHUNK_SIZE,
+            help=f'Patients scanned per transaction (default: {SCAN_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        patients = User.objects.filter(
+            profile__role=UserRole.PATIENT, is_active=True
+        ).order_by('pk').values_list('pk', flat=True)
+        counts = scan_health_alerts(patients.iterator(chunk_size=options['chunk_size']), chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['metric']} metric alerts and {counts['goal']} goal alerts"
+        ))
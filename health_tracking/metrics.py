@@ -0,0 +1,174 @@
+"""
+Health Metrics Engine
+Columnar, vectorized statistics over DailyHealthMetric readings.
+
+A MetricStore loads the readings of one patient or many (a ward, or every
+patient for batch reports) with a single query, sorted by user, metric type
+and date, into parallel NumPy arrays. Each (user, metric type) series is a
+contiguous slice, so count/avg/min/max for every series come from one
+``reduceat`` pass, and per-series rolling means, slopes and percentiles are
+array operations rather than further queries.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+from .models import DailyHealthMetric, HealthMetricType
+
+# Days averaged by rolling means in trend data
+ROLLING_WINDOW = 7
+
+
+def rolling_mean(values, window=ROLLING_WINDOW):
+    """Trailing mean over the last ``window`` readings (shorter at the start)"""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return values
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def slope_per_day(days, values):
+    """Least-squares change in value per day, or 0.0 with fewer than two distinct days"""
+    days = np.asarray(days, dtype=float)
+    if len(days) < 2 or np.ptp(days) == 0:
+        return 0.0
+    x = days - days.mean()
+    return float(np.dot(x, values - np.mean(values)) / np.dot(x, x))
+
+
+class MetricStore:
+    """Readings of one or more users as columns, grouped into (user, metric type) series"""
+
+    def __init__(self, rows, metric_types):
+        self.metric_types = metric_types
+        count = len(rows)
+        self.user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        self.type_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=count)
+        self.days = np.array([row[2] for row in rows], dtype='datetime64[D]').astype(np.int64)
+        self.values = np.fromiter((float(row[3]) for row in rows), dtype=float, count=count)
+
+        # Series boundaries: rows are sorted by (user, type, date)
+        if count:
+            changes = (np.diff(self.user_ids) != 0) | (np.diff(self.type_ids) != 0)
+            self.starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+        else:
+            self.starts = np.array([], dtype=np.int64)
+        self.ends = np.append(self.starts[1:], count).astype(np.int64)
+        self._series = {}
+        self._user_series = defaultdict(list)
+        for index, start in enumerate(self.starts.tolist()):
+            user_id, type_id = int(self.user_ids[start]), int(self.type_ids[start])
+            self._series[(user_id, type_id)] = index
+            self._user_series[user_id].append(index)
+
+        if count:
+            self.counts = self.ends - self.starts
+            self.sums = np.add.reduceat(self.values, self.starts)
+            self.mins = np.minimum.reduceat(self.values, self.starts)
+            self.maxs = np.maximum.reduceat(self.values, self.starts)
+        else:
+            self.counts = self.sums = self.mins = self.maxs = np.array([])
+
+    @classmethod
+    def load(cls, user_ids=None, start_date=None, end_date=None, type_ids=None, metric_types=None):
+        """
+        Load readings in one query.
+
+        ``user_ids`` / ``type_ids`` None load every user / metric type;
+        ``metric_types`` is an optional ``{id: HealthMetricType}`` map to avoid
+        reloading the types.
+        """
+        readings = DailyHealthMetric.objects.all()
+        if user_ids is not None:
+            readings = readings.filter(user_id__in=user_ids)
+        if type_ids is not None:
+            readings = readings.filter(metric_type_id__in=type_ids)
+        if start_date is not None:
+            readings = readings.filter(recorded_date__gte=start_date)
+        if end_date is not None:
+            readings = readings.filter(recorded_date__lte=end_date)
+        rows = list(
+            readings.order_by('user_id', 'metric_type_id', 'recorded_date')
+            .values_list('user_id', 'metric_type_id', 'recorded_date', 'value')
+        )
+        if metric_types is None:
+            metric_types = HealthMetricType.objects.in_bulk()
+        return cls(rows, metric_types)
+
+    def __len__(self):
+        return len(self.values)
+
+    def series_types(self, user_id):
+        """Metric type ids with readings for a user"""
+        return [int(self.type_ids[self.starts[index]]) for index in self._user_series.get(user_id, [])]
+
+    def reading_count(self, user_id):
+        """Readings of a user across all metric types"""
+        return int(sum(self.counts[index] for index in self._user_series.get(user_id, [])))
+
+    def series(self, user_id, type_id):
+        """``(days as datetime64[D], values)`` for one series, oldest first"""
+        index = self._series.get((user_id, type_id))
+        if index is None:
+            return np.array([], dtype='datetime64[D]'), np.array([])
+        window = slice(self.starts[index], self.ends[index])
+        return self.days[window].astype('datetime64[D]'), self.values[window]
+
+    def stats(self, user_id, type_id):
+        """count/avg/min/max for one series, or None without readings"""
+        index = self._series.get((user_id, type_id))
+        if index is None:
+            return None
+        count = int(self.counts[index])
+        return {
+            'count': count,
+            'avg': float(self.sums[index] / count),
+            'min': float(self.mins[index]),
+            'max': float(self.maxs[index]),
+        }
+
+    def summary(self, user_id):
+        """Per-metric stats for a user, keyed by metric name, as stored on HealthReport"""
+        summary = {}
+        for type_id in self.series_types(user_id):
+            metric_type = self.metric_types.get(type_id)
+            if metric_type is None:
+                continue
+            stats = self.stats(user_id, type_id)
+            days, values = self.series(user_id, type_id)
+            stats['median'] = float(np.median(values))
+            stats['slope_per_day'] = round(slope_per_day(days.astype(np.int64), values), 4)
+            stats['status'] = 'alert' if is_outside_thresholds(metric_type, stats['avg']) else 'normal'
+            summary[metric_type.metric_name] = stats
+        return dict(sorted(summary.items()))
+
+    def trend(self, user_id, metric_type):
+        """Dates, values, rolling mean, slope and percentiles for one metric"""
+        days, values = self.series(user_id, metric_type.id)
+        stats = self.stats(user_id, metric_type.id) or {'avg': 0.0, 'min': 0.0, 'max': 0.0}
+        percentiles = np.percentile(values, [25, 50, 75]).tolist() if len(values) else [0.0, 0.0, 0.0]
+        return {
+            'dates': [str(day) for day in days],
+            'values': values.tolist(),
+            'rolling_mean': np.round(rolling_mean(values), 2).tolist(),
+            'metric_name': metric_type.metric_name,
+            'unit': metric_type.unit,
+            'avg': stats['avg'],
+            'min': stats['min'],
+            'max': stats['max'],
+            'slope_per_day': round(slope_per_day(days.astype(np.int64), values), 4),
+            'percentiles': dict(zip(('p25', 'p50', 'p75'), percentiles)),
+        }
+
+
+def is_outside_thresholds(metric_type, value):
+    """Whether a value falls outside a metric type's alert thresholds"""
+    if metric_type.alert_threshold_max and value > float(metric_type.alert_threshold_max):
+        return True
+    if metric_type.alert_threshold_min and value < float(metric_type.alert_threshold_min):
+        return True
+    return False
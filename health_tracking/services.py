@@ -1,12 +1,18 @@
+from django.db import transaction
 from django.db.models import Avg, Q, Count, F
 from django.utils import timezone
 from decimal import Decimal
 from datetime import timedelta
+from .alerts import scan_chunk
+from .metrics import MetricStore
 from .models import (
     DailyHealthMetric, PatientHealthGoal, MealReview, HealthAlert,
     HealthReport, HealthMetricType, MealEffectivenessScore, GoalMilestone
 )
 
+# Users whose reports are built and inserted together
+REPORT_CHUNK_SIZE = 500
+
 
 class HealthService:
     """Business logic for health tracking system"""
@@ -21,51 +27,8 @@ class HealthService:
         - Meal effectiveness (20%)
         - Alert status (10%)
         """
-        score_components = {}
-        
-        # Goals progress (0-100)
-        goals = PatientHealthGoal.objects.filter(user=user, status='active')
-        if goals.exists():
-            avg_progress = sum([g.progress_percentage for g in goals]) / goals.count()
-            score_components['goals'] = min(100, avg_progress * 0.4)
-        else:
-            score_components['goals'] = 50  # Neutral if no active goals
-        
-        # Metrics consistency (past 7 days)
-        week_ago = timezone.now().date() - timedelta(days=7)
-        metrics = DailyHealthMetric.objects.filter(
-            user=user,
-            recorded_date__gte=week_ago
-        )
-        
-        in_range = metrics.filter(is_alert_generated=False).count()
-        if metrics.exists():
-            consistency = (in_range / metrics.count()) * 100
-            score_components['metrics'] = consistency * 0.3
-        else:
-            score_components['metrics'] = 50
-        
-        # Meal effectiveness
-        meal_reviews = MealReview.objects.filter(user=user)
-        if meal_reviews.exists():
-            avg_meal_score = meal_reviews.aggregate(
-                avg_score=Avg('overall_rating')
-            )['avg_score'] or 0
-            score_components['meals'] = (avg_meal_score / 5) * 100 * 0.2
-        else:
-            score_components['meals'] = 50
-        
-        # Alert status
-        unacknowledged_alerts = HealthAlert.objects.filter(
-            user=user,
-            is_acknowledged=False,
-            severity='critical'
-        ).count()
-        alert_deduction = min(10, unacknowledged_alerts * 3)
-        score_components['alerts'] = 10 - alert_deduction
-        
-        total_score = sum(score_components.values())
-        return min(100, max(0, total_score))
+        inputs = _health_score_inputs([user.id], timezone.now().date())
+        return _health_score(inputs[user.id])
     
     @staticmethod
     def update_goal_progress(goal):
@@ -115,77 +78,8 @@ class HealthService:
         Checks for:
         - Metrics outside alert thresholds
         - Goals at risk of not being met
-        - Unusual trends
         """
-        alerts_created = []
-        
-        # Check recent metrics for alert thresholds
-        recent_metrics = DailyHealthMetric.objects.filter(
-            user=user,
-            recorded_date__gte=timezone.now().date() - timedelta(days=1),
-            is_alert_generated=False
-        )
-        
-        for metric in recent_metrics:
-            if metric.is_in_alert_range:
-                alert = HealthAlert.objects.create(
-                    user=user,
-                    alert_type='unusual_metric',
-                    severity='warning',
-                    title=f'Alert: Unusual {metric.metric_type.metric_name}',
-                    message=f'{metric.metric_type.metric_name} reading of {metric.value} {metric.metric_type.unit} is outside normal range',
-                    metric=metric,
-                    notify_nutritionist=True,
-                    send_email=True
-                )
-                metric.is_alert_generated = True
-                metric.save()
-                alerts_created.append(alert)
-        
-        # Check goals at risk
-        today = timezone.now().date()
-        at_risk_goals = PatientHealthGoal.objects.filter(
-            user=user,
-            status='active',
-            target_date__lt=today + timedelta(days=14)  # Goals due in 2 weeks
-        )
-        
-        for goal in at_risk_goals:
-            # Calculate if on track
-            days_remaining = (goal.target_date - today).days
-            if days_remaining > 0 and goal.current_value:
-                progress_needed = abs(goal.target_value - goal.current_value)
-                daily_progress_needed = progress_needed / days_remaining
-                
-                # Check if past progress supports achieving goal
-                if goal.current_value and not HealthService._is_on_track(goal):
-                    alert = HealthAlert.objects.create(
-                        user=user,
-                        alert_type='goal_at_risk',
-                        severity='warning',
-                        title=f'Goal at Risk: {goal.goal_name}',
-                        message=f'Your goal "{goal.goal_name}" may not be achieved by {goal.target_date}. Consider adjusting your strategy.',
-                        goal=goal,
-                        notify_nutritionist=True
-                    )
-                    alerts_created.append(alert)
-        
-        return alerts_created
-    
-    @staticmethod
-    def _is_on_track(goal):
-        """Check if goal progress is on track for target date"""
-        today = timezone.now().date()
-        days_elapsed = (today - goal.start_date).days
-        days_total = (goal.target_date - goal.start_date).days
-        
-        if days_total <= 0 or days_elapsed <= 0:
-            return True
-        
-        progress_ratio = days_elapsed / days_total
-        expected_progress_ratio = (goal.current_value - goal.metric_type.normal_range_min) / (goal.target_value - goal.metric_type.normal_range_min) if goal.metric_type else 0
-        
-        return expected_progress_ratio >= progress_ratio * 0.8  # Allow 20% margin
+        return scan_chunk([user.id])
     
     @staticmethod
     def analyze_meal_effectiveness(meal):
@@ -237,107 +131,37 @@ class HealthService:
         Generate comprehensive health report for user
         Types: weekly, monthly, goal_progress, meal_analysis, custom
         """
-        if report_type == 'weekly':
-            start_date = timezone.now().date() - timedelta(days=7)
-        elif report_type == 'monthly':
-            start_date = timezone.now().date() - timedelta(days=30)
-        else:
-            start_date = custom_range[0] if custom_range else timezone.now().date() - timedelta(days=7)
-        
-        # Metrics summary
-        metrics = DailyHealthMetric.objects.filter(
-            user=user,
-            recorded_date__gte=start_date
-        )
-        
-        metrics_summary = {}
-        for metric_type in HealthMetricType.objects.all():
-            type_metrics = metrics.filter(metric_type=metric_type)
-            if type_metrics.exists():
-                metrics_summary[metric_type.metric_name] = {
-                    'count': type_metrics.count(),
-                    'avg': float(type_metrics.aggregate(Avg('value'))['value__avg'] or 0),
-                    'min': float(type_metrics.aggregate(models.Min('value'))['value__min'] or 0),
-                    'max': float(type_metrics.aggregate(models.Max('value'))['value__max'] or 0),
-                }
-        
-        # Goals progress
-        active_goals = PatientHealthGoal.objects.filter(user=user, status='active')
-        goal_progress = {}
-        for goal in active_goals:
-            goal_progress[goal.goal_name] = {
-                'progress': goal.progress_percentage,
-                'days_remaining': goal.days_remaining,
-                'target_date': goal.target_date.isoformat(),
-            }
-        
-        # Meal analysis
-        meal_reviews = MealReview.objects.filter(
-            user=user,
-            date_consumed__gte=start_date
-        )
-        
-        meal_analysis = {}
-        if meal_reviews.exists():
-            best_meals = meal_reviews.values('meal__name').annotate(
-                avg_rating=Avg('overall_rating')
-            ).order_by('-avg_rating')[:5]
-            
-            meal_analysis = {
-                'total_reviewed': meal_reviews.count(),
-                'best_meals': list(best_meals),
-                'avg_satisfaction': float(meal_reviews.aggregate(Avg('satisfaction'))['satisfaction__avg'] or 0),
-            }
-        
-        # Generate report
-        title = f"{report_type.title()} Health Report - {timezone.now().date()}"
-        
-        summary = f"""
-        Health Summary for {user.get_full_name() or user.username}
-        Period: {start_date} to {timezone.now().date()}
-        
-        Overall Health Score: {HealthService.calculate_health_score(user)}/100
-        
-        Metrics Tracked: {metrics.count()} readings
-        Active Goals: {active_goals.count()}
-        Meals Reviewed: {meal_reviews.count()}
+        return _create_reports([user], report_type, custom_range)[0]
+    
+    @staticmethod
+    def generate_health_reports(users, report_type='weekly', custom_range=None, chunk_size=REPORT_CHUNK_SIZE):
         """
-        
-        report = HealthReport.objects.create(
-            user=user,
-            report_type=report_type,
-            report_title=title,
-            metrics_summary=metrics_summary,
-            goal_progress=goal_progress,
-            meal_analysis=meal_analysis,
-            summary=summary.strip(),
-            generated_by=None  # Can be set to staff user if needed
-        )
-        
-        return report
+        Generate reports for many users in one pass per chunk
+        Metrics, goals, meal reviews and alerts are each loaded with one query per chunk.
+        Returns the number of reports created.
+        """
+        created = 0
+        chunk = []
+        for user in users:
+            chunk.append(user)
+            if len(chunk) >= chunk_size:
+                created += len(_create_reports(chunk, report_type, custom_range))
+                chunk = []
+        if chunk:
+            created += len(_create_reports(chunk, report_type, custom_range))
+        return created
     
     @staticmethod
     def get_metric_trends(user, metric_type, days=30):
         """Get trend data for a specific metric"""
         start_date = timezone.now().date() - timedelta(days=days)
-        
-        metrics = DailyHealthMetric.objects.filter(
-            user=user,
-            metric_type=metric_type,
-            recorded_date__gte=start_date
-        ).order_by('recorded_date')
-        
-        trend_data = {
-            'dates': [m.recorded_date.isoformat() for m in metrics],
-            'values': [float(m.value) for m in metrics],
-            'metric_name': metric_type.metric_name,
-            'unit': metric_type.unit,
-            'avg': float(metrics.aggregate(Avg('value'))['value__avg'] or 0),
-            'min': float(metrics.aggregate(models.Min('value'))['value__min'] or 0),
-            'max': float(metrics.aggregate(models.Max('value'))['value__max'] or 0),
-        }
-        
-        return trend_data
+        store = MetricStore.load(
+            user_ids=[user.id],
+            start_date=start_date,
+            type_ids=[metric_type.id],
+            metric_types={metric_type.id: metric_type}
+        )
+        return store.trend(user.id, metric_type)
     
     @staticmethod
     def get_goal_recommendations(user):
@@ -345,16 +169,21 @@ class HealthService:
         recommendations = []
         
         # Analyze recent metrics for potential areas
-        recent_metrics = DailyHealthMetric.objects.filter(
-            user=user,
-            recorded_date__gte=timezone.now().date() - timedelta(days=30)
+        active_types = HealthMetricType.objects.in_bulk(
+            HealthMetricType.objects.filter(active=True).values_list('id', flat=True)
+        )
+        store = MetricStore.load(
+            user_ids=[user.id],
+            start_date=timezone.now().date() - timedelta(days=30),
+            type_ids=list(active_types),
+            metric_types=active_types
         )
         
         # Check for consistent high/low values
-        for metric_type in HealthMetricType.objects.filter(active=True):
-            type_metrics = recent_metrics.filter(metric_type=metric_type)
-            if type_metrics.count() >= 5:
-                avg_value = float(type_metrics.aggregate(Avg('value'))['value__avg'] or 0)
+        for metric_type in sorted(active_types.values(), key=lambda t: (t.category, t.metric_name)):
+            stats = store.stats(user.id, metric_type.id)
+            if stats and stats['count'] >= 5:
+                avg_value = stats['avg']
                 
                 # Generate recommendations based on anomalies
                 if metric_type.alert_threshold_max and avg_value > metric_type.alert_threshold_max:
@@ -421,3 +250,158 @@ class HealthService:
         }
         
         return improvement_score
+
+
+# ==================== BATCH REPORTS ====================
+
+def _active_goals(user_ids):
+    return list(PatientHealthGoal.objects.filter(user_id__in=user_ids, status='active').select_related('metric_type'))
+
+
+def _health_score_inputs(user_ids, today, goals=None):
+    """Per-user health score inputs, with one grouped query per source"""
+    inputs = {
+        user_id: {'goal_progress': [], 'readings': 0, 'in_range': 0, 'avg_meal_rating': None, 'critical_alerts': 0}
+        for user_id in user_ids
+    }
+    
+    for goal in _active_goals(user_ids) if goals is None else goals:
+        inputs[goal.user_id]['goal_progress'].append(goal.progress_percentage)
+    
+    readings = DailyHealthMetric.objects.filter(
+        user_id__in=user_ids,
+        recorded_date__gte=today - timedelta(days=7)
+    ).values('user_id').annotate(
+        total=Count('id'),
+        in_range=Count('id', filter=Q(is_alert_generated=False))
+    ).order_by()
+    for row in readings:
+        inputs[row['user_id']].update(readings=row['total'], in_range=row['in_range'])
+    
+    meals = MealReview.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+        avg_rating=Avg('overall_rating')
+    ).order_by()
+    for row in meals:
+        inputs[row['user_id']]['avg_meal_rating'] = row['avg_rating']
+    
+    alerts = HealthAlert.objects.filter(
+        user_id__in=user_ids,
+        is_acknowledged=False,
+        severity='critical'
+    ).values('user_id').annotate(count=Count('id')).order_by()
+    for row in alerts:
+        inputs[row['user_id']]['critical_alerts'] = row['count']
+    
+    return inputs
+
+
+def _health_score(inputs):
+    """Weighted 0-100 score from the inputs gathered by _health_score_inputs"""
+    score_components = {}
+    
+    # Goals progress (0-100)
+    progress = inputs['goal_progress']
+    if progress:
+        score_components['goals'] = min(100, sum(progress) / len(progress) * Decimal('0.4'))
+    else:
+        score_components['goals'] = 50  # Neutral if no active goals
+    
+    # Metrics consistency (past 7 days)
+    if inputs['readings']:
+        consistency = (inputs['in_range'] / inputs['readings']) * 100
+        score_components['metrics'] = consistency * 0.3
+    else:
+        score_components['metrics'] = 50
+    
+    # Meal effectiveness
+    if inputs['avg_meal_rating'] is not None:
+        score_components['meals'] = (inputs['avg_meal_rating'] / 5) * 100 * 0.2
+    else:
+        score_components['meals'] = 50
+    
+    # Alert status
+    alert_deduction = min(10, inputs['critical_alerts'] * 3)
+    score_components['alerts'] = 10 - alert_deduction
+    
+    total_score = sum(float(value) for value in score_components.values())
+    return min(100, max(0, total_score))
+
+
+def _meal_analysis(user_ids, start_date):
+    """Per-user meal review summary for a report period"""
+    analysis = {}
+    totals = MealReview.objects.filter(user_id__in=user_ids, date_consumed__gte=start_date).values('user_id').annotate(
+        total=Count('id'),
+        avg_satisfaction=Avg('satisfaction')
+    ).order_by()
+    for row in totals:
+        analysis[row['user_id']] = {
+            'total_reviewed': row['total'],
+            'best_meals': [],
+            'avg_satisfaction': float(row['avg_satisfaction'] or 0),
+        }
+    
+    best_meals = MealReview.objects.filter(user_id__in=user_ids, date_consumed__gte=start_date).values(
+        'user_id', 'meal__name'
+    ).annotate(avg_rating=Avg('overall_rating')).order_by('user_id', '-avg_rating')
+    for row in best_meals:
+        meals = analysis[row['user_id']]['best_meals']
+        if len(meals) < 5:
+            meals.append({'meal__name': row['meal__name'], 'avg_rating': row['avg_rating']})
+    return analysis
+
+
+def _report_start(report_type, today, custom_range=None):
+    if report_type == 'weekly':
+        return today - timedelta(days=7)
+    if report_type == 'monthly':
+        return today - timedelta(days=30)
+    return custom_range[0] if custom_range else today - timedelta(days=7)
+
+
+def _create_reports(users, report_type='weekly', custom_range=None):
+    """Build and bulk insert one HealthReport per user"""
+    today = timezone.now().date()
+    start_date = _report_start(report_type, today, custom_range)
+    user_ids = [user.id for user in users]
+    
+    active_goals = _active_goals(user_ids)
+    store = MetricStore.load(user_ids=user_ids, start_date=start_date)
+    score_inputs = _health_score_inputs(user_ids, today, goals=active_goals)
+    meal_analysis = _meal_analysis(user_ids, start_date)
+    
+    goals = {}
+    for goal in active_goals:
+        goals.setdefault(goal.user_id, {})[goal.goal_name] = {
+            'progress': float(goal.progress_percentage),
+            'days_remaining': goal.days_remaining,
+            'target_date': goal.target_date.isoformat(),
+        }
+    
+    reports = []
+    for user in users:
+        meals = meal_analysis.get(user.id, {})
+        goal_progress = goals.get(user.id, {})
+        summary = f"""
+        Health Summary for {user.get_full_name() or user.username}
+        Period: {start_date} to {today}
+        
+        Overall Health Score: {_health_score(score_inputs[user.id])}/100
+        
+        Metrics Tracked: {store.reading_count(user.id)} readings
+        Active Goals: {len(goal_progress)}
+        Meals Reviewed: {meals.get('total_reviewed', 0)}
+        """
+        reports.append(HealthReport(
+            user=user,
+            report_type=report_type,
+            report_title=f"{report_type.title()} Health Report - {today}",
+            metrics_summary=store.summary(user.id),
+            goal_progress=goal_progress,
+            meal_analysis=meals,
+            summary=summary.strip(),
+            generated_by=None  # Can be set to staff user if needed
+        ))
+    
+    with transaction.atomic():
+        return HealthReport.objects.bulk_create(reports)
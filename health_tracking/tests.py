@@ -1,3 +1,161 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import UserRole
+
+from .alerts import goal_off_track
+from .metrics import MetricStore, rolling_mean, slope_per_day
+from .models import DailyHealthMetric, HealthAlert, HealthMetricType, HealthReport, PatientHealthGoal
+from .services import HealthService
+
+
+class MetricStoreTests(TestCase):
+    """Columnar metric loading and vectorized statistics"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.glucose = HealthMetricType.objects.create(
+            metric_name='Blood Glucose', unit='mg/dL', category='vital', alert_threshold_max=Decimal('180')
+        )
+        self.weight = HealthMetricType.objects.create(metric_name='Weight', unit='kg', category='body')
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        for offset, value in enumerate([100, 120, 140, 160, 200]):
+            DailyHealthMetric.objects.create(
+                user=self.alice, metric_type=self.glucose, value=Decimal(value),
+                recorded_date=self.today - timedelta(days=4 - offset)
+            )
+        DailyHealthMetric.objects.create(user=self.alice, metric_type=self.weight, value=Decimal('70.5'))
+        DailyHealthMetric.objects.create(user=self.bob, metric_type=self.weight, value=Decimal('82'))
+
+    def test_rolling_mean_and_slope(self):
+        self.assertEqual(rolling_mean([1, 2, 3, 4], window=2).tolist(), [1.0, 1.5, 2.5, 3.5])
+        self.assertAlmostEqual(slope_per_day([0, 1, 2], [1.0, 3.0, 5.0]), 2.0)
+        self.assertEqual(slope_per_day([3], [1.0]), 0.0)
+
+    def test_series_stats_from_one_query(self):
+        with self.assertNumQueries(2):
+            store = MetricStore.load(start_date=self.today - timedelta(days=30))
+
+        self.assertEqual(len(store), 7)
+        self.assertEqual(store.stats(self.alice.id, self.glucose.id), {'count': 5, 'avg': 144.0, 'min': 100.0, 'max': 200.0})
+        self.assertEqual(store.stats(self.bob.id, self.weight.id)['avg'], 82.0)
+        self.assertIsNone(store.stats(self.bob.id, self.glucose.id))
+        self.assertEqual(store.reading_count(self.alice.id), 6)
+
+        summary = store.summary(self.alice.id)
+        self.assertEqual(list(summary), ['Blood Glucose', 'Weight'])
+        self.assertEqual(summary['Blood Glucose']['median'], 140.0)
+        self.assertEqual(summary['Blood Glucose']['status'], 'normal')
+
+    def test_metric_trends(self):
+        trend = HealthService.get_metric_trends(self.alice, self.glucose, days=30)
+        self.assertEqual(trend['values'], [100.0, 120.0, 140.0, 160.0, 200.0])
+        self.assertEqual(trend['dates'][-1], str(self.today))
+        self.assertEqual(trend['avg'], 144.0)
+        self.assertEqual(trend['slope_per_day'], 24.0)
+        self.assertEqual(trend['percentiles']['p50'], 140.0)
+
+
+class HealthReportBatchTests(TestCase):
+    """Batch report generation for many patients"""
+
+    def setUp(self):
+        self.weight = HealthMetricType.objects.create(metric_name='Weight', unit='kg', category='body')
+        self.patients = []
+        for index in range(4):
+            user = User.objects.create_user(username=f'patient{index}', password='pass12345')
+            user.profile.role = UserRole.PATIENT
+            user.profile.save()
+            DailyHealthMetric.objects.create(user=user, metric_type=self.weight, value=Decimal(60 + index))
+            self.patients.append(user)
+
+    def test_single_report(self):
+        report = HealthService.generate_health_report(self.patients[1])
+        self.assertEqual(report.report_type, 'weekly')
+        self.assertEqual(report.metrics_summary['Weight']['avg'], 61.0)
+        self.assertIn('Metrics Tracked: 1 readings', report.summary)
+
+    def test_batch_query_count_is_independent_of_patients(self):
+        with self.assertNumQueries(11):
+            created = HealthService.generate_health_reports(self.patients, chunk_size=10)
+        self.assertEqual(created, 4)
+        self.assertEqual(HealthReport.objects.count(), 4)
+
+    def test_command_reports_every_patient(self):
+        out = StringIO()
+        call_command('generate_health_reports', '--chunk-size', '3', stdout=out)
+        self.assertIn('Generated 4 weekly health reports', out.getvalue())
+        self.assertEqual(HealthReport.objects.filter(user=self.patients[3]).count(), 1)
+
+
+class HealthAlertScanTests(TestCase):
+    """Set-based threshold and goal risk alert scanning"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.glucose = HealthMetricType.objects.create(
+            metric_name='Blood Glucose', unit='mg/dL', category='vital',
+            normal_range_min=Decimal('70'), alert_threshold_min=Decimal('60'), alert_threshold_max=Decimal('180')
+        )
+        self.patients = []
+        for index in range(3):
+            user = User.objects.create_user(username=f'patient{index}', password='pass12345')
+            user.profile.role = UserRole.PATIENT
+            user.profile.save()
+            self.patients.append(user)
+        alice, bob, carol = self.patients
+        DailyHealthMetric.objects.bulk_create([
+            DailyHealthMetric(user=alice, metric_type=self.glucose, value=Decimal('220')),
+            DailyHealthMetric(user=bob, metric_type=self.glucose, value=Decimal('50')),
+            DailyHealthMetric(user=carol, metric_type=self.glucose, value=Decimal('100')),
+        ])
+        goal = {
+            'metric_type': self.glucose, 'description': 'Lower glucose', 'goal_type': 'custom',
+            'start_date': self.today - timedelta(days=20), 'target_date': self.today + timedelta(days=5),
+        }
+        self.behind = PatientHealthGoal.objects.create(
+            user=alice, goal_name='Reach 170', target_value=Decimal('170'), current_value=Decimal('75'), **goal
+        )
+        PatientHealthGoal.objects.create(
+            user=bob, goal_name='Reach 120', target_value=Decimal('120'), current_value=Decimal('115'), **goal
+        )
+
+    def test_command_creates_alerts_once(self):
+        out = StringIO()
+        call_command('scan_health_alerts', '--chunk-size', '2', stdout=out)
+        self.assertIn('Created 2 metric alerts and 1 goal alerts', out.getvalue())
+        self.assertEqual(DailyHealthMetric.objects.filter(is_alert_generated=True).count(), 2)
+        self.assertEqual(HealthAlert.objects.get(alert_type='goal_at_risk').goal, self.behind)
+        self.assertEqual(
+            HealthAlert.objects.get(user=self.patients[0], alert_type='unusual_metric').title,
+            'Alert: Unusual Blood Glucose'
+        )
+
+        out = StringIO()
+        call_command('scan_health_alerts', stdout=out)
+        self.assertIn('Created 0 metric alerts and 0 goal alerts', out.getvalue())
+
+    def test_new_breaching_reading_alerts_its_user(self):
+        user = self.patients[2]
+        DailyHealthMetric.objects.filter(user=user).delete()
+        DailyHealthMetric.objects.create(user=user, metric_type=self.glucose, value=Decimal('190'))
+        self.assertEqual(HealthAlert.objects.filter(user=user, alert_type='unusual_metric').count(), 1)
+        self.assertFalse(HealthAlert.objects.exclude(user=user).exists())
 
-# Create your tests here.
+    def test_goal_risk_edge_cases(self):
+        start, target = self.today - timedelta(days=10), self.today + timedelta(days=10)
+        # Half the period elapsed: 40% of the way from the baseline is on track, 30% is not
+        self.assertFalse(goal_off_track(self.today, start, target, 110.0, 170.0, 70.0))
+        self.assertTrue(goal_off_track(self.today, start, target, 100.0, 170.0, 70.0))
+        # Without a metric type there is no baseline, so no progress is counted
+        self.assertTrue(goal_off_track(self.today, start, target, 160.0, 170.0, None))
+        # Goals that have not started, or have no period, are never behind
+        self.assertFalse(goal_off_track(self.today, self.today, target, 0.0, 170.0, 70.0))
+        self.assertFalse(goal_off_track(self.today, start, start, 0.0, 170.0, 70.0))
@@ -5,7 +5,8 @@ from .models import (
     MealNutritionInfo, DeliveryScheduleSlot,
     PatientEducationCategory, PatientEducationContent, PatientEducationProgress,
     CaregiverNotification, PatientAdmission, PatientDischarge, PatientTransfer,
-    BedMaintenanceSchedule, BulkOperation, PatientNotification, NotificationTemplate
+    BedMaintenanceSchedule, BulkOperation, PatientNotification, NotificationTemplate,
+    NotificationOutbox
 )
 
 
@@ -57,6 +58,7 @@ class WardAdmin(admin.ModelAdmin):
     )
     
     inlines = [WardBedInline, WardDeliveryRouteInline, WardAvailabilityInline]
+    list_select_related = ['availability']
     
     def available_beds(self, obj):
         """Display available beds count"""
@@ -561,3 +563,18 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
         }),
     )
 
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """Admin for queued notifications"""
+    list_display = ['template_name', 'channel', 'recipient_email', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'channel', 'template_name']
+    search_fields = ['recipient_email', 'recipient__username', 'last_error']
+    readonly_fields = ['created_at', 'sent_at', 'attempts', 'last_error']
+    actions = ['requeue']
+    
+    def requeue(self, request, queryset):
+        from .notification_outbox import requeue_dead_letters
+        count = requeue_dead_letters(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'{count} dead-lettered notification(s) requeued.')
+    requeue.short_description = 'Requeue dead-lettered notifications'
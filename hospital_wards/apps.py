@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class HospitalWardsConfig(AppConfig):
     name = 'hospital_wards'
+
+    def ready(self):
+        import hospital_wards.signals  # noqa
@@ -8,12 +8,18 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
 from hospital_wards.models import Ward, WardBed, PatientAdmission
+from hospital_wards import ward_feed
 from delivery.models import DeliveryAddress
 
 
 class WardConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer for real-time ward and bed status updates
+    
+    Bed changes arrive as versioned deltas computed once by the producer
+    (see hospital_wards.ward_feed) and are forwarded as-is. Clients that see a
+    gap in ``seq`` send ``{"action": "resync", "since": <last seq>}`` and get
+    the missed deltas replayed, or a full snapshot if they are too far behind.
     """
     
     async def connect(self):
@@ -21,7 +27,7 @@ class WardConsumer(AsyncWebsocketConsumer):
         Handle WebSocket connection
         """
         self.ward_id = self.scope['url_route']['kwargs'].get('ward_id')
-        self.room_group_name = f'ward_{self.ward_id}'
+        self.room_group_name = ward_feed.group_name(self.ward_id)
         
         # Verify user has permission to access this ward
         user = self.scope['user']
@@ -38,11 +44,7 @@ class WardConsumer(AsyncWebsocketConsumer):
         await self.accept()
         
         # Send current ward status
-        ward_data = await self.get_ward_status()
-        await self.send(text_data=json.dumps({
-            'type': 'ward_status',
-            'data': ward_data
-        }))
+        await self.send_snapshot()
     
     async def disconnect(self, close_code):
         """
@@ -64,11 +66,16 @@ class WardConsumer(AsyncWebsocketConsumer):
             
             if action == 'get_status':
                 # Send current ward status
-                ward_data = await self.get_ward_status()
-                await self.send(text_data=json.dumps({
-                    'type': 'ward_status',
-                    'data': ward_data
-                }))
+                await self.send_snapshot()
+            
+            elif action == 'resync':
+                # Replay missed deltas, falling back to a full snapshot
+                deltas = await self.get_deltas_since(int(data.get('since', 0)))
+                if deltas is None:
+                    await self.send_snapshot()
+                else:
+                    for delta in deltas:
+                        await self.send_delta(delta)
             
             elif action == 'get_bed_status':
                 # Send specific bed status
@@ -82,17 +89,17 @@ class WardConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             print(f"Error in WardConsumer.receive: {e}")
     
+    async def ward_delta(self, event):
+        """
+        Forward a producer-computed bed delta without touching the database
+        """
+        await self.send_delta(event['delta'])
+    
     async def ward_update(self, event):
         """
         Handle ward update messages from the group
         """
-        ward_data = await self.get_ward_status()
-        
-        await self.send(text_data=json.dumps({
-            'type': 'ward_status',
-            'data': ward_data,
-            'timestamp': timezone.now().isoformat()
-        }))
+        await self.send_snapshot()
     
     async def bed_status_change(self, event):
         """
@@ -110,39 +117,38 @@ class WardConsumer(AsyncWebsocketConsumer):
             'timestamp': timezone.now().isoformat()
         }))
     
+    async def send_snapshot(self):
+        """
+        Send the latest (cached) ward snapshot
+        """
+        ward_data = await self.get_ward_status()
+        await self.send(text_data=json.dumps({
+            'type': 'ward_status',
+            'data': ward_data
+        }))
+    
+    async def send_delta(self, delta):
+        """
+        Send one versioned bed delta
+        """
+        await self.send(text_data=json.dumps({
+            'type': 'ward_delta',
+            'data': delta
+        }))
+    
     @database_sync_to_async
     def get_ward_status(self):
         """
         Get current ward status including all beds
         """
-        try:
-            ward = Ward.objects.get(id=self.ward_id, is_active=True)
-            beds = WardBed.objects.filter(ward=ward, is_active=True)
-            
-            bed_data = []
-            for bed in beds:
-                bed_data.append({
-                    'id': bed.id,
-                    'bed_number': bed.bed_number,
-                    'status': bed.status,
-                    'patient': {
-                        'id': bed.patient.id,
-                        'name': bed.patient.get_full_name() if bed.patient else None
-                    } if bed.patient else None,
-                    'assigned_date': bed.patient_assigned_date.isoformat() if bed.patient_assigned_date else None,
-                })
-            
-            return {
-                'ward_id': ward.id,
-                'ward_name': ward.name,
-                'total_beds': beds.count(),
-                'occupied_beds': beds.filter(status='occupied').count(),
-                'available_beds': beds.filter(status='available').count(),
-                'beds': bed_data,
-                'timestamp': timezone.now().isoformat()
-            }
-        except Ward.DoesNotExist:
-            return None
+        return ward_feed.get_snapshot(self.ward_id)
+    
+    @database_sync_to_async
+    def get_deltas_since(self, since):
+        """
+        Get cached deltas after sequence number ``since``
+        """
+        return ward_feed.get_deltas_since(self.ward_id, since)
     
     @database_sync_to_async
     def get_bed_status(self, bed_id):
@@ -150,19 +156,13 @@ class WardConsumer(AsyncWebsocketConsumer):
         Get status of a specific bed
         """
         try:
-            bed = WardBed.objects.get(id=bed_id, ward_id=self.ward_id, is_active=True)
+            bed = WardBed.objects.select_related('ward', 'patient').get(
+                id=bed_id, ward_id=self.ward_id, is_active=True
+            )
             
-            return {
-                'id': bed.id,
-                'bed_number': bed.bed_number,
-                'status': bed.status,
-                'ward': bed.ward.name,
-                'patient': {
-                    'id': bed.patient.id,
-                    'name': bed.patient.get_full_name()
-                } if bed.patient else None,
-                'assigned_date': bed.patient_assigned_date.isoformat() if bed.patient_assigned_date else None,
-            }
+            data = ward_feed.serialize_bed(bed)
+            data['ward'] = bed.ward.name
+            return data
         except WardBed.DoesNotExist:
             return None
 
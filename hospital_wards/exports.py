@@ -0,0 +1,142 @@
+"""
+Streaming CSV Exports
+Constant-memory CSV downloads shared by the hospital ward reports and the
+admin log export.
+
+Rows are read with keyset pagination (``pk > last``) as ``values_list``
+tuples through ``.iterator(chunk_size=...)``, encoded into small CSV blocks and
+streamed with StreamingHttpResponse, optionally gzip-compressed on the fly.
+When a BulkOperation is given, its counters are updated as blocks are sent,
+and it ends completed, failed, or failed as cancelled when the client
+disconnects mid-download.
+"""
+
+import csv
+import io
+import zlib
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import BulkOperation
+
+# Rows fetched per keyset page / database round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# Flush the CSV buffer to the client once it grows past this many characters
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# Recorded on the BulkOperation of a download the client abandoned
+CANCELLED_MESSAGE = 'Cancelled: the client disconnected before the export finished'
+
+
+def iter_keyset(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE, descending=False):
+    """
+    Yield ``values_list(*fields)`` tuples for a queryset, one keyset page at a time.
+
+    Each page is ``WHERE pk > last_pk ORDER BY pk LIMIT chunk_size``, so deep
+    pages cost the same as the first and only one page is held in memory.
+    """
+    order = '-pk' if descending else 'pk'
+    last_pk = None
+    while True:
+        page = queryset.order_by(order)
+        if last_pk is not None:
+            page = page.filter(pk__lt=last_pk) if descending else page.filter(pk__gt=last_pk)
+        fetched = 0
+        for row in page.values_list('pk', *fields)[:chunk_size].iterator(chunk_size=chunk_size):
+            fetched += 1
+            last_pk = row[0]
+            yield row[1:]
+        if fetched < chunk_size:
+            return
+
+
+def _record_progress(bulk_op, rows, **extra):
+    BulkOperation.objects.filter(pk=bulk_op.pk).update(
+        total_records=rows,
+        successful_records=rows,
+        **extra
+    )
+
+
+def _csv_blocks(header, rows, bulk_op=None):
+    """Encode rows into CSV text blocks, updating ``bulk_op`` as blocks are produced"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+
+    if bulk_op is not None:
+        BulkOperation.objects.filter(pk=bulk_op.pk).update(status='processing', started_at=timezone.now())
+
+    try:
+        if header:
+            writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if buffer.tell() >= EXPORT_BUFFER_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                if bulk_op is not None:
+                    _record_progress(bulk_op, count)
+        yield buffer.getvalue()
+    except GeneratorExit:
+        # The response was closed before the last block was sent
+        if bulk_op is not None:
+            _record_progress(bulk_op, count, status='failed', error_message=CANCELLED_MESSAGE, completed_at=timezone.now())
+        raise
+    except Exception as e:
+        if bulk_op is not None:
+            _record_progress(bulk_op, count, status='failed', error_message=str(e), completed_at=timezone.now())
+        raise
+
+    if bulk_op is not None:
+        _record_progress(bulk_op, count, status='completed', completed_at=timezone.now())
+
+
+def _encoded_blocks(blocks):
+    """UTF-8 encode text blocks; closing this closes ``blocks`` too"""
+    try:
+        for block in blocks:
+            yield block.encode('utf-8')
+    finally:
+        blocks.close()
+
+
+def _gzip_blocks(blocks):
+    """Compress text blocks into a gzip stream as they are produced; closing this closes ``blocks`` too"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    try:
+        for block in blocks:
+            data = compressor.compress(block.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        blocks.close()
+
+
+def stream_csv(filename, header, rows, bulk_op=None, compress=False):
+    """
+    Build a StreamingHttpResponse that writes ``rows`` as CSV.
+
+    ``rows`` can be any iterable of sequences (typically from iter_keyset);
+    with ``compress`` the download is a ``.csv.gz`` file encoded on the fly.
+    """
+    blocks = _csv_blocks(header, rows, bulk_op)
+
+    if compress:
+        response = StreamingHttpResponse(_gzip_blocks(blocks), content_type='application/gzip')
+        filename = f'{filename}.gz'
+    else:
+        response = StreamingHttpResponse(_encoded_blocks(blocks), content_type='text/csv')
+
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def wants_gzip(request):
+    """Whether a GET export asked for a compressed download (``?gzip=1``)"""
+    return request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
@@ -10,6 +10,7 @@ from .models import (
     PatientAdmission, PatientDischarge, PatientTransfer,
     WardBed, Ward, BulkOperation
 )
+from .imports import PATIENT_IMPORT_FIELDS, read_csv_header
 import csv
 from io import StringIO
 
@@ -83,16 +84,14 @@ class BulkPatientImportForm(forms.Form):
             if not file.name.endswith('.csv'):
                 raise ValidationError('File must be a CSV file.')
             
-            # Read and validate
+            # Only the header is read here; rows are streamed by the importer
             try:
-                decoded = file.read().decode('utf-8')
-                reader = csv.DictReader(StringIO(decoded))
-                
-                expected_fields = ['patient_id', 'first_name', 'last_name', 'email', 'phone', 'date_of_birth', 'gender']
-                if reader.fieldnames and not all(field in reader.fieldnames for field in expected_fields):
-                    raise ValidationError(f'CSV must have columns: {", ".join(expected_fields)}')
+                fieldnames = read_csv_header(file)
             except Exception as e:
                 raise ValidationError(f'Error reading CSV: {str(e)}')
+            
+            if fieldnames and not all(field in fieldnames for field in PATIENT_IMPORT_FIELDS):
+                raise ValidationError(f'CSV must have columns: {", ".join(PATIENT_IMPORT_FIELDS)}')
         
         return file
 
@@ -187,6 +186,13 @@ class ExportReportForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-control'}),
         label='Filter by Ward (optional)'
     )
+    
+    compress = forms.BooleanField(
+        required=False,
+        initial=False,
+        label='Compress download (gzip)',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
 
 
 class FilterBulkOperationForm(forms.Form):
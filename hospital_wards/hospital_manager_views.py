@@ -7,12 +7,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Count, Sum, Q, Avg, F
+from django.db.models.functions import NullIf
 from django.utils import timezone
 from datetime import timedelta
 
 from accounts.models import UserRole, Profile
 from hospital_wards.models import (
-    Ward, WardBed, PatientAdmission, PatientDischarge,
+    Ward, WardBed, WardAvailability, PatientAdmission, PatientDischarge,
     MealNutritionInfo, PatientEducationContent
 )
 from nutritionist_dashboard.models import MealPlan
@@ -49,11 +50,9 @@ def hospital_manager_dashboard(request):
     
     # Hospital Bed Statistics
     total_wards = Ward.objects.filter(is_active=True).count()
-    total_beds = WardBed.objects.filter(ward__is_active=True).count()
-    occupied_beds = WardBed.objects.filter(
-        ward__is_active=True,
-        status='occupied'
-    ).count()
+    bed_totals = WardAvailability.totals(is_active=True)
+    total_beds = bed_totals['total_beds']
+    occupied_beds = bed_totals['occupied_beds']
     available_beds = total_beds - occupied_beds
     occupancy_rate = (occupied_beds / total_beds * 100) if total_beds > 0 else 0
     
@@ -113,8 +112,8 @@ def hospital_manager_dashboard(request):
     
     # Ward Performance
     wards = Ward.objects.filter(is_active=True).annotate(
-        available_beds=Count('beds', filter=Q(beds__status='available')),
-        occupied_beds=Count('beds', filter=Q(beds__status='occupied')),
+        available_beds=F('availability__available_beds'),
+        occupied_beds=F('availability__occupied_beds'),
     )
     
     # Recent Activity
@@ -266,17 +265,20 @@ def hospital_analytics(request):
     ).values('paid_at__date').annotate(total=Sum('amount')).order_by('paid_at__date')
     
     # Performance metrics
-    avg_occupancy = WardBed.objects.filter(
-        ward__is_active=True
-    ).aggregate(
-        occupancy=Count('id', filter=Q(status='occupied')) * 100.0 / Count('id')
-    )['occupancy'] or 0
+    bed_totals = WardAvailability.totals(is_active=True)
+    avg_occupancy = (
+        bed_totals['occupied_beds'] * 100.0 / bed_totals['total_beds']
+        if bed_totals['total_beds'] else 0
+    )
     
     # Ward-wise statistics
     ward_performance = Ward.objects.filter(is_active=True).annotate(
         occupancy_rate=(
-            Count('beds', filter=Q(beds__status='occupied')) * 100.0 /
-            Count('beds')
+            F('availability__occupied_beds') * 100.0 / NullIf(
+                F('availability__available_beds') + F('availability__occupied_beds') +
+                F('availability__maintenance_beds') + F('availability__reserved_beds'),
+                0
+            )
         ),
         total_patients=Count('beds', filter=Q(beds__patient__isnull=False))
     )
@@ -0,0 +1,57 @@
+"""
+Django management command to deliver queued ward notifications from the outbox
+Usage: python manage.py deliver_notifications [--batch-size 100] [--requeue-dead] [--loop --interval 10]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from hospital_wards.notification_outbox import OUTBOX_BATCH_SIZE, deliver_outbox, requeue_dead_letters
+
+
+class Command(BaseCommand):
+    help = 'Send queued admission, discharge and transfer notifications in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help=f'Outbox rows delivered per batch (default: {OUTBOX_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--requeue-dead',
+            action='store_true',
+            help='Queue dead-lettered notifications again before delivering'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep delivering every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=10,
+            help='Seconds between deliveries with --loop (default: 10)'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f'Requeued {requeue_dead_letters()} dead-lettered notifications')
+
+        if options['loop']:
+            self.stdout.write(f"Delivering queued notifications every {options['interval']}s (Ctrl+C to stop)")
+            try:
+                while True:
+                    deliver_outbox(options['batch_size'])
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Notification worker stopped'))
+            return
+
+        totals = deliver_outbox(options['batch_size'])
+        style = self.style.WARNING if totals['dead'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Sent {totals['sent']} notifications, {totals['retry']} to retry, {totals['dead']} dead-lettered"
+        ))
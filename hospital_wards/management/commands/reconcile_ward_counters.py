@@ -0,0 +1,52 @@
+"""
+Django management command to check the incrementally maintained bed counters
+Usage: python manage.py reconcile_ward_counters [--fix]
+"""
+
+from django.core.management.base import BaseCommand
+from hospital_wards.models import Ward, WardAvailability
+
+
+class Command(BaseCommand):
+    help = 'Detect (and optionally repair) drift between WardAvailability counters and bed statuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rewrite drifted or missing counters from the beds table'
+        )
+
+    def handle(self, *args, **options):
+        fix = options['fix']
+        drifted = 0
+
+        for ward in Ward.objects.select_related('availability'):
+            actual = WardAvailability.count_beds(ward)
+            try:
+                stored = {field: getattr(ward.availability, field) for field in actual}
+            except WardAvailability.DoesNotExist:
+                stored = None
+
+            if stored == actual:
+                continue
+
+            drifted += 1
+            if stored is None:
+                self.stdout.write(self.style.WARNING(f'{ward.name}: counters missing'))
+            else:
+                changes = ', '.join(
+                    f'{field} {stored[field]} -> {actual[field]}'
+                    for field in actual if stored[field] != actual[field]
+                )
+                self.stdout.write(self.style.WARNING(f'{ward.name}: {changes}'))
+
+            if fix:
+                WardAvailability.rebuild(ward)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All ward counters are in sync'))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f'Repaired counters for {drifted} ward(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{drifted} ward(s) drifted; rerun with --fix to repair'))
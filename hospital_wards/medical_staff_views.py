@@ -11,8 +11,9 @@ from django.utils import timezone
 from datetime import timedelta
 
 from accounts.models import UserRole
+from dusangire.dates import since_day
 from hospital_wards.models import (
-    Ward, WardBed, PatientAdmission, PatientDischarge,
+    Ward, WardBed, WardAvailability, PatientAdmission, PatientDischarge,
     MealNutritionInfo, PatientEducationProgress
 )
 from orders.models import Order
@@ -48,18 +49,16 @@ def medical_staff_dashboard(request):
     wards = Ward.objects.filter(is_active=True)
     
     # Get bed statistics
-    total_beds = WardBed.objects.filter(ward__is_active=True).count()
-    occupied_beds = WardBed.objects.filter(
-        ward__is_active=True,
-        status='occupied'
-    ).count()
+    bed_totals = WardAvailability.totals(is_active=True)
+    total_beds = bed_totals['total_beds']
+    occupied_beds = bed_totals['occupied_beds']
     available_beds = total_beds - occupied_beds
     
     # Get recent admissions
     recent_admissions = PatientAdmission.objects.select_related(
         'patient', 'ward'
     ).filter(
-        admission_date__date__gte=week_ago.date()
+        **since_day('admission_date', week_ago.date())
     ).order_by('-admission_date')[:10]
     
     # Get pending discharges (patients due to be discharged)
@@ -108,8 +107,8 @@ def ward_management_dashboard(request):
     wards = Ward.objects.filter(is_active=True).prefetch_related(
         'beds__patient'
     ).annotate(
-        available_beds=Count('beds', filter=Q(beds__status='available')),
-        occupied_beds=Count('beds', filter=Q(beds__status='occupied')),
+        available_beds=F('availability__available_beds'),
+        occupied_beds=F('availability__occupied_beds'),
     )
     
     # Get ward statistics
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+STATUS_FIELDS = {
+    'available': 'available_beds',
+    'occupied': 'occupied_beds',
+    'maintenance': 'maintenance_beds',
+    'reserved': 'reserved_beds',
+}
+
+
+def rebuild_ward_availability(apps, schema_editor):
+    """Seed the bed counters for every existing ward from its active beds"""
+    Ward = apps.get_model('hospital_wards', 'Ward')
+    WardBed = apps.get_model('hospital_wards', 'WardBed')
+    WardAvailability = apps.get_model('hospital_wards', 'WardAvailability')
+
+    rows = WardBed.objects.filter(is_active=True).values('ward_id').annotate(**{
+        field: Count('id', filter=Q(status=status))
+        for status, field in STATUS_FIELDS.items()
+    })
+    counts = {row.pop('ward_id'): row for row in rows}
+
+    for ward_id in Ward.objects.values_list('id', flat=True):
+        defaults = counts.get(ward_id, {field: 0 for field in STATUS_FIELDS.values()})
+        WardAvailability.objects.update_or_create(ward_id=ward_id, defaults=defaults)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital_wards', '0004_notificationpreferences'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_ward_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital_wards', '0005_rebuild_ward_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wardavailability',
+            name='feed_sequence',
+            field=models.PositiveIntegerField(default=0, help_text="Version of the ward's live bed feed"),
+        ),
+    ]
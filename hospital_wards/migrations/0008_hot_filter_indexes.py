@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hospital_wards', '0007_notification_outbox'),
+        ('orders', '0006_hot_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caregivernotification',
+            index=models.Index(fields=['caregiver', 'is_read'], name='hospital_wa_caregiv_a630bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientadmission',
+            index=models.Index(fields=['admission_date', 'is_active'], name='hospital_wa_admissi_5e41ef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wardbed',
+            index=models.Index(fields=['ward', 'status', 'is_active'], name='hospital_wa_ward_id_ef752d_idx'),
+        ),
+    ]
@@ -3,13 +3,23 @@ Hospital Ward Management Models
 Handles ward & bed management, delivery scheduling, nutrition info, and patient education
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
 
+# Sent after a bed's save/delete has been applied to the ward counters, with
+# ``instance``, ``previous`` (the (ward_id, status) it was counted as before)
+# and ``deleted``. Used by the ward WebSocket feed to publish bed deltas.
+bed_state_changed = Signal()
+
+
 class Ward(models.Model):
     """Hospital ward/department"""
     name = models.CharField(max_length=100, unique=True)
@@ -26,13 +36,20 @@ class Ward(models.Model):
     def __str__(self):
         return self.name
     
+    def get_counters(self):
+        """Get the bed counters row for this ward, rebuilding it if missing"""
+        try:
+            return self.availability
+        except WardAvailability.DoesNotExist:
+            return WardAvailability.rebuild(self)
+    
     def get_available_beds_count(self):
         """Get number of available beds"""
-        return self.capacity - self.beds.filter(status='occupied').count()
+        return self.capacity - self.get_counters().occupied_beds
     
     def get_occupancy_percentage(self):
         """Get ward occupancy percentage"""
-        occupied = self.beds.filter(status='occupied').count()
+        occupied = self.get_counters().occupied_beds
         if self.capacity == 0:
             return 0
         return (occupied / self.capacity) * 100
@@ -60,10 +77,39 @@ class WardBed(models.Model):
     class Meta:
         unique_together = ['ward', 'bed_number']
         ordering = ['ward', 'bed_number']
+        indexes = [
+            models.Index(fields=['ward', 'status', 'is_active']),
+        ]
     
     def __str__(self):
         return f"{self.ward.name} - Bed {self.bed_number}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counted_as = instance._counter_key()
+        return instance
+    
+    def _counter_key(self):
+        """(ward_id, status) this bed contributes to, or None if not counted"""
+        state = self.__dict__
+        if 'ward_id' not in state or 'status' not in state or 'is_active' not in state:
+            return None
+        if not self.is_active:
+            return None
+        return (self.ward_id, self.status)
+    
+    def save(self, *args, **kwargs):
+        """Save the bed and move it between its ward's status counters"""
+        previous = getattr(self, '_counted_as', None)
+        current = self._counter_key()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous != current:
+                WardAvailability.apply_transition(previous, current)
+            bed_state_changed.send(sender=WardBed, instance=self, previous=previous, deleted=False)
+        self._counted_as = current
+    
     def assign_patient(self, patient):
         """Assign patient to bed"""
         if self.status != 'available':
@@ -79,6 +125,26 @@ class WardBed(models.Model):
         self.status = 'available'
         self.assigned_at = None
         self.save()
+    
+    def transfer_patient_to(self, to_bed):
+        """Move this bed's patient to another available bed"""
+        patient = self.patient
+        with transaction.atomic():
+            self.release_patient()
+            to_bed.assign_patient(patient)
+    
+    def start_maintenance(self):
+        """Take an empty bed out of service for maintenance"""
+        if self.status == 'occupied':
+            raise ValueError(f"Bed {self.bed_number} is occupied")
+        self.status = 'maintenance'
+        self.save()
+    
+    def end_maintenance(self):
+        """Return a bed from maintenance to service"""
+        if self.status == 'maintenance':
+            self.status = 'available'
+            self.save()
 
 
 class PatientAdmission(models.Model):
@@ -106,6 +172,9 @@ class PatientAdmission(models.Model):
     
     class Meta:
         ordering = ['-admission_date']
+        indexes = [
+            models.Index(fields=['admission_date', 'is_active']),
+        ]
     
     def __str__(self):
         return f"{self.patient.get_full_name()} - {self.admission_date.strftime('%Y-%m-%d')}"
@@ -207,12 +276,26 @@ class WardDeliveryRoute(models.Model):
 
 
 class WardAvailability(models.Model):
-    """Real-time availability tracking for ward beds"""
+    """
+    Real-time availability tracking for ward beds.
+    
+    The counters are kept in step with active WardBed rows by WardBed.save()
+    and the post_delete receiver below; update_counts() rebuilds them from
+    the beds table when drift is suspected.
+    """
+    STATUS_FIELDS = {
+        'available': 'available_beds',
+        'occupied': 'occupied_beds',
+        'maintenance': 'maintenance_beds',
+        'reserved': 'reserved_beds',
+    }
+    
     ward = models.OneToOneField(Ward, on_delete=models.CASCADE, related_name='availability')
     available_beds = models.PositiveIntegerField(default=0)
     occupied_beds = models.PositiveIntegerField(default=0)
     maintenance_beds = models.PositiveIntegerField(default=0)
     reserved_beds = models.PositiveIntegerField(default=0)
+    feed_sequence = models.PositiveIntegerField(default=0, help_text="Version of the ward's live bed feed")
     last_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -221,13 +304,77 @@ class WardAvailability(models.Model):
     def __str__(self):
         return f"{self.ward.name} - {self.available_beds}/{self.ward.capacity} available"
     
+    @property
+    def total_beds(self):
+        """Number of active beds across all statuses"""
+        return self.available_beds + self.occupied_beds + self.maintenance_beds + self.reserved_beds
+    
+    @classmethod
+    def count_beds(cls, ward):
+        """Count a ward's active beds per status in a single query"""
+        return ward.beds.filter(is_active=True).aggregate(**{
+            field: Count('id', filter=Q(status=status))
+            for status, field in cls.STATUS_FIELDS.items()
+        })
+    
+    @classmethod
+    def rebuild(cls, ward):
+        """Create or overwrite the counters for a ward from its beds"""
+        availability, _ = cls.objects.update_or_create(ward=ward, defaults=cls.count_beds(ward))
+        return availability
+    
+    @classmethod
+    def apply_transition(cls, previous, current, rebuild_missing=True):
+        """
+        Move one bed between counters.
+        
+        ``previous`` and ``current`` are (ward_id, status) pairs, or None when
+        the bed was not / is no longer counted (new, inactive or deleted).
+        """
+        deltas = {}
+        if previous and previous[1] in cls.STATUS_FIELDS:
+            deltas.setdefault(previous[0], {})[cls.STATUS_FIELDS[previous[1]]] = -1
+        if current and current[1] in cls.STATUS_FIELDS:
+            ward_deltas = deltas.setdefault(current[0], {})
+            field = cls.STATUS_FIELDS[current[1]]
+            ward_deltas[field] = ward_deltas.get(field, 0) + 1
+        
+        for ward_id, changes in deltas.items():
+            updates = {
+                field: Greatest(F(field) + delta, 0)
+                for field, delta in changes.items() if delta
+            }
+            if not updates:
+                continue
+            updated = cls.objects.filter(ward_id=ward_id).update(last_updated=timezone.now(), **updates)
+            if not updated and rebuild_missing:
+                # No counters yet; counting now already includes this change
+                ward = Ward.objects.filter(id=ward_id).first()
+                if ward is not None:
+                    cls.rebuild(ward)
+    
+    @classmethod
+    def totals(cls, **ward_filters):
+        """Sum the counters over wards matching ``ward_filters`` in one query"""
+        totals = cls.objects.filter(**{
+            f'ward__{lookup}': value for lookup, value in ward_filters.items()
+        }).aggregate(**{field: Sum(field) for field in cls.STATUS_FIELDS.values()})
+        totals = {field: value or 0 for field, value in totals.items()}
+        totals['total_beds'] = sum(totals.values())
+        return totals
+    
     def update_counts(self):
         """Update availability counts from actual bed statuses"""
-        self.available_beds = self.ward.beds.filter(status='available').count()
-        self.occupied_beds = self.ward.beds.filter(status='occupied').count()
-        self.maintenance_beds = self.ward.beds.filter(status='maintenance').count()
-        self.reserved_beds = self.ward.beds.filter(status='reserved').count()
+        for field, value in self.count_beds(self.ward).items():
+            setattr(self, field, value)
         self.save()
+    
+    def is_in_sync(self):
+        """Check the stored counters against the beds table"""
+        return all(
+            getattr(self, field) == value
+            for field, value in self.count_beds(self.ward).items()
+        )
 
 
 class MealNutritionInfo(models.Model):
@@ -572,6 +719,7 @@ class CaregiverNotification(models.Model):
         indexes = [
             models.Index(fields=['caregiver', '-created_at']),
             models.Index(fields=['is_read', '-created_at']),
+            models.Index(fields=['caregiver', 'is_read']),
         ]
     
     def __str__(self):
@@ -795,5 +943,72 @@ class NotificationPreferences(models.Model):
         return f"Preferences for {self.user.username}"
 
 
+class NotificationOutbox(models.Model):
+    """Queued notification, written with the change it announces and delivered by the outbox worker"""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('in_app', 'In-App'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('retry', 'Retry'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+    ]
+    
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    template_name = models.CharField(max_length=255, help_text="NotificationTemplate rendered at delivery")
+    notification_type = models.CharField(max_length=50)
+    context = models.JSONField(default=dict)
+    
+    # Recipient: an email address, or the user shown the in-app notification
+    recipient_email = models.EmailField(blank=True)
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='queued_notifications'
+    )
+    patient = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    admission = models.ForeignKey(PatientAdmission, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    # Delivery state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.template_name} via {self.channel} - {self.status}"
+
+
+
+
+
+
+@receiver(post_save, sender=Ward)
+def create_ward_availability(sender, instance, created, **kwargs):
+    """Give every new ward an (empty) counters row"""
+    if created and not kwargs.get('raw'):
+        WardAvailability.objects.get_or_create(ward=instance)
 
 
+@receiver(post_delete, sender=WardBed)
+def release_bed_counter(sender, instance, **kwargs):
+    """Drop a deleted bed from its ward's counters"""
+    previous = getattr(instance, '_counted_as', None) or instance._counter_key()
+    if previous:
+        # Never recreate counters here: the ward itself may be mid-delete
+        WardAvailability.apply_transition(previous, None, rebuild_missing=False)
+        bed_state_changed.send(sender=WardBed, instance=instance, previous=previous, deleted=True)
@@ -0,0 +1,286 @@
+"""
+Notification Outbox
+Queued, batched delivery of admission, discharge and transfer notifications.
+
+The ward signals add NotificationOutbox rows in the same transaction as the
+change they announce. A rolled-back discharge therefore sends nothing, and the
+worker only ever sees committed rows. Requests never wait on SMTP, however
+many patients a bulk operation touches.
+
+``deliver_outbox`` leases due rows in batches and delivers them outside any
+transaction. Templates are loaded once per batch and compiled once per
+(template id, updated_at), so an edited template is used from the next batch
+on. Emails share one open mail connection but are sent one at a time, so a
+refused recipient fails only its own row: SMTP stops at the first error, and
+a multi-message send could not tell which messages already went out. In-app
+rows become PatientNotifications with one ``bulk_create``. A row that fails
+to send is retried with exponential backoff, and after MAX_ATTEMPTS it moves
+to the dead letter state. A row whose template is missing or does not
+render is dead-lettered at once. ``requeue_dead_letters`` queues dead rows
+again.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template import Context, Template
+from django.utils import timezone
+
+from .models import NotificationOutbox, NotificationTemplate, PatientNotification
+
+logger = logging.getLogger(__name__)
+
+# Rows leased per batch
+OUTBOX_BATCH_SIZE = 100
+
+# Deliveries tried before a row is dead-lettered
+MAX_ATTEMPTS = 5
+
+# Retry delays grow as RETRY_BASE * 2 ** (attempt - 1), capped at RETRY_MAX
+RETRY_BASE = timedelta(minutes=1)
+RETRY_MAX = timedelta(hours=1)
+
+# Leased rows stay hidden from other workers for this long
+LEASE_DURATION = timedelta(minutes=5)
+
+_state = threading.local()
+
+
+# ==================== ENQUEUE ====================
+
+@contextmanager
+def muted(active=True):
+    """Queue no notifications inside the block, e.g. for bulk operations run without them"""
+    previous = getattr(_state, 'muted', False)
+    _state.muted = previous or active
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def enqueue(template_name, context, notification_type, emails=(), user=None, patient=None, admission=None):
+    """
+    Queue one email per address and, with ``user``, one in-app notification.
+
+    ``context`` must be JSON serializable; it is rendered into the template
+    at delivery. Returns the created outbox rows.
+    """
+    if getattr(_state, 'muted', False):
+        return []
+    common = {
+        'template_name': template_name,
+        'notification_type': notification_type,
+        'context': context,
+        'patient': patient,
+        'admission': admission,
+    }
+    rows = [NotificationOutbox(channel='email', recipient_email=email, **common) for email in emails]
+    if user is not None:
+        rows.append(NotificationOutbox(channel='in_app', recipient=user, **common))
+    return NotificationOutbox.objects.bulk_create(rows)
+
+
+# ==================== RENDERING ====================
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compiled_template(template):
+    """``(subject, body)`` Templates of a NotificationTemplate, compiled once per version"""
+    entry = _compiled.get(template.pk)
+    if entry is None or entry[0] != template.updated_at:
+        entry = (template.updated_at, Template(template.email_subject), Template(template.email_body))
+        with _compiled_lock:
+            _compiled[template.pk] = entry
+    return entry[1], entry[2]
+
+
+def clear_template_cache():
+    with _compiled_lock:
+        _compiled.clear()
+
+
+def render_template_string(template_str, context):
+    """Render template string with context"""
+    return Template(template_str).render(Context(context))
+
+
+def render(template, context):
+    """Rendered ``(subject, body)`` of a NotificationTemplate"""
+    subject, body = compiled_template(template)
+    context = Context(context)
+    return ' '.join(subject.render(context).split()), body.render(context)
+
+
+def format_html_email(subject, body):
+    """Format plain text body as HTML email"""
+    html = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: #0066cc;">{subject}</h2>
+                <div style="background: #f5f5f5; padding: 20px; border-left: 4px solid #0066cc;">
+                    <pre style="font-family: Arial, sans-serif; white-space: pre-wrap;">
+{body}
+                    </pre>
+                </div>
+                <p style="color: #999; font-size: 12px; margin-top: 30px;">
+                    This is an automated notification from Hospital Management System.
+                    Please do not reply to this email.
+                </p>
+            </div>
+        </body>
+    </html>
+    """
+    return html
+
+
+# ==================== DELIVERY ====================
+
+def lease_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """Claim due rows, hiding them from other workers for LEASE_DURATION"""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status__in=('pending', 'retry'), next_attempt_at__lte=now)
+            .select_related('recipient')
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        if rows:
+            NotificationOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(next_attempt_at=now + LEASE_DURATION)
+    return rows
+
+
+def _mark_sent(row, now):
+    row.status = 'sent'
+    row.attempts += 1
+    row.sent_at = now
+    row.last_error = ''
+
+
+def _mark_failed(row, error, now, retryable=True):
+    row.attempts += 1
+    row.last_error = str(error)[:1000]
+    if retryable and row.attempts < MAX_ATTEMPTS:
+        row.status = 'retry'
+        row.next_attempt_at = now + min(RETRY_MAX, RETRY_BASE * 2 ** (row.attempts - 1))
+    else:
+        row.status = 'dead'
+        logger.warning(f"Notification outbox row {row.pk} dead-lettered after {row.attempts} attempt(s): {error}")
+
+
+def deliver_batch(rows, connection):
+    """Render and deliver leased rows, then record each row's outcome"""
+    now = timezone.now()
+    templates = {
+        template.name: template
+        for template in NotificationTemplate.objects.filter(
+            name__in={row.template_name for row in rows}, is_active=True
+        )
+    }
+
+    emails, in_app = [], []
+    for row in rows:
+        template = templates.get(row.template_name)
+        if template is None:
+            _mark_failed(row, f"No active template '{row.template_name}'", now, retryable=False)
+            continue
+        try:
+            subject, body = render(template, row.context)
+        except Exception as e:
+            _mark_failed(row, f"Template '{row.template_name}' failed to render: {e}", now, retryable=False)
+            continue
+        if row.channel == 'in_app':
+            in_app.append((row, subject, body))
+        else:
+            message = EmailMultiAlternatives(
+                subject=subject,
+                body=body,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[row.recipient_email],
+                connection=connection
+            )
+            message.attach_alternative(format_html_email(subject, body), 'text/html')
+            emails.append((row, message))
+
+    if in_app:
+        PatientNotification.objects.bulk_create([
+            PatientNotification(
+                recipient=row.recipient,
+                patient=row.patient,
+                admission_id=row.admission_id,
+                notification_type=row.notification_type,
+                title=subject[:255],
+                message=body,
+                send_email=False
+            )
+            for row, subject, body in in_app
+        ])
+        for row, _, _ in in_app:
+            _mark_sent(row, now)
+
+    for row, message in emails:
+        try:
+            sent = connection.send_messages([message])
+        except Exception as e:
+            logger.error(f"Sending notification email {row.pk} to {row.recipient_email} failed: {e}")
+            _mark_failed(row, e, now)
+            continue
+        if sent:
+            _mark_sent(row, now)
+        else:
+            _mark_failed(row, 'The mail backend sent nothing', now)
+
+    NotificationOutbox.objects.bulk_update(
+        rows, ['status', 'attempts', 'last_error', 'next_attempt_at', 'sent_at'], batch_size=OUTBOX_BATCH_SIZE
+    )
+    counts = {'sent': 0, 'retry': 0, 'dead': 0}
+    for row in rows:
+        counts[row.status] += 1
+    return counts
+
+
+def deliver_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """Deliver due rows batch by batch over one mail connection; returns sent/retry/dead counts"""
+    totals = {'sent': 0, 'retry': 0, 'dead': 0}
+    batches = 0
+    connection = None
+    try:
+        while max_batches is None or batches < max_batches:
+            rows = lease_batch(batch_size)
+            if not rows:
+                break
+            if connection is None:
+                connection = get_connection()
+                try:
+                    connection.open()
+                except Exception as e:
+                    # send_messages opens it again per message and records the failure
+                    logger.error(f"Opening the mail connection failed: {e}")
+            for status, count in deliver_batch(rows, connection).items():
+                totals[status] += count
+            batches += 1
+    finally:
+        if connection is not None:
+            connection.close()
+    if batches:
+        logger.info(
+            f"Notification outbox: {totals['sent']} sent, {totals['retry']} to retry, {totals['dead']} dead-lettered"
+        )
+    return totals
+
+
+def requeue_dead_letters(row_ids=None):
+    """Queue dead-lettered rows (or only ``row_ids``) for delivery again"""
+    rows = NotificationOutbox.objects.filter(status='dead')
+    if row_ids:
+        rows = rows.filter(pk__in=row_ids)
+    return rows.update(status='pending', attempts=0, last_error='', next_attempt_at=timezone.now())
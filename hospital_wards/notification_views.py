@@ -10,9 +10,6 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.utils import timezone
 from django.db.models import Q
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
 import logging
 
 from .models import (
@@ -20,6 +17,7 @@ from .models import (
     WardBed, PatientNotification, NotificationTemplate,
     CaregiverNotification
 )
+from .notification_outbox import enqueue, format_html_email, render_template_string  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
@@ -139,8 +137,8 @@ Hospital Management System
         NotificationTemplate.objects.get_or_create(
             name=key,
             defaults={
-                'subject': data['subject'],
-                'body': data['body'],
+                'email_subject': data['subject'],
+                'email_body': data['body'],
                 'notification_type': data['notification_type'],
                 'is_active': True
             }
@@ -148,134 +146,89 @@ Hospital Management System
 
 
 # ==================== NOTIFICATION SENDING ====================
+# These queue NotificationOutbox rows; `manage.py deliver_notifications` sends them.
 
 def send_admission_notification(admission):
-    """Send notification when patient is admitted"""
+    """Queue notifications for a patient admission"""
     try:
-        template = NotificationTemplate.objects.get(name='patient_admitted')
-        
-        # Prepare context
+        patient = admission.patient
+        bed = admission.bed
         context = {
-            'patient_name': admission.patient.user.get_full_name(),
-            'bed_number': admission.bed.bed_number,
-            'ward_name': admission.bed.ward.name,
+            'patient_name': patient.get_full_name(),
+            'bed_number': bed.bed_number if bed else 'N/A',
+            'ward_name': bed.ward.name if bed else 'N/A',
             'admission_date': admission.admission_date.strftime('%Y-%m-%d %H:%M'),
-            'reason': admission.reason,
+            'reason': admission.get_reason_display(),
             'chief_complaint': admission.chief_complaint or 'N/A'
         }
-        
-        # Get caregivers (if tracking is implemented)
-        # For now, send to patient's emergency contacts
-        recipients = get_patient_contacts(admission.patient)
-        
-        if recipients:
-            # Send email notifications
-            for recipient in recipients:
-                send_notification_email(
-                    recipient,
-                    template,
-                    context,
-                    'admission',
-                    admission.patient.user
-                )
-            
-            logger.info(f"Admission notifications sent for patient {admission.patient.id}")
-        
+        enqueue(
+            'patient_admitted', context, 'admission',
+            emails=get_patient_contacts(patient), user=patient, patient=patient, admission=admission
+        )
         return True
     
     except Exception as e:
-        logger.error(f"Error sending admission notification: {str(e)}")
+        logger.error(f"Error queueing admission notification: {str(e)}")
         return False
 
 
 def send_discharge_notification(discharge):
-    """Send notification when patient is discharged"""
+    """Queue notifications for a patient discharge"""
     try:
-        template = NotificationTemplate.objects.get(name='patient_discharged')
         admission = discharge.admission
+        patient = admission.patient
         
         # Calculate length of stay
         length_of_stay = (discharge.created_at.date() - admission.admission_date.date()).days
         
-        # Prepare context
         context = {
-            'patient_name': admission.patient.user.get_full_name(),
+            'patient_name': patient.get_full_name(),
             'discharge_date': discharge.created_at.strftime('%Y-%m-%d %H:%M'),
             'discharge_status': discharge.get_discharge_status_display(),
             'length_of_stay': length_of_stay,
             'discharge_notes': discharge.discharge_notes or 'None'
         }
-        
-        # Get caregivers
-        recipients = get_patient_contacts(admission.patient)
-        
-        if recipients:
-            for recipient in recipients:
-                send_notification_email(
-                    recipient,
-                    template,
-                    context,
-                    'discharge',
-                    admission.patient.user
-                )
-            
-            logger.info(f"Discharge notifications sent for patient {admission.patient.id}")
-        
+        enqueue(
+            'patient_discharged', context, 'discharge',
+            emails=get_patient_contacts(patient), user=patient, patient=patient, admission=admission
+        )
         return True
     
     except Exception as e:
-        logger.error(f"Error sending discharge notification: {str(e)}")
+        logger.error(f"Error queueing discharge notification: {str(e)}")
         return False
 
 
 def send_transfer_notification(transfer):
-    """Send notification when patient is transferred"""
+    """Queue notifications for a bed transfer"""
     try:
-        template = NotificationTemplate.objects.get(name='patient_transferred')
-        
-        # Get previous admission
-        previous_bed = transfer.previous_bed
-        new_bed = transfer.new_bed
+        patient = transfer.patient
+        previous_bed = transfer.from_bed
+        new_bed = transfer.to_bed
         
-        # Prepare context
         context = {
-            'patient_name': transfer.patient.user.get_full_name(),
+            'patient_name': patient.get_full_name(),
             'old_bed': previous_bed.bed_number if previous_bed else 'N/A',
             'old_ward': previous_bed.ward.name if previous_bed else 'N/A',
-            'new_bed': new_bed.bed_number,
-            'new_ward': new_bed.ward.name,
+            'new_bed': new_bed.bed_number if new_bed else 'N/A',
+            'new_ward': new_bed.ward.name if new_bed else 'N/A',
             'transfer_date': transfer.transfer_date.strftime('%Y-%m-%d %H:%M'),
             'transfer_reason': transfer.reason or 'N/A'
         }
-        
-        # Get caregivers
-        recipients = get_patient_contacts(transfer.patient)
-        
-        if recipients:
-            for recipient in recipients:
-                send_notification_email(
-                    recipient,
-                    template,
-                    context,
-                    'transfer',
-                    transfer.patient.user
-                )
-            
-            logger.info(f"Transfer notifications sent for patient {transfer.patient.id}")
-        
+        enqueue(
+            'patient_transferred', context, 'transfer',
+            emails=get_patient_contacts(patient), user=patient, patient=patient
+        )
         return True
     
     except Exception as e:
-        logger.error(f"Error sending transfer notification: {str(e)}")
+        logger.error(f"Error queueing transfer notification: {str(e)}")
         return False
 
 
 def send_bed_status_notification(bed, old_status, new_status, changed_by=None):
-    """Send notification when bed status changes"""
+    """Queue notifications for a bed status change"""
     try:
-        template = NotificationTemplate.objects.get(name='bed_status_changed')
-        
-        # Prepare context
         context = {
             'bed_number': bed.bed_number,
             'ward_name': bed.ward.name,
@@ -284,103 +237,34 @@ def send_bed_status_notification(bed, old_status, new_status, changed_by=None):
             'status_change_time': timezone.now().strftime('%Y-%m-%d %H:%M'),
             'changed_by': changed_by.get_full_name() if changed_by else 'System'
         }
-        
-        # Get ward staff
-        recipients = get_ward_staff(bed.ward)
-        
-        if recipients:
-            for recipient in recipients:
-                send_notification_email(
-                    recipient,
-                    template,
-                    context,
-                    'bed_status',
-                    None
-                )
-            
-            logger.info(f"Bed status notifications sent for bed {bed.id}")
-        
+        enqueue('bed_status_changed', context, 'bed_status', emails=get_ward_staff(bed.ward))
         return True
     
     except Exception as e:
-        logger.error(f"Error sending bed status notification: {str(e)}")
+        logger.error(f"Error queueing bed status notification: {str(e)}")
         return False
 
 
 # ==================== NOTIFICATION HELPERS ====================
 
 def send_notification_email(recipient_email, template, context, notification_type, user=None):
-    """Send email notification using template"""
+    """Queue an email (and an in-app notification for ``user``) rendered from a NotificationTemplate"""
     try:
-        # Render subject and body with context
-        subject = render_template_string(template.subject, context)
-        body = render_template_string(template.body, context)
-        
-        # Send email
-        send_mail(
-            subject,
-            body,
-            settings.DEFAULT_FROM_EMAIL,
-            [recipient_email],
-            html_message=format_html_email(subject, body),
-            fail_silently=False
-        )
-        
-        # Create in-app notification if user exists
-        if user:
-            PatientNotification.objects.create(
-                recipient=user,
-                title=subject,
-                message=body,
-                notification_type=notification_type,
-                related_object=None
-            )
-        
-        logger.info(f"Notification email sent to {recipient_email}")
+        enqueue(template.name, context, notification_type, emails=[recipient_email], user=user)
         return True
     
     except Exception as e:
-        logger.error(f"Error sending notification email: {str(e)}")
+        logger.error(f"Error queueing notification email: {str(e)}")
         return False
 
 
-def render_template_string(template_str, context):
-    """Render template string with context"""
-    from django.template import Template, Context
-    template = Template(template_str)
-    return template.render(Context(context))
-
-
-def format_html_email(subject, body):
-    """Format plain text body as HTML email"""
-    html = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #0066cc;">{subject}</h2>
-                <div style="background: #f5f5f5; padding: 20px; border-left: 4px solid #0066cc;">
-                    <pre style="font-family: Arial, sans-serif; white-space: pre-wrap;">
-{body}
-                    </pre>
-                </div>
-                <p style="color: #999; font-size: 12px; margin-top: 30px;">
-                    This is an automated notification from Hospital Management System.
-                    Please do not reply to this email.
-                </p>
-            </div>
-        </body>
-    </html>
-    """
-    return html
-
-
 def get_patient_contacts(patient):
     """Get list of email addresses for patient contacts"""
     contacts = []
     
     # Add patient's own email
-    if patient.user.email:
-        contacts.append(patient.user.email)
+    if patient.email:
+        contacts.append(patient.email)
     
     # TODO: Add emergency contacts when that model is created
     # For now, just return patient email
@@ -529,35 +413,6 @@ def notification_count(request):
     return JsonResponse({'unread_count': count})
 
 
-# ==================== NOTIFICATION SIGNALS ====================
-
-def setup_notification_signals():
-    """
-    Connect signals to create notifications on model changes.
-    Call this in apps.py ready() method
-    """
-    from django.db.models.signals import post_save
-    from django.dispatch import receiver
-    
-    @receiver(post_save, sender=PatientAdmission)
-    def patient_admitted_signal(sender, instance, created, **kwargs):
-        """Send notification when patient is admitted"""
-        if created:
-            send_admission_notification(instance)
-    
-    @receiver(post_save, sender=PatientDischarge)
-    def patient_discharged_signal(sender, instance, created, **kwargs):
-        """Send notification when patient is discharged"""
-        if created:
-            send_discharge_notification(instance)
-    
-    @receiver(post_save, sender=PatientTransfer)
-    def patient_transferred_signal(sender, instance, created, **kwargs):
-        """Send notification when patient is transferred"""
-        if created:
-            send_transfer_notification(instance)
-
-
 # ==================== NOTIFICATION STATS ====================
 
 @login_required
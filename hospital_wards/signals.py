@@ -0,0 +1,87 @@
+"""
+Hospital Ward Signals
+Publishes bed changes to the live ward feed, queues patient movement notifications
+and pushes order status changes to the staff dashboards
+"""
+
+import logging
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from orders.events import subscriber
+
+from .models import PatientAdmission, PatientDischarge, PatientTransfer, WardBed, bed_state_changed
+from . import notification_views, ward_feed
+
+logger = logging.getLogger(__name__)
+
+# DashboardConsumer roles told about order status changes
+ORDER_DASHBOARD_ROLES = ('chef', 'kitchen_staff', 'delivery_person', 'admin')
+
+
+@receiver(bed_state_changed, sender=WardBed)
+def publish_bed_change(sender, instance, previous, deleted, **kwargs):
+    """Turn a committed bed save/delete into one delta per affected ward"""
+    current = None if deleted else instance._counter_key()
+    previous_ward = previous[0] if previous else None
+    current_ward = current[0] if current else None
+
+    if previous_ward and previous_ward != current_ward:
+        ward_feed.record_change(previous_ward, removed=[instance.id])
+    if current_ward:
+        ward_feed.record_change(current_ward, beds=[instance])
+
+
+# ==================== PATIENT NOTIFICATIONS ====================
+# Outbox rows are written in the saving transaction and delivered by the outbox worker.
+
+@receiver(post_save, sender=PatientAdmission)
+def queue_admission_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notification_views.send_admission_notification(instance)
+
+
+@receiver(post_save, sender=PatientDischarge)
+def queue_discharge_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notification_views.send_discharge_notification(instance)
+
+
+@receiver(post_save, sender=PatientTransfer)
+def queue_transfer_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        notification_views.send_transfer_notification(instance)
+
+
+# ==================== ORDER DASHBOARDS ====================
+
+@subscriber
+def broadcast_order_events(events):
+    """Send a batch of order events to each staff dashboard group in one message"""
+    orders = [
+        {
+            'id': event.order_id,
+            'order_number': event.order.order_number,
+            'status': event.status,
+            'previous_status': event.previous_status,
+        }
+        for event in events
+    ]
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        message = {
+            'type': 'dashboard_update',
+            'data': {'event': 'orders', 'orders': orders},
+            'timestamp': timezone.now().isoformat(),
+        }
+        for role in ORDER_DASHBOARD_ROLES:
+            async_to_sync(channel_layer.group_send)(f'dashboard_{role}', message)
+    except Exception as e:
+        logger.warning(f"Could not broadcast {len(orders)} order event(s): {e}")
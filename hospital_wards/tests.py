@@ -1,3 +1,341 @@
-from django.test import TestCase
+import gzip
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import ward_feed
+from .exports import CANCELLED_MESSAGE, iter_keyset, stream_csv
+from .imports import import_patients
+from .models import (
+    BulkOperation, NotificationOutbox, NotificationTemplate, PatientAdmission, PatientDischarge,
+    PatientNotification, Ward, WardBed, WardAvailability
+)
+from .notification_outbox import MAX_ATTEMPTS, compiled_template, deliver_outbox, muted, requeue_dead_letters
+from .notification_views import get_or_create_templates
+
+
+class WardCounterTests(TestCase):
+    """Incrementally maintained bed counters on WardAvailability"""
+
+    def setUp(self):
+        self.ward = Ward.objects.create(name='Ward A', location='Block 1', capacity=4)
+        self.other_ward = Ward.objects.create(name='Ward B', location='Block 2', capacity=2)
+        self.beds = [
+            WardBed.objects.create(ward=self.ward, bed_number=str(i)) for i in range(1, 4)
+        ]
+        self.spare = WardBed.objects.create(ward=self.other_ward, bed_number='1')
+        self.patient = User.objects.create_user(username='patient', password='pass12345')
+
+    def counters(self, ward):
+        return WardAvailability.objects.get(ward=ward)
+
+    def test_new_beds_are_counted(self):
+        counters = self.counters(self.ward)
+        self.assertEqual(counters.available_beds, 3)
+        self.assertEqual(counters.total_beds, 3)
+
+    def test_assign_and_release_move_between_counters(self):
+        bed = WardBed.objects.get(pk=self.beds[0].pk)
+        bed.assign_patient(self.patient)
+        counters = self.counters(self.ward)
+        self.assertEqual((counters.available_beds, counters.occupied_beds), (2, 1))
+        self.assertEqual(Ward.objects.get(pk=self.ward.pk).get_available_beds_count(), 3)
+
+        bed.release_patient()
+        counters = self.counters(self.ward)
+        self.assertEqual((counters.available_beds, counters.occupied_beds), (3, 0))
+
+    def test_transfer_updates_both_wards(self):
+        bed = self.beds[0]
+        bed.assign_patient(self.patient)
+        bed.transfer_patient_to(self.spare)
+        self.assertEqual(self.counters(self.ward).occupied_beds, 0)
+        self.assertEqual(self.counters(self.other_ward).occupied_beds, 1)
+        self.assertEqual(self.counters(self.other_ward).available_beds, 0)
+
+    def test_maintenance_deactivation_and_delete(self):
+        self.beds[0].start_maintenance()
+        self.assertEqual(self.counters(self.ward).maintenance_beds, 1)
+
+        self.beds[1].is_active = False
+        self.beds[1].save()
+        self.beds[2].delete()
+
+        counters = self.counters(self.ward)
+        self.assertEqual(counters.available_beds, 0)
+        self.assertTrue(counters.is_in_sync())
+
+    def test_reading_counters_does_not_count_beds(self):
+        ward = Ward.objects.select_related('availability').get(pk=self.ward.pk)
+        with self.assertNumQueries(0):
+            ward.get_occupancy_percentage()
+
+    def test_reconcile_command_repairs_drift(self):
+        WardAvailability.objects.filter(ward=self.ward).update(available_beds=9)
+        WardAvailability.objects.filter(ward=self.other_ward).delete()
+
+        out = StringIO()
+        call_command('reconcile_ward_counters', stdout=out)
+        self.assertIn('2 ward(s) drifted', out.getvalue())
+        self.assertEqual(self.counters(self.ward).available_beds, 9)
+
+        call_command('reconcile_ward_counters', '--fix', stdout=StringIO())
+        self.assertEqual(self.counters(self.ward).available_beds, 3)
+        self.assertEqual(self.counters(self.other_ward).available_beds, 1)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class WardFeedTests(TestCase):
+    """Versioned bed deltas published once per change"""
+
+    def setUp(self):
+        cache.clear()
+        self.ward = Ward.objects.create(name='Ward A', location='Block 1', capacity=2)
+        self.bed = WardBed.objects.create(ward=self.ward, bed_number='1')
+        WardBed.objects.create(ward=self.ward, bed_number='2')
+        self.patient = User.objects.create_user(username='patient', password='pass12345')
+
+    def test_change_publishes_one_delta_to_the_ward_group(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(ward_feed.group_name(self.ward.id), channel)
+        before = WardAvailability.objects.get(ward=self.ward).feed_sequence
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bed.assign_patient(self.patient)
+
+        message = async_to_sync(layer.receive)(channel)
+        delta = message['delta']
+        self.assertEqual(message['type'], 'ward.delta')
+        self.assertEqual(delta['seq'], before + 1)
+        self.assertEqual([bed['id'] for bed in delta['beds']], [self.bed.id])
+        self.assertEqual(delta['beds'][0]['patient']['id'], self.patient.id)
+        self.assertEqual(delta['counters']['occupied_beds'], 1)
+
+    def test_cached_snapshot_is_rolled_forward(self):
+        snapshot = ward_feed.get_snapshot(self.ward.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bed.start_maintenance()
+
+        with self.assertNumQueries(0):
+            snapshot_after = ward_feed.get_snapshot(self.ward.id)
+        self.assertEqual(snapshot_after['seq'], snapshot['seq'] + 1)
+        self.assertEqual(snapshot_after['counters']['maintenance_beds'], 1)
+        self.assertEqual(snapshot_after, {**ward_feed.build_snapshot(self.ward.id), 'timestamp': snapshot_after['timestamp']})
+
+    def test_resync_replays_missed_deltas_or_requires_snapshot(self):
+        seq = WardAvailability.objects.get(ward=self.ward).feed_sequence
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bed.assign_patient(self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bed.release_patient()
+
+        deltas = ward_feed.get_deltas_since(self.ward.id, seq)
+        self.assertEqual([delta['seq'] for delta in deltas], [seq + 1, seq + 2])
+        self.assertIsNone(ward_feed.get_deltas_since(self.ward.id, seq + 2))
+
+    def test_resync_too_far_behind_requires_snapshot(self):
+        limit = ward_feed.MAX_REPLAY_DELTAS
+        for seq in range(1, limit + 1):
+            cache.set(ward_feed._delta_key(self.ward.id, seq), {'seq': seq})
+        self.assertEqual(len(ward_feed.get_deltas_since(self.ward.id, 0)), limit)
+
+        cache.set(ward_feed._delta_key(self.ward.id, limit + 1), {'seq': limit + 1})
+        self.assertIsNone(ward_feed.get_deltas_since(self.ward.id, 0))
+        # A gap is not replayed past either
+        cache.delete(ward_feed._delta_key(self.ward.id, 5))
+        self.assertIsNone(ward_feed.get_deltas_since(self.ward.id, 1))
+
+
+class StreamingExportTests(TestCase):
+    """Keyset-paginated, streamed CSV exports"""
+
+    def setUp(self):
+        self.ward = Ward.objects.create(name='Ward A', location='Block 1', capacity=5)
+        for i in range(5):
+            WardBed.objects.create(ward=self.ward, bed_number=f'{i:02d}')
+        self.user = User.objects.create_user(username='manager', password='pass12345')
+
+    def test_iter_keyset_pages_through_every_row(self):
+        beds = WardBed.objects.filter(ward=self.ward)
+        self.assertEqual(
+            list(iter_keyset(beds, ['bed_number'], chunk_size=2)),
+            [(f'{i:02d}',) for i in range(5)]
+        )
+        self.assertEqual(
+            [row[0] for row in iter_keyset(beds, ['bed_number'], chunk_size=2, descending=True)],
+            [f'{i:02d}' for i in reversed(range(5))]
+        )
+
+    def test_stream_csv_records_progress_and_compresses(self):
+        bulk_op = BulkOperation.objects.create(operation_type='export_report', initiated_by=self.user)
+        rows = iter_keyset(WardBed.objects.all(), ['bed_number', 'status'], chunk_size=2)
+
+        response = stream_csv('beds.csv', ['Bed', 'Status'], rows, bulk_op=bulk_op, compress=True)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="beds.csv.gz"')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+
+        self.assertEqual(content.splitlines()[0], 'Bed,Status')
+        self.assertEqual(len(content.splitlines()), 6)
+        bulk_op.refresh_from_db()
+        self.assertEqual(bulk_op.status, 'completed')
+        self.assertEqual(bulk_op.successful_records, 5)
+
+    def test_client_disconnect_marks_export_cancelled(self):
+        bulk_op = BulkOperation.objects.create(operation_type='export_report', initiated_by=self.user)
+        for compress in (False, True):
+            BulkOperation.objects.filter(pk=bulk_op.pk).update(status='pending', error_message='')
+            rows = iter_keyset(WardBed.objects.all(), ['bed_number', 'status'], chunk_size=2)
+            response = stream_csv('beds.csv', ['Bed', 'Status'], rows, bulk_op=bulk_op, compress=compress)
+            next(iter(response.streaming_content))
+            response.close()
+
+            bulk_op.refresh_from_db()
+            self.assertEqual(bulk_op.status, 'failed')
+            self.assertEqual(bulk_op.error_message, CANCELLED_MESSAGE)
+            self.assertIsNotNone(bulk_op.completed_at)
+
+
+class PatientImportTests(TestCase):
+    """Chunked patient roster import"""
+
+    HEADER = 'patient_id,first_name,last_name,email,phone,date_of_birth,gender\n'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', email='taken@example.com', password='pass12345')
+        self.bulk_op = BulkOperation.objects.create(operation_type='import_patients', initiated_by=self.user)
+
+    def upload(self, rows):
+        return SimpleUploadedFile('roster.csv', (self.HEADER + ''.join(rows)).encode('utf-8'))
+
+    def test_import_creates_patients_in_chunks_and_reports_row_errors(self):
+        csv_file = self.upload([
+            'P1,Ann,One,ann@example.com,0788000001,1990-01-01,F\n',
+            'P2,Bob,Two,TAKEN@example.com,,,M\n',
+            'P3,,Three,c@example.com,,,\n',
+            'P4,Dan,Four,ann@example.com,,,M\n',
+            'P5,Eve,Five,manager@example.com,,,F\n',
+        ])
+
+        # No per-row queries: one email lookup, two inserts per chunk with valid rows,
+        # a progress update per chunk plus savepoints and status updates
+        with self.assertNumQueries(14):
+            successful, failed = import_patients(csv_file, self.bulk_op, chunk_size=2)
+
+        self.assertEqual((successful, failed), (2, 3))
+        ann = User.objects.select_related('profile').get(email='ann@example.com')
+        self.assertEqual(ann.profile.role, 'patient')
+        self.assertEqual(ann.profile.phone, '0788000001')
+        self.assertFalse(ann.has_usable_password())
+        self.assertTrue(User.objects.filter(username='manager2').exists())
+
+        self.bulk_op.refresh_from_db()
+        self.assertEqual(self.bulk_op.status, 'completed')
+        self.assertEqual((self.bulk_op.successful_records, self.bulk_op.failed_records), (2, 3))
+        self.assertEqual(self.bulk_op.error_message.splitlines(), [
+            'Row 3: Patient with email TAKEN@example.com already exists',
+            'Row 4: Missing required fields',
+            'Row 5: Patient with email ann@example.com already exists',
+        ])
+
+
+class NotificationOutboxTests(TestCase):
+    """Admission and discharge notifications queued in the outbox and delivered in batches"""
+
+    def setUp(self):
+        get_or_create_templates()
+        ward = Ward.objects.create(name='Ward N', location='Block 3', capacity=4)
+        self.beds = [WardBed.objects.create(ward=ward, bed_number=str(i)) for i in range(1, 4)]
+        self.patients = [
+            User.objects.create_user(username=f'patient{i}', email=f'patient{i}@example.com', first_name=f'P{i}')
+            for i in range(3)
+        ]
+
+    def admit_and_discharge(self):
+        for patient, bed in zip(self.patients, self.beds):
+            admission = PatientAdmission.objects.create(patient=patient, bed=bed, reason='routine')
+            PatientDischarge.objects.create(admission=admission, discharge_status='recovered')
+
+    def test_signals_queue_and_worker_delivers_over_one_connection(self):
+        with transaction.atomic():
+            self.admit_and_discharge()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(NotificationOutbox.objects.filter(channel='email').count(), 6)
+        self.assertEqual(NotificationOutbox.objects.filter(channel='in_app').count(), 6)
+
+        with mock.patch.object(
+            locmem.EmailBackend, 'send_messages', autospec=True, side_effect=locmem.EmailBackend.send_messages
+        ) as send_messages:
+            totals = deliver_outbox()
+
+        self.assertEqual(totals, {'sent': 12, 'retry': 0, 'dead': 0})
+        self.assertEqual(send_messages.call_count, 6)
+        self.assertEqual(len({call.args[0] for call in send_messages.call_args_list}), 1)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(mail.outbox[0].subject, 'Patient Admission Notification')
+        self.assertIn('P0', mail.outbox[0].body)
+        self.assertEqual(PatientNotification.objects.filter(recipient=self.patients[0]).count(), 2)
+        self.assertEqual(deliver_outbox(), {'sent': 0, 'retry': 0, 'dead': 0})
+
+    def test_rolled_back_and_muted_changes_queue_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.admit_and_discharge()
+            raise RuntimeError
+        with muted():
+            self.admit_and_discharge()
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_failed_sends_retry_then_dead_letter(self):
+        PatientAdmission.objects.create(patient=self.patients[0], bed=self.beds[0], reason='routine')
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=SMTPException('down')):
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                NotificationOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+                deliver_outbox()
+                row = NotificationOutbox.objects.get(channel='email')
+                self.assertEqual(row.attempts, attempt)
+        self.assertEqual(row.status, 'dead')
+        self.assertEqual(row.last_error, 'down')
+        self.assertEqual(NotificationOutbox.objects.get(channel='in_app').status, 'sent')
+
+        self.assertEqual(requeue_dead_letters(), 1)
+        self.assertEqual(deliver_outbox(), {'sent': 1, 'retry': 0, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_refused_recipient_fails_only_its_row(self):
+        with transaction.atomic():
+            self.admit_and_discharge()
+
+        def send_messages(backend, messages):
+            if messages[0].to == ['patient1@example.com']:
+                raise SMTPException('recipient refused')
+            return send(backend, messages)
+
+        send = locmem.EmailBackend.send_messages
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', autospec=True, side_effect=send_messages):
+            totals = deliver_outbox()
+
+        self.assertEqual(totals, {'sent': 10, 'retry': 2, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 4)
+        retried = NotificationOutbox.objects.filter(status='retry')
+        self.assertEqual(set(retried.values_list('recipient_email', flat=True)), {'patient1@example.com'})
+
+    def test_templates_compiled_once_per_version(self):
+        template = NotificationTemplate.objects.get(name='patient_admitted')
+        self.assertIs(compiled_template(template)[1], compiled_template(template)[1])
+
+        template.email_body = 'Admitted: {{ patient_name }}'
+        template.save()
+        self.assertEqual(compiled_template(template)[1].source, 'Admitted: {{ patient_name }}')
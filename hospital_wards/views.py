@@ -9,7 +9,7 @@ from django.contrib.auth.models import User
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.views.decorators.http import require_http_methods, require_POST
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count
+from django.db.models import Q, Count, F
 from django.utils import timezone
 from django.contrib import messages
 from django.db import transaction
@@ -28,12 +28,17 @@ from .forms import (
     BulkPatientImportForm, BulkPatientAssignmentForm, BulkDischargeForm,
     ExportReportForm, FilterBulkOperationForm
 )
+from .exports import iter_keyset, stream_csv, wants_gzip
+from .imports import import_patients
+from . import notification_outbox
 from .notification_views import (
     send_admission_notification, send_discharge_notification,
     send_transfer_notification, send_bed_status_notification,
-    get_or_create_templates, setup_notification_signals
+    get_or_create_templates
 )
 from orders.models import Order
+from accounts.rbac import get_principal, role_mask
+from dusangire.dates import on_day
 
 
 # ==================== WARD MANAGEMENT VIEWS ====================
@@ -42,8 +47,8 @@ from orders.models import Order
 def ward_list(request):
     """Display list of all wards"""
     wards = Ward.objects.filter(is_active=True).annotate(
-        available_beds=Count('beds', filter=Q(beds__status='available')),
-        occupied_beds=Count('beds', filter=Q(beds__status='occupied'))
+        available_beds=F('availability__available_beds'),
+        occupied_beds=F('availability__occupied_beds')
     )
     
     context = {
@@ -67,7 +72,7 @@ def ward_detail(request, ward_id):
         'available_beds': beds.filter(status='available'),
         'occupied_beds': beds.filter(status='occupied'),
         'delivery_routes': delivery_routes,
-        'availability': ward.availability,
+        'availability': ward.get_counters(),
     }
     return render(request, 'hospital_wards/ward_detail.html', context)
 
@@ -339,7 +344,7 @@ def notification_detail(request, notification_id):
     unread_count = CaregiverNotification.objects.filter(caregiver=request.user, is_read=False).count()
     today_count = CaregiverNotification.objects.filter(
         caregiver=request.user,
-        created_at__date=timezone.now().date()
+        **on_day('created_at')
     ).count()
     week_count = CaregiverNotification.objects.filter(
         caregiver=request.user,
@@ -359,11 +364,13 @@ def notification_detail(request, notification_id):
 
 def _require_role(*allowed_roles):
     """Decorator to check user role"""
+    allowed = role_mask(*allowed_roles)
+
     def decorator(view_func):
         def wrapper(request, *args, **kwargs):
             if not request.user.is_authenticated:
                 return redirect('login')
-            if request.user.profile.role not in allowed_roles:
+            if not get_principal(request).has_role(allowed):
                 messages.error(request, 'You do not have access to this dashboard.')
                 return redirect('hospital_wards:dashboard')
             return view_func(request, *args, **kwargs)
@@ -442,7 +449,7 @@ def nutritionist_dashboard(request):
         'active_patients': Order.objects.filter(status='pending').values('user').distinct().count(),
         'special_diet_count': MealNutritionInfo.objects.filter(suitable_for_diets__isnull=False).count(),
         'allergen_alerts': 0,
-        'todays_orders': Order.objects.filter(created_at__date=timezone.now().date()).count(),
+        'todays_orders': Order.objects.filter(**on_day('created_at')).count(),
         'nutrition_meals': MealNutritionInfo.objects.all()[:5],
         'dietary_requirements': [],
         'patient_nutrition': [],
@@ -461,8 +468,8 @@ def medical_staff_dashboard(request):
     wards = Ward.objects.filter(is_active=True).prefetch_related(
         'beds__patient__profile'
     ).annotate(
-        occupied_count=Count('beds', filter=Q(beds__status='occupied')),
-        available_count=Count('beds', filter=Q(beds__status='available')),
+        occupied_count=F('availability__occupied_beds'),
+        available_count=F('availability__available_beds'),
     )
     
     # Get all occupied beds with patient details
@@ -472,9 +479,10 @@ def medical_staff_dashboard(request):
     ).select_related('patient__profile', 'ward').order_by('ward__name', 'bed_number')
     
     # Calculate statistics
-    total_beds = WardBed.objects.filter(is_active=True).count()
-    total_occupied = occupied_beds.count()
-    total_available = WardBed.objects.filter(status='available', is_active=True).count()
+    bed_totals = WardAvailability.totals()
+    total_beds = bed_totals['total_beds']
+    total_occupied = bed_totals['occupied_beds']
+    total_available = bed_totals['available_beds']
     occupancy_rate = (total_occupied / total_beds * 100) if total_beds > 0 else 0
     
     # Get patients with recent admissions
@@ -542,13 +550,13 @@ def medical_staff_dashboard(request):
 @_require_role('chef')
 def chef_dashboard(request):
     """Chef meal preparation dashboard"""
-    todays_orders = Order.objects.filter(created_at__date=timezone.now().date()).count()
+    todays_orders = Order.objects.filter(**on_day('created_at')).count()
     
     context = {
         'todays_orders': todays_orders,
         'pending_items': Order.objects.filter(status='pending').count(),
         'special_requests': 0,
-        'completed_today': Order.objects.filter(updated_at__date=timezone.now().date(), status='completed').count(),
+        'completed_today': Order.objects.filter(**on_day('updated_at'), status='completed').count(),
         'meal_queue': Order.objects.filter(status='pending').order_by('created_at')[:8],
         'dietary_restrictions': [],
         'nutrition_details': MealNutritionInfo.objects.all()[:6],
@@ -618,11 +626,10 @@ def support_staff_dashboard(request):
     ).select_related('patient', 'bed').order_by('admission_date')[:5]
     
     # Get bed status summary
+    bed_totals = WardAvailability.totals()
     bed_status_summary = {
-        'occupied': beds.filter(status='occupied').count(),
-        'available': beds.filter(status='available').count(),
-        'maintenance': beds.filter(status='maintenance').count(),
-        'reserved': beds.filter(status='reserved').count(),
+        status: bed_totals[field]
+        for status, field in WardAvailability.STATUS_FIELDS.items()
     }
     
     context = {
@@ -645,9 +652,9 @@ def support_staff_dashboard(request):
 @_require_role('hospital_manager')
 def hospital_manager_dashboard(request):
     """Hospital manager analytics and oversight dashboard"""
-    wards = Ward.objects.filter(is_active=True)
+    wards = Ward.objects.filter(is_active=True).select_related('availability')
     total_beds = sum(w.capacity for w in wards)
-    occupied_beds = sum(w.beds.filter(status='occupied').count() for w in wards)
+    occupied_beds = WardAvailability.totals(is_active=True)['occupied_beds']
     
     context = {
         'total_patients': Order.objects.values('user').distinct().count(),
@@ -658,7 +665,7 @@ def hospital_manager_dashboard(request):
         'staff_distribution': [],
         'service_efficiency': 88,
         'patient_satisfaction': 92,
-        'orders_today': Order.objects.filter(created_at__date=timezone.now().date()).count(),
+        'orders_today': Order.objects.filter(**on_day('created_at')).count(),
         'orders_weekly_avg': 120,
         'orders_monthly_avg': 500,
         'ontime_today': 94,
@@ -768,9 +775,7 @@ def discharge_bed(request, bed_id):
     """Discharge patient from bed (Support Staff)"""
     try:
         bed = get_object_or_404(WardBed, id=bed_id)
-        bed.patient = None
-        bed.status = 'available'
-        bed.save()
+        bed.release_patient()
         return JsonResponse({'success': True, 'message': 'Patient discharged'})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -830,9 +835,6 @@ def patient_admission(request):
                 current_medications=current_medications,
             )
             
-            # Send admission notifications
-            send_admission_notification(admission)
-            
             # Create notification for medical staff
             CaregiverNotification.objects.create(
                 patient=patient,
@@ -898,9 +900,6 @@ def patient_discharge(request, admission_id):
             admission.is_active = False
             admission.save()
             
-            # Send discharge notifications
-            send_discharge_notification(discharge)
-            
             # Create notification
             CaregiverNotification.objects.create(
                 patient=admission.patient,
@@ -941,11 +940,8 @@ def transfer_patient_bed(request):
             from_bed = get_object_or_404(WardBed, id=from_bed_id, patient=patient)
             to_bed = get_object_or_404(WardBed, id=to_bed_id, status='available')
             
-            # Release from old bed
-            from_bed.release_patient()
-            
-            # Assign to new bed
-            to_bed.assign_patient(patient)
+            # Release from old bed and assign to new bed
+            from_bed.transfer_patient_to(to_bed)
             
             # Create transfer record
             transfer = PatientTransfer.objects.create(
@@ -956,9 +952,6 @@ def transfer_patient_bed(request):
                 reason=reason,
             )
             
-            # Send transfer notifications
-            send_transfer_notification(transfer)
-            
             # Create notification
             CaregiverNotification.objects.create(
                 patient=patient,
@@ -995,16 +988,20 @@ def occupancy_report(request):
     """View bed occupancy statistics and reports"""
     from django.db.models import Count, Q
     
-    wards = Ward.objects.filter(is_active=True).prefetch_related('beds').annotate(
-        total_beds=Count('beds'),
-        occupied_beds=Count('beds', filter=Q(beds__status='occupied')),
-        available_beds=Count('beds', filter=Q(beds__status='available')),
-        maintenance_beds=Count('beds', filter=Q(beds__status='maintenance')),
+    wards = Ward.objects.filter(is_active=True).annotate(
+        total_beds=(
+            F('availability__available_beds') + F('availability__occupied_beds') +
+            F('availability__maintenance_beds') + F('availability__reserved_beds')
+        ),
+        occupied_beds=F('availability__occupied_beds'),
+        available_beds=F('availability__available_beds'),
+        maintenance_beds=F('availability__maintenance_beds'),
     )
     
     # Calculate overall statistics
-    total_beds = WardBed.objects.filter(is_active=True).count()
-    occupied_beds = WardBed.objects.filter(status='occupied', is_active=True).count()
+    bed_totals = WardAvailability.totals()
+    total_beds = bed_totals['total_beds']
+    occupied_beds = bed_totals['occupied_beds']
     occupancy_rate = (occupied_beds / total_beds * 100) if total_beds > 0 else 0
     
     # Get recent admissions
@@ -1108,9 +1105,7 @@ def bulk_discharge_patients(request):
                         )
                         
                         # Release bed
-                        admission.bed.patient = None
-                        admission.bed.status = 'available'
-                        admission.bed.save()
+                        admission.bed.release_patient()
                         
                         admission.is_active = False
                         admission.save()
@@ -1163,9 +1158,8 @@ def export_patients_csv(request):
         return redirect('home')
     
     # Get all active admissions
-    admissions = PatientAdmission.objects.filter(
-        is_active=True
-    ).select_related('patient', 'bed__ward').values_list(
+    admissions = PatientAdmission.objects.filter(is_active=True)
+    rows = iter_keyset(admissions, [
         'patient__first_name',
         'patient__last_name',
         'patient__email',
@@ -1174,31 +1168,19 @@ def export_patients_csv(request):
         'admission_date',
         'reason',
         'chief_complaint'
-    )
-    
-    # Create CSV
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="patients_export.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'First Name', 'Last Name', 'Email', 'Bed Number', 'Ward',
-        'Admission Date', 'Reason', 'Chief Complaint'
     ])
     
-    for row in admissions:
-        writer.writerow(row)
-    
     # Log operation
-    BulkOperation.objects.create(
+    bulk_op = BulkOperation.objects.create(
         operation_type='export_patients',
-        status='completed',
+        status='processing',
         initiated_by=request.user,
-        total_records=admissions.count(),
-        successful_records=admissions.count()
     )
     
-    return response
+    return stream_csv('patients_export.csv', [
+        'First Name', 'Last Name', 'Email', 'Bed Number', 'Ward',
+        'Admission Date', 'Reason', 'Chief Complaint'
+    ], rows, bulk_op=bulk_op, compress=wants_gzip(request))
 
 
 @login_required
@@ -1208,45 +1190,15 @@ def export_occupancy_report_csv(request):
         messages.error(request, 'You do not have permission to export reports')
         return redirect('home')
     
-    # Get ward occupancy data
-    wards = Ward.objects.annotate(
-        total_beds=Count('beds'),
-        occupied_beds=Count('beds', filter=Q(beds__status='occupied')),
-        available_beds=Count('beds', filter=Q(beds__status='available')),
-        maintenance_beds=Count('beds', filter=Q(beds__status='maintenance'))
-    )
-    
-    # Create CSV
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="occupancy_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Ward Name', 'Total Beds', 'Occupied', 'Available', 'Maintenance',
-        'Occupancy %'
-    ])
-    
-    for ward in wards:
-        occupancy = (ward.occupied_beds / ward.total_beds * 100) if ward.total_beds > 0 else 0
-        writer.writerow([
-            ward.name,
-            ward.total_beds,
-            ward.occupied_beds,
-            ward.available_beds,
-            ward.maintenance_beds,
-            f'{occupancy:.1f}%'
-        ])
-    
     # Log operation
-    BulkOperation.objects.create(
+    bulk_op = BulkOperation.objects.create(
         operation_type='export_report',
-        status='completed',
+        status='processing',
         initiated_by=request.user,
-        total_records=wards.count(),
-        successful_records=wards.count()
     )
     
-    return response
+    header, rows = export_occupancy_report(None, total_row=False)
+    return stream_csv('occupancy_report.csv', header, rows, bulk_op=bulk_op, compress=wants_gzip(request))
 
 
 # ==================== NOTIFICATION VIEWS ====================
@@ -1342,80 +1294,19 @@ def handle_patient_import(request, csv_file):
     )
     
     try:
-        decoded = csv_file.read().decode('utf-8')
-        reader = csv.DictReader(io.StringIO(decoded))
-        
-        successful = 0
-        failed = 0
-        errors = []
-        
-        with transaction.atomic():
-            for row_num, row in enumerate(reader, start=2):  # Start at 2 (skip header)
-                try:
-                    # Validate and create patient
-                    patient_id = row.get('patient_id', '').strip()
-                    first_name = row.get('first_name', '').strip()
-                    last_name = row.get('last_name', '').strip()
-                    email = row.get('email', '').strip()
-                    phone = row.get('phone', '').strip()
-                    date_of_birth = row.get('date_of_birth', '').strip()
-                    gender = row.get('gender', '').strip()
-                    
-                    if not all([first_name, last_name, email]):
-                        errors.append(f"Row {row_num}: Missing required fields")
-                        failed += 1
-                        continue
-                    
-                    # Check if patient already exists
-                    if User.objects.filter(email=email).exists():
-                        errors.append(f"Row {row_num}: Patient with email {email} already exists")
-                        failed += 1
-                        continue
-                    
-                    # Create patient user account
-                    user = User.objects.create_user(
-                        username=email.split('@')[0] + str(datetime.now().timestamp()),
-                        email=email,
-                        first_name=first_name,
-                        last_name=last_name
-                    )
-                    
-                    # Create patient record
-                    patient = Patient.objects.create(
-                        user=user,
-                        phone=phone,
-                        date_of_birth=date_of_birth if date_of_birth else None,
-                        gender=gender if gender in ['M', 'F', 'O'] else 'O'
-                    )
-                    
-                    successful += 1
-                
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    failed += 1
-        
-        # Update bulk operation record
-        bulk_op.total_records = successful + failed
-        bulk_op.successful_records = successful
-        bulk_op.failed_records = failed
-        bulk_op.status = 'completed' if failed == 0 else 'completed'
-        bulk_op.completed_at = timezone.now()
-        
-        if errors:
-            bulk_op.error_message = '\n'.join(errors[:20])  # Store first 20 errors
-        
-        bulk_op.save()
-        
+        successful, failed = import_patients(csv_file, bulk_op)
         messages.success(
             request,
             f'Import completed: {successful} patients created, {failed} failed'
         )
     
     except Exception as e:
-        bulk_op.status = 'failed'
-        bulk_op.error_message = str(e)
-        bulk_op.completed_at = timezone.now()
-        bulk_op.save()
+        # Counters for chunks already committed were saved by the importer
+        BulkOperation.objects.filter(pk=bulk_op.pk).update(
+            status='failed',
+            error_message=str(e),
+            completed_at=timezone.now()
+        )
         messages.error(request, f'Import failed: {str(e)}')
     
     return redirect('hospital_wards:bulk_operations_list')
@@ -1457,7 +1348,7 @@ def handle_bulk_assignment(request, csv_file, send_notifications):
         failed = 0
         errors = []
         
-        with transaction.atomic():
+        with transaction.atomic(), notification_outbox.muted(not send_notifications):
             for row_num, row in enumerate(reader, start=2):
                 try:
                     patient_id = int(row.get('patient_id', 0))
@@ -1552,7 +1443,7 @@ def handle_bulk_discharge(request, admissions, discharge_notes, send_notificatio
         successful = 0
         failed = 0
         
-        with transaction.atomic():
+        with transaction.atomic(), notification_outbox.muted(not send_notifications):
             for admission in admissions:
                 try:
                     # Create discharge record
@@ -1562,10 +1453,7 @@ def handle_bulk_discharge(request, admissions, discharge_notes, send_notificatio
                     )
                     
                     # Release bed
-                    bed = admission.bed
-                    bed.status = 'available'
-                    bed.current_patient = None
-                    bed.save()
+                    admission.bed.release_patient()
                     
                     # Mark admission as inactive
                     admission.is_active = False
@@ -1607,46 +1495,30 @@ def export_patients_csv(request):
         initiated_by=request.user
     )
     
-    try:
-        # Get all patients with current admissions
-        admissions = PatientAdmission.objects.filter(is_active=True).select_related(
-            'patient__user', 'bed__ward'
-        )
-        
-        # Create CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="patients_export.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Patient ID', 'Name', 'Email', 'Phone', 'Bed', 'Ward', 'Admission Date', 'Reason'])
-        
-        for admission in admissions:
-            writer.writerow([
-                admission.patient.id,
-                admission.patient.user.get_full_name(),
-                admission.patient.user.email,
-                admission.patient.phone,
-                admission.bed.bed_number,
-                admission.bed.ward.name,
-                admission.admission_date.strftime('%Y-%m-%d %H:%M'),
-                admission.reason,
-            ])
-        
-        bulk_op.total_records = admissions.count()
-        bulk_op.successful_records = admissions.count()
-        bulk_op.status = 'completed'
-        bulk_op.completed_at = timezone.now()
-        bulk_op.save()
-        
-        return response
+    # Get all patients with current admissions
+    admissions = PatientAdmission.objects.filter(is_active=True)
+    rows = (
+        [
+            patient_id,
+            f'{first_name} {last_name}'.strip(),
+            email,
+            phone or '',
+            bed_number or '',
+            ward_name or '',
+            timezone.localtime(admission_date).strftime('%Y-%m-%d %H:%M'),
+            reason,
+        ]
+        for patient_id, first_name, last_name, email, phone, bed_number, ward_name, admission_date, reason
+        in iter_keyset(admissions, PATIENT_EXPORT_FIELDS)
+    )
     
-    except Exception as e:
-        bulk_op.status = 'failed'
-        bulk_op.error_message = str(e)
-        bulk_op.completed_at = timezone.now()
-        bulk_op.save()
-        messages.error(request, f'Export failed: {str(e)}')
-        return redirect('hospital_wards:bulk_operations_list')
+    return stream_csv(
+        'patients_export.csv',
+        ['Patient ID', 'Name', 'Email', 'Phone', 'Bed', 'Ward', 'Admission Date', 'Reason'],
+        rows,
+        bulk_op=bulk_op,
+        compress=wants_gzip(request),
+    )
 
 
 @login_required
@@ -1678,18 +1550,21 @@ def handle_report_export(request, data):
     )
     
     try:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{report_type}_report.csv"'
-        writer = csv.writer(response)
-        
         if report_type == 'occupancy':
-            return export_occupancy_report(writer, ward, bulk_op, response)
+            header, rows = export_occupancy_report(ward)
         elif report_type == 'patient_list':
-            return export_patient_list_report(writer, start_date, end_date, ward, bulk_op, response)
+            header, rows = export_patient_list_report(start_date, end_date, ward)
         elif report_type == 'admission_discharge':
-            return export_admission_discharge_report(writer, start_date, end_date, ward, bulk_op, response)
+            header, rows = export_admission_discharge_report(start_date, end_date, ward)
         elif report_type == 'bed_utilization':
-            return export_bed_utilization_report(writer, start_date, end_date, ward, bulk_op, response)
+            header, rows = export_bed_utilization_report(start_date, end_date, ward)
+        else:
+            raise ValueError(f'Unknown report type: {report_type}')
+        
+        return stream_csv(
+            f'{report_type}_report.csv', header, rows,
+            bulk_op=bulk_op, compress=data.get('compress', False)
+        )
     
     except Exception as e:
         bulk_op.status = 'failed'
@@ -1700,53 +1575,57 @@ def handle_report_export(request, data):
         return redirect('hospital_wards:bulk_operations_list')
 
 
-def export_occupancy_report(writer, ward_filter, bulk_op, response):
+# Patient columns shared by the patient exports, as values_list lookups
+PATIENT_EXPORT_FIELDS = [
+    'patient_id',
+    'patient__first_name',
+    'patient__last_name',
+    'patient__email',
+    'patient__profile__phone',
+    'bed__bed_number',
+    'bed__ward__name',
+    'admission_date',
+    'reason',
+]
+
+
+def export_occupancy_report(ward_filter, total_row=True):
     """Export occupancy report"""
     wards = Ward.objects.filter(is_active=True)
     if ward_filter:
         wards = wards.filter(id=ward_filter.id)
     
-    writer.writerow(['Ward', 'Total Beds', 'Occupied', 'Available', 'Maintenance', 'Occupancy %'])
-    
-    total_occupied = 0
-    total_beds = 0
+    header = ['Ward', 'Total Beds', 'Occupied', 'Available', 'Maintenance', 'Occupancy %']
     
-    for ward in wards:
-        total = ward.beds.count()
-        occupied = ward.beds.filter(status='occupied').count()
-        available = ward.beds.filter(status='available').count()
-        maintenance = ward.beds.filter(status='maintenance').count()
-        occupancy_pct = (occupied / total * 100) if total > 0 else 0
+    def rows():
+        total_occupied = 0
+        total_beds = 0
         
-        writer.writerow([
-            ward.name,
-            total,
-            occupied,
-            available,
-            maintenance,
-            f'{occupancy_pct:.1f}%'
-        ])
+        for name, available, occupied, maintenance, reserved in iter_keyset(wards, [
+            'name',
+            'availability__available_beds',
+            'availability__occupied_beds',
+            'availability__maintenance_beds',
+            'availability__reserved_beds',
+        ]):
+            available, occupied, maintenance = available or 0, occupied or 0, maintenance or 0
+            total = available + occupied + maintenance + (reserved or 0)
+            occupancy_pct = (occupied / total * 100) if total > 0 else 0
+            yield [name, total, occupied, available, maintenance, f'{occupancy_pct:.1f}%']
+            
+            total_occupied += occupied
+            total_beds += total
         
-        total_occupied += occupied
-        total_beds += total
+        if total_row:
+            yield []
+            yield ['TOTAL', total_beds, total_occupied, '', '', f'{(total_occupied/total_beds*100):.1f}%' if total_beds > 0 else '0%']
     
-    writer.writerow([])
-    writer.writerow(['TOTAL', total_beds, total_occupied, '', '', f'{(total_occupied/total_beds*100):.1f}%' if total_beds > 0 else '0%'])
-    
-    bulk_op.total_records = wards.count()
-    bulk_op.successful_records = wards.count()
-    bulk_op.status = 'completed'
-    bulk_op.completed_at = timezone.now()
-    bulk_op.save()
-    
-    return response
+    return header, rows()
 
 
-def export_patient_list_report(writer, start_date, end_date, ward_filter, bulk_op, response):
+def export_patient_list_report(start_date, end_date, ward_filter):
     """Export patient list report"""
-    admissions = PatientAdmission.objects.filter(is_active=True).select_related(
-        'patient__user', 'bed__ward'
-    )
+    admissions = PatientAdmission.objects.filter(is_active=True)
     
     if ward_filter:
         admissions = admissions.filter(bed__ward=ward_filter)
@@ -1756,36 +1635,29 @@ def export_patient_list_report(writer, start_date, end_date, ward_filter, bulk_o
     if end_date:
         admissions = admissions.filter(admission_date__lte=end_date)
     
-    writer.writerow(['Patient ID', 'Name', 'Email', 'Phone', 'Bed', 'Ward', 'Admission Date', 'Days Admitted', 'Reason'])
-    
-    for admission in admissions:
-        days = (timezone.now().date() - admission.admission_date.date()).days
-        writer.writerow([
-            admission.patient.id,
-            admission.patient.user.get_full_name(),
-            admission.patient.user.email,
-            admission.patient.phone,
-            admission.bed.bed_number,
-            admission.bed.ward.name,
-            admission.admission_date.strftime('%Y-%m-%d'),
-            days,
-            admission.reason,
-        ])
-    
-    bulk_op.total_records = admissions.count()
-    bulk_op.successful_records = admissions.count()
-    bulk_op.status = 'completed'
-    bulk_op.completed_at = timezone.now()
-    bulk_op.save()
-    
-    return response
+    header = ['Patient ID', 'Name', 'Email', 'Phone', 'Bed', 'Ward', 'Admission Date', 'Days Admitted', 'Reason']
+    today = timezone.localdate()
+    rows = (
+        [
+            patient_id,
+            f'{first_name} {last_name}'.strip(),
+            email,
+            phone or '',
+            bed_number or '',
+            ward_name or '',
+            timezone.localtime(admission_date).strftime('%Y-%m-%d'),
+            (today - timezone.localtime(admission_date).date()).days,
+            reason,
+        ]
+        for patient_id, first_name, last_name, email, phone, bed_number, ward_name, admission_date, reason
+        in iter_keyset(admissions, PATIENT_EXPORT_FIELDS)
+    )
+    return header, rows
 
 
-def export_admission_discharge_report(writer, start_date, end_date, ward_filter, bulk_op, response):
+def export_admission_discharge_report(start_date, end_date, ward_filter):
     """Export admission/discharge summary"""
-    discharges = PatientDischarge.objects.select_related(
-        'admission__patient__user', 'admission__bed__ward'
-    )
+    discharges = PatientDischarge.objects.all()
     
     if ward_filter:
         discharges = discharges.filter(admission__bed__ward=ward_filter)
@@ -1795,63 +1667,61 @@ def export_admission_discharge_report(writer, start_date, end_date, ward_filter,
     if end_date:
         discharges = discharges.filter(created_at__lte=end_date)
     
-    writer.writerow(['Date', 'Patient', 'Ward', 'Admission Date', 'Discharge Date', 'Days Admitted', 'Status'])
-    
-    for discharge in discharges:
-        days = (discharge.created_at.date() - discharge.admission.admission_date.date()).days
-        writer.writerow([
-            discharge.created_at.strftime('%Y-%m-%d'),
-            discharge.admission.patient.user.get_full_name(),
-            discharge.admission.bed.ward.name,
-            discharge.admission.admission_date.strftime('%Y-%m-%d'),
-            discharge.created_at.strftime('%Y-%m-%d'),
-            days,
-            discharge.discharge_status,
+    header = ['Date', 'Patient', 'Ward', 'Admission Date', 'Discharge Date', 'Days Admitted', 'Status']
+    rows = (
+        [
+            timezone.localtime(created_at).strftime('%Y-%m-%d'),
+            f'{first_name} {last_name}'.strip(),
+            ward_name or '',
+            timezone.localtime(admission_date).strftime('%Y-%m-%d'),
+            timezone.localtime(created_at).strftime('%Y-%m-%d'),
+            (timezone.localtime(created_at).date() - timezone.localtime(admission_date).date()).days,
+            discharge_status,
+        ]
+        for created_at, first_name, last_name, ward_name, admission_date, discharge_status
+        in iter_keyset(discharges, [
+            'created_at',
+            'admission__patient__first_name',
+            'admission__patient__last_name',
+            'admission__bed__ward__name',
+            'admission__admission_date',
+            'discharge_status',
         ])
-    
-    bulk_op.total_records = discharges.count()
-    bulk_op.successful_records = discharges.count()
-    bulk_op.status = 'completed'
-    bulk_op.completed_at = timezone.now()
-    bulk_op.save()
-    
-    return response
+    )
+    return header, rows
 
 
-def export_bed_utilization_report(writer, start_date, end_date, ward_filter, bulk_op, response):
+def export_bed_utilization_report(start_date, end_date, ward_filter):
     """Export bed utilization report"""
-    beds = WardBed.objects.filter(is_active=True).select_related('ward')
+    beds = WardBed.objects.filter(is_active=True)
     
     if ward_filter:
         beds = beds.filter(ward=ward_filter)
     
-    writer.writerow(['Ward', 'Bed Number', 'Status', 'Current Patient', 'Assigned Since', 'Days Occupied'])
-    
-    for bed in beds:
-        days = ''
-        if bed.current_patient and bed.status == 'occupied':
-            admission = PatientAdmission.objects.filter(
-                bed=bed, is_active=True
-            ).first()
-            if admission:
-                days = (timezone.now().date() - admission.admission_date.date()).days
-        
-        writer.writerow([
-            bed.ward.name,
-            bed.bed_number,
-            bed.get_status_display(),
-            bed.current_patient.user.get_full_name() if bed.current_patient else 'N/A',
-            '',
-            days if days != '' else '0',
+    header = ['Ward', 'Bed Number', 'Status', 'Current Patient', 'Assigned Since', 'Days Occupied']
+    status_labels = dict(WardBed.BED_STATUS_CHOICES)
+    today = timezone.localdate()
+    rows = (
+        [
+            ward_name,
+            bed_number,
+            status_labels.get(status, status),
+            f'{first_name} {last_name}'.strip() if patient_id else 'N/A',
+            timezone.localtime(assigned_at).strftime('%Y-%m-%d') if assigned_at else '',
+            (today - timezone.localtime(assigned_at).date()).days if assigned_at and status == 'occupied' else 0,
+        ]
+        for ward_name, bed_number, status, patient_id, first_name, last_name, assigned_at
+        in iter_keyset(beds, [
+            'ward__name',
+            'bed_number',
+            'status',
+            'patient_id',
+            'patient__first_name',
+            'patient__last_name',
+            'assigned_at',
         ])
-    
-    bulk_op.total_records = beds.count()
-    bulk_op.successful_records = beds.count()
-    bulk_op.status = 'completed'
-    bulk_op.completed_at = timezone.now()
-    bulk_op.save()
-    
-    return response
+    )
+    return header, rows
 
 
 @login_required
@@ -0,0 +1,188 @@
+"""
+Live Ward Feed
+Versioned ward snapshots and per-bed deltas for WardConsumer groups.
+
+Every committed bed change bumps WardAvailability.feed_sequence and broadcasts
+a delta (changed beds + counters) to the ward's channel group once, so the
+consumers only forward it and never touch the database. Recent deltas and the
+latest snapshot are kept in the cache so lagging clients can resync by
+sequence number without re-serializing the ward for every socket.
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Ward, WardAvailability
+
+logger = logging.getLogger(__name__)
+
+# How long deltas and snapshots stay replayable (seconds)
+FEED_CACHE_TIMEOUT = 10 * 60
+
+# Beyond this many missed deltas a client is sent a full snapshot instead
+MAX_REPLAY_DELTAS = 100
+
+
+def group_name(ward_id):
+    """Channel group that WardConsumer sockets for a ward join"""
+    return f'ward_{ward_id}'
+
+
+def _delta_key(ward_id, seq):
+    return f'ward_feed:{ward_id}:delta:{seq}'
+
+
+def _snapshot_key(ward_id):
+    return f'ward_feed:{ward_id}:snapshot'
+
+
+def serialize_bed(bed):
+    """Bed payload shared by snapshots and deltas"""
+    return {
+        'id': bed.id,
+        'bed_number': bed.bed_number,
+        'status': bed.status,
+        'patient': {
+            'id': bed.patient.id,
+            'name': bed.patient.get_full_name(),
+        } if bed.patient_id else None,
+        'assigned_date': bed.assigned_at.isoformat() if bed.assigned_at else None,
+    }
+
+
+def _serialize_counters(counters):
+    return {
+        field: counters[field] for field in WardAvailability.STATUS_FIELDS.values()
+    }
+
+
+def build_snapshot(ward_id):
+    """Serialize a ward and all its active beds from the database"""
+    with transaction.atomic():
+        ward = Ward.objects.filter(id=ward_id, is_active=True).select_related('availability').first()
+        if ward is None:
+            return None
+        availability = ward.get_counters()
+        beds = ward.beds.filter(is_active=True).select_related('patient')
+
+        counters = {
+            field: getattr(availability, field) for field in WardAvailability.STATUS_FIELDS.values()
+        }
+        return {
+            'ward_id': ward.id,
+            'ward_name': ward.name,
+            'seq': availability.feed_sequence,
+            'total_beds': availability.total_beds,
+            'counters': counters,
+            'beds': [serialize_bed(bed) for bed in beds],
+            'timestamp': timezone.now().isoformat(),
+        }
+
+
+def get_snapshot(ward_id):
+    """Latest ward snapshot, built from the database only on a cache miss"""
+    snapshot = cache.get(_snapshot_key(ward_id))
+    if snapshot is None:
+        snapshot = build_snapshot(ward_id)
+        if snapshot is not None:
+            cache.set(_snapshot_key(ward_id), snapshot, FEED_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_deltas_since(ward_id, since):
+    """
+    Deltas after sequence ``since`` still held in the cache, in order.
+
+    Returns None when the missed deltas cannot all be replayed (expired,
+    missing from the cache, or more than MAX_REPLAY_DELTAS of them), in which
+    case the client needs a full snapshot.
+    """
+    # One key past the limit tells a client that is too far behind
+    keys = [_delta_key(ward_id, seq) for seq in range(since + 1, since + MAX_REPLAY_DELTAS + 2)]
+    found = cache.get_many(keys)
+    deltas = []
+    for key in keys:
+        if key not in found:
+            break
+        deltas.append(found[key])
+    if not deltas or len(deltas) > MAX_REPLAY_DELTAS or len(deltas) < len(found):
+        return None
+    return deltas
+
+
+def _apply_to_snapshot(delta):
+    """Roll the cached snapshot forward, or drop it if it is not the direct predecessor"""
+    key = _snapshot_key(delta['ward_id'])
+    snapshot = cache.get(key)
+    if snapshot is None:
+        return
+    if snapshot['seq'] != delta['seq'] - 1:
+        cache.delete(key)
+        return
+
+    changed = {bed['id']: bed for bed in delta['beds']}
+    removed = set(delta['removed']) | set(changed)
+    beds = [bed for bed in snapshot['beds'] if bed['id'] not in removed]
+    beds.extend(changed.values())
+    beds.sort(key=lambda bed: bed['bed_number'])
+
+    snapshot.update(
+        seq=delta['seq'],
+        counters=delta['counters'],
+        total_beds=sum(delta['counters'].values()),
+        beds=beds,
+        timestamp=delta['timestamp'],
+    )
+    cache.set(key, snapshot, FEED_CACHE_TIMEOUT)
+
+
+def publish_delta(delta):
+    """Store a delta for replay and fan it out to the ward's sockets once"""
+    cache.set(_delta_key(delta['ward_id'], delta['seq']), delta, FEED_CACHE_TIMEOUT)
+    _apply_to_snapshot(delta)
+
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        async_to_sync(channel_layer.group_send)(
+            group_name(delta['ward_id']),
+            {'type': 'ward.delta', 'delta': delta}
+        )
+    except Exception as e:
+        logger.warning(f"Could not broadcast ward {delta['ward_id']} delta {delta['seq']}: {e}")
+
+
+def record_change(ward_id, beds=(), removed=()):
+    """
+    Version a change to a ward's beds and publish it once the transaction commits.
+
+    Must run inside the transaction that changed the beds so the sequence bump
+    and counters read here are consistent with it.
+    """
+    updated = WardAvailability.objects.filter(ward_id=ward_id).update(
+        feed_sequence=F('feed_sequence') + 1
+    )
+    if not updated:
+        return None
+
+    counters = WardAvailability.objects.filter(ward_id=ward_id).values(
+        'feed_sequence', *WardAvailability.STATUS_FIELDS.values()
+    ).get()
+    delta = {
+        'ward_id': ward_id,
+        'seq': counters['feed_sequence'],
+        'counters': _serialize_counters(counters),
+        'beds': [serialize_bed(bed) for bed in beds],
+        'removed': list(removed),
+        'timestamp': timezone.now().isoformat(),
+    }
+    transaction.on_commit(lambda: publish_delta(delta))
+    return delta
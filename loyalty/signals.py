@@ -1,62 +1,68 @@
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
-from orders.models import Order, OrderStatus
-from .models import LoyaltyPoints
+from django.db import transaction
+from django.utils import timezone
+from orders.events import subscriber
+from orders.models import OrderStatus
+from .models import LoyaltyPoints, PointsTransaction, TransactionType
 
 
-# Store the old status before save
-_old_order_status = {}
-
-
-@receiver(pre_save, sender=Order)
-def store_old_order_status(sender, instance, **kwargs):
-    """Store the old status before saving"""
-    if instance.pk:
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            _old_order_status[instance.pk] = old_instance.status
-        except Order.DoesNotExist:
-            _old_order_status[instance.pk] = None
-    else:
-        _old_order_status[instance.pk] = None
-
-
-@receiver(post_save, sender=Order)
-def award_loyalty_points(sender, instance, created, **kwargs):
-    """Award loyalty points when order status changes to DELIVERED"""
+@subscriber
+def award_loyalty_points(events):
+    """Award loyalty points, once per order, for orders that became DELIVERED"""
     # Only award points when order status changes to DELIVERED (not on creation)
-    if not created and instance.status == OrderStatus.DELIVERED:
-        old_status = _old_order_status.get(instance.pk)
+    delivered = {
+        event.order_id: event.order
+        for event in events if not event.created and event.entered(OrderStatus.DELIVERED)
+    }
+    if not delivered:
+        return
+    
+    # Skip orders that already earned points
+    awarded = set(
+        PointsTransaction.objects.filter(order_id__in=delivered).values_list('order_id', flat=True)
+    )
+    orders = [order for order_id, order in delivered.items() if order_id not in awarded]
+    if not orders:
+        return
+    
+    from notifications import badges
+    from notifications.models import Notification, NotificationType
+    
+    with transaction.atomic():
+        user_ids = {order.user_id for order in orders}
+        balances = {
+            points.user_id: points
+            for points in LoyaltyPoints.objects.select_for_update().filter(user_id__in=user_ids)
+        }
+        missing = [LoyaltyPoints(user_id=user_id) for user_id in user_ids - set(balances)]
+        for points in LoyaltyPoints.objects.bulk_create(missing):
+            balances[points.user_id] = points
         
-        # Only award if status actually changed to DELIVERED
-        if old_status != OrderStatus.DELIVERED:
-            # Check if points were already awarded for this order
-            if instance.points_transactions.exists():
-                return
-            
-            # Get or create loyalty points for user
-            loyalty_points, _ = LoyaltyPoints.objects.get_or_create(user=instance.user)
-            
+        now = timezone.now()
+        transactions, notifications = [], []
+        for order in orders:
+            loyalty_points = balances[order.user_id]
             # Calculate points from order total
-            points = loyalty_points.calculate_points_from_order(instance.total)
-            
-            if points > 0:
-                # Award points
-                loyalty_points.add_points(
-                    points=points,
-                    reason=f"Order {instance.order_number} delivered",
-                    order=instance
-                )
-                
-                # Create notification
-                from notifications.models import Notification
-                Notification.create_loyalty_notification(
-                    user=instance.user,
-                    title="Points Earned!",
-                    message=f"You've earned {points} loyalty points for your order {instance.order_number}. Your new balance is {loyalty_points.total_points} points."
-                )
+            points = loyalty_points.calculate_points_from_order(order.total)
+            if points <= 0:
+                continue
+            loyalty_points.total_points += points
+            loyalty_points.lifetime_points += points
+            loyalty_points.updated_at = now
+            transactions.append(PointsTransaction(
+                user_id=order.user_id,
+                points=points,
+                transaction_type=TransactionType.EARNED,
+                reason=f"Order {order.order_number} delivered",
+                order=order
+            ))
+            notifications.append(Notification(
+                user_id=order.user_id,
+                notification_type=NotificationType.LOYALTY,
+                title="Points Earned!",
+                message=f"You've earned {points} loyalty points for your order {order.order_number}. Your new balance is {loyalty_points.total_points} points."
+            ))
         
-        # Clean up
-        if instance.pk in _old_order_status:
-            del _old_order_status[instance.pk]
-
+        LoyaltyPoints.objects.bulk_update(balances.values(), ['total_points', 'lifetime_points', 'updated_at'])
+        PointsTransaction.objects.bulk_create(transactions)
+        Notification.objects.bulk_create(notifications)
+        badges.changed(notification.user_id for notification in notifications)
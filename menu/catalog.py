@@ -0,0 +1,164 @@
+"""
+Menu Catalog Cache
+Versioned read-through cache for the menu_list and menu_detail pages.
+
+Every MenuItem, Category, DietaryTag and Review write bumps one global
+catalog version once its transaction commits. The version is a millisecond
+timestamp, so it also gives the pages their Last-Modified. It is kept in the
+cache for good when every process shares it (SHARED_CACHE). With a
+per-process cache a bump reaches only the process that made it, so each
+process starts a new version every LOCAL_VERSION_TIMEOUT seconds instead. Everything cached
+here is keyed by it, so a bump invalidates every entry at once without
+deleting any, and stale entries expire on their own.
+
+Cached per version:
+- the active categories and the dietary tags of the filter sidebar
+- one entry per (normalized filter params, page): the page's item ids, the
+  total count and, with filters, the facet counts
+- one entry per item detail: the item, related items, rating distribution
+  and recent reviews
+
+Item objects for list pages come from the recommendations catalog, which
+holds every available item with its category and tags. With anonymous
+visitors without a session, a warm list page runs no queries, and
+``etag``/``last_modified`` let browsers revalidate it with a 304.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'menu_catalog:version'
+
+# Seconds an entry is kept; a version bump makes it unreachable sooner
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Seconds a version is kept without a shared cache; bumps made by other
+# processes show up within this delay
+LOCAL_VERSION_TIMEOUT = 60
+
+# Query parameters of menu_list that select its results
+FILTER_PARAMS = (
+    'search', 'category', 'dietary_tags', 'min_price', 'max_price',
+    'max_calories', 'min_protein', 'max_carbs', 'max_fat',
+)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+# ==================== VERSION ====================
+
+def _version_timeout():
+    return None if settings.SHARED_CACHE else LOCAL_VERSION_TIMEOUT
+
+
+def get_version():
+    """Current catalog version, starting one when the cache has none"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _now_ms(), _version_timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump():
+    cache.set(VERSION_KEY, max(_now_ms(), (cache.get(VERSION_KEY) or 0) + 1), _version_timeout())
+
+
+def bump_version():
+    """Move to a new catalog version once the current transaction commits"""
+    from . import recommendations
+
+    # List pages take their item objects from the recommendations catalog
+    recommendations.invalidate_catalog()
+    transaction.on_commit(_bump)
+
+
+def last_modified_at(version):
+    return datetime.fromtimestamp(version / 1000, tz=dt_timezone.utc)
+
+
+# ==================== CONDITIONAL GET ====================
+
+def _conditional(request):
+    # Only visitors without a session get 304s: signed-in pages and flash messages vary per session
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def etag(request, *args, **kwargs):
+    """Catalog ETag of a page for visitors without a session, otherwise None"""
+    if not _conditional(request):
+        return None
+    params = normalize_params(request.GET, extra=('page',))
+    return hashlib.sha1(f"{get_version()}:{request.path}:{params}".encode()).hexdigest()
+
+
+def last_modified(request, *args, **kwargs):
+    if not _conditional(request):
+        return None
+    return last_modified_at(get_version())
+
+
+# ==================== CACHED READS ====================
+
+def normalize_params(query, extra=()):
+    """Filter params of a QueryDict in a canonical string: sorted, de-duplicated, empty values dropped"""
+    pairs = []
+    for name in sorted((*FILTER_PARAMS, *extra)):
+        values = sorted({value.strip() for value in query.getlist(name) if value.strip()})
+        pairs.extend(f"{name}={value}" for value in values)
+    return '&'.join(pairs)
+
+
+def _key(version, name, params=''):
+    digest = hashlib.sha1(params.encode()).hexdigest() if params else ''
+    return f"menu_catalog:{version}:{name}:{digest}"
+
+
+def cached(version, name, build, params=''):
+    """Read-through get of ``build()`` under the catalog version"""
+    key = _key(version, name, params)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, CATALOG_CACHE_TIMEOUT)
+    return value
+
+
+def get_categories(version):
+    from .models import Category
+
+    return cached(version, 'categories', lambda: list(Category.objects.filter(is_active=True)))
+
+
+def get_dietary_tags(version):
+    from .models import DietaryTag
+
+    return cached(version, 'dietary_tags', lambda: list(DietaryTag.objects.all()))
+
+
+def get_result_page(version, params, build):
+    """``{'ids', 'count', 'number', 'facets'}`` of one filtered list page, from ``build()`` on a miss"""
+    return cached(version, 'results', build, params)
+
+
+def get_items(item_ids):
+    """Available items, with category and dietary tags, from the recommendations catalog"""
+    from . import recommendations
+
+    items = recommendations.get_catalog()['items']
+    if any(item_id not in items for item_id in item_ids):
+        # The catalog predates the page entry; rebuild it once
+        items = recommendations.refresh_catalog()['items']
+    return [items[item_id] for item_id in item_ids if item_id in items]
+
+
+def get_item_detail(version, item_id, build):
+    """``{'item', 'related', 'rating_distribution', 'recent_reviews'}`` of one item, from ``build()`` on a miss"""
+    return cached(version, f'item:{item_id}', build)
@@ -0,0 +1,223 @@
+"""
+Menu Image Pipeline
+Content-addressed renditions of menu item images, built off the request path.
+
+A saved MenuItem is only queued when its image name differs from the source
+recorded in ``image_manifest``, so saving price or availability edits never
+touches the file. Queued images are hashed, and unchanged content keeps its
+existing renditions. Otherwise the image is decoded once and every rendition
+in RENDITIONS is encoded from it. Larger sizes are resized first, and smaller
+ones are derived from them. Files are named after the content hash, so the
+same photo uploaded twice shares its renditions.
+
+Rendering runs in a process pool of MENU_IMAGE_WORKERS processes. The
+manifest is stored with a queryset update guarded on the image name, so a
+newer upload is never overwritten by an older job. With no workers, images
+are rendered on the committing thread (tests, management commands). Worker
+functions only use PIL and the file system; models are imported where they
+are needed.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# name: (longest side in px, format, quality); largest first, each size resized from the previous one
+RENDITIONS = {
+    'full': (1200, 'JPEG', 85),
+    'full_webp': (1200, 'WEBP', 80),
+    'card': (600, 'JPEG', 82),
+    'card_webp': (600, 'WEBP', 80),
+    'thumb': (300, 'JPEG', 80),
+}
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+# Storage directory of rendition files
+RENDITION_DIR = 'menu_items/renditions'
+
+
+# ==================== RENDERING (worker processes) ====================
+
+def content_hash(path, chunk_size=1 << 20):
+    """sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _flatten(img):
+    """RGB copy of an image, transparent areas on white"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert('RGB')
+
+
+def render_renditions(source_path, output_dir, previous_hash=None):
+    """
+    Write every rendition of an image into ``output_dir``.
+
+    Returns ``(hash, {name: (file name, width, height)})``. The renditions
+    are None when the content hash equals ``previous_hash``.
+    """
+    digest = content_hash(source_path)
+    if digest == previous_hash:
+        return digest, None
+
+    os.makedirs(output_dir, exist_ok=True)
+    renditions = {}
+    with Image.open(source_path) as source:
+        source.draft('RGB', (max(size for size, _, _ in RENDITIONS.values()),) * 2)
+        img = _flatten(ImageOps.exif_transpose(source))
+    for name, (size, image_format, quality) in RENDITIONS.items():
+        if img.width > size or img.height > size:
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        filename = f"{digest[:16]}_{name}.{EXTENSIONS[image_format]}"
+        img.save(os.path.join(output_dir, filename), image_format, quality=quality, optimize=True)
+        renditions[name] = (filename, img.width, img.height)
+    return digest, renditions
+
+
+# ==================== SCHEDULING ====================
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process pool shared by saves, started on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=settings.MENU_IMAGE_WORKERS)
+    return _pool
+
+
+def needs_processing(item):
+    """Whether the item's image differs from the one its manifest was built from"""
+    manifest = item.image_manifest or {}
+    if not item.image:
+        return bool(manifest)
+    return manifest.get('source') != item.image.name
+
+
+def _manifest(image_name, previous, digest, renditions):
+    if renditions is None:
+        return {**previous, 'source': image_name}
+    return {
+        'source': image_name,
+        'hash': digest,
+        'renditions': {
+            name: {'name': f"{RENDITION_DIR}/{filename}", 'width': width, 'height': height}
+            for name, (filename, width, height) in renditions.items()
+        },
+    }
+
+
+def store_manifest(item_id, image_name, manifest):
+    """Save a manifest unless the item's image changed meanwhile; returns whether it was saved"""
+    from .models import MenuItem
+
+    from . import catalog
+
+    stored = bool(MenuItem.objects.filter(pk=item_id, image=image_name).update(image_manifest=manifest))
+    if stored:
+        # Cached menu pages link the renditions
+        catalog.bump_version()
+    return stored
+
+
+def _job(item):
+    """Arguments for render_renditions, or None when the item's image is gone"""
+    if not item.image:
+        return None
+    previous = item.image_manifest or {}
+    return (default_storage.path(item.image.name), default_storage.path(RENDITION_DIR), previous.get('hash'))
+
+
+def process_item(item, workers=None):
+    """
+    Build the renditions of one item's current image.
+
+    Runs in the pool when MENU_IMAGE_WORKERS is set (returning the future),
+    otherwise here (returning whether a manifest was stored).
+    """
+    from .models import MenuItem
+
+    image_name = item.image.name if item.image else ''
+    previous = item.image_manifest or {}
+    job = _job(item)
+    if job is None:
+        MenuItem.objects.filter(pk=item.pk, image__in=['', None]).update(image_manifest={})
+        return False
+
+    workers = settings.MENU_IMAGE_WORKERS if workers is None else workers
+    if not workers:
+        try:
+            digest, renditions = render_renditions(*job)
+        except Exception as e:
+            logger.error(f"Rendering image of menu item {item.pk} failed: {e}")
+            return False
+        return store_manifest(item.pk, image_name, _manifest(image_name, previous, digest, renditions))
+
+    future = get_pool().submit(render_renditions, *job)
+
+    def done(future):
+        close_old_connections()
+        try:
+            digest, renditions = future.result()
+            store_manifest(item.pk, image_name, _manifest(image_name, previous, digest, renditions))
+        except Exception as e:
+            logger.error(f"Rendering image of menu item {item.pk} failed: {e}")
+        finally:
+            close_old_connections()
+
+    future.add_done_callback(done)
+    return future
+
+
+def process_items(items, workers=None):
+    """Build renditions for many items across the pool; returns how many manifests were stored"""
+    items = [item for item in items if item.image]
+    workers = settings.MENU_IMAGE_WORKERS if workers is None else workers
+    if not workers:
+        return sum(1 for item in items if process_item(item, workers=0))
+
+    stored = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(item, pool.submit(render_renditions, *_job(item))) for item in items]
+        for item, future in futures:
+            try:
+                digest, renditions = future.result()
+            except Exception as e:
+                logger.error(f"Rendering image of menu item {item.pk} failed: {e}")
+                continue
+            manifest = _manifest(item.image.name, item.image_manifest or {}, digest, renditions)
+            stored += store_manifest(item.pk, item.image.name, manifest)
+    return stored
+
+
+def delete_renditions(manifest, keep_hashes=()):
+    """Remove a manifest's rendition files unless another item still uses the same content"""
+    if not manifest or manifest.get('hash') in keep_hashes:
+        return
+    for rendition in manifest.get('renditions', {}).values():
+        if default_storage.exists(rendition['name']):
+            default_storage.delete(rendition['name'])
+
@@ -0,0 +1,46 @@
+"""
+Management command to build processed image renditions for menu items
+Run it after bulk imports, or with --force after changing menu.images.RENDITIONS
+Usage: python manage.py build_menu_renditions [--force] [--workers 4]
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from menu import images
+from menu.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Build thumbnail, card and full-size renditions for menu item images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild every image, including ones already processed'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.MENU_IMAGE_WORKERS,
+            help=f'Rendering processes; 0 renders here (default: {settings.MENU_IMAGE_WORKERS})'
+        )
+
+    def handle(self, *args, **options):
+        items = MenuItem.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_manifest')
+        if options['force']:
+            items = list(items)
+            for item in items:
+                item.image_manifest = {}
+        else:
+            items = [item for item in items if images.needs_processing(item)]
+
+        if not items:
+            self.stdout.write(self.style.SUCCESS('All menu images are processed'))
+            return
+
+        stored = images.process_items(items, workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f'Built renditions for {stored} of {len(items)} menu items'))
+        if stored < len(items):
+            self.stdout.write(self.style.WARNING(f'{len(items) - stored} images failed; see the log'))
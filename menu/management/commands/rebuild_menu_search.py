@@ -0,0 +1,23 @@
+"""
+Management command to rebuild the menu full-text search index
+Run it after bulk imports or raw SQL edits that bypass the MenuItem signals
+Usage: python manage.py rebuild_menu_search
+"""
+
+from django.core.management.base import BaseCommand
+
+from menu.search import create_index, fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 search index for menu items'
+
+    def handle(self, *args, **options):
+        if not fts_available() and not create_index():
+            self.stdout.write(
+                self.style.WARNING('FTS5 is not available on this database; menu search uses LIKE matching')
+            )
+            return
+
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} menu items'))
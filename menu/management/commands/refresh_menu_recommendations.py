@@ -0,0 +1,32 @@
+"""
+Management command to rebuild the cached menu recommendation catalog
+Run it periodically (e.g. every 10 minutes from cron) so page views never build it
+Usage: python manage.py refresh_menu_recommendations [--rebuild-affinities]
+"""
+
+from django.core.management.base import BaseCommand
+
+from menu.recommendations import rebuild_affinities, refresh_catalog
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached popular / highly rated menu catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild-affinities',
+            action='store_true',
+            help='Also recompute every user\'s category and tag affinity from order history',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild_affinities']:
+            users = rebuild_affinities()
+            self.stdout.write(f'Rebuilt menu affinities for {users} users')
+
+        catalog = refresh_catalog()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Cached recommendation catalog with {len(catalog['items'])} available items"
+            )
+        )
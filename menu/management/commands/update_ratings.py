@@ -1,10 +1,11 @@
 """
 Management command to update cached ratings for all menu items
-Run this after adding the average_rating and total_reviews fields
+Reviews keep the ratings current; this recomputes them in bulk
+(see also: python manage.py repair_review_aggregates)
 """
 
 from django.core.management.base import BaseCommand
-from menu.models import MenuItem
+from reviews.aggregates import rebuild_rating_aggregates
 
 
 class Command(BaseCommand):
@@ -13,31 +14,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Updating ratings for all menu items...')
         
-        menu_items = MenuItem.objects.all()
-        total = menu_items.count()
-        updated = 0
-        
-        for menu_item in menu_items:
-            menu_item.update_average_rating()
-            updated += 1
-            if updated % 10 == 0:
-                self.stdout.write(f'Updated {updated}/{total} items...')
+        updated = rebuild_rating_aggregates()
         
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully updated ratings for {updated} menu items'
             )
         )
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0004_menuitem_average_rating_menuitem_total_reviews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_counts', models.JSONField(blank=True, default=dict, help_text='Ordered lines per category id')),
+                ('tag_counts', models.JSONField(blank=True, default=dict, help_text='Ordered lines per dietary tag id')),
+                ('ordered_items', models.JSONField(blank=True, default=list, help_text='Menu item ids already ordered')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='menu_affinity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Menu Affinities',
+            },
+        ),
+    ]
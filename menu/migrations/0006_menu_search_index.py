@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 menu search table on SQLite"""
+    from menu.search import create_index
+    create_index(using=schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from menu.search import drop_index
+    drop_index(using=schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0005_menu_affinity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0006_menu_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_manifest',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
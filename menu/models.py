@@ -1,8 +1,9 @@
 from django.db import models
+from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from decimal import Decimal
-import os
 from .validators import validate_image_size, validate_image_format, validate_image_dimensions
 
 
@@ -69,6 +70,10 @@ class MenuItem(models.Model):
     is_available = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
     
+    # Processed image renditions, written by menu.images:
+    # {"source": image name, "hash": sha256, "renditions": {name: {"name", "width", "height"}}}
+    image_manifest = models.JSONField(default=dict, blank=True, editable=False)
+    
     # Rating cache (updated automatically when reviews are added/updated)
     average_rating = models.DecimalField(
         max_digits=3,
@@ -81,6 +86,14 @@ class MenuItem(models.Model):
         help_text="Total number of approved reviews"
     )
     
+    # Running rating aggregates of approved reviews, kept by reviews.aggregates
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -92,54 +105,51 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.name} - {self.category.name}"
     
-    def get_thumbnail_url(self):
-        """Get thumbnail URL if exists, otherwise return original image URL"""
+    def get_rendition_url(self, name):
+        """URL of a processed rendition from the manifest, falling back to the original image"""
         if not self.image:
             return None
         
-        try:
-            # Try to find thumbnail
-            if hasattr(self.image, 'path') and os.path.exists(self.image.path):
-                image_path = str(self.image.path)
-                # Generate thumbnail path
-                base_path = os.path.splitext(image_path)[0]
-                ext = os.path.splitext(image_path)[1]
-                thumbnail_path = f"{base_path}_thumb.jpg"
-                
-                if os.path.exists(thumbnail_path):
-                    # Return thumbnail URL
-                    image_url = str(self.image.url)
-                    base_url = os.path.splitext(image_url)[0]
-                    return f"{base_url}_thumb.jpg"
-        except Exception:
-            pass
+        manifest = self.image_manifest or {}
+        rendition = manifest.get('renditions', {}).get(name)
+        if rendition and manifest.get('source') == self.image.name:
+            return default_storage.url(rendition['name'])
         
-        # Fallback to original image
-        return self.image.url if self.image else None
+        # Fallback to original image (not processed yet)
+        return self.image.url
+    
+    def get_thumbnail_url(self):
+        """Get thumbnail URL if processed, otherwise return original image URL"""
+        return self.get_rendition_url('thumb')
     
     def update_average_rating(self):
-        """Update cached average rating and total reviews count"""
-        from reviews.models import Review
-        from django.db.models import Avg, Count
-        
-        stats = Review.objects.filter(
-            menu_item=self,
-            is_approved=True
-        ).aggregate(
-            avg_rating=Avg('rating'),
-            total_reviews=Count('id')
-        )
+        """Recompute cached rating aggregates from scratch (reviews keep them current incrementally)"""
+        from reviews.aggregates import RATING_FIELDS, rebuild_rating_aggregates
         
-        self.average_rating = stats['avg_rating'] or Decimal('0.00')
-        self.total_reviews = stats['total_reviews'] or 0
-        # Save without triggering signals to avoid recursion
-        MenuItem.objects.filter(id=self.id).update(
-            average_rating=self.average_rating,
-            total_reviews=self.total_reviews
-        )
+        rebuild_rating_aggregates(item_ids=[self.pk])
+        self.refresh_from_db(fields=RATING_FIELDS)
+    
+    def get_rating_distribution(self):
+        """Approved review count per star, as {"1": n, ..., "5": n}"""
+        return {str(star): getattr(self, f'rating_{star}_count') for star in range(1, 6)}
     
     def get_rating_display(self):
         """Get formatted rating display"""
         if self.total_reviews == 0:
             return "No ratings yet"
         return f"{self.average_rating:.1f} ({self.total_reviews} review{'s' if self.total_reviews != 1 else ''})"
+
+
+class MenuAffinity(models.Model):
+    """Per-user category and dietary tag affinity built from delivered orders"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='menu_affinity')
+    category_counts = models.JSONField(default=dict, blank=True, help_text="Ordered lines per category id")
+    tag_counts = models.JSONField(default=dict, blank=True, help_text="Ordered lines per dietary tag id")
+    ordered_items = models.JSONField(default=list, blank=True, help_text="Menu item ids already ordered")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Menu Affinities"
+
+    def __str__(self):
+        return f"Menu affinity for {self.user.username}"
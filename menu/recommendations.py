@@ -0,0 +1,256 @@
+"""
+Menu Recommendations
+Cached popular, highly rated and personalized menu item lists for menu_list
+and menu_detail.
+
+The catalog (every available item with its category and dietary tags, plus
+the popular, highly rated and featured rankings) is built in a few queries
+and cached as one entry. Popularity comes from the analytics OrderItemRollup
+table and ratings from MenuItem's denormalized average, so a rebuild never
+scans order or review history. Menu item, order item and review writes drop
+the entry on commit; `manage.py refresh_menu_recommendations` rebuilds it
+ahead of its timeout.
+
+Each user's MenuAffinity (ordered lines per category and dietary tag) is
+built from their history on first use and then updated incrementally when
+one of their orders is delivered. Their ranked recommendations are cached
+against the catalog version, so a page view reads the catalog and the user's
+list with a single ``cache.get_many``.
+"""
+
+import logging
+import uuid
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import MenuAffinity, MenuItem
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_KEY = 'menu_recs:catalog'
+
+# Seconds before the catalog is rebuilt even without writes
+CATALOG_CACHE_TIMEOUT = 15 * 60
+
+# Seconds a user's ranked list is kept
+USER_CACHE_TIMEOUT = 60 * 60
+
+# Items kept per precomputed list; views slice what they show
+RANKED_LIST_SIZE = 12
+
+# Order statuses whose items count towards a user's affinity
+AFFINITY_STATUSES = ('delivered', 'ready')
+
+
+def _user_key(user_id):
+    return f'menu_recs:user:{user_id}'
+
+
+# ==================== CATALOG ====================
+
+def build_catalog():
+    """Rank the available menu from denormalized ratings and order rollups"""
+    from analytics.models import OrderItemRollup
+
+    items = list(
+        MenuItem.objects.filter(is_available=True)
+        .select_related('category').prefetch_related('dietary_tags')
+    )
+    order_counts = dict(
+        OrderItemRollup.objects.filter(menu_item__is_available=True)
+        .values('menu_item_id').annotate(total=Sum('line_count'))
+        .order_by().values_list('menu_item_id', 'total')
+    )
+
+    popular = sorted(items, key=lambda item: (-order_counts.get(item.id, 0), not item.is_featured))
+    highly_rated = sorted(
+        (item for item in items if item.total_reviews >= 1 and item.average_rating >= 4),
+        key=lambda item: (-item.average_rating, -item.total_reviews)
+    )
+
+    return {
+        'version': uuid.uuid4().hex,
+        'items': {item.id: item for item in items},
+        'features': {
+            item.id: (item.category_id, [tag.id for tag in item.dietary_tags.all()]) for item in items
+        },
+        'popular': [item.id for item in popular],
+        'highly_rated': [item.id for item in highly_rated[:RANKED_LIST_SIZE]],
+        'featured': [item.id for item in items if item.is_featured],
+    }
+
+
+def refresh_catalog():
+    """Rebuild and cache the catalog, returning it"""
+    catalog = build_catalog()
+    cache.set(CATALOG_CACHE_KEY, catalog, CATALOG_CACHE_TIMEOUT)
+    return catalog
+
+
+def get_catalog():
+    """The cached catalog, rebuilt on a miss"""
+    catalog = cache.get(CATALOG_CACHE_KEY)
+    if catalog is None:
+        catalog = refresh_catalog()
+    return catalog
+
+
+def invalidate_catalog():
+    """Drop the cached catalog once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(CATALOG_CACHE_KEY))
+
+
+# ==================== USER AFFINITY ====================
+
+def _order_lines(order_ids):
+    """``(user_id, menu_item_id, category_id, [tag ids])`` for every line of the given orders"""
+    from orders.models import OrderItem
+
+    lines = list(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values_list('order__user_id', 'menu_item_id', 'menu_item__category_id')
+    )
+    tags = {}
+    for item_id, tag_id in MenuItem.dietary_tags.through.objects.filter(
+        menuitem_id__in={line[1] for line in lines}
+    ).values_list('menuitem_id', 'dietarytag_id'):
+        tags.setdefault(item_id, []).append(tag_id)
+    return [(user_id, item_id, category_id, tags.get(item_id, [])) for user_id, item_id, category_id in lines]
+
+
+def _apply_lines(affinity, lines):
+    categories = Counter(affinity.category_counts)
+    dietary_tags = Counter(affinity.tag_counts)
+    ordered = set(affinity.ordered_items)
+    for _, item_id, category_id, tag_ids in lines:
+        categories[str(category_id)] += 1
+        dietary_tags.update(str(tag_id) for tag_id in tag_ids)
+        ordered.add(item_id)
+    affinity.category_counts = dict(categories)
+    affinity.tag_counts = dict(dietary_tags)
+    affinity.ordered_items = sorted(ordered)
+
+
+def _history_order_ids(user_ids=None):
+    from orders.models import Order
+
+    orders = Order.objects.filter(status__in=AFFINITY_STATUSES)
+    if user_ids is not None:
+        orders = orders.filter(user_id__in=user_ids)
+    return orders.values_list('pk', flat=True)
+
+
+def build_affinity(user_id):
+    """Create a user's affinity from their whole order history"""
+    affinity = MenuAffinity(user_id=user_id)
+    _apply_lines(affinity, _order_lines(_history_order_ids([user_id])))
+    affinity, _ = MenuAffinity.objects.get_or_create(
+        user_id=user_id,
+        defaults={
+            'category_counts': affinity.category_counts,
+            'tag_counts': affinity.tag_counts,
+            'ordered_items': affinity.ordered_items,
+        }
+    )
+    return affinity
+
+
+def record_delivered_order(order):
+    """Add a newly delivered order's lines to its user's affinity"""
+    with transaction.atomic():
+        affinity = MenuAffinity.objects.select_for_update().filter(user_id=order.user_id).first()
+        if affinity is None:
+            # First seen: the history already includes this order
+            build_affinity(order.user_id)
+        else:
+            lines = _order_lines([order.pk])
+            if not lines:
+                return
+            _apply_lines(affinity, lines)
+            affinity.save()
+    transaction.on_commit(lambda: cache.delete(_user_key(order.user_id)))
+
+
+def rebuild_affinities():
+    """Recompute every MenuAffinity from order history; returns the number of users"""
+    lines_by_user = {}
+    for line in _order_lines(_history_order_ids()):
+        lines_by_user.setdefault(line[0], []).append(line)
+
+    affinities = []
+    for user_id, lines in lines_by_user.items():
+        affinity = MenuAffinity(user_id=user_id)
+        _apply_lines(affinity, lines)
+        affinities.append(affinity)
+
+    with transaction.atomic():
+        MenuAffinity.objects.all().delete()
+        MenuAffinity.objects.bulk_create(affinities, batch_size=1000)
+    transaction.on_commit(lambda: cache.delete_many([_user_key(user_id) for user_id in lines_by_user]))
+    return len(affinities)
+
+
+def rank_for_user(catalog, affinity):
+    """Item ids scored by category and tag affinity, topped up with featured then popular items"""
+    if affinity is None or not affinity.ordered_items:
+        return catalog['featured'][:RANKED_LIST_SIZE]
+
+    categories = affinity.category_counts
+    dietary_tags = affinity.tag_counts
+    ordered = set(affinity.ordered_items)
+
+    scored = []
+    for item_id, (category_id, tag_ids) in catalog['features'].items():
+        if item_id in ordered:
+            continue
+        score = categories.get(str(category_id), 0) + sum(dietary_tags.get(str(tag_id), 0) for tag_id in tag_ids)
+        if score:
+            scored.append((score, item_id))
+    scored.sort(key=lambda entry: -entry[0])
+    ranked = [item_id for _, item_id in scored[:RANKED_LIST_SIZE]]
+
+    for fallback in (catalog['featured'], catalog['popular']):
+        for item_id in fallback:
+            if len(ranked) >= RANKED_LIST_SIZE:
+                return ranked
+            if item_id not in ordered and item_id not in ranked:
+                ranked.append(item_id)
+    return ranked
+
+
+# ==================== READ PATH ====================
+
+def get_menu_recommendations(user, limit=6):
+    """
+    ``{'recommendations', 'popular', 'highly_rated', 'featured'}`` item lists for a page.
+
+    ``recommendations`` is None for anonymous users. A warm read is one
+    ``cache.get_many`` call.
+    """
+    authenticated = user.is_authenticated
+    keys = [CATALOG_CACHE_KEY] + ([_user_key(user.pk)] if authenticated else [])
+    found = cache.get_many(keys)
+
+    catalog = found.get(CATALOG_CACHE_KEY)
+    if catalog is None:
+        catalog = refresh_catalog()
+    items = catalog['items']
+
+    recommendations = None
+    if authenticated:
+        entry = found.get(_user_key(user.pk))
+        if entry is None or entry['version'] != catalog['version']:
+            affinity = MenuAffinity.objects.filter(user_id=user.pk).first() or build_affinity(user.pk)
+            entry = {'version': catalog['version'], 'ids': rank_for_user(catalog, affinity)}
+            cache.set(_user_key(user.pk), entry, USER_CACHE_TIMEOUT)
+        recommendations = [items[item_id] for item_id in entry['ids'][:limit] if item_id in items]
+
+    return {
+        'recommendations': recommendations,
+        'popular': [items[item_id] for item_id in catalog['popular'][:limit]],
+        'highly_rated': [items[item_id] for item_id in catalog['highly_rated'][:limit]],
+        'featured': [items[item_id] for item_id in catalog['featured'][:limit]],
+    }
@@ -0,0 +1,212 @@
+"""
+Menu Search
+Full-text search over menu items for menu_list.
+
+On SQLite, items are indexed in the FTS5 virtual table ``menu_menuitem_fts``
+(rowid = menu item id) over name, description, category name, ingredients
+and dietary tag names. Queries match every search word as a prefix and are
+ranked with bm25, weighting names above descriptions. The rank is a
+subquery correlated with the queryset's own id column, so it holds when the
+queryset is aliased or nested in another query. The table is kept in
+sync by the MenuItem, Category and DietaryTag signals and can be rebuilt with
+`manage.py rebuild_menu_search`.
+
+Other databases, or SQLite builds without FTS5, fall back to a per-word
+``icontains`` match across the same fields. Either way ``search_items``
+returns a lazy queryset, so results are paginated in the database and facet
+counts are grouped from the same match. Each facet is counted without its own
+filter, so selecting one category still shows the counts of the others.
+"""
+
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.db.models import Count, FloatField, Func, Q
+from django.db.models.expressions import RawSQL
+
+from .models import DietaryTag, MenuItem
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'menu_menuitem_fts'
+
+# bm25 column weights: name, description, category, ingredients, tags
+FTS_WEIGHTS = (10.0, 1.0, 3.0, 2.0, 3.0)
+
+# Search words beyond this many are ignored
+MAX_SEARCH_TERMS = 8
+
+CREATE_FTS_SQL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, category, ingredients, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+# Index rows for the menu items matching the WHERE clause appended to it
+DOCUMENT_SQL = """
+    SELECT item.id, item.name, item.description, category.name, item.ingredients,
+           COALESCE((
+               SELECT group_concat(tag.name, ' ')
+               FROM menu_menuitem_dietary_tags link
+               JOIN menu_dietarytag tag ON tag.id = link.dietarytag_id
+               WHERE link.menuitem_id = item.id
+           ), '')
+    FROM menu_menuitem item
+    JOIN menu_category category ON category.id = item.category_id
+"""
+
+_fts_available = {}
+
+
+def search_terms(query):
+    """Lower-cased words of a search query"""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def fts_available(using=None):
+    """Whether the FTS5 index exists on the current (SQLite) database"""
+    conn = using or connection
+    if conn.vendor != 'sqlite':
+        return False
+    if conn.alias not in _fts_available:
+        _fts_available[conn.alias] = FTS_TABLE in conn.introspection.table_names()
+    return _fts_available[conn.alias]
+
+
+# ==================== INDEXING ====================
+
+def create_index(using=None):
+    """Create and fill the FTS5 table; returns False when SQLite lacks FTS5"""
+    conn = using or connection
+    if conn.vendor != 'sqlite':
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_FTS_SQL)
+    except DatabaseError as e:
+        logger.warning(f"FTS5 unavailable, menu search falls back to LIKE matching: {e}")
+        return False
+    _fts_available[conn.alias] = True
+    rebuild_index(using=conn)
+    return True
+
+
+def drop_index(using=None):
+    """Drop the FTS5 table"""
+    conn = using or connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_available.pop(conn.alias, None)
+
+
+def rebuild_index(using=None):
+    """Re-index every menu item; returns the number of indexed items"""
+    conn = using or connection
+    if not fts_available(conn):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, ingredients, tags) {DOCUMENT_SQL}"
+        )
+        return cursor.rowcount
+
+
+def index_items(item_ids):
+    """Refresh the index rows of the given menu items (deleted ones are dropped)"""
+    item_ids = [int(item_id) for item_id in item_ids]
+    if not item_ids or not fts_available():
+        return
+    placeholders = ', '.join(['%s'] * len(item_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", item_ids)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description, category, ingredients, tags) "
+            f"{DOCUMENT_SQL} WHERE item.id IN ({placeholders})",
+            item_ids
+        )
+
+
+def index_category(category_id):
+    index_items(MenuItem.objects.filter(category_id=category_id).values_list('id', flat=True))
+
+
+def index_dietary_tag(tag_id):
+    index_items(MenuItem.objects.filter(dietary_tags__id=tag_id).values_list('id', flat=True))
+
+
+# ==================== QUERYING ====================
+
+def _match_expression(terms):
+    # Terms are \w+ only, so quoting them is enough to neutralize FTS syntax
+    return ' AND '.join(f'"{term}"*' for term in terms)
+
+
+class SearchRank(Func):
+    """bm25 rank of the menu item whose id is ``expression`` for an FTS5 MATCH expression"""
+    output_field = FloatField()
+
+    def __init__(self, match, expression='id'):
+        super().__init__(expression)
+        self.match = match
+
+    def as_sql(self, compiler, connection, **extra_context):
+        item_id, params = compiler.compile(self.source_expressions[0])
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        sql = (
+            f"(SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {item_id})"
+        )
+        return sql, (self.match, *params)
+
+
+def search_items(queryset, query):
+    """
+    Narrow a MenuItem queryset to items matching ``query``, best matches first.
+
+    The result stays lazy; with FTS5 the ranking is bm25 over the index.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    if fts_available():
+        match = _match_expression(terms)
+        matched_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        return queryset.filter(id__in=matched_ids).annotate(
+            search_rank=SearchRank(match)
+        ).order_by('search_rank', 'name')
+
+    matches = MenuItem.objects.all()
+    for term in terms:
+        matches = matches.filter(
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(category__name__icontains=term) |
+            Q(ingredients__icontains=term) |
+            Q(dietary_tags__name__icontains=term)
+        )
+    return queryset.filter(id__in=matches.values('id'))
+
+
+def facet_counts(category_items, tag_items):
+    """
+    ``{'categories': {id: count}, 'dietary_tags': {id: count}}`` of the filtered items.
+
+    ``category_items`` has every filter but the category one applied, and
+    ``tag_items`` every filter but the dietary tag one.
+    """
+    categories = dict(
+        MenuItem.objects.filter(id__in=category_items.order_by().values('id')).values('category_id')
+        .annotate(count=Count('id')).order_by().values_list('category_id', 'count')
+    )
+    dietary_tags = dict(
+        DietaryTag.objects.filter(menu_items__id__in=tag_items.order_by().values('id')).values('id')
+        .annotate(count=Count('menu_items')).order_by().values_list('id', 'count')
+    )
+    return {'categories': categories, 'dietary_tags': dietary_tags}
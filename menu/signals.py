@@ -1,83 +1,134 @@
-from django.db.models.signals import pre_save, post_delete, post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_delete, post_delete, post_save
 from django.dispatch import receiver
-from PIL import Image
 import os
-from pathlib import Path
-from .models import MenuItem
-
-
-@receiver(pre_save, sender=MenuItem)
-def optimize_image(sender, instance, **kwargs):
-    """Optimize and resize image before saving"""
-    if instance.image and hasattr(instance.image, 'path'):
-        try:
-            # Open the image
-            img = Image.open(instance.image.path)
-            
-            # Convert RGBA to RGB if necessary (for JPEG compatibility)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            # Resize if image is too large (max 1200px on longest side)
-            max_size = 1200
-            if img.width > max_size or img.height > max_size:
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            # Save optimized image
-            img.save(instance.image.path, 'JPEG', quality=85, optimize=True)
-            
-        except Exception as e:
-            # If optimization fails, continue with original image
-            print(f"Image optimization failed: {str(e)}")
+from orders.models import Order, OrderItem
+from reviews.models import Review
+from . import catalog, images, recommendations, search
+from .models import Category, DietaryTag, MenuItem
 
 
+# ==================== IMAGES ====================
+
 @receiver(post_save, sender=MenuItem)
-def generate_thumbnail(sender, instance, **kwargs):
-    """Generate thumbnail after saving menu item"""
-    if instance.image and hasattr(instance.image, 'path') and os.path.exists(instance.image.path):
-        try:
-            # Open the image
-            img = Image.open(instance.image.path)
-            
-            # Create thumbnail directory if it doesn't exist
-            thumbnail_path = instance.image.path.replace('.jpg', '_thumb.jpg').replace('.jpeg', '_thumb.jpeg').replace('.png', '_thumb.jpg')
-            thumbnail_dir = os.path.dirname(thumbnail_path)
-            
-            if not os.path.exists(thumbnail_dir):
-                os.makedirs(thumbnail_dir, exist_ok=True)
-            
-            # Generate thumbnail (300x300 max, maintaining aspect ratio)
-            img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            # Save thumbnail
-            img.save(thumbnail_path, 'JPEG', quality=80, optimize=True)
-            
-        except Exception as e:
-            # If thumbnail generation fails, continue without it
-            print(f"Thumbnail generation failed: {str(e)}")
+def queue_image_renditions(sender, instance, raw=False, **kwargs):
+    """Render a new or replaced image once the save commits; other edits leave it alone"""
+    if raw or not images.needs_processing(instance):
+        return
+    transaction.on_commit(lambda: images.process_item(instance))
 
 
 @receiver(post_delete, sender=MenuItem)
 def delete_image_file(sender, instance, **kwargs):
-    """Delete image file when menu item is deleted"""
+    """Delete image file and renditions when menu item is deleted"""
     if instance.image:
         if os.path.isfile(instance.image.path):
             os.remove(instance.image.path)
+    manifest = instance.image_manifest or {}
+    if manifest.get('hash'):
+        shared = MenuItem.objects.filter(image_manifest__hash=manifest['hash']).exists()
+        images.delete_renditions(manifest, keep_hashes={manifest['hash']} if shared else ())
+
+
+# ==================== CATALOG VERSION ====================
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=DietaryTag)
+@receiver(post_delete, sender=DietaryTag)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_catalog_version(sender, instance, **kwargs):
+    """Cached menu pages are keyed by the catalog version"""
+    catalog.bump_version()
+
+
+@receiver(m2m_changed, sender=MenuItem.dietary_tags.through)
+def bump_catalog_version_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        catalog.bump_version()
+
+
+# ==================== RECOMMENDATIONS ====================
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_recommendations_on_menu_change(sender, instance, **kwargs):
+    """Menu edits change what the cached catalog may list"""
+    recommendations.invalidate_catalog()
+
+
+@receiver(post_save, sender=OrderItem)
+def invalidate_recommendations_on_order(sender, instance, created, raw=False, **kwargs):
+    """New order lines move the popular ranking"""
+    if created and not raw:
+        recommendations.invalidate_catalog()
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_recommendations_on_review(sender, instance, **kwargs):
+    """Review writes move the highly rated ranking"""
+    recommendations.invalidate_catalog()
+
+
+@receiver(post_save, sender=Order)
+def update_menu_affinity(sender, instance, created, raw=False, **kwargs):
+    """Fold an order into its user's affinity when it is first delivered"""
+    if raw or instance.status not in recommendations.AFFINITY_STATUSES:
+        return
+    previous_status = None if created else instance.loaded_values().get('status')
+    if previous_status in recommendations.AFFINITY_STATUSES:
+        return
+    recommendations.record_delivered_order(instance)
+
+
+# ==================== SEARCH INDEX ====================
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def index_menu_item(sender, instance, raw=False, **kwargs):
+    """Keep the item's search row in step with the item"""
+    if not raw:
+        search.index_items([instance.pk])
+
+
+@receiver(m2m_changed, sender=MenuItem.dietary_tags.through)
+def index_menu_item_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tag names are part of the indexed text"""
+    if reverse and action == 'pre_clear':
+        # A reverse clear sends no pk_set, so note the tagged items first
+        instance._search_item_ids = list(instance.menu_items.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            search.index_items([instance.pk])
+        elif action == 'post_clear':
+            search.index_items(getattr(instance, '_search_item_ids', []))
+        else:
+            search.index_items(pk_set or [])
+
+
+@receiver(post_save, sender=Category)
+def index_category_items(sender, instance, created, raw=False, **kwargs):
+    """A renamed category changes its items' indexed text"""
+    if not created and not raw:
+        search.index_category(instance.pk)
 
 
+@receiver(post_save, sender=DietaryTag)
+def index_tag_items(sender, instance, created, raw=False, **kwargs):
+    """A renamed tag changes its items' indexed text"""
+    if not created and not raw:
+        search.index_dietary_tag(instance.pk)
 
 
+@receiver(pre_delete, sender=DietaryTag)
+def remember_tag_items(sender, instance, **kwargs):
+    instance._search_item_ids = list(instance.menu_items.values_list('id', flat=True))
 
 
+@receiver(post_delete, sender=DietaryTag)
+def index_deleted_tag_items(sender, instance, **kwargs):
+    search.index_items(getattr(instance, '_search_item_ids', []))
@@ -1,7 +1,7 @@
 """
 Unit tests for menu app
 """
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from decimal import Decimal
 from .models import Category, DietaryTag, MenuItem
 
@@ -65,6 +65,9 @@ class MenuItemModelTest(TestCase):
     
     def setUp(self):
         """Set up test data"""
+        from django.core.cache import cache
+
+        cache.clear()
         self.category = Category.objects.create(
             name='Breakfast',
             slug='breakfast'
@@ -166,3 +169,310 @@ class MenuViewsTest(TestCase):
         response = self.client.get('/menu/?search=eggs')
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Scrambled Eggs')
+
+
+class MenuRecommendationTests(TestCase):
+    """Cached catalog and incrementally maintained user affinity"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.lunch = Category.objects.create(name='Lunch', slug='lunch')
+        self.drinks = Category.objects.create(name='Drinks', slug='drinks')
+        self.beans = MenuItem.objects.create(name='Beans', description='Beans', category=self.lunch, price=Decimal('1000'))
+        self.rice = MenuItem.objects.create(name='Rice', description='Rice', category=self.lunch, price=Decimal('1200'))
+        self.juice = MenuItem.objects.create(
+            name='Juice', description='Juice', category=self.drinks, price=Decimal('800'), is_featured=True
+        )
+
+    def deliver(self, *items):
+        from orders.models import Order, OrderItem
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(
+                user=self.user, customer_name='Alice', customer_phone='0788000000',
+                subtotal=Decimal('1000'), total=Decimal('1000')
+            )
+            for item in items:
+                OrderItem.objects.create(order=order, menu_item=item, quantity=1, price=item.price)
+            order.status = 'delivered'
+            order.save()
+        return order
+
+    def test_warm_read_needs_no_queries(self):
+        from .recommendations import get_menu_recommendations
+
+        first = get_menu_recommendations(self.user)
+        self.assertEqual(first['recommendations'], [self.juice])
+
+        with self.assertNumQueries(0):
+            again = get_menu_recommendations(self.user)
+        self.assertEqual(again['popular'], first['popular'])
+
+    def test_delivered_order_updates_affinity_and_recommendations(self):
+        from .models import MenuAffinity
+        from .recommendations import get_menu_recommendations
+
+        self.deliver(self.beans)
+        affinity = MenuAffinity.objects.get(user=self.user)
+        self.assertEqual(affinity.category_counts, {str(self.lunch.id): 1})
+        self.assertEqual(affinity.ordered_items, [self.beans.id])
+
+        recommended = get_menu_recommendations(self.user, limit=2)
+        self.assertEqual(recommended['recommendations'], [self.rice, self.juice])
+        self.assertEqual(recommended['popular'][0], self.beans)
+
+        self.deliver(self.rice)
+        affinity.refresh_from_db()
+        self.assertEqual(affinity.category_counts, {str(self.lunch.id): 2})
+        self.assertEqual(get_menu_recommendations(self.user)['recommendations'], [self.juice])
+
+    def test_review_invalidates_highly_rated(self):
+        from django.contrib.auth.models import User
+        from reviews.models import Review
+        from .recommendations import get_menu_recommendations
+
+        self.assertEqual(get_menu_recommendations(self.user)['highly_rated'], [])
+        reviewer = User.objects.create_user(username='bob', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=reviewer, menu_item=self.rice, rating=5, comment='Perfectly cooked rice.')
+
+        self.assertEqual(get_menu_recommendations(self.user)['highly_rated'], [self.rice])
+
+
+class MenuSearchTests(TestCase):
+    """FTS5 menu search kept in sync by signals"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.lunch = Category.objects.create(name='Lunch', slug='lunch')
+        self.soups = Category.objects.create(name='Soups', slug='soups')
+        self.vegan = DietaryTag.objects.create(name='Vegan')
+        self.chicken = MenuItem.objects.create(
+            name='Chicken Brochette', description='Grilled skewers', category=self.lunch, price=Decimal('3000')
+        )
+        self.stew = MenuItem.objects.create(
+            name='Bean Stew', description='Slow cooked with chicken stock', category=self.soups,
+            price=Decimal('2000'), ingredients='beans, tomato'
+        )
+        self.salad = MenuItem.objects.create(
+            name='Garden Salad', description='Fresh greens', category=self.lunch, price=Decimal('1500')
+        )
+        self.salad.dietary_tags.add(self.vegan)
+
+    def search(self, query):
+        from .search import search_items
+        return list(search_items(MenuItem.objects.all(), query))
+
+    def test_ranked_prefix_search(self):
+        from .search import fts_available
+
+        self.assertTrue(fts_available())
+        self.assertEqual(self.search('chick'), [self.chicken, self.stew])
+        self.assertEqual(self.search('tomato bean'), [self.stew])
+        self.assertEqual(self.search('"vegan'), [self.salad])
+        self.assertEqual(self.search('soups'), [self.stew])
+
+    def test_index_follows_edits(self):
+        self.chicken.name = 'Goat Brochette'
+        self.chicken.save()
+        self.salad.dietary_tags.remove(self.vegan)
+        self.soups.name = 'Broths'
+        self.soups.save()
+
+        self.assertEqual(self.search('chicken'), [self.stew])
+        self.assertEqual(self.search('vegan'), [])
+        self.assertEqual(self.search('broth'), [self.stew])
+
+        self.stew.delete()
+        self.assertEqual(self.search('broths'), [])
+
+    def test_menu_list_pages_and_counts_facets(self):
+        response = self.client.get('/menu/', {'search': 'chicken'})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 2)
+        lunch = next(c for c in response.context['categories'] if c.id == self.lunch.id)
+        self.assertEqual(lunch.result_count, 1)
+
+    def test_facets_are_counted_without_their_own_filter(self):
+        response = self.client.get('/menu/', {'search': 'chicken', 'category': self.lunch.id})
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        counts = {category.id: category.result_count for category in response.context['categories']}
+        self.assertEqual((counts[self.lunch.id], counts[self.soups.id]), (1, 1))
+
+        response = self.client.get('/menu/', {'category': self.lunch.id, 'dietary_tags': [self.vegan.id]})
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        counts = {category.id: category.result_count for category in response.context['categories']}
+        self.assertEqual((counts[self.lunch.id], counts[self.soups.id]), (1, 0))
+        self.assertEqual(response.context['dietary_tags'][0].result_count, 1)
+
+    def test_ranked_search_nests_in_other_queries(self):
+        from .search import search_items
+
+        best = search_items(MenuItem.objects.all(), 'chicken').values('id')[:1]
+        self.assertEqual(list(MenuItem.objects.filter(id__in=best)), [self.chicken])
+
+
+class MenuCatalogCacheTests(TestCase):
+    """Versioned page cache and conditional GET of the menu list"""
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.lunch = Category.objects.create(name='Lunch', slug='lunch')
+        self.vegan = DietaryTag.objects.create(name='Vegan')
+        self.beans = MenuItem.objects.create(name='Beans', description='Beans', category=self.lunch, price=Decimal('1000'))
+        self.beans.dietary_tags.add(self.vegan)
+
+    def test_warm_home_page_runs_no_queries(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, 'Beans')
+        self.assertContains(response, 'Vegan')
+
+    def test_filtered_pages_are_cached_per_normalized_params(self):
+        self.client.get('/menu/', {'dietary_tags': [self.vegan.id], 'search': 'beans '})
+        with self.assertNumQueries(0):
+            response = self.client.get('/menu/', {'search': 'beans', 'dietary_tags': [self.vegan.id]})
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertEqual(response.context['dietary_tags'][0].result_count, 1)
+
+    def test_unchanged_catalog_answers_not_modified(self):
+        response = self.client.get('/')
+        self.assertTrue(response.has_header('ETag'))
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_writes_bump_version(self):
+        from . import catalog
+
+        first = self.client.get('/')
+        version = catalog.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunch.name = 'Midday'
+            self.lunch.save()
+        self.assertGreater(catalog.get_version(), version)
+
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Midday')
+
+    def test_version_expires_without_shared_cache(self):
+        import time
+        from unittest import mock
+        from django.core.cache import cache
+        from . import catalog
+
+        later = time.time() + catalog.LOCAL_VERSION_TIMEOUT + 1
+        with override_settings(SHARED_CACHE=True):
+            version = catalog.get_version()
+            with mock.patch('time.time', return_value=later):
+                self.assertEqual(catalog.get_version(), version)
+
+        cache.clear()
+        with override_settings(SHARED_CACHE=False):
+            version = catalog.get_version()
+            with mock.patch('time.time', return_value=later):
+                self.assertGreater(catalog.get_version(), version)
+
+    def test_signed_in_pages_are_not_conditional(self):
+        from django.contrib.auth.models import User
+
+        User.objects.create_user(username='alice', password='pass12345')
+        self.client.login(username='alice', password='pass12345')
+        response = self.client.get('/')
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(MENU_IMAGE_WORKERS=0)
+class MenuImagePipelineTests(TestCase):
+    """Renditions are built once per uploaded image, off the original file"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Lunch', slug='lunch')
+
+    def _upload(self, color='red', size=(1600, 1000)):
+        import io
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile('dish.png', buffer.getvalue(), content_type='image/png')
+
+    def _create(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return MenuItem.objects.create(
+                name='Beans', description='Stewed beans', category=self.category,
+                price=Decimal('1500.00'), image=self._upload(**kwargs)
+            )
+
+    def test_upload_builds_content_addressed_renditions(self):
+        import os
+        from django.core.files.storage import default_storage
+        from . import images
+
+        item = self._create()
+        item.refresh_from_db()
+        manifest = item.image_manifest
+
+        self.assertEqual(manifest['source'], item.image.name)
+        self.assertEqual(set(manifest['renditions']), set(images.RENDITIONS))
+        self.assertEqual(manifest['renditions']['full']['width'], 1200)
+        self.assertEqual(manifest['renditions']['card']['width'], 600)
+        self.assertEqual(manifest['renditions']['thumb']['width'], 300)
+        for rendition in manifest['renditions'].values():
+            self.assertTrue(os.path.basename(rendition['name']).startswith(manifest['hash'][:16]))
+            self.assertTrue(default_storage.exists(rendition['name']))
+        self.assertEqual(item.get_thumbnail_url(), default_storage.url(manifest['renditions']['thumb']['name']))
+        # The uploaded original is left untouched
+        self.assertTrue(item.image.name.endswith('.png'))
+
+    def test_edits_without_a_new_image_do_not_reprocess(self):
+        from unittest import mock
+        from . import images
+
+        item = self._create()
+        item.refresh_from_db()
+        with mock.patch.object(images, 'render_renditions') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                item.price = Decimal('1800.00')
+                item.save()
+        render.assert_not_called()
+
+    def test_unprocessed_image_falls_back_to_original(self):
+        item = self._create()
+        MenuItem.objects.filter(pk=item.pk).update(image_manifest={})
+        item.refresh_from_db()
+        self.assertEqual(item.get_thumbnail_url(), item.image.url)
+
+    def test_delete_keeps_renditions_shared_by_same_content(self):
+        from django.core.files.storage import default_storage
+
+        first = self._create(color='blue')
+        second = self._create(color='blue')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image_manifest['hash'], second.image_manifest['hash'])
+        thumb = first.image_manifest['renditions']['thumb']['name']
+
+        first.delete()
+        self.assertTrue(default_storage.exists(thumb))
+        second.delete()
+        self.assertFalse(default_storage.exists(thumb))
@@ -6,41 +6,31 @@ from django.db import connection
 from django.utils import timezone
 from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required
+from . import catalog
 from .models import Category, MenuItem, DietaryTag
 from .forms import MenuFilterForm
-from .utils import get_recommendations, get_popular_items, get_highly_rated_items
+from .recommendations import get_menu_recommendations
+from .search import facet_counts, search_items
+from .utils import get_recommendations
 
 
+@condition(etag_func=catalog.etag, last_modified_func=catalog.last_modified)
 def menu_list(request):
     """Display all menu items with search and filter functionality"""
     menu_items = MenuItem.objects.filter(is_available=True).select_related('category').prefetch_related('dietary_tags')
     
-    # Get all categories and dietary tags for filter form
-    categories = Category.objects.filter(is_active=True)
-    dietary_tags = DietaryTag.objects.all()
+    # Categories, dietary tags and result pages are cached per catalog version
+    version = catalog.get_version()
+    categories = catalog.get_categories(version)
+    dietary_tags = catalog.get_dietary_tags(version)
     
     # Initialize filter form
     filter_form = MenuFilterForm(request.GET)
     
-    # Apply search filter (including ingredients)
+    # Apply full-text search (name, description, category, ingredients, tags)
     search_query = request.GET.get('search', '')
     if search_query:
-        menu_items = menu_items.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(category__name__icontains=search_query) |
-            Q(ingredients__icontains=search_query)
-        )
-    
-    # Apply category filter
-    category_id = request.GET.get('category')
-    if category_id:
-        menu_items = menu_items.filter(category_id=category_id)
-    
-    # Apply dietary tags filter
-    dietary_tag_ids = request.GET.getlist('dietary_tags')
-    if dietary_tag_ids:
-        menu_items = menu_items.filter(dietary_tags__id__in=dietary_tag_ids).distinct()
+        menu_items = search_items(menu_items, search_query)
     
     # Apply price range filter
     min_price = request.GET.get('min_price')
@@ -67,6 +57,15 @@ def menu_list(request):
     if max_fat:
         menu_items = menu_items.filter(fat__lte=max_fat)
     
+    # Apply category and dietary tags filters; each facet is counted without its own filter
+    category_id = request.GET.get('category')
+    dietary_tag_ids = request.GET.getlist('dietary_tags')
+    tag_items = menu_items.filter(category_id=category_id) if category_id else menu_items
+    category_items = menu_items
+    if dietary_tag_ids:
+        category_items = menu_items.filter(dietary_tags__id__in=dietary_tag_ids).distinct()
+    menu_items = category_items.filter(category_id=category_id) if category_id else category_items
+    
     # Check if any filters are active
     has_active_filters = bool(
         search_query or category_id or dietary_tag_ids or 
@@ -74,41 +73,43 @@ def menu_list(request):
         min_protein or max_carbs or max_fat
     )
     
-    # Get recommendations for authenticated users
-    recommendations = None
-    if request.user.is_authenticated:
-        recommendations = get_recommendations(request.user, limit=6)
-    
-    # Get popular and highly rated items
-    popular_items = get_popular_items(limit=6)
-    highly_rated_items = get_highly_rated_items(limit=6)
-    
-    # When filters are active, show only filtered results (not all menu items)
+    # Recommendations (authenticated users only), popular and highly rated items
+    # from the cached catalog
+    recommended = get_menu_recommendations(request.user, limit=6)
+    recommendations = recommended['recommendations']
+    popular_items = recommended['popular']
+    highly_rated_items = recommended['highly_rated']
+    
+    def build_page():
+        # Paginate ids in the database; only the current page is read
+        paginator = Paginator(menu_items.values_list('id', flat=True), 12)
+        page = paginator.get_page(request.GET.get('page'))
+        return {
+            'ids': list(page.object_list),
+            'count': paginator.count,
+            'number': page.number,
+            'facets': facet_counts(category_items, tag_items) if has_active_filters else None,
+        }
+    
+    params = catalog.normalize_params(request.GET, extra=('page',))
+    result = catalog.get_result_page(version, params, build_page)
+    page_obj = Paginator(range(result['count']), 12).page(result['number'])
+    page_obj.object_list = catalog.get_items(result['ids'])
+    
+    # Group paginated items by category
+    menu_by_category = {}
+    for item in page_obj:
+        if item.category not in menu_by_category:
+            menu_by_category[item.category] = []
+        menu_by_category[item.category].append(item)
+    
+    # Result counts per category and dietary tag for the current filters
     if has_active_filters:
-        # Pagination for filtered results
-        paginator = Paginator(list(menu_items), 12)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        # Group paginated items by category
-        menu_by_category = {}
-        for item in page_obj:
-            if item.category not in menu_by_category:
-                menu_by_category[item.category] = []
-            menu_by_category[item.category].append(item)
-    else:
-        # No filters active - show all items grouped by category
-        # Pagination for all items
-        paginator = Paginator(list(menu_items), 12)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        # Group paginated items by category
-        menu_by_category = {}
-        for item in page_obj:
-            if item.category not in menu_by_category:
-                menu_by_category[item.category] = []
-            menu_by_category[item.category].append(item)
+        facets = result['facets']
+        for category in categories:
+            category.result_count = facets['categories'].get(category.id, 0)
+        for tag in dietary_tags:
+            tag.result_count = facets['dietary_tags'].get(tag.id, 0)
     
     context = {
         'menu_by_category': menu_by_category,
@@ -127,105 +128,62 @@ def menu_list(request):
     return render(request, 'menu/menu_list.html', context)
 
 
-def menu_detail(request, item_id):
-    """Display detailed view of a menu item"""
-    menu_item = get_object_or_404(
-        MenuItem.objects.select_related('category').prefetch_related('dietary_tags'),
-        id=item_id,
-        is_available=True
-    )
-    
-    # Get related items from the same category
-    related_items = MenuItem.objects.filter(
-        category=menu_item.category,
-        is_available=True
-    ).exclude(id=item_id)[:4]
-    
-    # Get recommendations
-    recommendations = None
-    if request.user.is_authenticated:
-        recommendations = get_recommendations(request.user, limit=4)
-    
-    # Get review statistics (use cached values from model)
-    from reviews.models import Review
-    # Use cached average_rating and total_reviews from MenuItem
-    # But also get detailed stats for display
-    review_stats = {
-        'avg_rating': float(menu_item.average_rating),
-        'total_reviews': menu_item.total_reviews,
-        'rating_distribution': Review.objects.filter(
-            menu_item=menu_item,
-            is_approved=True
-        ).values('rating').annotate(count=Count('id')).order_by('-rating')
-    }
-    
-    # Get recent approved reviews for preview
-    recent_reviews = Review.objects.filter(
-        menu_item=menu_item,
-        is_approved=True
-    ).select_related('user').order_by('-created_at', '-is_verified_purchase')[:5]
-    
-    context = {
-        'menu_item': menu_item,
-        'related_items': related_items,
-        'recommendations': recommendations,
-        'review_stats': review_stats,
-        'recent_reviews': recent_reviews,
-    }
-    return render(request, 'menu/menu_detail.html', context)
-
-
 @login_required
 def menu_detail(request, item_id):
     """Display detailed view of a menu item"""
-    menu_item = get_object_or_404(
-        MenuItem.objects.select_related('category').prefetch_related('dietary_tags'),
-        id=item_id,
-        is_available=True
-    )
+    from reviews.models import Review
     
-    # Get related items from the same category
-    related_items = MenuItem.objects.filter(
-        category=menu_item.category,
-        is_available=True
-    ).exclude(id=item_id)[:4]
+    def build_detail():
+        menu_item = get_object_or_404(
+            MenuItem.objects.select_related('category').prefetch_related('dietary_tags'),
+            id=item_id,
+            is_available=True
+        )
+        # Star counts are kept on the item by the review aggregates
+        distribution = menu_item.get_rating_distribution()
+        return {
+            'item': menu_item,
+            # Get related items from the same category
+            'related': list(
+                MenuItem.objects.filter(category=menu_item.category, is_available=True)
+                .exclude(id=item_id)[:4]
+            ),
+            'rating_distribution': [
+                {'rating': int(star), 'count': count}
+                for star, count in sorted(distribution.items(), reverse=True) if count
+            ],
+            # Recent approved reviews for preview
+            'recent_reviews': list(
+                Review.objects.filter(menu_item=menu_item, is_approved=True)
+                .select_related('user').order_by('-created_at', '-is_verified_purchase')[:5]
+            ),
+        }
+    
+    detail = catalog.get_item_detail(catalog.get_version(), item_id, build_detail)
+    menu_item = detail['item']
     
     # Get recommendations
     recommendations = None
     if request.user.is_authenticated:
         recommendations = get_recommendations(request.user, limit=4)
     
-    # Get review statistics (use cached values from model)
-    from reviews.models import Review
     # Use cached average_rating and total_reviews from MenuItem
-    # But also get detailed stats for display
     review_stats = {
         'avg_rating': float(menu_item.average_rating),
         'total_reviews': menu_item.total_reviews,
-        'rating_distribution': Review.objects.filter(
-            menu_item=menu_item,
-            is_approved=True
-        ).values('rating').annotate(count=Count('id')).order_by('-rating')
+        'rating_distribution': detail['rating_distribution'],
     }
     
-    # Get recent approved reviews for preview
-    recent_reviews = Review.objects.filter(
-        menu_item=menu_item,
-        is_approved=True
-    ).select_related('user').order_by('-created_at', '-is_verified_purchase')[:5]
-    
     context = {
         'menu_item': menu_item,
-        'related_items': related_items,
+        'related_items': detail['related'],
         'recommendations': recommendations,
         'review_stats': review_stats,
-        'recent_reviews': recent_reviews,
+        'recent_reviews': detail['recent_reviews'],
     }
     return render(request, 'menu/menu_detail.html', context)
 
 
-
-
 def health_check(request):
     """
     Health check endpoint for monitoring and load balancers
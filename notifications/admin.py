@@ -14,7 +14,11 @@ class NotificationAdmin(admin.ModelAdmin):
     def mark_as_read(self, request, queryset):
         """Mark selected notifications as read"""
         from django.utils import timezone
-        queryset.filter(is_read=False).update(is_read=True, read_at=timezone.now())
+        from . import badges
+        unread = queryset.filter(is_read=False)
+        user_ids = set(unread.values_list('user_id', flat=True))
+        unread.update(is_read=True, read_at=timezone.now())
+        badges.changed(user_ids)
         self.message_user(request, f"{queryset.count()} notification(s) marked as read.")
     mark_as_read.short_description = "Mark selected notifications as read"
     
@@ -0,0 +1,123 @@
+"""
+Header Badge Counters
+Per-user cart and unread notification counts, served from the cache.
+
+Each user's badges are one cache entry, ``{"cart": n, "notifications": n}``.
+The navbar tags and the count endpoint read that one key. On a miss, both
+counts are rebuilt with one aggregate query each. Cart item and notification
+writes call ``changed()``. Once the transaction commits, the affected users'
+entries are recomputed in grouped queries and pushed to their open
+``ws/badges/`` sockets, so pages no longer poll for counts.
+
+Bulk writes that skip signals (``bulk_create``, ``update``) must call
+``changed()`` themselves.
+
+Entries are refreshed by the process that made the write, often a background
+worker, so every process must share the cache: set REDIS_URL in production.
+"""
+
+import logging
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+
+logger = logging.getLogger(__name__)
+
+# Seconds a badge entry lives without writes; it is rebuilt on the next read
+BADGE_TIMEOUT = 60 * 60 * 24
+
+BADGE_NAMES = ('cart', 'notifications')
+
+_pending = threading.local()
+
+
+def _key(user_id):
+    return f"badges:{user_id}"
+
+
+def group_name(user_id):
+    """Channel layer group of a user's badge sockets"""
+    return f"badges_{user_id}"
+
+
+def compute_badges(user_ids):
+    """Badge counts of many users from the database, in one query per badge"""
+    from orders.models import CartItem
+    from .models import Notification
+
+    badges = {user_id: {'cart': 0, 'notifications': 0} for user_id in user_ids}
+    cart_counts = (
+        CartItem.objects.filter(cart__user_id__in=user_ids)
+        .values('cart__user_id').annotate(total=Sum('quantity'))
+    )
+    for row in cart_counts:
+        badges[row['cart__user_id']]['cart'] = row['total'] or 0
+    unread_counts = (
+        Notification.objects.filter(user_id__in=user_ids, is_read=False)
+        .values('user_id').annotate(total=Count('id'))
+    )
+    for row in unread_counts:
+        badges[row['user_id']]['notifications'] = row['total']
+    return badges
+
+
+def get_badges(user):
+    """``{"cart": n, "notifications": n}`` for a user; zeros for anonymous users"""
+    if not user.is_authenticated:
+        return dict.fromkeys(BADGE_NAMES, 0)
+    badges = cache.get(_key(user.pk))
+    if badges is None:
+        badges = compute_badges([user.pk])[user.pk]
+        cache.set(_key(user.pk), badges, BADGE_TIMEOUT)
+    return badges
+
+
+def get_count(user, name):
+    return get_badges(user)[name]
+
+
+# ==================== UPDATES ====================
+
+def changed(user_ids):
+    """Recompute and push the badges of ``user_ids`` once the current transaction commits"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    pending = getattr(_pending, 'user_ids', None)
+    if pending is None:
+        pending = _pending.user_ids = set()
+    pending.update(user_ids)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    # The first callback after a commit refreshes every pending user; the rest find nothing to do
+    user_ids = getattr(_pending, 'user_ids', None)
+    _pending.user_ids = None
+    if user_ids:
+        refresh(user_ids)
+
+
+def refresh(user_ids):
+    """Recompute, store and push the badges of ``user_ids``"""
+    badges = compute_badges(list(user_ids))
+    cache.set_many({_key(user_id): counts for user_id, counts in badges.items()}, BADGE_TIMEOUT)
+    push(badges)
+    return badges
+
+
+def push(badges):
+    """Send new counts to each user's open badge sockets"""
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for user_id, counts in badges.items():
+            async_to_sync(channel_layer.group_send)(group_name(user_id), {'type': 'badges.update', 'badges': counts})
+    except Exception as e:
+        logger.warning(f"Could not push badges to {len(badges)} user(s): {e}")
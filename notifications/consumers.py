@@ -0,0 +1,41 @@
+"""
+WebSocket Consumers for Header Badges
+Pushes cart and unread notification counts to the navbar
+"""
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from notifications import badges
+
+
+class BadgeConsumer(AsyncJsonWebsocketConsumer):
+    """
+    WebSocket consumer for the signed-in user's header badges
+
+    Sends the current counts on connect, then every change published by
+    notifications.badges, so pages need not poll the count endpoint.
+    """
+
+    async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.room_group_name = badges.group_name(user.pk)
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({'type': 'badges', 'badges': await self.get_badges(user)})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+
+    async def badges_update(self, event):
+        """Forward counts published after a cart or notification write"""
+        await self.send_json({'type': 'badges', 'badges': event['badges']})
+
+    @database_sync_to_async
+    def get_badges(self, user):
+        return badges.get_badges(user)
@@ -113,14 +113,17 @@ class Notification(models.Model):
     
     @classmethod
     def get_unread_count(cls, user):
-        """Get count of unread notifications for user"""
-        return cls.objects.filter(user=user, is_read=False).count()
+        """Get count of unread notifications for user (cached badge counter)"""
+        from . import badges
+        return badges.get_count(user, 'notifications')
     
     @classmethod
     def mark_all_as_read(cls, user):
         """Mark all notifications as read for user"""
         from django.utils import timezone
+        from . import badges
         cls.objects.filter(user=user, is_read=False).update(
             is_read=True,
             read_at=timezone.now()
         )
+        badges.changed([user.pk])
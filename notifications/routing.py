@@ -0,0 +1,10 @@
+"""
+WebSocket URL routing for header badge updates
+"""
+
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/badges/', consumers.BadgeConsumer.as_asgi()),
+]
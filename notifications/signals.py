@@ -1,81 +1,107 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from orders.models import Order, OrderStatus
+from orders.events import subscriber
+from orders.models import Cart, CartItem, OrderStatus
 from payments.models import Payment, PaymentStatus
-from .models import Notification
-
-
-@receiver(post_save, sender=Order)
-def create_order_notifications(sender, instance, created, **kwargs):
-    """Create notifications when order status changes"""
+from . import badges
+from .models import Notification, NotificationType
+
+
+# Message for each status an order can move into
+ORDER_STATUS_MESSAGES = {
+    OrderStatus.CONFIRMED: "Your order {number} has been confirmed and is being prepared.",
+    OrderStatus.PREPARING: "Your order {number} is now being prepared.",
+    OrderStatus.READY: "Your order {number} is ready for pickup/delivery.",
+    OrderStatus.DELIVERED: "Your order {number} has been delivered. Thank you for your order!",
+    OrderStatus.CANCELLED: "Your order {number} has been cancelled. If you have any questions, please contact us.",
+}
+
+
+@subscriber
+def create_order_notifications(events):
+    """Create notifications for placed orders and status changes, in one insert per batch"""
+    notifications = []
+    for event in events:
+        order = event.order
+        if event.created:
+            title = "Order Placed"
+            message = f"Your order {order.order_number} has been placed successfully. We'll notify you when it's confirmed."
+        elif event.status in ORDER_STATUS_MESSAGES:
+            title = f"Order {OrderStatus(event.status).label}"
+            message = ORDER_STATUS_MESSAGES[event.status].format(number=order.order_number)
+        else:
+            continue
+        notifications.append(Notification(
+            user_id=order.user_id,
+            notification_type=NotificationType.ORDER_STATUS,
+            title=title,
+            message=message,
+            order=order
+        ))
+    Notification.objects.bulk_create(notifications)
+    badges.changed(notification.user_id for notification in notifications)
+
+
+def payment_notification(payment, created=False):
+    """Unsaved notification for a new payment, or a completed or failed one; None otherwise"""
+    order = payment.order
+    if order is None:
+        return None
     if created:
-        # Order created
-        Notification.create_order_notification(
-            user=instance.user,
-            order=instance,
-            title="Order Placed",
-            message=f"Your order {instance.order_number} has been placed successfully. We'll notify you when it's confirmed."
-        )
+        title = "Payment Initiated"
+        message = f"Payment of RWF {payment.amount} for order {order.order_number} has been initiated."
+    elif payment.status == PaymentStatus.COMPLETED:
+        title = "Payment Confirmed"
+        message = f"Your payment of RWF {payment.amount} for order {order.order_number} has been confirmed."
+    elif payment.status == PaymentStatus.FAILED:
+        title = "Payment Failed"
+        message = f"Your payment for order {order.order_number} has failed. Please try again or contact support."
     else:
-        # Order status changed
-        status_messages = {
-            OrderStatus.CONFIRMED: f"Your order {instance.order_number} has been confirmed and is being prepared.",
-            OrderStatus.PREPARING: f"Your order {instance.order_number} is now being prepared.",
-            OrderStatus.READY: f"Your order {instance.order_number} is ready for pickup/delivery.",
-            OrderStatus.DELIVERED: f"Your order {instance.order_number} has been delivered. Thank you for your order!",
-            OrderStatus.CANCELLED: f"Your order {instance.order_number} has been cancelled. If you have any questions, please contact us."
-        }
-        
-        if instance.status in status_messages:
-            Notification.create_order_notification(
-                user=instance.user,
-                order=instance,
-                title=f"Order {instance.get_status_display()}",
-                message=status_messages[instance.status]
-            )
+        return None
+    return Notification(
+        user_id=order.user_id,
+        notification_type=NotificationType.PAYMENT,
+        title=title,
+        message=message,
+        payment=payment
+    )
+
+
+def notify_payments(payments, created=False):
+    """Create the notifications of many payments, e.g. bulk-written ones, in one insert"""
+    notifications = [
+        notification for notification in (payment_notification(payment, created) for payment in payments)
+        if notification is not None
+    ]
+    Notification.objects.bulk_create(notifications)
+    badges.changed(notification.user_id for notification in notifications)
+    return notifications
 
 
 @receiver(post_save, sender=Payment)
 def create_payment_notifications(sender, instance, created, **kwargs):
     """Create notifications when payment status changes"""
-    if created:
-        # Payment created
-        Notification.create_payment_notification(
-            user=instance.order.user,
-            payment=instance,
-            title="Payment Initiated",
-            message=f"Payment of RWF {instance.amount} for order {instance.order.order_number} has been initiated."
-        )
-    else:
-        # Payment status changed
-        if instance.status == PaymentStatus.COMPLETED:
-            Notification.create_payment_notification(
-                user=instance.order.user,
-                payment=instance,
-                title="Payment Confirmed",
-                message=f"Your payment of RWF {instance.amount} for order {instance.order.order_number} has been confirmed."
-            )
-        elif instance.status == PaymentStatus.FAILED:
-            Notification.create_payment_notification(
-                user=instance.order.user,
-                payment=instance,
-                title="Payment Failed",
-                message=f"Your payment for order {instance.order.order_number} has failed. Please try again or contact support."
-            )
-
-
-
-
-
-
-
-
-
-
-
-
+    notify_payments([instance], created=created)
 
 
+# ==================== BADGES ====================
 
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def update_notification_badge(sender, instance, raw=False, **kwargs):
+    """New, read and deleted notifications move the unread badge"""
+    if not raw:
+        badges.changed([instance.user_id])
 
 
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def update_cart_badge(sender, instance, raw=False, **kwargs):
+    """Cart item writes move the cart badge"""
+    if raw:
+        return
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    badges.changed([user_id])
@@ -1,5 +1,5 @@
 from django import template
-from notifications.models import Notification
+from notifications import badges
 
 register = template.Library()
 
@@ -7,9 +7,7 @@ register = template.Library()
 @register.simple_tag
 def get_unread_notification_count(user):
     """Get count of unread notifications for user"""
-    if not user.is_authenticated:
-        return 0
-    return Notification.get_unread_count(user)
+    return badges.get_count(user, 'notifications')
 
 
 
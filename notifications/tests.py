@@ -1,3 +1,66 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from menu.models import Category, MenuItem
+from orders.models import Cart, CartItem
+
+from . import badges
+from .models import Notification
+
+
+class BadgeCounterTests(TestCase):
+    """Header badges are read from one cache key and refreshed on writes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='diner', password='testpass123')
+        category = Category.objects.create(name='Soups', slug='soups')
+        self.item = MenuItem.objects.create(
+            name='Pumpkin Soup', description='Warm', category=category, price=Decimal('2000.00')
+        )
+
+    def test_read_is_cached_after_first_miss(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(badges.get_badges(self.user), {'cart': 0, 'notifications': 0})
+        with self.assertNumQueries(0):
+            badges.get_badges(self.user)
+
+    def test_writes_refresh_and_push_counts(self):
+        badges.get_badges(self.user)
+        with mock.patch.object(badges, 'push') as push:
+            with self.captureOnCommitCallbacks(execute=True):
+                cart = Cart.objects.create(user=self.user)
+                CartItem.objects.create(cart=cart, menu_item=self.item, quantity=3)
+                Notification.objects.create(user=self.user, title='Hi', message='Welcome')
+        push.assert_called_once_with({self.user.pk: {'cart': 3, 'notifications': 1}})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(badges.get_badges(self.user), {'cart': 3, 'notifications': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.mark_all_as_read(self.user)
+            cart.items.all().delete()
+        self.assertEqual(badges.get_badges(self.user), {'cart': 0, 'notifications': 0})
+
+    def test_admin_mark_as_read_refreshes_badges(self):
+        admin_user = User.objects.create_superuser(username='admin', password='testpass123')
+        notification = Notification.objects.create(user=self.user, title='Hi', message='Welcome')
+        self.assertEqual(badges.get_badges(self.user)['notifications'], 1)
+
+        self.client.force_login(admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/notifications/notification/', {
+                'action': 'mark_as_read', '_selected_action': [notification.pk],
+            })
+        self.assertEqual(badges.get_badges(self.user)['notifications'], 0)
+
+    def test_count_endpoint_reads_badges(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.user, title='Hi', message='Welcome')
+        response = self.client.get('/notifications/count/')
+        self.assertEqual(response.json(), {'count': 1, 'cart': 0})
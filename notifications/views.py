@@ -2,7 +2,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.core.paginator import Paginator
+from dusangire.pagination import CursorPaginator
+from . import badges
 from .models import Notification
 
 
@@ -11,7 +12,7 @@ def notification_list(request):
     """Display user's notifications"""
     notifications = Notification.objects.filter(
         user=request.user
-    ).select_related('order', 'payment').order_by('-created_at')
+    ).select_related('order', 'payment')
     
     # Filter by type if provided
     notification_type = request.GET.get('type', '')
@@ -25,10 +26,18 @@ def notification_list(request):
     elif read_filter == 'read':
         notifications = notifications.filter(is_read=True)
     
-    # Pagination
-    paginator = Paginator(notifications, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (created_at, id)
+    page_obj = CursorPaginator(notifications, 20, count=None).get_page(request)
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(page_obj.as_json(lambda notification: {
+            'id': notification.id,
+            'type': notification.notification_type,
+            'title': notification.title,
+            'message': notification.message,
+            'is_read': notification.is_read,
+            'created_at': notification.created_at.isoformat(),
+        }))
     
     # Get unread count
     unread_count = Notification.get_unread_count(request.user)
@@ -88,6 +97,6 @@ def mark_all_read(request):
 
 @login_required
 def notification_count(request):
-    """Get unread notification count (AJAX)"""
-    count = Notification.get_unread_count(request.user)
-    return JsonResponse({'count': count})
+    """Get unread notification count (AJAX); live updates come over ws/badges/"""
+    counts = badges.get_badges(request.user)
+    return JsonResponse({'count': counts['notifications'], 'cart': counts['cart']})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Order, OrderItem, OrderStatus
+from .models import Cart, CartItem, Order, OrderEvent, OrderItem, OrderStatus
 
 
 @admin.register(Cart)
@@ -54,3 +54,18 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'menu_item', 'quantity', 'price', 'subtotal']
     list_filter = ['order__status', 'order__created_at']
     search_fields = ['order__order_number', 'menu_item__name']
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ['order', 'previous_status', 'status', 'created', 'state', 'attempts', 'occurred_at', 'processed_at']
+    list_filter = ['state', 'status', 'occurred_at']
+    search_fields = ['order__order_number', 'last_error']
+    readonly_fields = ['order', 'status', 'previous_status', 'created', 'attempts', 'last_error', 'handled_by', 'occurred_at', 'processed_at']
+    actions = ['replay_events']
+    
+    def replay_events(self, request, queryset):
+        from .events import replay_events
+        count = replay_events(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'{count} order event(s) queued for replay.')
+    replay_events.short_description = '↻ Replay Events'
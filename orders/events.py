@@ -0,0 +1,193 @@
+"""
+Order Lifecycle Events
+Durable order events, handed to subscribers in batches.
+
+One post_save receiver compares an Order's status with the value it was loaded
+with (LoadedValuesMixin), so each creation or status transition is detected
+once, without reading the row again. It writes an OrderEvent row in the
+transaction that saves the order (``Order.save`` is atomic). A rolled-back
+save therefore records nothing, and subscribers only ever see committed
+orders. Code that bulk-creates orders publishes their events with
+``publish``.
+
+Subscribers are registered with ``@subscriber`` and receive a list of
+OrderEvent rows. Each row carries the order id and the statuses. ``event.order``
+is loaded fresh for the batch, not the instance that was saved. Without
+ORDER_EVENTS_ASYNC, the events of a transaction are processed right after it
+commits. With it, ``process_order_events`` drains pending rows in batches of
+EVENT_BATCH_SIZE. Rows are claimed with ``select_for_update(skip_locked=True)``,
+so several workers never handle the same event. Rows left pending by a crash
+are picked up by the next drain. Each subscriber runs in its own savepoint,
+and its name is added to the ``handled_by`` list of the events it completed.
+A failing subscriber is logged and does not stop the others, but its events
+are marked failed with the error. ``replay_events``
+(`manage.py process_order_events --replay`) queues them again, and the next
+run only calls the subscribers missing from ``handled_by``.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Order, OrderEvent, OrderEventState
+
+logger = logging.getLogger(__name__)
+
+# Events handed to each subscriber per call
+EVENT_BATCH_SIZE = 200
+
+
+_subscribers = []
+
+
+def subscriber(handler):
+    """Register ``handler(events)`` for every batch of committed order events"""
+    _subscribers.append(handler)
+    return handler
+
+
+def subscriber_name(handler):
+    return f"{handler.__module__}.{handler.__qualname__}"
+
+
+def dispatch(events):
+    """
+    Run every subscriber on the events it has not handled yet.
+
+    Completed subscribers are added to each event's ``handled_by``. Returns
+    the errors of the failed subscribers, by event id.
+    """
+    failures = {}
+    for handler in list(_subscribers):
+        name = subscriber_name(handler)
+        pending = [event for event in events if name not in event.handled_by]
+        if not pending:
+            continue
+        try:
+            with transaction.atomic():
+                handler(pending)
+        except Exception as e:
+            logger.error(f"Order event subscriber {name} failed on {len(pending)} event(s): {e}", exc_info=True)
+            for event in pending:
+                failures.setdefault(event.pk, []).append(f"{name}: {e}")
+        else:
+            for event in pending:
+                event.handled_by.append(name)
+    return failures
+
+
+# ==================== RECORDING ====================
+
+def publish(events):
+    """
+    Record unsaved OrderEvents in the current transaction.
+
+    They are processed once it commits, or by the worker with
+    ORDER_EVENTS_ASYNC. Returns the saved rows.
+    """
+    events = OrderEvent.objects.bulk_create(events)
+    if events and not settings.ORDER_EVENTS_ASYNC:
+        event_ids = [event.pk for event in events]
+        transaction.on_commit(lambda: drain_events(event_ids=event_ids))
+    return events
+
+
+@receiver(post_save, sender=Order)
+def record_order_event(sender, instance, created, raw=False, **kwargs):
+    """Record creations and status transitions, compared with the loaded status"""
+    if raw:
+        return
+    if created:
+        publish([OrderEvent(order_id=instance.pk, status=instance.status, created=True)])
+        return
+    previous_status = instance.loaded_values().get('status')
+    if previous_status != instance.status:
+        publish([OrderEvent(order_id=instance.pk, status=instance.status, previous_status=previous_status)])
+
+
+# ==================== PROCESSING ====================
+
+def process_batch(event_ids):
+    """
+    Claim the pending events among ``event_ids`` and run the subscribers.
+
+    Events are marked processed, or failed when a subscriber failed; returns
+    the number of each.
+    """
+    counts = {OrderEventState.PROCESSED: 0, OrderEventState.FAILED: 0}
+    with transaction.atomic():
+        events = list(
+            OrderEvent.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=event_ids, state=OrderEventState.PENDING)
+            .order_by('pk')
+        )
+        if not events:
+            return counts
+        orders = Order.objects.in_bulk({event.order_id for event in events})
+        for event in events:
+            event.order = orders[event.order_id]
+        failures = dispatch(events)
+
+        now = timezone.now()
+        for event in events:
+            event.attempts += 1
+            errors = failures.get(event.pk)
+            if errors:
+                event.state = OrderEventState.FAILED
+                event.last_error = '\n'.join(errors)[:1000]
+            else:
+                event.state = OrderEventState.PROCESSED
+                event.last_error = ''
+                event.processed_at = now
+            counts[event.state] += 1
+        OrderEvent.objects.bulk_update(
+            events, ['state', 'attempts', 'last_error', 'handled_by', 'processed_at'], batch_size=EVENT_BATCH_SIZE
+        )
+    return counts
+
+
+def drain_events(batch_size=EVENT_BATCH_SIZE, max_batches=None, event_ids=None):
+    """Process pending events (or only ``event_ids``) batch by batch; returns processed/failed totals"""
+    totals = {OrderEventState.PROCESSED: 0, OrderEventState.FAILED: 0}
+    batches = 0
+    last_seen = 0
+    while max_batches is None or batches < max_batches:
+        pending = OrderEvent.objects.filter(state=OrderEventState.PENDING, pk__gt=last_seen)
+        if event_ids is not None:
+            pending = pending.filter(pk__in=event_ids)
+        batch = list(pending.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_seen = batch[-1]
+        try:
+            for state, count in process_batch(batch).items():
+                totals[state] += count
+        except Exception as e:
+            logger.error(f"Order event batch {batch[0]}-{last_seen} failed: {e}", exc_info=True)
+            OrderEvent.objects.filter(pk__in=batch, state=OrderEventState.PENDING).update(
+                state=OrderEventState.FAILED, attempts=F('attempts') + 1, last_error=str(e)[:1000]
+            )
+            totals[OrderEventState.FAILED] += len(batch)
+        batches += 1
+    if batches and event_ids is None:
+        logger.info(f"Order events drained in {batches} batch(es): {totals}")
+    return totals
+
+
+def replay_events(event_ids=None):
+    """
+    Queue failed events, or the given events in any state, to be processed again.
+
+    Subscribers already in an event's ``handled_by`` are not called again.
+    """
+    events = OrderEvent.objects.all()
+    if event_ids:
+        events = events.filter(pk__in=event_ids)
+    else:
+        events = events.filter(state=OrderEventState.FAILED)
+    return events.update(state=OrderEventState.PENDING, last_error='', processed_at=None)
@@ -0,0 +1,63 @@
+"""
+Management command to hand recorded order events to their subscribers
+Usage: python manage.py process_order_events [--batch-size 200] [--replay] [--event-id ID ...] [--loop --interval 2]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.events import EVENT_BATCH_SIZE, drain_events, replay_events
+
+
+class Command(BaseCommand):
+    help = 'Run the order event subscribers (notifications, loyalty, analytics, dashboards) on pending events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EVENT_BATCH_SIZE,
+            help=f'Events handed to the subscribers per batch (default: {EVENT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--replay',
+            action='store_true',
+            help='Queue failed events (or the --event-id events) again before processing',
+        )
+        parser.add_argument(
+            '--event-id',
+            type=int,
+            action='append',
+            dest='event_ids',
+            help='OrderEvent id to replay; may be repeated',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep draining pending events every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=2,
+            help='Seconds between drains with --loop (default: 2)',
+        )
+
+    def handle(self, *args, **options):
+        if options['replay'] or options['event_ids']:
+            replayed = replay_events(options['event_ids'])
+            self.stdout.write(f"Queued {replayed} order events for replay")
+
+        if options['loop']:
+            self.stdout.write(f"Draining order events every {options['interval']}s (Ctrl+C to stop)")
+            try:
+                while True:
+                    drain_events(options['batch_size'])
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Order event worker stopped'))
+            return
+
+        totals = drain_events(options['batch_size'])
+        style = self.style.WARNING if totals['failed'] else self.style.SUCCESS
+        self.stdout.write(style(f"Processed {totals['processed']} order events, {totals['failed']} failed"))
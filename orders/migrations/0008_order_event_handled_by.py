@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='handled_by',
+            field=models.JSONField(blank=True, default=list, help_text='Subscribers that completed for this event'),
+        ),
+    ]
@@ -1,10 +1,44 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from menu.models import MenuItem
 
 
+class LoadedValuesMixin:
+    """
+    Remember the last loaded/saved database values of ``TRACKED_FIELDS``.
+    
+    post_save/post_delete receivers compare ``loaded_values()`` with the
+    instance to see what changed, without re-fetching the row.
+    """
+    TRACKED_FIELDS = ()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+    
+    def _tracked_values(self):
+        return {
+            field: self.__dict__[field] for field in self.TRACKED_FIELDS if field in self.__dict__
+        }
+    
+    def loaded_values(self):
+        """Tracked field values as stored in the database, or {} for unsaved instances"""
+        return getattr(self, '_loaded_values', {})
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        current = self._tracked_values()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            saved = {self._meta.get_field(name).attname for name in update_fields}
+            current = {**self.loaded_values(), **{f: v for f, v in current.items() if f in saved}}
+        self._loaded_values = current
+
+
 class Cart(models.Model):
     """Shopping cart for a user"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
@@ -14,13 +48,19 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
     
+    def _items(self):
+        """Cart items with their menu items, reusing a prefetch when there is one"""
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.items.all()
+        return self.items.select_related('menu_item')
+    
     def get_total(self):
         """Calculate total price of all items in cart"""
-        return sum(item.get_subtotal() for item in self.items.all())
+        return sum(item.get_subtotal() for item in self._items())
     
     def get_item_count(self):
         """Get total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return sum(item.quantity for item in self._items())
 
 
 class CartItem(models.Model):
@@ -52,8 +92,10 @@ class OrderStatus(models.TextChoices):
     CANCELLED = 'cancelled', 'Cancelled'
 
 
-class Order(models.Model):
+class Order(LoadedValuesMixin, models.Model):
     """Customer order"""
+    TRACKED_FIELDS = ('user_id', 'status', 'payment_method', 'total', 'created_at')
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     order_number = models.CharField(max_length=20, unique=True, editable=False)
     status = models.CharField(max_length=20, choices=OrderStatus.choices, default=OrderStatus.PENDING)
@@ -112,6 +154,11 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number} - {self.user.username}"
@@ -132,7 +179,9 @@ class Order(models.Model):
                 self.order_number = f"{prefix}{timestamp}{random_part}"
             else:
                 self.order_number = f"{prefix}{uuid.uuid4().hex[:12].upper()}"
-        super().save(*args, **kwargs)
+        # post_save writes the OrderEvent row; it must commit or roll back with the order
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
     def get_status_display_class(self):
         status_classes = {
@@ -146,8 +195,10 @@ class Order(models.Model):
         return status_classes.get(self.status, 'secondary')
 
 
-class OrderItem(models.Model):
+class OrderItem(LoadedValuesMixin, models.Model):
     """Individual item in an order"""
+    TRACKED_FIELDS = ('order_id', 'menu_item_id', 'quantity', 'subtotal')
+    
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     menu_item = models.ForeignKey(MenuItem, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
@@ -160,3 +211,40 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         self.subtotal = self.price * self.quantity
         super().save(*args, **kwargs)
+
+
+class OrderEventState(models.TextChoices):
+    """Processing state of a recorded order event"""
+    PENDING = 'pending', 'Pending'
+    PROCESSED = 'processed', 'Processed'
+    FAILED = 'failed', 'Failed'
+
+
+class OrderEvent(models.Model):
+    """Order creation or status transition, written with the order and handed to the event subscribers"""
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    status = models.CharField(max_length=20, choices=OrderStatus.choices)
+    previous_status = models.CharField(max_length=20, choices=OrderStatus.choices, null=True, blank=True)
+    created = models.BooleanField(default=False, help_text="The order was placed by this event")
+    
+    state = models.CharField(max_length=20, choices=OrderEventState.choices, default=OrderEventState.PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    handled_by = models.JSONField(default=list, blank=True, help_text="Subscribers that completed for this event")
+    
+    occurred_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['occurred_at']
+        indexes = [
+            models.Index(fields=['state', 'occurred_at']),
+        ]
+    
+    def __str__(self):
+        return f"Order {self.order_id} {self.previous_status or 'new'} -> {self.status} - {self.state}"
+    
+    def entered(self, *statuses):
+        """Whether this event moved the order into one of ``statuses``"""
+        return self.status in statuses and (self.created or self.previous_status not in statuses)
@@ -3,78 +3,140 @@ Order calculation service for smart pricing with discounts
 """
 
 from decimal import Decimal
-from django.db.models import Sum
-from subscriptions.models import VIPTier, LoyaltyPoints, ReferralProgram
-from corporate.models import CorporateEmployee, CorporateContract
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
+from subscriptions.models import ReferralProgram
+from corporate.models import CorporateContract
+
+
+class PricingContext:
+    """
+    A user's discount entitlements and cart contents, loaded once.
+    
+    VIP tier, active corporate employment and contract discount, loyalty
+    balance and pending referral discount come from one joined query; cart
+    items are fetched once with their menu items. Use for_request() so the
+    loyalty info and every total priced in a request share the same context.
+    """
+    
+    def __init__(self, user):
+        self.user = user
+        self._entitled_user = None
+        self._cart_items = {}
+    
+    @classmethod
+    def for_request(cls, request):
+        """The pricing context memoized on ``request`` for its user"""
+        context = getattr(request, '_pricing_context', None)
+        if context is None or context.user.pk != request.user.pk:
+            context = cls(request.user)
+            request._pricing_context = context
+        return context
+    
+    @property
+    def entitled_user(self):
+        """The user with VIP, corporate, loyalty and referral data joined in"""
+        if self._entitled_user is None:
+            contract_discount = CorporateContract.objects.filter(
+                partner_id=OuterRef('corporate_profile__partner_id'),
+                is_active=True
+            ).values('discount_percentage')[:1]
+            referral_discount = ReferralProgram.objects.filter(
+                referee_id=OuterRef('pk'),
+                status='PENDING'
+            ).values('referee_discount_percent')[:1]
+            
+            self._entitled_user = User.objects.select_related(
+                'vip_tier', 'corporate_profile__partner', 'subscription_loyalty_points'
+            ).annotate(
+                contract_discount=Subquery(contract_discount),
+                referral_discount=Subquery(referral_discount),
+            ).get(pk=self.user.pk)
+        return self._entitled_user
+    
+    @property
+    def vip_tier(self):
+        return getattr(self.entitled_user, 'vip_tier', None)
+    
+    @property
+    def vip_discount_percent(self):
+        return self.vip_tier.get_benefits().get('discount', 0) if self.vip_tier else 0
+    
+    @property
+    def corporate_employee(self):
+        employee = getattr(self.entitled_user, 'corporate_profile', None)
+        return employee if employee is not None and employee.is_active else None
+    
+    @property
+    def corporate_discount_percent(self):
+        if self.corporate_employee is None or self.entitled_user.contract_discount is None:
+            return 0
+        return float(self.entitled_user.contract_discount)
+    
+    @property
+    def has_referral_discount(self):
+        return self.entitled_user.referral_discount is not None
+    
+    @property
+    def referral_discount_percent(self):
+        return float(self.entitled_user.referral_discount) if self.has_referral_discount else 0
+    
+    @property
+    def loyalty_points(self):
+        return getattr(self.entitled_user, 'subscription_loyalty_points', None)
+    
+    def cart_items(self, cart):
+        """The cart's items with menu items, fetched once per cart"""
+        if cart.pk not in self._cart_items:
+            self._cart_items[cart.pk] = list(cart.items.select_related('menu_item'))
+        return self._cart_items[cart.pk]
+    
+    def cart_subtotal(self, cart):
+        return sum((item.get_subtotal() for item in self.cart_items(cart)), Decimal('0.00'))
+
 
 class OrderCalculationService:
     """Service for calculating order totals with all discounts applied"""
     
     @staticmethod
-    def calculate_order_total(cart, user, loyalty_points_to_redeem=0):
+    def calculate_order_total(cart, user, loyalty_points_to_redeem=0, context=None):
         """
         Calculate order total with all applicable discounts.
+        
+        Pass the request's PricingContext to reuse its entitlements and cart items.
         """
+        if context is None:
+            context = PricingContext(user)
         
         # Calculate subtotal from cart
-        subtotal = cart.get_total()
+        subtotal = context.cart_subtotal(cart)
         
         # Initialize discount tracking
         vip_discount_amount = Decimal('0.00')
-        vip_discount_percent = 0
         corporate_discount_amount = Decimal('0.00')
-        corporate_discount_percent = 0
         loyalty_discount_amount = Decimal('0.00')
         referral_discount_amount = Decimal('0.00')
-        referral_discount_percent = 0
         
         # 1. VIP Tier Discount
-        try:
-            vip_tier = VIPTier.objects.get(user=user)
-            benefits = vip_tier.get_benefits()
-            vip_discount_percent = benefits.get('discount', 0)
-            
-            if vip_discount_percent > 0:
-                vip_discount_amount = subtotal * (Decimal(str(vip_discount_percent)) / 100)
-        except VIPTier.DoesNotExist:
-            pass
+        vip_discount_percent = context.vip_discount_percent
+        if vip_discount_percent > 0:
+            vip_discount_amount = subtotal * (Decimal(str(vip_discount_percent)) / 100)
             
         # 2. Corporate Discount
-        try:
-            employee = CorporateEmployee.objects.get(user=user, is_active=True)
-            contract = CorporateContract.objects.filter(
-                partner=employee.partner, 
-                is_active=True
-            ).first()
-            
-            if contract:
-                corporate_discount_percent = float(contract.discount_percentage)
-                corporate_discount_amount = subtotal * (Decimal(str(corporate_discount_percent)) / 100)
-        except Exception:
-            # Catching all exceptions (including OperationalError if table is missing)
-            pass
+        corporate_discount_percent = context.corporate_discount_percent
+        if corporate_discount_percent:
+            corporate_discount_amount = subtotal * (Decimal(str(corporate_discount_percent)) / 100)
         
         # 3. Referral Discount (10% off first order)
-        try:
-            referral = ReferralProgram.objects.filter(
-                referee=user,
-                status='PENDING'
-            ).first()
-            
-            if referral:
-                referral_discount_percent = float(referral.referee_discount_percent)
-                referral_discount_amount = subtotal * (Decimal(str(referral_discount_percent)) / 100)
-        except ReferralProgram.DoesNotExist:
-            pass
+        referral_discount_percent = context.referral_discount_percent
+        if referral_discount_percent:
+            referral_discount_amount = subtotal * (Decimal(str(referral_discount_percent)) / 100)
         
         # 4. Loyalty Points Redemption
         if loyalty_points_to_redeem > 0:
-            try:
-                loyalty_points = LoyaltyPoints.objects.get(user=user)
-                if loyalty_points.balance >= loyalty_points_to_redeem:
-                    loyalty_discount_amount = Decimal(loyalty_points_to_redeem * 100)
-            except LoyaltyPoints.DoesNotExist:
-                pass
+            loyalty_points = context.loyalty_points
+            if loyalty_points is not None and loyalty_points.balance >= loyalty_points_to_redeem:
+                loyalty_discount_amount = Decimal(loyalty_points_to_redeem * 100)
         
         # Calculate total discount
         # Policy: Take the highest of VIP or Corporate discount, then add others
@@ -113,8 +175,10 @@ class OrderCalculationService:
         }
     
     @staticmethod
-    def get_user_loyalty_info(user):
+    def get_user_loyalty_info(user, context=None):
         """Get user's VIP tier, corporate and loyalty points info"""
+        if context is None:
+            context = PricingContext(user)
         
         info = {
             'vip_tier': None,
@@ -129,49 +193,27 @@ class OrderCalculationService:
         }
         
         # VIP Tier
-        try:
-            vip_tier = VIPTier.objects.get(user=user)
-            benefits = vip_tier.get_benefits()
+        vip_tier = context.vip_tier
+        if vip_tier is not None:
             info['vip_tier'] = vip_tier
             info['vip_tier_name'] = vip_tier.get_tier_level_display()
-            info['vip_discount'] = benefits.get('discount', 0)
-        except VIPTier.DoesNotExist:
-            pass
+            info['vip_discount'] = context.vip_discount_percent
             
         # Corporate Info
-        try:
-            employee = CorporateEmployee.objects.get(user=user, is_active=True)
-            contract = CorporateContract.objects.filter(
-                partner=employee.partner, 
-                is_active=True
-            ).first()
-            
+        employee = context.corporate_employee
+        if employee is not None:
             info['corporate_partner'] = employee.partner.name
-            if contract:
-                info['corporate_discount'] = float(contract.discount_percentage)
-        except Exception:
-            # Catching all exceptions (including OperationalError if table is missing)
-            pass
+            info['corporate_discount'] = context.corporate_discount_percent
         
         # Loyalty Points
-        try:
-            loyalty_points = LoyaltyPoints.objects.get(user=user)
+        loyalty_points = context.loyalty_points
+        if loyalty_points is not None:
             info['loyalty_balance'] = loyalty_points.balance
             info['loyalty_value_rwf'] = loyalty_points.value_in_rwf
-        except LoyaltyPoints.DoesNotExist:
-            pass
         
         # Referral Discount
-        try:
-            referral = ReferralProgram.objects.filter(
-                referee=user,
-                status='PENDING'
-            ).first()
-            
-            if referral:
-                info['has_referral_discount'] = True
-                info['referral_discount_percent'] = float(referral.referee_discount_percent)
-        except:
-            pass
+        if context.has_referral_discount:
+            info['has_referral_discount'] = True
+            info['referral_discount_percent'] = context.referral_discount_percent
         
         return info
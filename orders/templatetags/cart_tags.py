@@ -1,16 +1,12 @@
 from django import template
+from notifications import badges
 
 register = template.Library()
 
 @register.simple_tag
 def get_cart_count(user):
     """Get cart item count for user"""
-    if user.is_authenticated:
-        try:
-            return user.cart.get_item_count()
-        except:
-            return 0
-    return 0
+    return badges.get_count(user, 'cart')
 
 
 
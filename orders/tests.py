@@ -1,11 +1,20 @@
 """
 Unit tests for orders app
 """
-from django.test import TestCase
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from decimal import Decimal
+from analytics.models import ConversionEvent, RevenueStream
+from loyalty.models import LoyaltyPoints, PointsTransaction
 from menu.models import Category, MenuItem
-from .models import Cart, CartItem, Order, OrderItem, OrderStatus
+from notifications.models import Notification
+from .events import drain_events, replay_events, subscriber, subscriber_name, _subscribers
+from .models import Cart, CartItem, Order, OrderEvent, OrderEventState, OrderItem, OrderStatus
 
 
 class CartModelTest(TestCase):
@@ -201,3 +210,264 @@ class OrderViewsTest(TestCase):
         """Test order history view"""
         response = self.client.get('/orders/history/')
         self.assertEqual(response.status_code, 200)
+
+
+class PricingContextTest(TestCase):
+    """Test discount resolution through PricingContext"""
+    
+    def setUp(self):
+        """Set up a user with every kind of entitlement"""
+        from datetime import date, timedelta
+        from django.utils import timezone
+        from corporate.models import CorporateContract, CorporateEmployee, CorporatePartner
+        from subscriptions.models import LoyaltyPoints, ReferralProgram, VIPTier
+        
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        referrer = User.objects.create_user(username='referrer', password='testpass123')
+        category = Category.objects.create(name='Lunch', slug='lunch')
+        menu_item = MenuItem.objects.create(
+            name='Isombe', description='Cassava leaves', category=category, price=Decimal('2000.00')
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, menu_item=menu_item, quantity=5)
+        
+        VIPTier.objects.create(user=self.user, tier_level='silver', achieved_at=date.today())
+        partner = CorporatePartner.objects.create(
+            name='CHUK', address='Kigali', contact_person='HR', contact_email='hr@chuk.rw', contact_phone='0788000000'
+        )
+        CorporateContract.objects.create(
+            partner=partner, contract_number='C-1', start_date=date.today(),
+            end_date=date.today() + timedelta(days=365), discount_percentage=Decimal('12.00')
+        )
+        CorporateEmployee.objects.create(user=self.user, partner=partner)
+        ReferralProgram.objects.create(
+            referrer=referrer, referee=self.user, referral_code='REF1',
+            expires_at=timezone.now() + timedelta(days=30)
+        )
+        LoyaltyPoints.objects.create(user=self.user, balance=20)
+    
+    def test_entitlements_and_cart_load_in_two_queries(self):
+        """Pricing and loyalty info share one entitlement query and one cart query"""
+        from .services import OrderCalculationService, PricingContext
+        
+        context = PricingContext(self.user)
+        with self.assertNumQueries(2):
+            pricing = OrderCalculationService.calculate_order_total(self.cart, self.user, 10, context=context)
+            info = OrderCalculationService.get_user_loyalty_info(self.user, context=context)
+        
+        self.assertEqual(pricing['subtotal'], Decimal('10000.00'))
+        # Corporate (12%) beats VIP silver (5%); referral and loyalty stack on top
+        self.assertEqual(pricing['corporate_discount_amount'], Decimal('1200.00'))
+        self.assertEqual(pricing['vip_discount_amount'], Decimal('0.00'))
+        self.assertEqual(pricing['referral_discount_amount'], Decimal('1000.00'))
+        self.assertEqual(pricing['loyalty_discount_amount'], Decimal('1000.00'))
+        self.assertEqual(pricing['grand_total'], Decimal('6800.00'))
+        
+        self.assertEqual(info['vip_discount'], 5)
+        self.assertEqual(info['corporate_partner'], 'CHUK')
+        self.assertEqual(info['loyalty_balance'], 20)
+        self.assertTrue(info['has_referral_discount'])
+    
+    def test_user_without_entitlements(self):
+        """A plain customer gets no discounts"""
+        from .services import OrderCalculationService
+        
+        plain = User.objects.create_user(username='plain', password='testpass123')
+        pricing = OrderCalculationService.calculate_order_total(Cart.objects.create(user=plain), plain)
+        info = OrderCalculationService.get_user_loyalty_info(plain)
+        
+        self.assertEqual(pricing['total_discount'], Decimal('0.00'))
+        self.assertIsNone(info['vip_tier'])
+        self.assertIsNone(info['corporate_partner'])
+        self.assertFalse(info['has_referral_discount'])
+
+
+class OrderEventBusTests(TestCase):
+    """Order lifecycle events published on commit to batched subscribers"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='eater', password='testpass123')
+
+    def place_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(
+                user=self.user, customer_name='Eater', customer_phone='+250788123456',
+                subtotal=Decimal('3000.00'), total=Decimal('3000.00')
+            )
+
+    def set_status(self, order, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = status
+            order.save()
+
+    def test_delivery_runs_each_subscriber_once(self):
+        order = self.place_order()
+        self.assertTrue(Notification.objects.filter(order=order, title='Order Placed').exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks() as callbacks:
+                order.status = OrderStatus.DELIVERED
+                order.save()
+        # The transition is read from the loaded values, not by re-fetching the row
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('SELECT "orders_order"."id"')])
+        for callback in callbacks:
+            callback()
+
+        # Saving again without a transition publishes nothing
+        self.set_status(Order.objects.get(pk=order.pk), OrderStatus.DELIVERED)
+
+        self.assertEqual(Notification.objects.filter(order=order, title='Order Delivered').count(), 1)
+        self.assertEqual(PointsTransaction.objects.get(order=order).points, 30)
+        self.assertEqual(LoyaltyPoints.objects.get(user=self.user).total_points, 30)
+        self.assertEqual(Notification.objects.filter(user=self.user, title='Points Earned!').count(), 1)
+        self.assertEqual(ConversionEvent.objects.filter(user=self.user, event_type='complete_order').count(), 1)
+        stream = RevenueStream.objects.get(channel='direct_order')
+        self.assertEqual((stream.amount, stream.transaction_count), (Decimal('3000.00'), 1))
+
+    def test_rolled_back_change_publishes_nothing(self):
+        order = self.place_order()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                order.status = OrderStatus.CANCELLED
+                order.save()
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+
+    def test_rolled_back_change_records_nothing(self):
+        order = self.place_order()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            order.status = OrderStatus.CANCELLED
+            order.save()
+            raise RuntimeError
+        self.assertFalse(OrderEvent.objects.filter(order=order, status=OrderStatus.CANCELLED).exists())
+
+    @override_settings(ORDER_EVENTS_ASYNC=True)
+    def test_worker_drains_pending_events_in_batches(self):
+        order = self.place_order()
+        for status in (OrderStatus.CONFIRMED, OrderStatus.PREPARING, OrderStatus.READY):
+            self.set_status(order, status)
+        pending = OrderEvent.objects.filter(state=OrderEventState.PENDING)
+        self.assertEqual(pending.count(), 4)
+        self.assertFalse(Notification.objects.filter(order=order).exists())
+
+        batches = []
+        handler = subscriber(lambda events: batches.append([(event.status, event.order.status) for event in events]))
+        self.addCleanup(_subscribers.remove, handler)
+        call_command('process_order_events', batch_size=3, stdout=mock.MagicMock())
+
+        # Events carry their own status; the order is loaded fresh for each batch
+        self.assertEqual(batches, [
+            [('pending', 'ready'), ('confirmed', 'ready'), ('preparing', 'ready')],
+            [('ready', 'ready')],
+        ])
+        self.assertFalse(pending.exists())
+        self.assertEqual(Notification.objects.filter(order=order).count(), 4)
+
+    @override_settings(ORDER_EVENTS_ASYNC=True)
+    def test_failed_batch_can_be_replayed(self):
+        order = self.place_order()
+        with mock.patch('orders.events.dispatch', side_effect=RuntimeError('boom')):
+            totals = drain_events()
+        self.assertEqual(totals['failed'], 1)
+        event = OrderEvent.objects.get(order=order)
+        self.assertEqual((event.state, event.last_error), (OrderEventState.FAILED, 'boom'))
+
+        self.assertEqual(replay_events(), 1)
+        self.assertEqual(drain_events()['processed'], 1)
+        self.assertTrue(Notification.objects.filter(order=order, title='Order Placed').exists())
+
+    @override_settings(ORDER_EVENTS_ASYNC=True)
+    def test_failed_subscriber_fails_event_and_replays_only_itself(self):
+        order = self.place_order()
+        calls = []
+
+        def flaky(events):
+            calls.append([event.order_id for event in events])
+            if len(calls) == 1:
+                raise RuntimeError('down')
+
+        handler = subscriber(flaky)
+        self.addCleanup(_subscribers.remove, handler)
+        totals = drain_events()
+
+        self.assertEqual((totals['processed'], totals['failed']), (0, 1))
+        event = OrderEvent.objects.get(order=order)
+        self.assertEqual(event.state, OrderEventState.FAILED)
+        self.assertIn('down', event.last_error)
+        self.assertNotIn(subscriber_name(flaky), event.handled_by)
+        self.assertEqual(Notification.objects.filter(order=order, title='Order Placed').count(), 1)
+
+        self.assertEqual(replay_events(), 1)
+        self.assertEqual(drain_events()['processed'], 1)
+        self.assertEqual(calls, [[order.pk], [order.pk]])
+        # Subscribers that completed the first time are not called again
+        self.assertEqual(Notification.objects.filter(order=order, title='Order Placed').count(), 1)
+        self.assertEqual(OrderEvent.objects.get(order=order).state, OrderEventState.PROCESSED)
+
+
+class OrderHistoryCursorTests(TestCase):
+    """Keyset pages of the order history with signed cursors"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='eater', password='testpass123')
+        self.orders = [
+            Order.objects.create(
+                user=self.user, customer_name='Eater', customer_phone='+250788123456',
+                subtotal=Decimal('1000.00'), total=Decimal('1000.00')
+            )
+            for _ in range(25)
+        ]
+        # Ties on created_at are broken by id
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[5:15]]).update(created_at=self.orders[5].created_at)
+        self.expected = list(Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.client.login(username='eater', password='testpass123')
+
+    def get(self, url='/orders/history/', **params):
+        return self.client.get(url, params, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()
+
+    def test_pages_walk_forwards_and_backwards(self):
+        seen, pages = [], []
+        data = self.get()
+        while True:
+            pages.append(data)
+            seen.extend(row['id'] for row in data['results'])
+            if not data['next']:
+                break
+            data = self.get(cursor=data['next'])
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+
+        back = self.get(cursor=pages[2]['previous'])
+        self.assertEqual([row['id'] for row in back['results']], self.expected[10:20])
+        first = self.get(cursor=back['previous'])
+        self.assertEqual([row['id'] for row in first['results']], self.expected[:10])
+        self.assertIsNone(first['previous'])
+
+    def test_deep_page_query_has_no_offset(self):
+        from django.test.utils import CaptureQueriesContext
+
+        cursor = self.get()['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/orders/history/', {'cursor': cursor})
+        order_queries = [q['sql'] for q in queries if 'FROM "orders_order"' in q['sql']]
+        self.assertTrue(order_queries)
+        self.assertFalse(any('OFFSET' in sql or 'COUNT(' in sql for sql in order_queries))
+
+    def test_tampered_or_foreign_cursor_falls_back_to_first_page(self):
+        from dusangire.pagination import CursorPaginator
+
+        cursor = self.get()['next']
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+        self.assertEqual([row['id'] for row in self.get(cursor=tampered)['results']], self.expected[:10])
+
+        foreign = CursorPaginator(Order.objects.all(), 10, key='support.tickets').encode(self.orders[0])
+        self.assertEqual([row['id'] for row in self.get(cursor=foreign)['results']], self.expected[:10])
+
+    def test_approximate_count_is_capped(self):
+        from dusangire import pagination
+
+        with mock.patch.object(pagination, 'COUNT_LIMIT', 20):
+            page = pagination.CursorPaginator(Order.objects.all(), 10).page()
+            self.assertEqual((page.count, page.count_is_approximate), (20, True))
+        page = pagination.CursorPaginator(Order.objects.filter(pk=self.orders[0].pk), 10, count='exact').page()
+        self.assertEqual((page.count, page.count_is_approximate), (1, False))
@@ -3,7 +3,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
 from django.http import JsonResponse
-from django.core.paginator import Paginator
+from dusangire.pagination import CursorPaginator
 from decimal import Decimal
 from menu.models import MenuItem, DietaryTag
 from delivery.models import DeliveryAddress, DeliveryZone
@@ -195,21 +195,24 @@ def cart(request):
 def checkout(request):
     """Checkout page with delivery address selection and loyalty integration"""
     from accounts.validators import validate_user_can_make_payment
-    from .services import OrderCalculationService
+    from .services import OrderCalculationService, PricingContext
     
     cart = get_or_create_cart(request.user)
-    cart_items = cart.items.select_related('menu_item').all()
+    pricing_context = PricingContext.for_request(request)
+    cart_items = pricing_context.cart_items(cart)
     
-    if not cart_items.exists():
+    if not cart_items:
         messages.warning(request, 'Your cart is empty')
         return redirect('orders:cart')
     
     # Get user delivery addresses
-    delivery_addresses = DeliveryAddress.objects.filter(user=request.user).order_by('-is_default', '-created_at')
-    default_address = delivery_addresses.filter(is_default=True).first()
+    delivery_addresses = list(
+        DeliveryAddress.objects.filter(user=request.user).order_by('-is_default', '-created_at')
+    )
+    default_address = next((address for address in delivery_addresses if address.is_default), None)
     
     # Ensure user has at least one address
-    if not delivery_addresses.exists():
+    if not delivery_addresses:
         messages.warning(request, 'Please add a delivery address before checking out')
         return redirect('delivery:address_create')
     
@@ -217,11 +220,13 @@ def checkout(request):
     profile = getattr(request.user, 'profile', None)
     
     # Get loyalty info for user
-    loyalty_info = OrderCalculationService.get_user_loyalty_info(request.user)
+    loyalty_info = OrderCalculationService.get_user_loyalty_info(request.user, context=pricing_context)
     
     if request.method == 'POST':
         loyalty_points_to_redeem = int(request.POST.get('loyalty_points_redeem', 0))
-        pricing = OrderCalculationService.calculate_order_total(cart, request.user, loyalty_points_to_redeem)
+        pricing = OrderCalculationService.calculate_order_total(
+            cart, request.user, loyalty_points_to_redeem, context=pricing_context
+        )
         
         payment_method = request.POST.get('payment_method', PaymentMethod.CASH_ON_DELIVERY)
         phone_number = request.POST.get('phone_number', '').strip()
@@ -303,10 +308,10 @@ def checkout(request):
         
         try:
             with transaction.atomic():
+                # Menu items are re-read by this locking query, so availability is current
                 cart_items_locked = list(cart.items.select_for_update().select_related('menu_item').all())
                 
                 for cart_item in cart_items_locked:
-                    cart_item.menu_item.refresh_from_db()
                     if not cart_item.menu_item.is_available:
                         messages.error(request, f'{cart_item.menu_item.name} is no longer available')
                         return redirect('orders:cart')
@@ -354,7 +359,7 @@ def checkout(request):
             messages.error(request, 'An error occurred while placing your order. Please try again or contact support.')
             return redirect('orders:checkout')
     
-    pricing = OrderCalculationService.calculate_order_total(cart, request.user, 0)
+    pricing = OrderCalculationService.calculate_order_total(cart, request.user, 0, context=pricing_context)
     delivery_zones = DeliveryZone.objects.filter(is_active=True)
     
     context = {
@@ -384,11 +389,19 @@ def order_detail(request, order_id):
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).select_related('user').prefetch_related('items__menu_item').order_by('-created_at')
+    orders = Order.objects.filter(user=request.user).select_related('user').prefetch_related('items__menu_item')
     
-    paginator = Paginator(orders, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pages on (created_at, id); the cursor names the last order shown
+    page_obj = CursorPaginator(orders, 10, count=None).get_page(request)
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(page_obj.as_json(lambda order: {
+            'id': order.id,
+            'order_number': order.order_number,
+            'status': order.status,
+            'total': str(order.total),
+            'created_at': order.created_at.isoformat(),
+        }))
     
     context = {
         'page_obj': page_obj,
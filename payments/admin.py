@@ -8,7 +8,7 @@ from datetime import timedelta
 from .models import (
     Payment, PaymentTransaction, Invoice, PaymentReconciliation,
     RefundRequest, AirtelMoneyProvider, MTNMobileMoneyProvider,
-    BankTransferProvider
+    BankTransferProvider, WebhookEvent
 )
 
 
@@ -555,3 +555,17 @@ class RefundRequestAdmin(admin.ModelAdmin):
         self.message_user(request, f'{count} refund request(s) rejected.')
     reject_refund.short_description = '✗ Reject Refund'
 
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'provider', 'status', 'attempts', 'payment', 'received_at', 'processed_at']
+    list_filter = ['provider', 'status', 'received_at']
+    search_fields = ['event_id', 'last_error']
+    readonly_fields = ['provider', 'event_id', 'payload', 'payment', 'attempts', 'last_error', 'received_at', 'processed_at']
+    actions = ['replay_events']
+    
+    def replay_events(self, request, queryset):
+        from .inbox import replay_events
+        count = replay_events(list(queryset.values_list('pk', flat=True)))
+        self.message_user(request, f'{count} webhook event(s) queued for replay.')
+    replay_events.short_description = '↻ Replay Events'
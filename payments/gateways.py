@@ -4,6 +4,7 @@ Supports multiple payment methods with real API integrations
 Hospital-ready payment processing system
 """
 
+import hmac
 import requests
 import json
 import logging
@@ -11,6 +12,7 @@ from decimal import Decimal
 from django.conf import settings
 from django.utils import timezone
 from .models import Payment, PaymentStatus, PaymentMethod
+from .transport import get_transport, token_cache
 
 logger = logging.getLogger(__name__)
 
@@ -20,21 +22,77 @@ class PaymentGatewayError(Exception):
     pass
 
 
+# verify_payment responses for each checked status
+VERIFY_RESULTS = {
+    'completed': {'success': True, 'status': 'completed'},
+    'failed': {'success': False, 'status': 'failed'},
+    'processing': {'success': True, 'status': 'processing'},
+    'unknown': {'success': False, 'status': 'unknown'},
+}
+
+
+def apply_status(payment: Payment, result: dict):
+    """Move a payment to a checked completed/failed status in memory; returns whether it changed"""
+    if result['status'] == 'completed':
+        payment.status = PaymentStatus.COMPLETED
+        payment.paid_at = timezone.now()
+        payment.transaction_id = result.get('transaction_id') or payment.transaction_id
+        return True
+    if result['status'] == 'failed':
+        payment.status = PaymentStatus.FAILED
+        return True
+    return False
+
+
 class BasePaymentGateway:
     """Base class for payment gateways"""
     
+    # Name of the pooled transport shared by every instance of the gateway
+    provider = None
+    
     def __init__(self):
         self.api_key = None
         self.api_secret = None
         self.environment = getattr(settings, 'PAYMENT_ENVIRONMENT', 'sandbox')
     
+    @property
+    def transport(self):
+        """Pooled HTTP session for this gateway's provider"""
+        return get_transport(self.provider)
+    
+    def _token_key(self):
+        """Token cache key; subclasses using OAuth include their credentials"""
+        return (self.provider, self.base_url)
+    
+    def _check_response(self, response):
+        """Drop a cached token the provider has rejected; raise on provider outages"""
+        if response.status_code == 401:
+            token_cache.invalidate(self._token_key())
+        if response.status_code >= 500:
+            raise PaymentGatewayError(f"{self.provider} unavailable: HTTP {response.status_code}")
+    
     def initiate_payment(self, payment: Payment, **kwargs):
         """Initiate payment with the gateway"""
         raise NotImplementedError("Subclasses must implement initiate_payment")
     
-    def verify_payment(self, payment: Payment, transaction_id: str):
-        """Verify payment status with the gateway"""
-        raise NotImplementedError("Subclasses must implement verify_payment")
+    def check_status(self, payment: Payment, transaction_id: str = None):
+        """
+        Ask the gateway for a payment's status without saving anything.
+        Returns {'status': 'completed'|'failed'|'processing'|'unknown'} plus the
+        gateway's 'transaction_id' when it reports one; network errors propagate.
+        """
+        raise NotImplementedError("Subclasses must implement check_status")
+    
+    def verify_payment(self, payment: Payment, transaction_id: str = None):
+        """Verify payment status with the gateway and save the outcome"""
+        try:
+            result = self.check_status(payment, transaction_id)
+            if apply_status(payment, result):
+                payment.save()
+            return dict(VERIFY_RESULTS[result['status']])
+        except Exception as e:
+            logger.error(f"{self.__class__.__name__} verification error: {str(e)}")
+            return {'success': False, 'error': str(e)}
     
     def process_webhook(self, payload: dict):
         """Process webhook callback from gateway"""
@@ -44,6 +102,8 @@ class BasePaymentGateway:
 class MTNMobileMoneyGateway(BasePaymentGateway):
     """MTN Mobile Money Payment Gateway"""
     
+    provider = 'mtn_momo'
+    
     def __init__(self):
         super().__init__()
         self.api_key = getattr(settings, 'MTN_MOMO_API_KEY', '')
@@ -55,6 +115,7 @@ class MTNMobileMoneyGateway(BasePaymentGateway):
             self.base_url = 'https://sandbox.momodeveloper.mtn.com'
         else:
             self.base_url = 'https://api.momodeveloper.mtn.com'
+        self.base_url = getattr(settings, 'MTN_MOMO_BASE_URL', self.base_url)
     
     def initiate_payment(self, payment: Payment, **kwargs):
         """Initiate MTN Mobile Money payment"""
@@ -88,12 +149,13 @@ class MTNMobileMoneyGateway(BasePaymentGateway):
                 'Ocp-Apim-Subscription-Key': self.subscription_key
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/collection/v1_0/requesttopay',
+                operation='initiate',
                 json=payment_request,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
+            self._check_response(response)
             
             if response.status_code in [200, 202]:
                 transaction_id = response.headers.get('X-Reference-Id', str(payment.id))
@@ -120,50 +182,44 @@ class MTNMobileMoneyGateway(BasePaymentGateway):
             logger.error(f"MTN Mobile Money payment error: {str(e)}")
             raise PaymentGatewayError(f"Payment initiation failed: {str(e)}")
     
-    def verify_payment(self, payment: Payment, transaction_id: str = None):
-        """Verify MTN Mobile Money payment status"""
-        try:
-            transaction_id = transaction_id or payment.transaction_id
-            if not transaction_id:
-                raise PaymentGatewayError("Transaction ID is required")
-            
-            token = self._get_access_token()
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'X-Target-Environment': self.environment,
-                'Ocp-Apim-Subscription-Key': self.subscription_key
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/collection/v1_0/requesttopay/{transaction_id}',
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get('status', '').upper()
-                
-                if status == 'SUCCESSFUL':
-                    payment.status = PaymentStatus.COMPLETED
-                    payment.paid_at = timezone.now()
-                    payment.save()
-                    return {'success': True, 'status': 'completed'}
-                elif status == 'FAILED':
-                    payment.status = PaymentStatus.FAILED
-                    payment.save()
-                    return {'success': False, 'status': 'failed'}
-                else:
-                    return {'success': True, 'status': 'processing'}
-            else:
-                return {'success': False, 'status': 'unknown'}
-                
-        except Exception as e:
-            logger.error(f"MTN Mobile Money verification error: {str(e)}")
-            return {'success': False, 'error': str(e)}
+    def check_status(self, payment: Payment, transaction_id: str = None):
+        """Check MTN Mobile Money payment status"""
+        transaction_id = transaction_id or payment.transaction_id
+        if not transaction_id:
+            raise PaymentGatewayError("Transaction ID is required")
+        
+        token = self._get_access_token()
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'X-Target-Environment': self.environment,
+            'Ocp-Apim-Subscription-Key': self.subscription_key
+        }
+        
+        response = self.transport.get(
+            f'{self.base_url}/collection/v1_0/requesttopay/{transaction_id}',
+            operation='verify',
+            headers=headers
+        )
+        self._check_response(response)
+        
+        if response.status_code != 200:
+            return {'status': 'unknown'}
+        status = response.json().get('status', '').upper()
+        if status == 'SUCCESSFUL':
+            return {'status': 'completed'}
+        if status == 'FAILED':
+            return {'status': 'failed'}
+        return {'status': 'processing'}
+    
+    def _token_key(self):
+        return (self.provider, self.base_url, self.api_key, self.subscription_key)
     
     def _get_access_token(self):
-        """Get OAuth access token from MTN API"""
+        """Get OAuth access token from MTN API, reusing it until shortly before it expires"""
+        return token_cache.get(self._token_key(), self._fetch_access_token)
+    
+    def _fetch_access_token(self):
+        """Request a new access token; returns (token, expires_in)"""
         try:
             auth_url = f'{self.base_url}/collection/token/'
             headers = {
@@ -171,9 +227,10 @@ class MTNMobileMoneyGateway(BasePaymentGateway):
                 'Ocp-Apim-Subscription-Key': self.subscription_key
             }
             
-            response = requests.post(auth_url, headers=headers, timeout=30)
+            response = self.transport.post(auth_url, operation='token', headers=headers)
             if response.status_code == 200:
-                return response.json().get('access_token')
+                data = response.json()
+                return data.get('access_token'), data.get('expires_in')
             else:
                 raise PaymentGatewayError("Failed to get access token")
         except Exception as e:
@@ -190,6 +247,8 @@ class MTNMobileMoneyGateway(BasePaymentGateway):
 class AirtelMoneyGateway(BasePaymentGateway):
     """Airtel Money Payment Gateway"""
     
+    provider = 'airtel_money'
+    
     def __init__(self):
         super().__init__()
         self.client_id = getattr(settings, 'AIRTEL_MONEY_CLIENT_ID', '')
@@ -200,6 +259,7 @@ class AirtelMoneyGateway(BasePaymentGateway):
             self.base_url = 'https://openapiuat.airtel.africa'
         else:
             self.base_url = 'https://openapi.airtel.africa'
+        self.base_url = getattr(settings, 'AIRTEL_MONEY_BASE_URL', self.base_url)
     
     def initiate_payment(self, payment: Payment, **kwargs):
         """Initiate Airtel Money payment"""
@@ -231,12 +291,13 @@ class AirtelMoneyGateway(BasePaymentGateway):
                 'X-Currency': getattr(settings, 'CURRENCY_CODE', 'UGX')
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/merchant/v1/payments',
+                operation='initiate',
                 json=payment_request,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
+            self._check_response(response)
             
             if response.status_code in [200, 201]:
                 data = response.json()
@@ -264,50 +325,44 @@ class AirtelMoneyGateway(BasePaymentGateway):
             logger.error(f"Airtel Money payment error: {str(e)}")
             raise PaymentGatewayError(f"Payment initiation failed: {str(e)}")
     
-    def verify_payment(self, payment: Payment, transaction_id: str = None):
-        """Verify Airtel Money payment status"""
-        try:
-            transaction_id = transaction_id or payment.transaction_id
-            if not transaction_id:
-                raise PaymentGatewayError("Transaction ID is required")
-            
-            token = self._get_access_token()
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'X-Country': getattr(settings, 'COUNTRY_CODE', 'UG'),
-                'X-Currency': getattr(settings, 'CURRENCY_CODE', 'UGX')
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/standard/v1/payments/{transaction_id}',
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get('status', {}).get('status', '').upper()
-                
-                if status == 'TS':
-                    payment.status = PaymentStatus.COMPLETED
-                    payment.paid_at = timezone.now()
-                    payment.save()
-                    return {'success': True, 'status': 'completed'}
-                elif status == 'TF':
-                    payment.status = PaymentStatus.FAILED
-                    payment.save()
-                    return {'success': False, 'status': 'failed'}
-                else:
-                    return {'success': True, 'status': 'processing'}
-            else:
-                return {'success': False, 'status': 'unknown'}
-                
-        except Exception as e:
-            logger.error(f"Airtel Money verification error: {str(e)}")
-            return {'success': False, 'error': str(e)}
+    def check_status(self, payment: Payment, transaction_id: str = None):
+        """Check Airtel Money payment status"""
+        transaction_id = transaction_id or payment.transaction_id
+        if not transaction_id:
+            raise PaymentGatewayError("Transaction ID is required")
+        
+        token = self._get_access_token()
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'X-Country': getattr(settings, 'COUNTRY_CODE', 'UG'),
+            'X-Currency': getattr(settings, 'CURRENCY_CODE', 'UGX')
+        }
+        
+        response = self.transport.get(
+            f'{self.base_url}/standard/v1/payments/{transaction_id}',
+            operation='verify',
+            headers=headers
+        )
+        self._check_response(response)
+        
+        if response.status_code != 200:
+            return {'status': 'unknown'}
+        status = response.json().get('status', {}).get('status', '').upper()
+        if status == 'TS':
+            return {'status': 'completed'}
+        if status == 'TF':
+            return {'status': 'failed'}
+        return {'status': 'processing'}
+    
+    def _token_key(self):
+        return (self.provider, self.base_url, self.client_id)
     
     def _get_access_token(self):
-        """Get OAuth access token from Airtel API"""
+        """Get OAuth access token from Airtel API, reusing it until shortly before it expires"""
+        return token_cache.get(self._token_key(), self._fetch_access_token)
+    
+    def _fetch_access_token(self):
+        """Request a new access token; returns (token, expires_in)"""
         try:
             auth_url = f'{self.base_url}/auth/oauth2/token'
             headers = {
@@ -319,9 +374,10 @@ class AirtelMoneyGateway(BasePaymentGateway):
                 'grant_type': 'client_credentials'
             }
             
-            response = requests.post(auth_url, json=data, headers=headers, timeout=30)
+            response = self.transport.post(auth_url, operation='token', json=data, headers=headers)
             if response.status_code == 200:
-                return response.json().get('access_token')
+                token_data = response.json()
+                return token_data.get('access_token'), token_data.get('expires_in')
             else:
                 raise PaymentGatewayError("Failed to get access token")
         except Exception as e:
@@ -332,6 +388,8 @@ class AirtelMoneyGateway(BasePaymentGateway):
 class FlutterwaveGateway(BasePaymentGateway):
     """Flutterwave Payment Gateway (for Bank Transfer and Card Payments)"""
     
+    provider = 'flutterwave'
+    
     def __init__(self):
         super().__init__()
         self.public_key = getattr(settings, 'FLUTTERWAVE_PUBLIC_KEY', '')
@@ -342,6 +400,7 @@ class FlutterwaveGateway(BasePaymentGateway):
             self.base_url = 'https://api.flutterwave.com/v3'
         else:
             self.base_url = 'https://api.flutterwave.com/v3'
+        self.base_url = getattr(settings, 'FLUTTERWAVE_BASE_URL', self.base_url)
     
     def initiate_payment(self, payment: Payment, **kwargs):
         """Initiate Flutterwave payment (Bank Transfer or Card)"""
@@ -384,11 +443,11 @@ class FlutterwaveGateway(BasePaymentGateway):
                 'Content-Type': 'application/json'
             }
             
-            response = requests.post(
+            response = self.transport.post(
                 f'{self.base_url}/payments',
+                operation='initiate',
                 json=payment_data,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             if response.status_code == 200:
@@ -423,93 +482,48 @@ class FlutterwaveGateway(BasePaymentGateway):
             logger.error(f"Flutterwave payment error: {str(e)}")
             raise PaymentGatewayError(f"Payment initiation failed: {str(e)}")
     
-    def verify_payment(self, payment: Payment, transaction_id: str = None):
-        """Verify Flutterwave payment status"""
-        try:
-            transaction_id = transaction_id or payment.transaction_id
-            if not transaction_id:
-                raise PaymentGatewayError("Transaction ID is required")
-            
-            headers = {
-                'Authorization': f'Bearer {self.secret_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f'{self.base_url}/transactions/{transaction_id}/verify',
-                headers=headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                status = data.get('status', '')
-                transaction_data = data.get('data', {})
-                
-                if status == 'success' and transaction_data.get('status') == 'successful':
-                    payment.status = PaymentStatus.COMPLETED
-                    payment.paid_at = timezone.now()
-                    payment.transaction_id = transaction_data.get('tx_ref', transaction_id)
-                    payment.save()
-                    return {'success': True, 'status': 'completed'}
-                elif transaction_data.get('status') == 'failed':
-                    payment.status = PaymentStatus.FAILED
-                    payment.save()
-                    return {'success': False, 'status': 'failed'}
-                else:
-                    return {'success': True, 'status': 'processing'}
-            else:
-                return {'success': False, 'status': 'unknown'}
-                
-        except Exception as e:
-            logger.error(f"Flutterwave verification error: {str(e)}")
-            return {'success': False, 'error': str(e)}
+    def check_status(self, payment: Payment, transaction_id: str = None):
+        """Check Flutterwave payment status"""
+        transaction_id = transaction_id or payment.transaction_id
+        if not transaction_id:
+            raise PaymentGatewayError("Transaction ID is required")
+        
+        headers = {
+            'Authorization': f'Bearer {self.secret_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        response = self.transport.get(
+            f'{self.base_url}/transactions/{transaction_id}/verify',
+            operation='verify',
+            headers=headers
+        )
+        self._check_response(response)
+        
+        if response.status_code != 200:
+            return {'status': 'unknown'}
+        data = response.json()
+        transaction_data = data.get('data', {})
+        if data.get('status', '') == 'success' and transaction_data.get('status') == 'successful':
+            return {'status': 'completed', 'transaction_id': transaction_data.get('tx_ref', transaction_id)}
+        if transaction_data.get('status') == 'failed':
+            return {'status': 'failed'}
+        return {'status': 'processing'}
+    
+    def verify_webhook_signature(self, signature: str):
+        """Whether a webhook's verif-hash header matches the configured secret hash; never without one"""
+        secret_hash = getattr(settings, 'FLUTTERWAVE_SECRET_HASH', '')
+        if not secret_hash:
+            logger.error("FLUTTERWAVE_SECRET_HASH is not configured; rejecting Flutterwave webhook")
+            return False
+        return hmac.compare_digest(signature or '', secret_hash)
     
     def process_webhook(self, payload: dict):
-        """Process Flutterwave webhook"""
-        try:
-            import hashlib
-            import hmac
-            
-            # Verify webhook signature
-            secret_hash = getattr(settings, 'FLUTTERWAVE_SECRET_HASH', '')
-            if secret_hash:
-                signature = payload.get('signature', '')
-                computed_hash = hmac.new(
-                    secret_hash.encode(),
-                    json.dumps(payload).encode(),
-                    hashlib.sha256
-                ).hexdigest()
-                
-                if signature != computed_hash:
-                    raise PaymentGatewayError("Invalid webhook signature")
-            
-            event = payload.get('event', '')
-            data = payload.get('data', {})
-            
-            if event == 'charge.completed':
-                transaction_ref = data.get('tx_ref', '')
-                if transaction_ref.startswith('ORDER_'):
-                    # Extract payment ID from transaction ref
-                    parts = transaction_ref.split('_')
-                    if len(parts) >= 3:
-                        payment_id = parts[-1]
-                        try:
-                            payment = Payment.objects.get(id=payment_id)
-                            if data.get('status') == 'successful':
-                                payment.status = PaymentStatus.COMPLETED
-                                payment.paid_at = timezone.now()
-                                payment.transaction_id = transaction_ref
-                                payment.save()
-                                return {'success': True, 'payment_id': payment_id}
-                        except Payment.DoesNotExist:
-                            logger.warning(f"Payment not found: {payment_id}")
-            
-            return {'success': False, 'message': 'Event not processed'}
-            
-        except Exception as e:
-            logger.error(f"Flutterwave webhook error: {str(e)}")
-            raise PaymentGatewayError(f"Webhook processing failed: {str(e)}")
+        """Queue a Flutterwave webhook in the inbox; the inbox worker applies it"""
+        from .inbox import record_event
+        
+        created = record_event(self.provider, payload)
+        return {'success': True, 'duplicate': not created}
 
 
 class PaymentGatewayService:
@@ -0,0 +1,235 @@
+"""
+Payment Webhook Inbox
+Durable, idempotent ingestion of payment provider callbacks.
+
+Webhook endpoints only verify the request and append the raw payload to the
+WebhookEvent table, keyed by a provider event id. A unique constraint on
+(provider, event_id) makes the insert a no-op for provider retries, so
+endpoints answer at once and never touch payments.
+
+``drain_inbox`` applies received events in batches. No outcome is taken from
+a payload: each referenced payment is re-verified with its gateway on the
+poller's thread pool, Flutterwave ones by the transaction id of the signed
+event, MTN and Airtel ones (whose callbacks are unsigned) by their own
+transaction id. This runs before any database lock is taken. Each
+batch is then written in one transaction: payments and their orders through
+the poller's batched apply, and every event marked processed, ignored or
+failed. Several events for the same payment collapse to the latest one.
+Failed events keep their error and can be sent through again with
+``replay_events`` (`manage.py process_webhooks --replay`).
+"""
+
+import hashlib
+import json
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment, PaymentStatus, WebhookEvent, WebhookEventStatus
+from .poller import apply_results, check_payments
+
+logger = logging.getLogger(__name__)
+
+# Events applied per transaction
+INBOX_BATCH_SIZE = 100
+
+
+# ==================== INGESTION ====================
+
+def event_transaction_ids(provider, payload):
+    """Gateway transaction ids a callback may refer to"""
+    if provider == 'mtn_momo':
+        candidates = [payload.get('referenceId'), payload.get('externalId'), payload.get('financialTransactionId')]
+    elif provider == 'airtel_money':
+        candidates = [(payload.get('transaction') or {}).get('id'), payload.get('id')]
+    else:
+        candidates = [(payload.get('data') or {}).get('tx_ref')]
+    return [str(candidate) for candidate in candidates if candidate]
+
+
+def event_id(provider, payload):
+    """Provider identity of a callback; a content hash when the payload carries none"""
+    if provider == 'flutterwave':
+        data = payload.get('data') or {}
+        reference = data.get('id') or data.get('tx_ref')
+        key = reference and f"{payload.get('event', '')}:{reference}:{data.get('status', '')}"
+    elif provider == 'airtel_money':
+        transaction_data = payload.get('transaction') or {}
+        ids = event_transaction_ids(provider, payload)
+        key = ids and f"{ids[0]}:{transaction_data.get('status_code') or transaction_data.get('status', '')}"
+    else:
+        ids = event_transaction_ids(provider, payload)
+        key = ids and f"{ids[0]}:{payload.get('status', '')}"
+    if key:
+        return key[:150]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def record_event(provider, payload):
+    """Append a callback to the inbox; returns False for a duplicate"""
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(provider=provider, event_id=event_id(provider, payload), payload=payload)
+    except IntegrityError:
+        return False
+    return True
+
+
+# ==================== PROCESSING ====================
+
+def _flutterwave_reference(payload):
+    """``(payment id, Flutterwave transaction id)`` of a charge event, to be verified with the gateway"""
+    if payload.get('event') != 'charge.completed':
+        return None, None
+    data = payload.get('data') or {}
+    tx_ref = data.get('tx_ref', '')
+    parts = tx_ref.split('_')
+    if not tx_ref.startswith('ORDER_') or len(parts) < 3 or not parts[-1].isdigit():
+        return None, None
+    return int(parts[-1]), str(data['id']) if data.get('id') else None
+
+
+def _load_payments(events):
+    """Payments referenced by a batch, by id and by transaction id"""
+    payment_ids, transaction_ids = set(), set()
+    for event in events:
+        if event.provider == 'flutterwave':
+            payment_id, _ = _flutterwave_reference(event.payload)
+            if payment_id:
+                payment_ids.add(payment_id)
+        else:
+            transaction_ids.update(event_transaction_ids(event.provider, event.payload))
+    payments = Payment.objects.filter(
+        Q(pk__in=payment_ids) | Q(transaction_id__in=transaction_ids)
+    ).select_related('order__user', 'subscription__user')
+    by_id, by_transaction = {}, {}
+    for payment in payments:
+        by_id[payment.pk] = payment
+        by_transaction[payment.transaction_id] = payment
+    return by_id, by_transaction
+
+
+def _resolve(events, provider_backoff=None):
+    """
+    Match events to payments and outcomes without writing anything.
+
+    Returns ``(event, payment or None, result or None, error)`` per event;
+    every referenced payment is verified with its gateway concurrently.
+    """
+    by_id, by_transaction = _load_payments(events)
+    resolved = []
+    to_verify = {}
+    references = {}
+    for event in events:
+        if event.provider == 'flutterwave':
+            payment_id, reference = _flutterwave_reference(event.payload)
+            payment = by_id.get(payment_id)
+            if payment is not None and reference:
+                references[payment.pk] = reference
+        else:
+            payment = next(
+                (by_transaction[tx] for tx in event_transaction_ids(event.provider, event.payload) if tx in by_transaction),
+                None
+            )
+        resolved.append([event, payment, None, '' if payment else 'No matching payment'])
+        if payment is not None:
+            to_verify[payment.pk] = payment
+
+    checked = check_payments(list(to_verify.values()), provider_backoff=provider_backoff, transaction_ids=references)
+    verified = {payment.pk: result for payment, result in checked}
+    for entry in resolved:
+        payment = entry[1]
+        if payment is not None:
+            entry[2] = verified.get(payment.pk)
+            if entry[2] is None:
+                entry[3] = 'Gateway verification failed'
+    return resolved
+
+
+def process_batch(events, provider_backoff=None):
+    """Apply one batch of received events in a single transaction; returns counts per outcome"""
+    resolved = _resolve(events, provider_backoff)
+
+    # The latest event per payment decides its outcome
+    latest = {}
+    for event, payment, result, error in resolved:
+        if payment is not None and result is not None:
+            latest[payment.pk] = (payment, result)
+
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = set(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=[event.pk for event in events], status=WebhookEventStatus.RECEIVED)
+            .values_list('pk', flat=True)
+        )
+        apply_results(
+            list(latest.values()),
+            from_statuses=(PaymentStatus.PENDING, PaymentStatus.PROCESSING)
+        )
+
+        updated = []
+        for event, payment, result, error in resolved:
+            if event.pk not in claimed:
+                continue
+            event.attempts += 1
+            event.payment = payment
+            event.last_error = error
+            if error and payment is not None:
+                event.status = WebhookEventStatus.FAILED
+            elif payment is None or result is None:
+                event.status = WebhookEventStatus.IGNORED
+            else:
+                event.status = WebhookEventStatus.PROCESSED
+                event.processed_at = now
+            updated.append(event)
+        WebhookEvent.objects.bulk_update(
+            updated, ['status', 'attempts', 'payment', 'last_error', 'processed_at'], batch_size=INBOX_BATCH_SIZE
+        )
+
+    counts = {status: 0 for status in WebhookEventStatus.values}
+    for event in updated:
+        counts[event.status] += 1
+    return counts
+
+
+def drain_inbox(batch_size=INBOX_BATCH_SIZE, max_batches=None, provider_backoff=None):
+    """Process received events batch by batch until the inbox is empty; returns outcome totals"""
+    totals = {status: 0 for status in WebhookEventStatus.values}
+    batches = 0
+    last_seen = 0
+    while max_batches is None or batches < max_batches:
+        events = list(
+            WebhookEvent.objects.filter(status=WebhookEventStatus.RECEIVED, pk__gt=last_seen)
+            .order_by('pk')[:batch_size]
+        )
+        if not events:
+            break
+        last_seen = events[-1].pk
+        try:
+            counts = process_batch(events, provider_backoff)
+        except Exception as e:
+            logger.error(f"Webhook batch {events[0].pk}-{last_seen} failed: {e}", exc_info=True)
+            WebhookEvent.objects.filter(
+                pk__in=[event.pk for event in events], status=WebhookEventStatus.RECEIVED
+            ).update(status=WebhookEventStatus.FAILED, last_error=str(e)[:1000])
+            totals[WebhookEventStatus.FAILED] += len(events)
+        else:
+            for status, count in counts.items():
+                totals[status] += count
+        batches += 1
+    if batches:
+        logger.info(f"Webhook inbox drained in {batches} batch(es): {totals}")
+    return totals
+
+
+def replay_events(event_ids=None):
+    """Queue failed events, or the given events in any state, to be processed again"""
+    events = WebhookEvent.objects.all()
+    if event_ids:
+        events = events.filter(pk__in=event_ids)
+    else:
+        events = events.filter(status=WebhookEventStatus.FAILED)
+    return events.update(status=WebhookEventStatus.RECEIVED, last_error='', processed_at=None)
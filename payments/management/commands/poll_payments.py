@@ -0,0 +1,66 @@
+"""
+Management command to verify stale processing payments against their gateways
+Usage: python manage.py poll_payments [--workers 8] [--limit 500] [--stale-after 60] [--loop --interval 30]
+"""
+import asyncio
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payments.poller import BATCH_SIZE, DEFAULT_WORKERS, POLL_INTERVAL, STALE_AFTER, poll_forever, poll_once
+
+
+class Command(BaseCommand):
+    help = 'Verify processing payments concurrently and record completed or failed ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Concurrent gateway checks (default: {DEFAULT_WORKERS})',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Payments checked per pass (default: {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=int(STALE_AFTER.total_seconds()),
+            help='Seconds a payment must have been processing before it is polled',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=POLL_INTERVAL,
+            help=f'Seconds between passes with --loop (default: {POLL_INTERVAL})',
+        )
+
+    def handle(self, *args, **options):
+        poll_options = {
+            'workers': options['workers'],
+            'limit': options['limit'],
+            'stale_after': timedelta(seconds=options['stale_after']),
+        }
+
+        if options['loop']:
+            self.stdout.write(f"Polling processing payments every {options['interval']}s (Ctrl+C to stop)")
+            try:
+                asyncio.run(poll_forever(options['interval'], **poll_options))
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Payment poller stopped'))
+            return
+
+        counts = poll_once(**poll_options)
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {counts['checked']} payments: {counts['completed']} completed, "
+            f"{counts['failed']} failed, {counts['skipped']} skipped"
+        ))
@@ -0,0 +1,65 @@
+"""
+Management command to apply received payment webhooks from the inbox
+Usage: python manage.py process_webhooks [--batch-size 100] [--replay] [--event-id ID ...] [--loop --interval 5]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.inbox import INBOX_BATCH_SIZE, drain_inbox, replay_events
+
+
+class Command(BaseCommand):
+    help = 'Apply received payment webhooks to payments and orders in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INBOX_BATCH_SIZE,
+            help=f'Events applied per transaction (default: {INBOX_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--replay',
+            action='store_true',
+            help='Queue failed events (or the --event-id events) again before processing',
+        )
+        parser.add_argument(
+            '--event-id',
+            type=int,
+            action='append',
+            dest='event_ids',
+            help='WebhookEvent id to replay; may be repeated',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep draining the inbox every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Seconds between drains with --loop (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        if options['replay'] or options['event_ids']:
+            replayed = replay_events(options['event_ids'])
+            self.stdout.write(f"Queued {replayed} webhook events for replay")
+
+        if options['loop']:
+            self.stdout.write(f"Draining the webhook inbox every {options['interval']}s (Ctrl+C to stop)")
+            try:
+                while True:
+                    drain_inbox(options['batch_size'])
+                    time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING('Webhook worker stopped'))
+            return
+
+        totals = drain_inbox(options['batch_size'])
+        style = self.style.WARNING if totals['failed'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Processed {totals['processed']} webhook events, {totals['ignored']} ignored, {totals['failed']} failed"
+        ))
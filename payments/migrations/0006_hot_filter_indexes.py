@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_hot_filter_indexes'),
+        ('payments', '0005_webhook_event'),
+        ('subscriptions', '0006_subscriptionplan_category'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'paid_at'], name='payments_pa_status_bed4b8_idx'),
+        ),
+    ]
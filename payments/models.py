@@ -3,7 +3,8 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, RegexValidator
 from django.utils import timezone
 from decimal import Decimal
-from orders.models import Order
+from dusangire.dates import on_day
+from orders.models import LoadedValuesMixin, Order
 from subscriptions.models import Subscription
 import uuid
 
@@ -44,6 +45,14 @@ class TransactionStatus(models.TextChoices):
     FAILED = 'failed', 'Failed'
 
 
+class WebhookEventStatus(models.TextChoices):
+    """Inbox processing state of a provider webhook"""
+    RECEIVED = 'received', 'Received'
+    PROCESSED = 'processed', 'Processed'
+    IGNORED = 'ignored', 'Ignored'
+    FAILED = 'failed', 'Failed'
+
+
 class AirtelMoneyProvider(models.Model):
     """Airtel Money gateway configuration"""
     merchant_id = models.CharField(max_length=100, unique=True)
@@ -96,8 +105,9 @@ class BankTransferProvider(models.Model):
         return f"{self.bank_name} - {self.account_number}"
 
 
-class Payment(models.Model):
+class Payment(LoadedValuesMixin, models.Model):
     """Payment record for orders and subscriptions - Professional payment tracking"""
+    TRACKED_FIELDS = ('status', 'payment_method', 'amount', 'paid_at', 'created_at')
     
     # Identifiers
     payment_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=False, db_index=True)
@@ -197,6 +207,7 @@ class Payment(models.Model):
             models.Index(fields=['-created_at']),
             models.Index(fields=['payment_method', 'status']),
             models.Index(fields=['reconciled', '-created_at']),
+            models.Index(fields=['status', 'paid_at']),
         ]
     
     def __str__(self):
@@ -223,7 +234,7 @@ class Payment(models.Model):
             prefix = 'INV'
             date_part = timezone.now().strftime('%Y%m%d')
             count = Payment.objects.filter(
-                created_at__date=timezone.now().date(),
+                **on_day('created_at'),
                 invoice_number__startswith=prefix
             ).count() + 1
             self.invoice_number = f"{prefix}-{date_part}-{count:05d}"
@@ -450,3 +461,31 @@ class RefundRequest(models.Model):
     def __str__(self):
         return f"Refund - {self.payment.payment_id} - {self.status}"
 
+
+
+class WebhookEvent(models.Model):
+    """Raw payment provider callback, stored on receipt and applied by the inbox worker"""
+    
+    provider = models.CharField(max_length=30)
+    event_id = models.CharField(max_length=150, help_text="Provider event identity used to drop duplicates")
+    payload = models.JSONField()
+    
+    status = models.CharField(max_length=20, choices=WebhookEventStatus.choices, default=WebhookEventStatus.RECEIVED)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='webhook_events')
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='payments_webhook_event_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider} {self.event_id} - {self.status}"
@@ -0,0 +1,231 @@
+"""
+Payment Verification Poller
+Background confirmation of mobile money and Flutterwave payments.
+
+Payments left in PROCESSING for longer than STALE_AFTER are checked against
+their gateways from a bounded thread pool. Only HTTP runs in the threads,
+over the pooled transports, and none of them touch the database. The
+completed and failed outcomes are then written with one ``bulk_update`` per
+batch, and the orders' payment_status follows. Only rows still PROCESSING are
+updated, so a webhook that got there first wins. bulk_update sends no
+post_save, so the hooks a ``save()`` would trigger are called explicitly: the
+dashboard rollups in the same transaction, and the payment notifications and
+loyalty rewards once it commits.
+
+A provider whose checks keep failing is backed off exponentially, and its
+payments are skipped until the backoff ends. ``poll_once`` runs a single pass
+for cron or the `poll_payments` command. ``poll_forever`` is the same loop as
+a coroutine for asyncio workers.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from analytics import rollups
+from notifications.signals import notify_payments
+from orders.models import Order
+from subscriptions.signals import reward_completed_payment
+
+from .gateways import PaymentGatewayService, apply_status
+from .models import Payment, PaymentMethod, PaymentStatus
+
+logger = logging.getLogger(__name__)
+
+# Payments processing for at least this long are polled
+STALE_AFTER = timedelta(seconds=60)
+
+# Concurrent gateway checks
+DEFAULT_WORKERS = 8
+
+# Payments polled per pass, oldest first
+BATCH_SIZE = 500
+
+# Seconds between passes of poll_forever
+POLL_INTERVAL = 30
+
+# Provider backoff after consecutive failures: base * 2 ** (failures - 1), capped
+BACKOFF_BASE = 5
+BACKOFF_MAX = 300
+
+# Payment methods verified by a gateway
+POLLED_METHODS = (
+    PaymentMethod.MTN_MOBILE_MONEY,
+    PaymentMethod.AIRTEL_MONEY,
+    PaymentMethod.BANK_TRANSFER,
+    PaymentMethod.CARD,
+)
+
+UPDATE_FIELDS = ['status', 'paid_at', 'transaction_id', 'updated_at']
+
+
+class ProviderBackoff:
+    """Thread-safe exponential backoff per gateway provider"""
+
+    def __init__(self, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+        self.base = base
+        self.maximum = maximum
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._retry_at = {}
+
+    def is_open(self, provider):
+        """Whether the provider may be called now"""
+        return time.monotonic() >= self._retry_at.get(provider, 0)
+
+    def failure(self, provider):
+        with self._lock:
+            failures = self._failures[provider] = self._failures.get(provider, 0) + 1
+            delay = min(self.maximum, self.base * 2 ** (failures - 1))
+            self._retry_at[provider] = time.monotonic() + delay
+        logger.warning(f"Payment provider {provider} failed {failures} time(s); backing off {delay}s")
+
+    def success(self, provider):
+        with self._lock:
+            self._failures.pop(provider, None)
+            self._retry_at.pop(provider, None)
+
+
+backoff = ProviderBackoff()
+
+
+def stale_payments(stale_after=STALE_AFTER, limit=BATCH_SIZE):
+    """PROCESSING gateway payments untouched for ``stale_after``, oldest first"""
+    return list(
+        Payment.objects.filter(
+            status=PaymentStatus.PROCESSING,
+            payment_method__in=POLLED_METHODS,
+            updated_at__lte=timezone.now() - stale_after,
+        ).exclude(transaction_id='')
+        .select_related('order__user', 'subscription__user')
+        .order_by('updated_at')[:limit]
+    )
+
+
+def _check(gateway, payment, provider_backoff, transaction_id=None):
+    """Gateway status of one payment, or None when skipped or failed"""
+    if not provider_backoff.is_open(gateway.provider):
+        return None
+    try:
+        result = gateway.check_status(payment, transaction_id)
+    except Exception as e:
+        logger.error(f"Polling payment {payment.pk} via {gateway.provider} failed: {e}")
+        provider_backoff.failure(gateway.provider)
+        return None
+    provider_backoff.success(gateway.provider)
+    return result
+
+
+def check_payments(payments, workers=DEFAULT_WORKERS, provider_backoff=None, transaction_ids=None):
+    """
+    ``[(payment, result or None)]`` from concurrent gateway checks.
+
+    ``transaction_ids`` maps payment ids to the gateway transaction id to
+    check, when it differs from the payment's own.
+    """
+    provider_backoff = provider_backoff or backoff
+    transaction_ids = transaction_ids or {}
+    gateways = {}
+    for payment in payments:
+        if payment.payment_method not in gateways:
+            gateways[payment.payment_method] = PaymentGatewayService.get_gateway(payment.payment_method)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='payment-poller') as pool:
+        results = pool.map(
+            lambda payment: _check(
+                gateways[payment.payment_method], payment, provider_backoff, transaction_ids.get(payment.pk)
+            ),
+            payments
+        )
+        return list(zip(payments, results))
+
+
+def apply_results(checked, from_statuses=(PaymentStatus.PROCESSING,)):
+    """
+    Write completed/failed outcomes in one batch; returns the payments moved.
+
+    Only payments still in one of ``from_statuses`` are moved. Their orders'
+    payment_status follows in one update per outcome.
+    """
+    changed = [payment for payment, result in checked if result and apply_status(payment, result)]
+    if not changed:
+        return []
+
+    with transaction.atomic():
+        movable = set(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=[payment.pk for payment in changed], status__in=from_statuses)
+            .values_list('pk', flat=True)
+        )
+        moved = [payment for payment in changed if payment.pk in movable]
+        now = timezone.now()
+        for payment in moved:
+            payment.updated_at = now
+        Payment.objects.bulk_update(moved, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+        for status in (PaymentStatus.COMPLETED, PaymentStatus.FAILED):
+            order_ids = [payment.order_id for payment in moved if payment.status == status and payment.order_id]
+            if order_ids:
+                Order.objects.filter(pk__in=order_ids).update(payment_status=status)
+        for payment in moved:
+            rollups.record_payment(payment)
+        transaction.on_commit(lambda: _notify(moved))
+    return moved
+
+
+def _notify(payments):
+    """Notify the customers of moved payments and reward the completed ones"""
+    try:
+        notify_payments(payments)
+    except Exception as e:
+        logger.error(f"Notifying {len(payments)} settled payment(s) failed: {e}")
+    for payment in payments:
+        if payment.status != PaymentStatus.COMPLETED:
+            continue
+        try:
+            reward_completed_payment(payment)
+        except Exception as e:
+            logger.error(f"Rewarding completed payment {payment.pk} failed: {e}")
+
+
+def poll_once(workers=DEFAULT_WORKERS, limit=BATCH_SIZE, stale_after=STALE_AFTER, provider_backoff=None):
+    """One polling pass; returns counts of checked, completed, failed and skipped payments"""
+    payments = stale_payments(stale_after, limit)
+    checked = check_payments(payments, workers, provider_backoff)
+    moved = apply_results(checked)
+
+    counts = {
+        'checked': sum(1 for _, result in checked if result),
+        'skipped': sum(1 for _, result in checked if not result),
+        'completed': sum(1 for payment in moved if payment.status == PaymentStatus.COMPLETED),
+        'failed': sum(1 for payment in moved if payment.status == PaymentStatus.FAILED),
+    }
+    if payments:
+        logger.info(
+            f"Payment poll: {counts['checked']} checked, {counts['completed']} completed, "
+            f"{counts['failed']} failed, {counts['skipped']} skipped"
+        )
+    return counts
+
+
+def _poll_pass(**options):
+    close_old_connections()
+    try:
+        return poll_once(**options)
+    finally:
+        close_old_connections()
+
+
+async def poll_forever(interval=POLL_INTERVAL, **options):
+    """Poll every ``interval`` seconds until cancelled, off the event loop"""
+    while True:
+        try:
+            await asyncio.to_thread(_poll_pass, **options)
+        except Exception as e:
+            logger.error(f"Payment poll failed: {e}")
+        await asyncio.sleep(interval)
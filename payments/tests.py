@@ -1,3 +1,330 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from analytics.models import PaymentRollup
+from notifications.models import Notification
+from orders.models import Order
+
+from .gateways import AirtelMoneyGateway, FlutterwaveGateway, MTNMobileMoneyGateway, PaymentGatewayError
+from .inbox import drain_inbox, replay_events
+from .models import Payment, PaymentMethod, PaymentStatus, WebhookEvent, WebhookEventStatus
+from .poller import ProviderBackoff, poll_once
+from .transport import TokenCache, gateway_metrics, reset_transports
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    """Mimics the MTN, Airtel and Flutterwave endpoints used by the gateways"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        server.calls.append((method, self.path, self.client_address[1], self.headers.get('Authorization')))
+
+        if server.failures.get((method, self.path)):
+            server.failures[(method, self.path)] -= 1
+            return self._respond(503, {'message': 'unavailable'})
+
+        if self.path in ('/mtn/collection/token/', '/airtel/auth/oauth2/token'):
+            server.tokens_issued += 1
+            return self._respond(200, {'access_token': f'token-{server.tokens_issued}', 'expires_in': 3600})
+        if self.headers.get('Authorization') in server.revoked:
+            return self._respond(401, {'message': 'expired token'})
+        if self.path == '/mtn/collection/v1_0/requesttopay':
+            return self._respond(202, {}, {'X-Reference-Id': 'mtn-ref-1'})
+        if self.path.startswith('/mtn/collection/v1_0/requesttopay/'):
+            return self._respond(200, {'status': server.statuses.get(self.path.rsplit('/', 1)[1], 'PENDING')})
+        if self.path.startswith('/airtel/standard/v1/payments/'):
+            return self._respond(200, {'status': {'status': server.statuses.get(self.path.rsplit('/', 1)[1], 'TIP')}})
+        if self.path == '/airtel/merchant/v1/payments':
+            return self._respond(200, {'data': {'transaction': {'id': 'airtel-1'}}})
+        if self.path.startswith('/flw/transactions/'):
+            transaction_id = self.path.split('/')[3]
+            return self._respond(200, {'status': 'success', 'data': {
+                'status': server.statuses.get(transaction_id, 'pending'), 'tx_ref': f'flw-{transaction_id}',
+            }})
+        if self.path == '/flw/payments':
+            return self._respond(200, {'status': 'success', 'data': {'link': 'https://pay.example/flw', 'tx_ref': 'flw-1'}})
+        return self._respond(404, {'message': 'not found'})
+
+    def _respond(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubGatewayTestCase(TestCase):
+    """Runs the gateways against a local stub server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGatewayHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        cls.stub_settings = override_settings(
+            MTN_MOMO_BASE_URL=f'{base}/mtn', AIRTEL_MONEY_BASE_URL=f'{base}/airtel', FLUTTERWAVE_BASE_URL=f'{base}/flw'
+        )
+        cls.stub_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        reset_transports()
+        super().tearDownClass()
+
+    def setUp(self):
+        reset_transports()
+        self.server.calls = []
+        self.server.failures = {}
+        self.server.revoked = set()
+        self.server.tokens_issued = 0
+        self.server.statuses = {}
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='pass12345')
+        self.payment = self._payment(PaymentMethod.MTN_MOBILE_MONEY)
+
+    def _payment(self, method, **fields):
+        order = Order.objects.create(
+            user=self.user, customer_name='Payer', customer_phone='0788000000',
+            subtotal=Decimal('3000.00'), total=Decimal('3000.00')
+        )
+        return Payment.objects.create(
+            order=order, payment_method=method, amount=Decimal('3000.00'), phone_number='+250788000000', **fields
+        )
+
+
+class GatewayTransportTests(StubGatewayTestCase):
+    """Pooled sessions, token caching and retries against a local stub server"""
+
+    def test_token_fetched_once_and_connection_reused(self):
+        gateway = MTNMobileMoneyGateway()
+        result = gateway.initiate_payment(self.payment)
+        self.assertEqual(result['transaction_id'], 'mtn-ref-1')
+        for _ in range(3):
+            self.assertEqual(MTNMobileMoneyGateway().verify_payment(self.payment)['status'], 'processing')
+
+        paths = [path for _, path, _, _ in self.server.calls]
+        self.assertEqual(paths.count('/mtn/collection/token/'), 1)
+        self.assertEqual(len({port for _, _, port, _ in self.server.calls}), 1)
+
+        metrics = gateway_metrics()
+        self.assertEqual(metrics[('mtn_momo', 'verify')]['calls'], 3)
+        self.assertEqual(metrics[('mtn_momo', 'token')]['calls'], 1)
+
+    def test_rejected_token_is_refreshed(self):
+        gateway = AirtelMoneyGateway()
+        gateway.verify_payment(self.payment, 'airtel-1')
+        self.server.revoked.add('Bearer token-1')
+
+        self.assertEqual(gateway.verify_payment(self.payment, 'airtel-1')['status'], 'unknown')
+        self.assertEqual(gateway.verify_payment(self.payment, 'airtel-1')['status'], 'processing')
+        self.assertEqual(self.server.tokens_issued, 2)
+
+    def test_get_is_retried_but_post_is_not(self):
+        gateway = AirtelMoneyGateway()
+        self.server.failures[('GET', '/airtel/standard/v1/payments/airtel-1')] = 1
+        self.assertEqual(gateway.verify_payment(self.payment, 'airtel-1')['status'], 'processing')
+
+        self.server.failures[('POST', '/airtel/merchant/v1/payments')] = 1
+        with self.assertRaises(PaymentGatewayError):
+            gateway.initiate_payment(self.payment)
+        posts = [call for call in self.server.calls if call[:2] == ('POST', '/airtel/merchant/v1/payments')]
+        self.assertEqual(len(posts), 1)
+
+    def test_flutterwave_payment_link(self):
+        self.payment.payment_method = PaymentMethod.CARD
+        result = FlutterwaveGateway().initiate_payment(self.payment, payment_type='card')
+        self.assertEqual(result['payment_link'], 'https://pay.example/flw')
+        self.assertEqual(gateway_metrics()[('flutterwave', 'initiate')]['errors'], 0)
+
+
+class TokenCacheTests(TestCase):
+    """Expiry-aware, thread-safe token reuse"""
+
+    def test_refreshes_before_expiry(self):
+        cache = TokenCache(refresh_margin=60)
+        fetch = mock.Mock(side_effect=[('first', 600), ('second', 600)])
+        with mock.patch('payments.transport.time.monotonic', return_value=1000.0):
+            self.assertEqual(cache.get('mtn', fetch), 'first')
+        with mock.patch('payments.transport.time.monotonic', return_value=1500.0):
+            self.assertEqual(cache.get('mtn', fetch), 'first')
+        with mock.patch('payments.transport.time.monotonic', return_value=1541.0):
+            self.assertEqual(cache.get('mtn', fetch), 'second')
+
+    def test_concurrent_callers_share_one_fetch(self):
+        cache = TokenCache()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'token', 3600
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('airtel', fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['token'] * 8)
+        self.assertEqual(len(calls), 1)
+
+
+class PaymentPollerTests(StubGatewayTestCase):
+    """Concurrent verification of stale processing payments"""
+
+    def test_poll_applies_outcomes_in_one_batch(self):
+        completed = self._payment(PaymentMethod.MTN_MOBILE_MONEY, status=PaymentStatus.PROCESSING, transaction_id='mtn-ok')
+        failed = self._payment(PaymentMethod.AIRTEL_MONEY, status=PaymentStatus.PROCESSING, transaction_id='airtel-no')
+        waiting = self._payment(PaymentMethod.MTN_MOBILE_MONEY, status=PaymentStatus.PROCESSING, transaction_id='mtn-wait')
+        self.server.statuses.update({'mtn-ok': 'SUCCESSFUL', 'airtel-no': 'TF'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counts = poll_once(workers=4, stale_after=timedelta(0), provider_backoff=ProviderBackoff())
+
+        self.assertEqual(counts, {'checked': 3, 'skipped': 0, 'completed': 1, 'failed': 1})
+        completed.refresh_from_db()
+        self.assertEqual(completed.status, PaymentStatus.COMPLETED)
+        self.assertIsNotNone(completed.paid_at)
+        self.assertEqual(Payment.objects.get(pk=failed.pk).status, PaymentStatus.FAILED)
+        self.assertEqual(Payment.objects.get(pk=waiting.pk).status, PaymentStatus.PROCESSING)
+        self.assertTrue(Notification.objects.filter(payment=completed, title='Payment Confirmed').exists())
+        self.assertEqual(PaymentRollup.objects.get(status=PaymentStatus.FAILED).payment_count, 1)
+
+    def test_failing_provider_is_backed_off(self):
+        for index in range(3):
+            self._payment(PaymentMethod.AIRTEL_MONEY, status=PaymentStatus.PROCESSING, transaction_id=f'airtel-{index}')
+        mtn = self._payment(PaymentMethod.MTN_MOBILE_MONEY, status=PaymentStatus.PROCESSING, transaction_id='mtn-ok')
+        self.server.statuses['mtn-ok'] = 'SUCCESSFUL'
+        for index in range(3):
+            self.server.failures[('GET', f'/airtel/standard/v1/payments/airtel-{index}')] = 10
+
+        provider_backoff = ProviderBackoff()
+        counts = poll_once(workers=1, stale_after=timedelta(0), provider_backoff=provider_backoff)
+
+        self.assertEqual(counts['completed'], 1)
+        self.assertEqual(counts['skipped'], 3)
+        self.assertFalse(provider_backoff.is_open('airtel_money'))
+        self.assertTrue(provider_backoff.is_open('mtn_momo'))
+        airtel_calls = [call for call in self.server.calls if call[1].startswith('/airtel/standard')]
+        self.assertEqual(len(airtel_calls), 4)
+        self.assertEqual(Payment.objects.get(pk=mtn.pk).status, PaymentStatus.COMPLETED)
+
+
+class WebhookInboxTests(StubGatewayTestCase):
+    """Record-only webhook endpoints and batched inbox processing"""
+
+    def _post(self, name, payload, **headers):
+        return self.client.post(reverse(f'payments:{name}'), json.dumps(payload), content_type='application/json', **headers)
+
+    def test_endpoint_records_each_event_once(self):
+        payload = {'externalId': 'mtn-ok', 'status': 'SUCCESSFUL'}
+        first = self._post('mtn_momo_webhook', payload)
+        retry = self._post('mtn_momo_webhook', payload)
+
+        self.assertEqual(first.json(), {'status': 'received'})
+        self.assertEqual(retry.json(), {'status': 'duplicate'})
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(self.server.calls, [])
+        self.assertEqual(self._post('mtn_momo_webhook', {'status': 'SUCCESSFUL'}).status_code, 400)
+
+    @override_settings(FLUTTERWAVE_SECRET_HASH='flw-secret')
+    def test_flutterwave_signature_checked(self):
+        payload = {'event': 'charge.completed', 'data': {'id': 7, 'tx_ref': 'ORDER_X_1', 'status': 'successful'}}
+        self.assertEqual(self._post('flutterwave_webhook', payload, HTTP_VERIF_HASH='wrong').status_code, 401)
+        self.assertEqual(self._post('flutterwave_webhook', payload, HTTP_VERIF_HASH='flw-secret').status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    @override_settings(FLUTTERWAVE_SECRET_HASH='')
+    def test_flutterwave_rejected_without_secret_hash(self):
+        payload = {'event': 'charge.completed', 'data': {'id': 7, 'tx_ref': 'ORDER_X_1', 'status': 'successful'}}
+        self.assertEqual(self._post('flutterwave_webhook', payload, HTTP_VERIF_HASH='').status_code, 401)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    @override_settings(FLUTTERWAVE_SECRET_HASH='flw-secret')
+    def test_flutterwave_outcome_confirmed_with_gateway(self):
+        card = self._payment(PaymentMethod.CARD)
+        self._post('flutterwave_webhook', {
+            'event': 'charge.completed',
+            'data': {'id': 11, 'tx_ref': f'ORDER_{card.order.order_number}_{card.pk}', 'status': 'successful'},
+        }, HTTP_VERIF_HASH='flw-secret')
+
+        # The payload claims success, but the gateway still reports the charge pending
+        drain_inbox(provider_backoff=ProviderBackoff())
+        card.refresh_from_db()
+        self.assertEqual(card.status, PaymentStatus.PENDING)
+        self.assertIn(('GET', '/flw/transactions/11/verify'), [call[:2] for call in self.server.calls])
+
+    @override_settings(FLUTTERWAVE_SECRET_HASH='flw-secret')
+    def test_drain_applies_batch_once(self):
+        mtn = self._payment(PaymentMethod.MTN_MOBILE_MONEY, status=PaymentStatus.PROCESSING, transaction_id='mtn-ok')
+        card = self._payment(PaymentMethod.CARD)
+        self.server.statuses['mtn-ok'] = 'SUCCESSFUL'
+        self.server.statuses['9'] = 'successful'
+        self._post('mtn_momo_webhook', {'externalId': 'mtn-ok', 'status': 'PENDING'})
+        self._post('mtn_momo_webhook', {'externalId': 'mtn-ok', 'status': 'SUCCESSFUL'})
+        self._post('flutterwave_webhook', {
+            'event': 'charge.completed',
+            'data': {'id': 9, 'tx_ref': f'ORDER_{card.order.order_number}_{card.pk}', 'status': 'successful'},
+        }, HTTP_VERIF_HASH='flw-secret')
+        self._post('airtel_money_webhook', {'transaction': {'id': 'unknown', 'status_code': 'TS'}})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = drain_inbox(provider_backoff=ProviderBackoff())
+
+        self.assertEqual(totals, {'received': 0, 'processed': 3, 'ignored': 1, 'failed': 0})
+        verify_calls = [call for call in self.server.calls if call[1].startswith('/mtn/collection/v1_0/')]
+        self.assertEqual(len(verify_calls), 1)
+        for payment in (mtn, card):
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, PaymentStatus.COMPLETED)
+            self.assertEqual(Order.objects.get(pk=payment.order_id).payment_status, PaymentStatus.COMPLETED)
+        self.assertEqual(Notification.objects.filter(payment=mtn, title='Payment Confirmed').count(), 1)
+        self.assertEqual(drain_inbox(), {'received': 0, 'processed': 0, 'ignored': 0, 'failed': 0})
+
+    def test_failed_events_can_be_replayed(self):
+        payment = self._payment(PaymentMethod.MTN_MOBILE_MONEY, status=PaymentStatus.PROCESSING, transaction_id='mtn-ok')
+        self.server.statuses['mtn-ok'] = 'SUCCESSFUL'
+        self.server.failures[('GET', '/mtn/collection/v1_0/requesttopay/mtn-ok')] = 10
+        self._post('mtn_momo_webhook', {'externalId': 'mtn-ok', 'status': 'SUCCESSFUL'})
+
+        self.assertEqual(drain_inbox(provider_backoff=ProviderBackoff())['failed'], 1)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEventStatus.FAILED)
+        self.assertEqual(event.payment, payment)
+
+        self.server.failures.clear()
+        self.assertEqual(replay_events(), 1)
+        self.assertEqual(drain_inbox(provider_backoff=ProviderBackoff())['processed'], 1)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertEqual(Payment.objects.get(pk=payment.pk).status, PaymentStatus.COMPLETED)
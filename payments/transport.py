@@ -0,0 +1,222 @@
+"""
+Payment Gateway Transport
+Pooled HTTP sessions, cached OAuth tokens and call latency metrics for the
+payment gateways.
+
+Each provider gets one ``requests.Session`` per process, shared by every
+gateway instance and thread, so connections (and their TLS sessions) are
+kept alive between calls. The session's adapter retries connection failures
+for every method, and 429/5xx responses and read timeouts only for GET
+requests. A POST that reached the provider is never resent, so a payment
+cannot be requested twice.
+
+Access tokens are cached per provider and credentials until shortly before
+``expires_in`` runs out. One thread refreshes an expired token while the
+others wait for it. Every call records its latency under
+``(provider, operation)``; ``gateway_metrics()`` returns the totals.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a provider response
+DEFAULT_TIMEOUT = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUT', 30)
+
+# Connections kept open per provider host
+POOL_SIZE = getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 10)
+
+# Retries for failed connections, and for retryable GET responses
+MAX_RETRIES = getattr(settings, 'PAYMENT_GATEWAY_MAX_RETRIES', 3)
+
+# Retry delays grow as backoff * 2 ** (retry - 1) seconds
+RETRY_BACKOFF = 0.5
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Tokens are refreshed this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 60
+
+# Lifetime assumed for tokens issued without expires_in
+DEFAULT_TOKEN_LIFETIME = 300
+
+
+# ==================== SESSIONS ====================
+
+def build_session():
+    """Session with a keep-alive pool and retry/backoff on both schemes"""
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class GatewayTransport:
+    """HTTP access to one provider through its pooled session"""
+
+    def __init__(self, provider, timeout=DEFAULT_TIMEOUT):
+        self.provider = provider
+        self.timeout = timeout
+        self.session = build_session()
+
+    def request(self, method, url, operation=None, **kwargs):
+        """Send a request, recording its latency under ``operation``"""
+        kwargs.setdefault('timeout', self.timeout)
+        operation = operation or method.lower()
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            _metrics.record(self.provider, operation, time.perf_counter() - started, error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        _metrics.record(self.provider, operation, elapsed, error=response.status_code >= 400)
+        logger.debug(f"{self.provider} {operation}: HTTP {response.status_code} in {elapsed * 1000:.0f} ms")
+        return response
+
+    def get(self, url, operation=None, **kwargs):
+        return self.request('GET', url, operation, **kwargs)
+
+    def post(self, url, operation=None, **kwargs):
+        return self.request('POST', url, operation, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(provider):
+    """The process-wide transport of a provider"""
+    transport = _transports.get(provider)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(provider)
+            if transport is None:
+                transport = _transports[provider] = GatewayTransport(provider)
+    return transport
+
+
+def reset_transports():
+    """Close every pooled session and forget cached tokens and metrics"""
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
+    token_cache.clear()
+    _metrics.clear()
+
+
+# ==================== TOKENS ====================
+
+class TokenCache:
+    """Thread-safe access tokens keyed by provider and credentials"""
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """
+        A valid token for ``key``, calling ``fetch`` when none is cached.
+
+        ``fetch`` returns ``(token, expires_in)``; the token is reused until
+        ``refresh_margin`` seconds (at most half its lifetime) before it expires.
+        """
+        token = self._valid(key)
+        if token is not None:
+            return token
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another thread may have refreshed it while we waited
+            token = self._valid(key)
+            if token is not None:
+                return token
+            token, expires_in = fetch()
+            lifetime = float(expires_in or DEFAULT_TOKEN_LIFETIME)
+            self._tokens[key] = (token, time.monotonic() + lifetime - min(self.refresh_margin, lifetime / 2))
+            return token
+
+    def invalidate(self, key):
+        self._tokens.pop(key, None)
+
+    def clear(self):
+        self._tokens.clear()
+
+    def _valid(self, key):
+        entry = self._tokens.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        return None
+
+
+token_cache = TokenCache()
+
+
+# ==================== METRICS ====================
+
+class GatewayMetrics:
+    """Call counts, errors and latency per provider operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, provider, operation, seconds, error=False):
+        with self._lock:
+            stats = self._stats.setdefault((provider, operation), {
+                'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            })
+            elapsed_ms = seconds * 1000
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    def snapshot(self):
+        """``{(provider, operation): {calls, errors, avg_ms, max_ms}}``"""
+        with self._lock:
+            return {
+                key: {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                }
+                for key, stats in self._stats.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_metrics = GatewayMetrics()
+
+
+def gateway_metrics():
+    return _metrics.snapshot()
@@ -1,21 +1,30 @@
 """
 Payment Webhook Handlers
-Processes callbacks from payment gateways
+Receives callbacks from payment gateways
+
+Endpoints verify the request and record it in the webhook inbox, then answer
+200 at once; provider retries of a recorded event are acknowledged without a
+second row. ``manage.py process_webhooks`` applies the inbox to payments.
 """
 
 import json
 import logging
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views import View
-from .models import Payment, PaymentMethod, PaymentStatus
-from .gateways import PaymentGatewayService, PaymentGatewayError
+from .models import PaymentMethod
+from .gateways import PaymentGatewayService
+from .inbox import event_transaction_ids, record_event
 
 logger = logging.getLogger(__name__)
 
 
+def _received(created):
+    return JsonResponse({'status': 'received' if created else 'duplicate'}, status=200)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class FlutterwaveWebhookView(View):
     """Handle Flutterwave webhook callbacks"""
@@ -23,110 +32,47 @@ class FlutterwaveWebhookView(View):
     def post(self, request):
         try:
             payload = json.loads(request.body)
-            logger.info(f"Flutterwave webhook received: {payload}")
+            gateway = PaymentGatewayService.get_gateway(PaymentMethod.CARD)  # Flutterwave handles both card and bank transfer
+            if not gateway.verify_webhook_signature(request.headers.get('verif-hash', '')):
+                logger.warning("Flutterwave webhook with invalid signature rejected")
+                return JsonResponse({'error': 'Invalid webhook signature'}, status=401)
             
-            result = PaymentGatewayService.process_webhook(
-                PaymentMethod.CARD,  # Flutterwave handles both card and bank transfer
-                payload
-            )
-            
-            if result.get('success'):
-                return JsonResponse({'status': 'success'}, status=200)
-            else:
-                return JsonResponse({'status': 'ignored'}, status=200)
+            result = gateway.process_webhook(payload)
+            return _received(not result['duplicate'])
                 
         except json.JSONDecodeError:
             logger.error("Invalid JSON in Flutterwave webhook")
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
-        except PaymentGatewayError as e:
-            logger.error(f"Flutterwave webhook error: {str(e)}")
-            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             logger.error(f"Unexpected webhook error: {str(e)}", exc_info=True)
             return JsonResponse({'error': 'Internal server error'}, status=500)
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def mtn_momo_webhook(request):
-    """Handle MTN Mobile Money webhook callbacks"""
+def _provider_webhook(request, provider, label):
+    """Record an unsigned mobile money callback; its payment is verified by the inbox worker"""
     try:
         payload = json.loads(request.body)
-        logger.info(f"MTN MoMo webhook received: {payload}")
-        
-        # Extract transaction reference
-        transaction_id = payload.get('externalId') or payload.get('financialTransactionId')
-        if not transaction_id:
+        if not event_transaction_ids(provider, payload):
             return JsonResponse({'error': 'Missing transaction ID'}, status=400)
-        
-        # Find payment by transaction ID
-        try:
-            payment = Payment.objects.get(transaction_id=transaction_id)
-        except Payment.DoesNotExist:
-            logger.warning(f"Payment not found for transaction: {transaction_id}")
-            return JsonResponse({'error': 'Payment not found'}, status=404)
-        
-        # Verify payment status
-        result = PaymentGatewayService.verify_payment(payment, transaction_id)
-        
-        if result.get('success'):
-            return JsonResponse({'status': 'success'}, status=200)
-        else:
-            return JsonResponse({'status': 'failed'}, status=200)
+        return _received(record_event(provider, payload))
             
     except json.JSONDecodeError:
-        logger.error("Invalid JSON in MTN MoMo webhook")
+        logger.error(f"Invalid JSON in {label} webhook")
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
-        logger.error(f"MTN MoMo webhook error: {str(e)}", exc_info=True)
+        logger.error(f"{label} webhook error: {str(e)}", exc_info=True)
         return JsonResponse({'error': 'Internal server error'}, status=500)
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def airtel_money_webhook(request):
-    """Handle Airtel Money webhook callbacks"""
-    try:
-        payload = json.loads(request.body)
-        logger.info(f"Airtel Money webhook received: {payload}")
-        
-        # Extract transaction ID
-        transaction_id = payload.get('transaction', {}).get('id') or payload.get('id')
-        if not transaction_id:
-            return JsonResponse({'error': 'Missing transaction ID'}, status=400)
-        
-        # Find payment by transaction ID
-        try:
-            payment = Payment.objects.get(transaction_id=transaction_id)
-        except Payment.DoesNotExist:
-            logger.warning(f"Payment not found for transaction: {transaction_id}")
-            return JsonResponse({'error': 'Payment not found'}, status=404)
-        
-        # Verify payment status
-        result = PaymentGatewayService.verify_payment(payment, transaction_id)
-        
-        if result.get('success'):
-            return JsonResponse({'status': 'success'}, status=200)
-        else:
-            return JsonResponse({'status': 'failed'}, status=200)
-            
-    except json.JSONDecodeError:
-        logger.error("Invalid JSON in Airtel Money webhook")
-        return JsonResponse({'error': 'Invalid JSON'}, status=400)
-    except Exception as e:
-        logger.error(f"Airtel Money webhook error: {str(e)}", exc_info=True)
-        return JsonResponse({'error': 'Internal server error'}, status=500)
-
-
-
-
-
-
-
-
-
-
-
-
+def mtn_momo_webhook(request):
+    """Handle MTN Mobile Money webhook callbacks"""
+    return _provider_webhook(request, 'mtn_momo', 'MTN MoMo')
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def airtel_money_webhook(request):
+    """Handle Airtel Money webhook callbacks"""
+    return _provider_webhook(request, 'airtel_money', 'Airtel Money')
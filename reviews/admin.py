@@ -1,13 +1,14 @@
 from django.contrib import admin
+from . import aggregates
 from .models import Review, ReviewHelpful
 
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
-    list_display = ['user', 'menu_item', 'rating', 'title', 'is_approved', 'is_verified_purchase', 'created_at']
+    list_display = ['user', 'menu_item', 'rating', 'title', 'is_approved', 'is_verified_purchase', 'helpful_count', 'created_at']
     list_filter = ['rating', 'is_approved', 'is_verified_purchase', 'created_at']
     search_fields = ['user__username', 'menu_item__name', 'title', 'comment']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['helpful_count', 'created_at', 'updated_at']
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
     
@@ -16,7 +17,7 @@ class ReviewAdmin(admin.ModelAdmin):
             'fields': ('user', 'menu_item', 'order', 'rating', 'title', 'comment')
         }),
         ('Status', {
-            'fields': ('is_approved', 'is_verified_purchase')
+            'fields': ('is_approved', 'is_verified_purchase', 'helpful_count')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -27,13 +28,13 @@ class ReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews', 'disapprove_reviews']
     
     def approve_reviews(self, request, queryset):
-        queryset.update(is_approved=True)
-        self.message_user(request, f"{queryset.count()} review(s) approved.")
+        approved = aggregates.set_approval(queryset, True)
+        self.message_user(request, f"{approved} review(s) approved.")
     approve_reviews.short_description = "Approve selected reviews"
     
     def disapprove_reviews(self, request, queryset):
-        queryset.update(is_approved=False)
-        self.message_user(request, f"{queryset.count()} review(s) disapproved.")
+        disapproved = aggregates.set_approval(queryset, False)
+        self.message_user(request, f"{disapproved} review(s) disapproved.")
     disapprove_reviews.short_description = "Disapprove selected reviews"
 
 
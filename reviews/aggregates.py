@@ -0,0 +1,175 @@
+"""
+Review Aggregates
+Running rating and helpful-vote totals, kept current with atomic F() updates.
+
+MenuItem stores, for its approved reviews, the rating sum, the count
+(total_reviews) and one count per star. Each review write only changes the
+difference it makes. A new approved review adds its stars. An edit moves them
+from the old rating to the new one. A deletion or a disapproval removes them.
+Each change is one ``UPDATE ... SET col = col + n`` per item, and
+average_rating is derived in the same statement. The old and new ratings come
+from Review.loaded_values(), so no other review is read.
+
+Review.helpful_count is kept the same way from ReviewHelpful writes.
+``rebuild_rating_aggregates`` and ``rebuild_helpful_counts`` recompute
+everything with grouped queries (`manage.py repair_review_aggregates`).
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+from menu import catalog
+from menu.models import MenuItem
+
+# Per-star count field of each rating
+STAR_FIELDS = {star: f'rating_{star}_count' for star in range(1, 6)}
+
+RATING_FIELDS = ['average_rating', 'total_reviews', 'rating_sum', *STAR_FIELDS.values()]
+
+# Rows written per bulk_update in the rebuild functions
+REBUILD_BATCH_SIZE = 500
+
+
+# ==================== INCREMENTAL UPDATES ====================
+
+def contribution(menu_item_id, rating, is_approved):
+    """What one review adds to its item's aggregates: ``(item id, rating)``, or None"""
+    if is_approved and menu_item_id and rating in STAR_FIELDS:
+        return menu_item_id, rating
+    return None
+
+
+def apply_changes(changes):
+    """
+    Apply ``[(old contribution, new contribution)]`` to the items' aggregates.
+
+    Contributions cancel out per item and star first, so a batch costs one
+    UPDATE per item whose totals actually move.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for old, new in changes:
+        if old == new:
+            continue
+        for sign, entry in ((-1, old), (1, new)):
+            if entry is not None:
+                item_id, rating = entry
+                deltas[item_id][rating] += sign
+
+    for item_id, stars in deltas.items():
+        if not any(stars.values()):
+            continue
+        count = sum(stars.values())
+        rating_sum = sum(star * n for star, n in stars.items())
+        # average_rating first: every expression must read the row's old values
+        fields = {
+            'average_rating': Coalesce(
+                Round(
+                    Cast(F('rating_sum') + rating_sum, FloatField()) / NullIf(F('total_reviews') + count, 0),
+                    2
+                ),
+                Value(0.0)
+            ),
+            'total_reviews': F('total_reviews') + count,
+            'rating_sum': F('rating_sum') + rating_sum,
+        }
+        for star, n in stars.items():
+            if n:
+                fields[STAR_FIELDS[star]] = F(STAR_FIELDS[star]) + n
+        MenuItem.objects.filter(pk=item_id).update(**fields)
+
+
+def set_approval(reviews, is_approved):
+    """Approve or disapprove a queryset of reviews and move their ratings; returns how many changed"""
+    from .models import Review
+
+    with transaction.atomic():
+        rows = list(
+            reviews.select_for_update().exclude(is_approved=is_approved)
+            .values_list('pk', 'menu_item_id', 'rating')
+        )
+        if not rows:
+            return 0
+        Review.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+            is_approved=is_approved, updated_at=timezone.now()
+        )
+        apply_changes([
+            (contribution(item_id, rating, not is_approved), contribution(item_id, rating, is_approved))
+            for _, item_id, rating in rows
+        ])
+        # A queryset update sends no signals; cached menu pages show the ratings
+        catalog.bump_version()
+    return len(rows)
+
+
+def adjust_helpful_count(review_id, delta):
+    from .models import Review
+
+    if delta:
+        Review.objects.filter(pk=review_id).update(helpful_count=F('helpful_count') + delta)
+
+
+# ==================== REPAIR ====================
+
+def _models(apps=None):
+    """(MenuItem, Review, ReviewHelpful), from a migration's app registry when given"""
+    if apps is not None:
+        return apps.get_model('menu', 'MenuItem'), apps.get_model('reviews', 'Review'), apps.get_model('reviews', 'ReviewHelpful')
+    from .models import Review, ReviewHelpful
+    return MenuItem, Review, ReviewHelpful
+
+
+def rebuild_rating_aggregates(item_ids=None, apps=None):
+    """Recompute rating aggregates from the approved reviews; returns the number of items corrected"""
+    MenuItem, Review, _ = _models(apps)
+
+    reviews = Review.objects.filter(is_approved=True)
+    items = MenuItem.objects.only('id', *RATING_FIELDS).order_by('pk')
+    if item_ids is not None:
+        reviews = reviews.filter(menu_item_id__in=item_ids)
+        items = items.filter(pk__in=item_ids)
+
+    stats = {
+        row.pop('menu_item_id'): row
+        for row in reviews.values('menu_item_id').annotate(
+            total_reviews=Count('id'),
+            rating_sum=Sum('rating'),
+            **{field: Count('id', filter=Q(rating=star)) for star, field in STAR_FIELDS.items()}
+        )
+    }
+
+    changed = []
+    for item in items.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        row = stats.get(item.pk, {})
+        values = {field: row.get(field) or 0 for field in ['total_reviews', 'rating_sum', *STAR_FIELDS.values()]}
+        total = values['total_reviews']
+        values['average_rating'] = round(values['rating_sum'] / total, 2) if total else 0
+        if any(float(getattr(item, field)) != float(value) for field, value in values.items()):
+            for field, value in values.items():
+                setattr(item, field, value)
+            changed.append(item)
+    MenuItem.objects.bulk_update(changed, RATING_FIELDS, batch_size=REBUILD_BATCH_SIZE)
+    if changed and apps is None:
+        catalog.bump_version()
+    return len(changed)
+
+
+def rebuild_helpful_counts(apps=None):
+    """Recompute Review.helpful_count from the votes; returns the number of reviews corrected"""
+    _, Review, ReviewHelpful = _models(apps)
+
+    counts = dict(
+        ReviewHelpful.objects.filter(is_helpful=True)
+        .values('review_id').annotate(total=Count('id')).values_list('review_id', 'total')
+    )
+    changed = []
+    for review in Review.objects.only('id', 'helpful_count').order_by('pk').iterator(chunk_size=REBUILD_BATCH_SIZE):
+        total = counts.get(review.pk, 0)
+        if review.helpful_count != total:
+            review.helpful_count = total
+            changed.append(review)
+    Review.objects.bulk_update(changed, ['helpful_count'], batch_size=REBUILD_BATCH_SIZE)
+    return len(changed)
@@ -0,0 +1,20 @@
+"""
+Management command to recompute the running review aggregates
+Run it after raw SQL edits or imports that bypass the Review signals
+Usage: python manage.py repair_review_aggregates
+"""
+
+from django.core.management.base import BaseCommand
+
+from reviews.aggregates import rebuild_helpful_counts, rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute menu item rating aggregates and review helpful counts in bulk'
+
+    def handle(self, *args, **options):
+        items = rebuild_rating_aggregates()
+        reviews = rebuild_helpful_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Corrected rating aggregates of {items} menu items and helpful counts of {reviews} reviews'
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0004_delete_menuitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='helpful_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
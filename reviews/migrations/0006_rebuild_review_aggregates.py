@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+STAR_FIELDS = {star: f'rating_{star}_count' for star in range(1, 6)}
+
+RATING_FIELDS = ['average_rating', 'total_reviews', 'rating_sum', *STAR_FIELDS.values()]
+
+BATCH_SIZE = 500
+
+
+def seed_aggregates(apps, schema_editor):
+    """Compute the running rating and helpful-vote totals from existing reviews"""
+    MenuItem = apps.get_model('menu', 'MenuItem')
+    Review = apps.get_model('reviews', 'Review')
+    ReviewHelpful = apps.get_model('reviews', 'ReviewHelpful')
+
+    stats = {
+        row.pop('menu_item_id'): row
+        for row in Review.objects.filter(is_approved=True).values('menu_item_id').annotate(
+            total_reviews=Count('id'),
+            rating_sum=Sum('rating'),
+            **{field: Count('id', filter=Q(rating=star)) for star, field in STAR_FIELDS.items()}
+        )
+    }
+    items = []
+    for item in MenuItem.objects.only('id', *RATING_FIELDS).order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        row = stats.get(item.pk, {})
+        for field in ['total_reviews', 'rating_sum', *STAR_FIELDS.values()]:
+            setattr(item, field, row.get(field) or 0)
+        item.average_rating = round(item.rating_sum / item.total_reviews, 2) if item.total_reviews else 0
+        items.append(item)
+    MenuItem.objects.bulk_update(items, RATING_FIELDS, batch_size=BATCH_SIZE)
+
+    counts = (
+        ReviewHelpful.objects.filter(is_helpful=True)
+        .values('review_id').annotate(total=Count('id')).values_list('review_id', 'total')
+    )
+    reviews = [Review(pk=review_id, helpful_count=total) for review_id, total in counts]
+    Review.objects.bulk_update(reviews, ['helpful_count'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_review_helpful_count'),
+        ('menu', '0008_menu_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_aggregates, migrations.RunPython.noop),
+    ]
@@ -6,11 +6,14 @@ from django.core.exceptions import ValidationError
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from menu.models import MenuItem
-from orders.models import Order
+from orders.models import LoadedValuesMixin, Order
+from . import aggregates
 
 
-class Review(models.Model):
+class Review(LoadedValuesMixin, models.Model):
     """Customer reviews for menu items - Professional review system"""
+    TRACKED_FIELDS = ('user_id', 'menu_item_id', 'rating', 'is_approved', 'order_id')
+    
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -67,6 +70,9 @@ class Review(models.Model):
         help_text="Admin notes for moderation"
     )
     
+    # Helpful votes, kept by ReviewHelpful writes (see reviews.aggregates)
+    helpful_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -99,19 +105,19 @@ class Review(models.Model):
             })
     
     def save(self, *args, **kwargs):
-        # Validate before saving
-        self.full_clean()
+        # Validate before saving; the (user, menu_item) pair is only checked when it changed
+        loaded = self.loaded_values()
+        pair_changed = not loaded or (loaded.get('user_id'), loaded.get('menu_item_id')) != (self.user_id, self.menu_item_id)
+        self.full_clean(validate_unique=pair_changed)
         
         # Mark as verified purchase if order is provided and belongs to user
-        if self.order and self.order.user == self.user:
+        order_changed = not loaded or loaded.get('order_id') != self.order_id
+        if self.order_id and order_changed and not self.is_verified_purchase and self.order.user_id == self.user_id:
             # Verify order contains this menu item
-            if self.order.items.filter(menu_item=self.menu_item).exists():
+            if self.order.items.filter(menu_item_id=self.menu_item_id).exists():
                 self.is_verified_purchase = True
         
         super().save(*args, **kwargs)
-        
-        # Update menu item average rating
-        self.menu_item.update_average_rating()
     
     @property
     def rating_stars(self):
@@ -125,11 +131,6 @@ class Review(models.Model):
         from datetime import timedelta
         return self.created_at >= timezone.now() - timedelta(days=30)
     
-    @property
-    def helpful_count(self):
-        """Count of helpful votes"""
-        return self.helpful_votes.filter(is_helpful=True).count()
-    
     def is_helpful_by_user(self, user):
         """Check if user has marked this review as helpful"""
         if not user.is_authenticated:
@@ -137,8 +138,10 @@ class Review(models.Model):
         return self.helpful_votes.filter(user=user, is_helpful=True).exists()
 
 
-class ReviewHelpful(models.Model):
+class ReviewHelpful(LoadedValuesMixin, models.Model):
     """Track which reviews users found helpful"""
+    TRACKED_FIELDS = ('is_helpful',)
+    
     review = models.ForeignKey(
         Review,
         on_delete=models.CASCADE,
@@ -158,20 +161,58 @@ class ReviewHelpful(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.review.menu_item.name} - {'Helpful' if self.is_helpful else 'Not Helpful'}"
+    
+    @classmethod
+    def helpful_review_ids(cls, user, reviews):
+        """Ids among ``reviews`` the user marked helpful, in one query"""
+        if not user.is_authenticated:
+            return set()
+        return set(
+            cls.objects.filter(
+                user=user, is_helpful=True, review_id__in=[review.pk for review in reviews]
+            ).values_list('review_id', flat=True)
+        )
+
+
+# Signal handlers for the running aggregates (see reviews.aggregates)
+def _rating_contribution(values):
+    return aggregates.contribution(values.get('menu_item_id'), values.get('rating'), values.get('is_approved'))
 
 
-# Signal handlers for updating menu item ratings
 @receiver(post_save, sender=Review)
-def update_rating_on_save(sender, instance, created, **kwargs):
-    """Update menu item rating when review is saved"""
-    if instance.menu_item:
+def update_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the review's stars on its menu item when it is added, edited, approved or moved"""
+    if raw:
+        return
+    new = aggregates.contribution(instance.menu_item_id, instance.rating, instance.is_approved)
+    if created:
+        aggregates.apply_changes([(None, new)])
+    elif instance.loaded_values():
+        aggregates.apply_changes([(_rating_contribution(instance.loaded_values()), new)])
+    elif instance.menu_item_id:
+        # Saved without being loaded first: nothing to diff against
         instance.menu_item.update_average_rating()
 
 
 @receiver(post_delete, sender=Review)
 def update_rating_on_delete(sender, instance, **kwargs):
-    """Update menu item rating when review is deleted"""
-    if instance.menu_item:
-        instance.menu_item.update_average_rating()
-        
+    """Remove the review's stars from its menu item"""
+    values = instance.loaded_values() or instance._tracked_values()
+    aggregates.apply_changes([(_rating_contribution(values), None)])
+
+
+@receiver(post_save, sender=ReviewHelpful)
+def update_helpful_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        aggregates.adjust_helpful_count(instance.review_id, int(instance.is_helpful))
+    else:
+        was_helpful = instance.loaded_values().get('is_helpful', instance.is_helpful)
+        aggregates.adjust_helpful_count(instance.review_id, int(instance.is_helpful) - int(was_helpful))
+
 
+@receiver(post_delete, sender=ReviewHelpful)
+def update_helpful_count_on_delete(sender, instance, **kwargs):
+    if (instance.loaded_values() or instance._tracked_values()).get('is_helpful'):
+        aggregates.adjust_helpful_count(instance.review_id, -1)
@@ -6,7 +6,10 @@ register = template.Library()
 
 @register.filter
 def is_helpful(user, review):
-    """Check if a user has marked a review as helpful"""
+    """
+    Check if a user has marked a review as helpful.
+    One query per review: list pages should pass ReviewHelpful.helpful_review_ids instead.
+    """
     if not user or not user.is_authenticated:
         return False
     
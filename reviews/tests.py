@@ -31,3 +31,76 @@ class ReviewsTestCase(TestCase):
 		resp = self.client.post(f'/reviews/{review.id}/helpful/')
 		self.assertIn(resp.status_code, (200, 302))
 		self.assertTrue(ReviewHelpful.objects.filter(review=review, user=self.user).exists())
+
+
+class ReviewAggregateTests(TestCase):
+	"""Ratings and helpful votes are kept as running totals"""
+
+	def setUp(self):
+		self.cat = Category.objects.create(name='Agg', slug='agg')
+		self.item = MenuItem.objects.create(
+			name='Stew', description='Hearty', category=self.cat, price=10.00
+		)
+		self.users = [User.objects.create_user(username=f'u{i}', password='pass') for i in range(3)]
+
+	def review(self, user, rating, **kwargs):
+		return Review.objects.create(user=user, menu_item=self.item, rating=rating, comment='Tasty and warm', **kwargs)
+
+	def assertAggregates(self, total, rating_sum, average, distribution):
+		self.item.refresh_from_db()
+		self.assertEqual(self.item.total_reviews, total)
+		self.assertEqual(self.item.rating_sum, rating_sum)
+		self.assertEqual(float(self.item.average_rating), average)
+		self.assertEqual(self.item.get_rating_distribution(), distribution)
+
+	def test_create_edit_approve_delete_move_totals(self):
+		from django.test.utils import CaptureQueriesContext
+		from django.db import connection
+		from .aggregates import set_approval
+
+		five = self.review(self.users[0], 5)
+		three = self.review(self.users[1], 3)
+		self.assertAggregates(2, 8, 4.0, {'1': 0, '2': 0, '3': 1, '4': 0, '5': 1})
+
+		with CaptureQueriesContext(connection) as queries:
+			three.rating = 1
+			three.save()
+		self.assertFalse(any('AVG(' in query['sql'].upper() for query in queries.captured_queries))
+		self.assertAggregates(2, 6, 3.0, {'1': 1, '2': 0, '3': 0, '4': 0, '5': 1})
+
+		self.assertEqual(set_approval(Review.objects.filter(pk=five.pk), False), 1)
+		self.assertAggregates(1, 1, 1.0, {'1': 1, '2': 0, '3': 0, '4': 0, '5': 0})
+		self.review(self.users[2], 4, is_approved=False)
+		self.assertAggregates(1, 1, 1.0, {'1': 1, '2': 0, '3': 0, '4': 0, '5': 0})
+
+		three.delete()
+		self.assertAggregates(0, 0, 0.0, {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0})
+
+	def test_helpful_votes_are_counted_and_fetched_per_page(self):
+		review = self.review(self.users[0], 4)
+		vote = ReviewHelpful.objects.create(review=review, user=self.users[1])
+		ReviewHelpful.objects.create(review=review, user=self.users[2])
+		review.refresh_from_db()
+		self.assertEqual(review.helpful_count, 2)
+
+		vote.is_helpful = False
+		vote.save()
+		review.refresh_from_db()
+		self.assertEqual(review.helpful_count, 1)
+
+		with self.assertNumQueries(1):
+			self.assertEqual(ReviewHelpful.helpful_review_ids(self.users[2], [review]), {review.pk})
+
+	def test_repair_recomputes_everything(self):
+		from io import StringIO
+		from django.core.management import call_command
+
+		review = self.review(self.users[0], 5)
+		ReviewHelpful.objects.create(review=review, user=self.users[1])
+		MenuItem.objects.filter(pk=self.item.pk).update(total_reviews=7, rating_sum=0, rating_5_count=0)
+		Review.objects.filter(pk=review.pk).update(helpful_count=9)
+
+		call_command('repair_review_aggregates', stdout=StringIO())
+		self.assertAggregates(1, 5, 5.0, {'1': 0, '2': 0, '3': 0, '4': 0, '5': 1})
+		review.refresh_from_db()
+		self.assertEqual(review.helpful_count, 1)
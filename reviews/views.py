@@ -2,7 +2,6 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Avg, Count, Q
 from django.http import JsonResponse
 from menu.models import MenuItem
 from orders.models import Order
@@ -88,34 +87,22 @@ def item_reviews(request, item_id):
         is_approved=True
     ).select_related('user').order_by('-created_at')
     
-    # Get helpful votes for the current user
-    helpful_review_ids = []
-    if request.user.is_authenticated:
-        helpful_review_ids = list(
-            ReviewHelpful.objects.filter(
-                user=request.user,
-                is_helpful=True,
-                review__in=reviews
-            ).values_list('review_id', flat=True)
-        )
-    
-    # Statistics
-    stats = reviews.aggregate(
-        average_rating=Avg('rating'),
-        total_reviews=Count('id')
-    )
-    
-    # Calculate rating distribution
-    rating_distribution = {}
-    for rating in range(1, 6):
-        count = reviews.filter(rating=rating).count()
-        rating_distribution[str(rating)] = count
+    # Statistics, from the item's running aggregates
+    stats = {
+        'average_rating': menu_item.average_rating if menu_item.total_reviews else None,
+        'total_reviews': menu_item.total_reviews,
+    }
+    rating_distribution = menu_item.get_rating_distribution()
     
     # Pagination
     paginator = Paginator(reviews, 10)
+    paginator.count = menu_item.total_reviews  # the approved reviews counted, without a COUNT query
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
+    # Helpful votes of the current user on this page
+    helpful_review_ids = ReviewHelpful.helpful_review_ids(request.user, page_obj.object_list)
+    
     # Check if user has reviewed
     user_review = None
     if request.user.is_authenticated:
@@ -168,7 +155,7 @@ def mark_helpful(request, review_id):
         helpful_vote.is_helpful = not helpful_vote.is_helpful
         helpful_vote.save()
     
-    helpful_count = review.helpful_votes.filter(is_helpful=True).count()
+    helpful_count = Review.objects.filter(pk=review.pk).values_list('helpful_count', flat=True).get()
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -0,0 +1,463 @@
+"""
+Batch Subscription Orders
+Generates the day's subscription orders in bulk for generate_subscription_orders.
+
+The available menu, plan menus and dietary tags are loaded once per run into
+NumPy arrays. For each chunk of due subscriptions the subscribers' reviews,
+order history and delivery addresses are loaded with one query each, meals
+are scored for the whole chunk as a (subscriptions x menu items) matrix, and
+orders, items, payments and SubscriptionOrder links are written with
+bulk_create in one transaction. bulk_create sends no post_save, so the chunk
+publishes the orders' creation events to the order event subscribers and
+calls the payment notification and dashboard rollup hooks for its rows.
+
+Large runs can be sharded across worker processes by subscription id
+(``generate_in_parallel``); each worker loads its own catalog and connection.
+"""
+
+import logging
+import multiprocessing
+import random
+import string
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import numpy as np
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import Count
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from analytics import rollups
+from delivery.models import DeliveryAddress
+from menu.models import MenuItem
+from notifications.signals import notify_payments
+from orders import events
+from orders.models import Order, OrderEvent, OrderItem, OrderStatus
+from payments.models import Payment, PaymentMethod, PaymentStatus
+from reviews.models import Review
+
+from .models import Subscription, SubscriptionOrder, SubscriptionPlan, SubscriptionStatus
+
+logger = logging.getLogger(__name__)
+
+# Subscriptions scored and written per transaction
+ORDER_CHUNK_SIZE = 500
+
+# Attempts per chunk when a generated order number is taken concurrently
+ORDER_NUMBER_ATTEMPTS = 3
+
+HISTORY_STATUSES = [OrderStatus.DELIVERED, OrderStatus.READY]
+FREQUENT_ITEMS_PER_USER = 10
+
+# Score weights
+RATING_WEIGHT = 2.0
+REVIEWED_BOOST = 5.0
+FREQUENT_BOOST = 3.0
+FEATURED_BOOST = 2.0
+REVIEW_COUNT_WEIGHT = 0.1
+REVIEW_COUNT_CAP = 2.0
+
+
+def is_due(subscription, today):
+    """Whether a subscription's plan schedules an order for ``today``"""
+    plan_type = subscription.plan.plan_type
+    if plan_type == 'daily':
+        return True
+    days_since_start = (today - subscription.start_date).days
+    if plan_type == 'weekly':
+        return days_since_start % 7 == 0
+    if plan_type == 'monthly':
+        return days_since_start % 30 == 0
+    return False
+
+
+def active_subscriptions(today, shard=None):
+    """
+    Auto-ordering subscriptions running on ``today`` without an order for it yet.
+
+    ``shard`` is an ``(index, count)`` pair selecting ``pk % count == index``.
+    """
+    subscriptions = Subscription.objects.filter(
+        status=SubscriptionStatus.ACTIVE,
+        auto_order_enabled=True,
+        start_date__lte=today,
+        end_date__gte=today
+    ).exclude(
+        subscription_orders__scheduled_date=today
+    ).select_related('plan', 'user').order_by('pk')
+    if shard is not None:
+        index, count = shard
+        subscriptions = subscriptions.annotate(shard=Mod('pk', count)).filter(shard=index)
+    return subscriptions
+
+
+def _order_numbers(count):
+    """``count`` unused order numbers in the format Order.save() generates"""
+    prefix = f"ORD{timezone.now():%Y%m%d}"
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {
+            prefix + ''.join(random.choices(string.digits, k=6))
+            for _ in range(count - len(numbers))
+        } - numbers
+        taken = set(Order.objects.filter(order_number__in=candidates).values_list('order_number', flat=True))
+        numbers |= candidates - taken
+    return list(numbers)
+
+
+def _pick_with_variety(ranked, categories, count):
+    """Take the best ``count`` items, holding back repeats of a category"""
+    selected = []
+    seen_categories = set()
+    for index in ranked:
+        if len(selected) >= count:
+            break
+        category_id = categories[index]
+        repeats = 1 if category_id in seen_categories else 0
+        if repeats < count // 2 or len(seen_categories) < 2:
+            selected.append(index)
+            seen_categories.add(category_id)
+
+    if len(selected) < count:
+        chosen = set(selected)
+        selected.extend([index for index in ranked if index not in chosen][:count - len(selected)])
+    return selected[:count]
+
+
+# ==================== MEAL SCORING ====================
+
+class MenuCatalog:
+    """The available menu as parallel arrays, with the rating-based score of every item"""
+
+    def __init__(self):
+        rows = list(MenuItem.objects.filter(is_available=True).values_list(
+            'pk', 'category_id', 'price', 'is_featured', 'average_rating', 'total_reviews', 'ingredients'
+        ))
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.index = {item_id: i for i, item_id in enumerate(self.ids.tolist())}
+        self.categories = [row[1] for row in rows]
+        self.prices = [row[2] for row in rows]
+
+        ratings = np.array([float(row[4] or 0) for row in rows])
+        review_counts = np.array([row[5] or 0 for row in rows], dtype=float)
+        featured = np.array([row[3] for row in rows], dtype=bool)
+        self.base_scores = (
+            ratings * RATING_WEIGHT
+            + featured * FEATURED_BOOST
+            + np.minimum(review_counts * REVIEW_COUNT_WEIGHT, REVIEW_COUNT_CAP)
+        )
+
+        tags = defaultdict(list)
+        for item_id, name in MenuItem.dietary_tags.through.objects.filter(
+            menuitem__is_available=True
+        ).values_list('menuitem_id', 'dietarytag__name'):
+            tags[item_id].append(name.lower())
+        self._ingredients = [(row[6] or '').lower() for row in rows]
+        self._tags = [tags[row[0]] for row in rows]
+
+        self._plan_items = defaultdict(set)
+        for plan_id, item_id in SubscriptionPlan.menu_items.through.objects.values_list(
+            'subscriptionplan_id', 'menuitem_id'
+        ):
+            self._plan_items[plan_id].add(item_id)
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def plan_mask(self, plan_id):
+        """Items a plan may serve: its own menu if it has one, else everything available"""
+        key = ('plan', plan_id)
+        if key not in self._masks:
+            items = self._plan_items.get(plan_id)
+            if items:
+                self._masks[key] = np.isin(self.ids, list(items))
+            else:
+                self._masks[key] = np.ones(len(self), dtype=bool)
+        return self._masks[key]
+
+    def dietary_mask(self, dietary_preferences):
+        """Items whose dietary tags or ingredients mention any preference keyword"""
+        keywords = tuple(sorted(set((dietary_preferences or '').lower().split())))
+        if not keywords:
+            return np.ones(len(self), dtype=bool)
+        key = ('diet', keywords)
+        if key not in self._masks:
+            self._masks[key] = np.array([
+                any(keyword in ingredients or any(keyword in tag for tag in tags) for keyword in keywords)
+                for ingredients, tags in zip(self._ingredients, self._tags)
+            ], dtype=bool)
+        return self._masks[key]
+
+
+def load_preferences(catalog, user_ids):
+    """``{user_id: (reviewed item indexes, frequent item indexes)}`` from two queries"""
+    reviewed = defaultdict(set)
+    for user_id, item_id in Review.objects.filter(
+        user_id__in=user_ids, rating__gte=4, is_approved=True
+    ).values_list('user_id', 'menu_item_id'):
+        if item_id in catalog.index:
+            reviewed[user_id].add(catalog.index[item_id])
+
+    frequent = defaultdict(list)
+    history = OrderItem.objects.filter(
+        order__user_id__in=user_ids, order__status__in=HISTORY_STATUSES
+    ).values('order__user_id', 'menu_item_id').annotate(
+        order_count=Count('id')
+    ).order_by('order__user_id', '-order_count')
+    for row in history:
+        items = frequent[row['order__user_id']]
+        if len(items) < FREQUENT_ITEMS_PER_USER:
+            items.append(row['menu_item_id'])
+
+    return {
+        user_id: (
+            reviewed[user_id],
+            {catalog.index[item_id] for item_id in frequent[user_id] if item_id in catalog.index},
+        )
+        for user_id in user_ids
+    }
+
+
+def select_meals(catalog, subscriptions, preferences, counts=None):
+    """
+    Pick meals for a batch of subscriptions, returning a list of catalog indexes per subscription.
+
+    Scores are ``base + reviewed + frequent`` over a subscriptions x items
+    matrix, with items outside the plan menu or dietary preferences masked out.
+    """
+    if counts is None:
+        counts = [subscription.plan.meals_per_cycle for subscription in subscriptions]
+    if not len(catalog) or not subscriptions:
+        return [[] for _ in subscriptions]
+
+    scores = np.tile(catalog.base_scores, (len(subscriptions), 1))
+    eligible = np.empty(scores.shape, dtype=bool)
+    for row, subscription in enumerate(subscriptions):
+        reviewed, frequent = preferences.get(subscription.user_id, ((), ()))
+        scores[row, list(reviewed)] += REVIEWED_BOOST
+        scores[row, list(frequent)] += FREQUENT_BOOST
+        eligible[row] = catalog.plan_mask(subscription.plan_id) & catalog.dietary_mask(
+            subscription.dietary_preferences
+        )
+
+    scores[~eligible] = -np.inf
+    ranking = np.argsort(-scores, axis=1, kind='stable')
+    eligible_counts = eligible.sum(axis=1)
+
+    selections = []
+    for row, count in enumerate(counts):
+        if not eligible_counts[row]:
+            # Nothing matches the plan and preferences: fall back to the menu as listed
+            selections.append(list(range(min(count, len(catalog)))))
+            continue
+        ranked = ranking[row, :eligible_counts[row]].tolist()
+        selections.append(_pick_with_variety(ranked, catalog.categories, count))
+    return selections
+
+
+# ==================== ORDER GENERATION ====================
+
+class SubscriptionOrderGenerator:
+    """Create the day's orders for due subscriptions, one bulk transaction per chunk"""
+
+    def __init__(self, today=None, chunk_size=ORDER_CHUNK_SIZE, dry_run=False):
+        self.today = today or timezone.now().date()
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.catalog = MenuCatalog()
+        self.created = 0
+        self.failed = 0
+        self.skipped = []
+        self.order_numbers = []
+
+    def run(self, subscriptions):
+        """Generate orders for an iterable of subscriptions; returns a picklable summary"""
+        chunk = []
+        for subscription in subscriptions:
+            if not is_due(subscription, self.today):
+                continue
+            chunk.append(subscription)
+            if len(chunk) >= self.chunk_size:
+                self._process_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._process_chunk(chunk)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'skipped': list(self.skipped),
+            'order_numbers': list(self.order_numbers),
+        }
+
+    def _addresses(self, subscriptions):
+        """The delivery address of each subscriber: the cached one, else their default, else any"""
+        addresses = {}
+        by_id = {}
+        for address in DeliveryAddress.objects.filter(
+            user_id__in={subscription.user_id for subscription in subscriptions}
+        ).select_related('zone'):
+            addresses.setdefault(address.user_id, address)
+            by_id[address.pk] = address
+
+        chosen = {}
+        for subscription in subscriptions:
+            cached = by_id.get(subscription.delivery_address_id)
+            if cached is not None and cached.user_id == subscription.user_id:
+                chosen[subscription.pk] = cached
+            elif subscription.user_id in addresses:
+                chosen[subscription.pk] = addresses[subscription.user_id]
+        return chosen
+
+    def _plan_chunk(self, chunk):
+        """``(subscription, address, item indexes)`` for every subscription that can be served"""
+        preferences = load_preferences(self.catalog, list({subscription.user_id for subscription in chunk}))
+        selections = select_meals(self.catalog, chunk, preferences)
+        addresses = self._addresses(chunk)
+
+        planned = []
+        for subscription, selection in zip(chunk, selections):
+            if not selection:
+                self.skipped.append(f'No available menu items for subscription {subscription.pk}')
+            elif subscription.pk not in addresses:
+                self.skipped.append(f'No delivery address for user {subscription.user.username}')
+            else:
+                planned.append((subscription, addresses[subscription.pk], selection))
+        return planned
+
+    def _process_chunk(self, chunk):
+        planned = self._plan_chunk(chunk)
+        if not planned:
+            return
+        if self.dry_run:
+            self.created += len(planned)
+            return
+
+        for attempt in range(1, ORDER_NUMBER_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    orders = self._write(planned)
+                break
+            except IntegrityError as e:
+                if attempt < ORDER_NUMBER_ATTEMPTS:
+                    logger.warning(f"Retrying subscription order chunk after integrity error: {e}")
+                    continue
+                logger.error(f"Subscription order chunk of {len(planned)} failed: {e}")
+                self.failed += len(planned)
+                return
+            except Exception as e:
+                logger.error(f"Subscription order chunk of {len(planned)} failed: {e}")
+                self.failed += len(planned)
+                return
+
+        self.created += len(orders)
+        self.order_numbers.extend(order.order_number for order in orders)
+
+    def _write(self, planned):
+        catalog = self.catalog
+        orders = []
+        for (subscription, address, selection), number in zip(planned, _order_numbers(len(planned))):
+            user = subscription.user
+            subtotal = sum((catalog.prices[index] for index in selection), Decimal('0.00'))
+            delivery_charge = address.get_delivery_charge()
+            orders.append(Order(
+                user=user,
+                order_number=number,
+                status=OrderStatus.PENDING,
+                customer_name=user.get_full_name() or user.username,
+                customer_phone=address.phone,
+                delivery_address=address,
+                delivery_instructions=subscription.dietary_preferences or '',
+                subtotal=subtotal,
+                delivery_charge=delivery_charge,
+                total=subtotal + delivery_charge,
+            ))
+        orders = Order.objects.bulk_create(orders)
+
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                menu_item_id=int(catalog.ids[index]),
+                quantity=1,
+                price=catalog.prices[index],
+                subtotal=catalog.prices[index],
+            )
+            for order, (_, _, selection) in zip(orders, planned)
+            for index in selection
+        ], batch_size=1000)
+
+        payments = Payment.objects.bulk_create([
+            Payment(
+                order=order,
+                payment_method=PaymentMethod.CASH_ON_DELIVERY,
+                status=PaymentStatus.PENDING,
+                amount=order.total,
+            )
+            for order in orders
+        ])
+
+        SubscriptionOrder.objects.bulk_create([
+            SubscriptionOrder(subscription=subscription, order=order, scheduled_date=self.today)
+            for order, (subscription, _, _) in zip(orders, planned)
+        ])
+
+        # What post_save would have triggered for the bulk-written rows
+        events.publish([OrderEvent(order_id=order.pk, status=order.status, created=True) for order in orders])
+        notify_payments(payments, created=True)
+        rollups.record_created(
+            orders=orders,
+            items=items,
+            payments=payments,
+            categories={int(item_id): category for item_id, category in zip(catalog.ids, catalog.categories)},
+        )
+        return orders
+
+
+def generate_orders(today=None, chunk_size=ORDER_CHUNK_SIZE, dry_run=False, shard=None):
+    """Generate subscription orders for ``today`` in this process"""
+    generator = SubscriptionOrderGenerator(today=today, chunk_size=chunk_size, dry_run=dry_run)
+    return generator.run(active_subscriptions(generator.today, shard=shard).iterator(chunk_size=chunk_size))
+
+
+def _generate_shard(today, shard, chunk_size, dry_run):
+    # Forked workers must not reuse the parent's database connections
+    connections.close_all()
+    try:
+        return generate_orders(today=today, chunk_size=chunk_size, dry_run=dry_run, shard=shard)
+    finally:
+        connections.close_all()
+
+
+def generate_in_parallel(workers, today=None, chunk_size=ORDER_CHUNK_SIZE, dry_run=False):
+    """
+    Shard due subscriptions by id across ``workers`` forked processes.
+
+    Each shard commits its own chunks. SQLite allows a single writer (and a
+    shard's open read cursor blocks the others' commits), so there the run
+    falls back to one process.
+    """
+    today = today or timezone.now().date()
+    if connection.vendor == 'sqlite':
+        logger.warning("SQLite database: generating subscription orders in a single process")
+        return generate_orders(today=today, chunk_size=chunk_size, dry_run=dry_run)
+
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(_generate_shard, today, (index, workers), chunk_size, dry_run)
+            for index in range(workers)
+        ]
+        results = [future.result() for future in futures]
+
+    return {
+        'created': sum(result['created'] for result in results),
+        'failed': sum(result['failed'] for result in results),
+        'skipped': [message for result in results for message in result['skipped']],
+        'order_numbers': [number for result in results for number in result['order_numbers']],
+    }
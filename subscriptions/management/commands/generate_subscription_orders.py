@@ -1,13 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.db import transaction
-from datetime import date, timedelta
-from decimal import Decimal
 
-from subscriptions.models import Subscription, SubscriptionStatus, SubscriptionOrder
-from orders.models import Order, OrderItem, OrderStatus
-from payments.models import Payment, PaymentMethod, PaymentStatus
-from menu.models import MenuItem
+from subscriptions.batch import ORDER_CHUNK_SIZE, active_subscriptions, generate_in_parallel, generate_orders
 
 
 class Command(BaseCommand):
@@ -19,181 +13,52 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be created without actually creating orders',
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=ORDER_CHUNK_SIZE,
+            help=f'Subscriptions scored and written per transaction (default: {ORDER_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Shard subscriptions across this many worker processes',
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        workers = max(options['workers'], 1)
         today = timezone.now().date()
-        
-        # Get active subscriptions with auto-order enabled
-        active_subscriptions = Subscription.objects.filter(
-            status=SubscriptionStatus.ACTIVE,
-            auto_order_enabled=True,
-            start_date__lte=today,
-            end_date__gte=today
-        ).select_related('plan', 'user').prefetch_related('plan__menu_items')
-        
-        self.stdout.write(f'Found {active_subscriptions.count()} active subscriptions')
-        
-        orders_created = 0
-        
-        for subscription in active_subscriptions:
-            # Determine if order should be created today based on plan type
-            should_create = False
-            
-            if subscription.plan.plan_type == 'daily':
-                # Check if order already exists for today
-                existing_order = SubscriptionOrder.objects.filter(
-                    subscription=subscription,
-                    scheduled_date=today
-                ).exists()
-                should_create = not existing_order
-                
-            elif subscription.plan.plan_type == 'weekly':
-                # Create order once per week (e.g., every Monday)
-                days_since_start = (today - subscription.start_date).days
-                if days_since_start % 7 == 0:
-                    existing_order = SubscriptionOrder.objects.filter(
-                        subscription=subscription,
-                        scheduled_date=today
-                    ).exists()
-                    should_create = not existing_order
-                    
-            elif subscription.plan.plan_type == 'monthly':
-                # Create order once per month
-                days_since_start = (today - subscription.start_date).days
-                if days_since_start % 30 == 0:
-                    existing_order = SubscriptionOrder.objects.filter(
-                        subscription=subscription,
-                        scheduled_date=today
-                    ).exists()
-                    should_create = not existing_order
-            
-            if should_create:
-                try:
-                    if not dry_run:
-                        with transaction.atomic():
-                            # Use smart meal selection service
-                            from subscriptions.services import MealSelectionService
-                            menu_items = MealSelectionService.select_meals_for_subscription(
-                                subscription,
-                                count=subscription.plan.meals_per_cycle
-                            )
-                            
-                            if not menu_items:
-                                self.stdout.write(
-                                    self.style.WARNING(
-                                        f'No available menu items for subscription {subscription.id}'
-                                    )
-                                )
-                                continue
-                            
-                            # Get user's default delivery address
-                            from delivery.models import DeliveryAddress
-                            delivery_address = DeliveryAddress.objects.filter(
-                                user=subscription.user,
-                                is_default=True
-                            ).first()
-                            
-                            if not delivery_address:
-                                delivery_addresses = DeliveryAddress.objects.filter(user=subscription.user)
-                                if delivery_addresses.exists():
-                                    delivery_address = delivery_addresses.first()
-                                else:
-                                    self.stdout.write(
-                                        self.style.WARNING(
-                                            f'No delivery address for user {subscription.user.username}'
-                                        )
-                                    )
-                                    continue
-                            
-                            # Calculate totals
-                            subtotal = sum(item.price for item in menu_items)
-                            delivery_charge = delivery_address.get_delivery_charge()
-                            total = subtotal + delivery_charge
-                            
-                            # Create order
-                            order = Order.objects.create(
-                                user=subscription.user,
-                                status=OrderStatus.PENDING,
-                                customer_name=subscription.user.get_full_name() or subscription.user.username,
-                                customer_phone=delivery_address.phone,
-                                delivery_address=delivery_address.get_full_address(),
-                                delivery_instructions=subscription.dietary_preferences or '',
-                                subtotal=subtotal,
-                                delivery_charge=delivery_charge,
-                                total=total
-                            )
-                            
-                            # Create order items
-                            for menu_item in menu_items:
-                                OrderItem.objects.create(
-                                    order=order,
-                                    menu_item=menu_item,
-                                    quantity=1,
-                                    price=menu_item.price,
-                                    subtotal=menu_item.price
-                                )
-                            
-                            # Create payment record
-                            Payment.objects.create(
-                                order=order,
-                                payment_method=PaymentMethod.CASH_ON_DELIVERY,
-                                status=PaymentStatus.PENDING,
-                                amount=total
-                            )
-                            
-                            # Create subscription order link
-                            SubscriptionOrder.objects.create(
-                                subscription=subscription,
-                                order=order,
-                                scheduled_date=today
-                            )
-                            
-                            orders_created += 1
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f'Created order {order.order_number} for subscription {subscription.id}'
-                                )
-                            )
-                    else:
-                        self.stdout.write(
-                            f'[DRY RUN] Would create order for subscription {subscription.id}'
-                        )
-                        orders_created += 1
-                        
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f'Error creating order for subscription {subscription.id}: {str(e)}'
-                        )
-                    )
-        
+
+        self.stdout.write(f'Found {active_subscriptions(today).count()} active subscriptions without an order today')
+
+        if workers > 1:
+            result = generate_in_parallel(
+                workers, today=today, chunk_size=options['chunk_size'], dry_run=dry_run
+            )
+        else:
+            result = generate_orders(today=today, chunk_size=options['chunk_size'], dry_run=dry_run)
+
+        for message in result['skipped']:
+            self.stdout.write(self.style.WARNING(message))
+        if options['verbosity'] > 1:
+            for order_number in result['order_numbers']:
+                self.stdout.write(self.style.SUCCESS(f'Created order {order_number}'))
+        if result['failed']:
+            self.stdout.write(
+                self.style.ERROR(f"Failed to create {result['failed']} orders; see the log for details")
+            )
+
         if dry_run:
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'[DRY RUN] Would create {orders_created} orders'
+                    f"[DRY RUN] Would create {result['created']} orders"
                 )
             )
         else:
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Successfully created {orders_created} subscription orders'
+                    f"Successfully created {result['created']} subscription orders"
                 )
             )
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -29,104 +29,19 @@ class MealSelectionService:
         - Dietary preferences
         - Meal variety
         - Plan menu items (if specified)
+
+        Scoring is shared with the batch order generator (subscriptions.batch).
         """
+        from .batch import MenuCatalog, load_preferences, select_meals
+
         if count is None:
             count = subscription.plan.meals_per_cycle
-        
-        # Start with plan's menu items if specified
-        if subscription.plan.menu_items.exists():
-            available_items = subscription.plan.menu_items.filter(is_available=True)
-        else:
-            available_items = MenuItem.objects.filter(is_available=True)
-        
-        # Filter by dietary preferences if specified
-        if subscription.dietary_preferences:
-            dietary_keywords = subscription.dietary_preferences.lower().split()
-            # Filter by dietary tags or ingredients
-            dietary_query = Q()
-            for keyword in dietary_keywords:
-                dietary_query |= Q(dietary_tags__name__icontains=keyword) | \
-                                 Q(ingredients__icontains=keyword)
-            if dietary_query:
-                available_items = available_items.filter(dietary_query).distinct()
-        
-        if not available_items.exists():
-            return MenuItem.objects.filter(is_available=True)[:count]
-        
-        # Get user's order history for preferences
-        user_orders = Order.objects.filter(
-            user=subscription.user,
-            status__in=['delivered', 'ready']
-        ).prefetch_related('items__menu_item')
-        
-        # Get user's reviewed items (they liked these)
-        reviewed_items = Review.objects.filter(
-            user=subscription.user,
-            rating__gte=4,
-            is_approved=True
-        ).values_list('menu_item_id', flat=True)
-        
-        # Get user's frequently ordered items
-        frequently_ordered = OrderItem.objects.filter(
-            order__user=subscription.user,
-            order__status__in=['delivered', 'ready']
-        ).values('menu_item').annotate(
-            order_count=Count('id')
-        ).order_by('-order_count')[:10].values_list('menu_item', flat=True)
-        
-        # Score items based on multiple factors
-        scored_items = []
-        for item in available_items:
-            score = 0.0
-            
-            # Base score from ratings
-            avg_rating = item.average_rating or 0
-            score += float(avg_rating) * 2  # Weight ratings highly
-            
-            # Boost if user reviewed it positively
-            if item.id in reviewed_items:
-                score += 5.0
-            
-            # Boost if user orders it frequently
-            if item.id in frequently_ordered:
-                score += 3.0
-            
-            # Boost if featured
-            if item.is_featured:
-                score += 2.0
-            
-            # Boost if has many reviews (popular)
-            review_count = item.total_reviews or 0
-            score += min(review_count * 0.1, 2.0)  # Cap at 2.0
-            
-            scored_items.append((item, score))
-        
-        # Sort by score
-        scored_items.sort(key=lambda x: x[1], reverse=True)
-        
-        # Select top items with variety
-        selected = []
-        selected_categories = set()
-        
-        for item, score in scored_items:
-            if len(selected) >= count:
-                break
-            
-            # Ensure variety - don't select too many from same category
-            category_id = item.category_id
-            category_count = sum(1 for cat in selected_categories if cat == category_id)
-            
-            if category_count < count // 2 or len(selected_categories) < 2:
-                selected.append(item)
-                selected_categories.add(category_id)
-        
-        # If we don't have enough, fill with random from top scored
-        if len(selected) < count:
-            remaining = [item for item, _ in scored_items if item not in selected]
-            needed = count - len(selected)
-            selected.extend(remaining[:needed])
-        
-        return selected[:count]
+
+        catalog = MenuCatalog()
+        preferences = load_preferences(catalog, [subscription.user_id])
+        selection, = select_meals(catalog, [subscription], preferences, counts=[count])
+        items = MenuItem.objects.in_bulk([int(catalog.ids[index]) for index in selection])
+        return [items[int(catalog.ids[index])] for index in selection]
     
     @staticmethod
     def get_recommended_meals(user, count=5):
@@ -64,38 +64,43 @@ def handle_subscription_save(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=Payment)
 def handle_payment_completion(sender, instance, created, **kwargs):
+    """Reward completed payments"""
+    if instance.status == 'completed':
+        reward_completed_payment(instance)
+
+
+def reward_completed_payment(payment):
     """
     Handle actions when a payment is completed:
     1. Award loyalty points
     2. Update VIP tier
     3. Check for referral completion
     """
-    if instance.status == 'completed':
-        user = instance.user
-        if not user:
-            return
-
-        # 1. Award loyalty points
-        LoyaltyService.award_loyalty_points(
-            user=user,
-            amount=instance.amount,
-            reason=f"Payment for {instance.invoice_number or 'Order'}",
-            related_object=instance
-        )
-        
-        # 2. Update VIP Tier
-        LoyaltyService.calculate_vip_tier(user)
-        
-        # 3. Check referral completion (if this is the first payment)
-        # We check if this is the user's first completed payment
-        # Note: We filter by order__user or subscription__user since Payment doesn't have direct user field
-        completed_payments_count = Payment.objects.filter(
-            models.Q(order__user=user) | models.Q(subscription__user=user),
-            status='completed'
-        ).count()
-        
-        if completed_payments_count == 1:
-            LoyaltyService.process_referral_completion(user)
+    user = payment.user
+    if not user:
+        return
+
+    # 1. Award loyalty points
+    LoyaltyService.award_loyalty_points(
+        user=user,
+        amount=payment.amount,
+        reason=f"Payment for {payment.invoice_number or 'Order'}",
+        related_object=payment
+    )
+    
+    # 2. Update VIP Tier
+    LoyaltyService.calculate_vip_tier(user)
+    
+    # 3. Check referral completion (if this is the first payment)
+    # We check if this is the user's first completed payment
+    # Note: We filter by order__user or subscription__user since Payment doesn't have direct user field
+    completed_payments_count = Payment.objects.filter(
+        models.Q(order__user=user) | models.Q(subscription__user=user),
+        status='completed'
+    ).count()
+    
+    if completed_payments_count == 1:
+        LoyaltyService.process_referral_completion(user)
 
 
 @receiver(post_save, sender=ReferralProgram)
@@ -1,3 +1,94 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from analytics.models import OrderItemRollup, OrderRollup
+from delivery.models import DeliveryAddress
+from menu.models import Category, MenuItem
+from notifications.models import Notification
+from orders.models import Order, OrderEvent, OrderEventState
+from reviews.models import Review
+
+from .batch import MenuCatalog, load_preferences, select_meals
+from .models import Subscription, SubscriptionOrder, SubscriptionPlan
+from .services import MealSelectionService
+
+
+class SubscriptionOrderBatchTests(TestCase):
+    """Vectorized meal selection and bulk subscription order generation"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        lunch = Category.objects.create(name='Lunch', slug='lunch')
+        soup = Category.objects.create(name='Soup', slug='soup')
+        self.rice = MenuItem.objects.create(
+            name='Rice', description='Rice', category=lunch, price=Decimal('1500.00'), average_rating=Decimal('4.5')
+        )
+        self.beans = MenuItem.objects.create(
+            name='Beans', description='Beans', category=lunch, price=Decimal('1000.00'), ingredients='beans, onion'
+        )
+        self.broth = MenuItem.objects.create(
+            name='Broth', description='Broth', category=soup, price=Decimal('800.00'), is_featured=True
+        )
+        self.plan = SubscriptionPlan.objects.create(
+            name='Daily Lunch', description='Lunch', price=Decimal('30000.00'), meals_per_cycle=2, duration_days=30
+        )
+
+        self.subscriptions = []
+        for name in ('alice', 'bob', 'carol'):
+            user = User.objects.create_user(username=name, password='pass12345')
+            DeliveryAddress.objects.create(
+                user=user, full_name=name, phone='0788000000', address_line1='Ward 3', is_default=True
+            )
+            self.subscriptions.append(Subscription.objects.create(
+                user=user, plan=self.plan, start_date=self.today, end_date=self.today + timedelta(days=30)
+            ))
+        self.alice, self.bob, self.carol = self.subscriptions
+        Review.objects.create(user=self.alice.user, menu_item=self.beans, rating=4, is_approved=True, comment='Great beans, every time.')
+
+    def test_scoring_uses_reviews_and_dietary_preferences(self):
+        self.bob.dietary_preferences = 'Beans'
+        catalog = MenuCatalog()
+        subscriptions = [self.alice, self.bob, self.carol]
+        preferences = load_preferences(catalog, [s.user_id for s in subscriptions])
+
+        chosen = [
+            [int(catalog.ids[index]) for index in selection]
+            for selection in select_meals(catalog, subscriptions, preferences)
+        ]
+        self.assertEqual(chosen[0], [self.beans.pk, self.rice.pk])
+        self.assertEqual(chosen[1], [self.beans.pk])
+        self.assertEqual(chosen[2], [self.rice.pk, self.beans.pk])
+        self.assertEqual(
+            MealSelectionService.select_meals_for_subscription(self.alice), [self.beans, self.rice]
+        )
+
+    def test_command_bulk_creates_orders_once_per_day(self):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_subscription_orders', '--chunk-size', '2', stdout=out)
+        self.assertIn('Successfully created 3 subscription orders', out.getvalue())
+
+        link = SubscriptionOrder.objects.select_related('order__payment').get(subscription=self.alice)
+        order = link.order
+        self.assertEqual(link.scheduled_date, self.today)
+        self.assertEqual(order.delivery_address.user, self.alice.user)
+        self.assertEqual(order.subtotal, Decimal('2500.00'))
+        self.assertEqual(order.total, Decimal('4500.00'))
+        self.assertEqual(order.payment.amount, order.total)
+        self.assertEqual(order.items.count(), 2)
+        # The order event subscribers see bulk-created orders like saved ones
+        self.assertEqual(OrderEvent.objects.get(order=order).state, OrderEventState.PROCESSED)
+        self.assertEqual(Notification.objects.filter(order=order, title='Order Placed').count(), 1)
+        self.assertEqual(Notification.objects.filter(payment=order.payment, title='Payment Initiated').count(), 1)
+
+        self.assertEqual(OrderRollup.objects.get(status='pending').order_count, 3)
+        self.assertEqual(OrderItemRollup.objects.filter(menu_item=self.rice).get().quantity, 3)
 
-# Create your tests here.
+        call_command('generate_subscription_orders', stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 3)
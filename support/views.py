@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.paginator import Paginator
+from dusangire.pagination import CursorPaginator
 from django.http import JsonResponse
 from django.core.mail import send_mail
 from django.conf import settings
@@ -106,7 +107,7 @@ def staff_ticket_list(request):
         messages.error(request, "You don't have permission to access this page.")
         return redirect('support:ticket_list')
     
-    tickets = SupportTicket.objects.all().select_related('user', 'assigned_to').order_by('-created_at')
+    tickets = SupportTicket.objects.all().select_related('user', 'assigned_to')
     
     # Filters
     status_filter = request.GET.get('status', '')
@@ -119,10 +120,19 @@ def staff_ticket_list(request):
     elif assigned_filter == 'unassigned':
         tickets = tickets.filter(assigned_to__isnull=True)
     
-    # Pagination
-    paginator = Paginator(tickets, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (created_at, id)
+    page_obj = CursorPaginator(tickets, 20).get_page(request)
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(page_obj.as_json(lambda ticket: {
+            'id': ticket.id,
+            'subject': ticket.subject,
+            'status': ticket.status,
+            'priority': ticket.priority,
+            'user': ticket.user.username,
+            'assigned_to': ticket.assigned_to.username if ticket.assigned_to else None,
+            'created_at': ticket.created_at.isoformat(),
+        }))
     
     context = {
         'page_obj': page_obj,